@@ -0,0 +1,394 @@
+import hashlib
+import json
+import os
+import tarfile
+import tempfile
+import time
+from typing import Dict, List, Any, Iterator, Optional, Tuple, BinaryIO
+from utils.atomic_files import RACY_WINDOW_NS, atomic_write, discard_temp, write_temp
+from utils.logger import Logger
+
+try:
+    import zstandard
+except ImportError:  # Sem zstandard os arquivos são comprimidos com gzip
+    zstandard = None
+
+CHUNK_SIZE = 1024 * 1024
+
+# Um diferencial maior que isso em relação ao completo já compensa um novo completo
+MAX_DIFF_RATIO = 0.5
+
+
+def _read_chunks(file_obj: BinaryIO) -> Iterator[bytes]:
+    while True:
+        chunk = file_obj.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in _read_chunks(f):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _HashingReader:
+    """Repassa as leituras do arquivo calculando o sha256 do que foi de fato lido."""
+
+    def __init__(self, file_obj: BinaryIO):
+        self.file_obj = file_obj
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.file_obj.read(size)
+        self.digest.update(chunk)
+        self.size += len(chunk)
+        return chunk
+
+
+class BackupStore:
+    """
+    Armazenamento de backups em arquivos tar comprimidos (zstd, ou gzip se o
+    zstandard não estiver instalado). Um backup completo guarda todos os
+    arquivos; um diferencial guarda só os que mudaram desde o último completo
+    e aponta para ele, então restaurar lê no máximo dois arquivos tar.
+    Cada backup tem um manifesto manifests/<nome>.json com o sha256, o
+    tamanho, o modo e o tar de onde vem cada arquivo. Um índice de stat
+    (mtime, tamanho) evita reler arquivos que não mudaram. Manifestos do
+    formato anterior, sem tar, ainda são lidos dos blobs soltos em
+    objects/<sha[:2]>/<sha256>.
+    """
+
+    def __init__(self, root: str, full_every: Optional[int] = None, compression: Optional[str] = None):
+        self.root = os.path.abspath(root)
+        self.objects_dir = os.path.join(self.root, 'objects')
+        self.archives_dir = os.path.join(self.root, 'archives')
+        self.manifests_dir = os.path.join(self.root, 'manifests')
+        self.index_file = os.path.join(self.root, 'index.json')
+        self.full_every = full_every or int(os.getenv('BACKUP_FULL_EVERY', '7'))
+        self.compression = compression or os.getenv('BACKUP_COMPRESSION', 'zstd' if zstandard else 'gzip')
+        if self.compression == 'zstd' and zstandard is None:
+            self.compression = 'gzip'
+        self.logger = Logger("BackupStore")
+
+        os.makedirs(self.archives_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        self._index: Dict[str, Dict[str, Any]] = self._load_index()
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.index_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        atomic_write(self.index_file, json.dumps(self._index))
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def manifest_path(self, backup_name: str) -> str:
+        return os.path.join(self.manifests_dir, f"{backup_name}.json")
+
+    def _hash(self, file_path: str, stat: os.stat_result) -> str:
+        """sha256 do arquivo, reaproveitando o índice quando mtime e tamanho não mudaram."""
+        key = os.path.abspath(file_path)
+        entry = self._index.get(key)
+        if (entry is not None and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size
+                and entry['mtime_ns'] < entry['verified_at_ns'] - RACY_WINDOW_NS):
+            return entry['sha256']
+        sha256 = file_sha256(file_path)
+        self._index[key] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': sha256,
+                            'verified_at_ns': time.time_ns()}
+        return sha256
+
+    def list_manifests(self) -> List[Dict[str, Any]]:
+        """Manifestos existentes, do mais antigo para o mais recente."""
+        manifests = []
+        for name in os.listdir(self.manifests_dir):
+            if name.endswith('.json'):
+                with open(os.path.join(self.manifests_dir, name), 'r') as f:
+                    manifests.append(json.load(f))
+        manifests.sort(key=lambda manifest: manifest.get('created_at', 0))
+        return manifests
+
+    def load_manifest(self, backup_name: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.manifest_path(backup_name), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _latest_full(self, manifests: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        for manifest in reversed(manifests):
+            # Completo sem arquivos (todos ausentes) não tem tar e não serve de base
+            if (manifest.get('kind') == 'full' and manifest.get('archive')
+                    and os.path.exists(os.path.join(self.archives_dir, manifest['archive']))):
+                return manifest
+        return None
+
+    @staticmethod
+    def _add_files(tar: tarfile.TarFile, base_path: str, paths: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Adiciona os arquivos ao tar calculando o sha256 dos bytes gravados,
+        para o manifesto descrever o que está no tar mesmo que o arquivo
+        mude durante o backup.
+        """
+        entries = {}
+        for relative_path in paths:
+            with open(os.path.join(base_path, relative_path), 'rb') as f:
+                member = tar.gettarinfo(arcname=relative_path, fileobj=f)
+                reader = _HashingReader(f)
+                # Se o arquivo encolher no meio da leitura o tarfile levanta OSError e o backup falha
+                tar.addfile(member, reader)
+            entries[relative_path] = {'sha256': reader.digest.hexdigest(), 'size': reader.size,
+                                      'mode': member.mode & 0o7777}
+        return entries
+
+    def _write_archive(self, archive_name: str, base_path: str,
+                       paths: List[str]) -> Tuple[int, Dict[str, Dict[str, Any]]]:
+        """
+        Grava os arquivos em um tar comprimido, de forma atômica. Retorna o
+        tamanho em disco e {caminho: {sha256, size, mode}} do que foi gravado.
+        """
+        archive_path = os.path.join(self.archives_dir, archive_name)
+        fd, temp_path = tempfile.mkstemp(dir=self.archives_dir, prefix=f".{archive_name}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw:
+                if archive_name.endswith('.zst'):
+                    with zstandard.ZstdCompressor().stream_writer(raw, closefd=False) as stream, \
+                            tarfile.open(fileobj=stream, mode='w|') as tar:
+                        archived = self._add_files(tar, base_path, paths)
+                else:
+                    with tarfile.open(fileobj=raw, mode='w:gz') as tar:
+                        archived = self._add_files(tar, base_path, paths)
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.replace(temp_path, archive_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return os.path.getsize(archive_path), archived
+
+    def _iter_archive(self, archive_name: str) -> Iterator[Tuple[tarfile.TarInfo, BinaryIO]]:
+        """Percorre o tar em modo stream, entregando (membro, conteúdo) de cada arquivo."""
+        if archive_name.endswith('.zst') and zstandard is None:
+            raise RuntimeError(f"zstandard não instalado: não é possível ler {archive_name}")
+        with open(os.path.join(self.archives_dir, archive_name), 'rb') as raw:
+            if archive_name.endswith('.zst'):
+                stream, mode = zstandard.ZstdDecompressor().stream_reader(raw), 'r|'
+            else:
+                stream, mode = raw, 'r|gz'
+            with tarfile.open(fileobj=stream, mode=mode) as tar:
+                for member in tar:
+                    if member.isfile():
+                        yield member, tar.extractfile(member)
+
+    def snapshot(self, base_path: str, files: List[str], backup_name: str,
+                 metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Registra os arquivos (relativos a base_path) no backup backup_name:
+        completo a cada full_every backups (ou quando o diferencial já seria
+        grande demais), senão diferencial sobre o último completo.
+        Retorna {manifest, kind, base, files_backed_up, files_archived,
+        bytes_written, raw_bytes}.
+        """
+        entries = {}
+        for relative_path in files:
+            source_path = os.path.join(base_path, relative_path)
+            try:
+                stat = os.stat(source_path)
+            except FileNotFoundError:
+                continue
+            entries[relative_path] = {'sha256': self._hash(source_path, stat), 'size': stat.st_size,
+                                      'mode': stat.st_mode & 0o7777}
+
+        manifests = self.list_manifests()
+        full = self._latest_full(manifests)
+        changed = list(entries)
+        if full is not None:
+            changed = [path for path, entry in entries.items()
+                       if full['files'].get(path, {}).get('sha256') != entry['sha256']]
+            diffs_since_full = sum(1 for manifest in manifests if manifest.get('base') == full['backup_name'])
+            full_bytes = sum(entry['size'] for entry in full['files'].values())
+            if (diffs_since_full + 1 >= self.full_every
+                    or sum(entries[path]['size'] for path in changed) > full_bytes * MAX_DIFF_RATIO):
+                full = None
+                changed = list(entries)
+
+        archive_name = None
+        bytes_written = 0
+        if changed:
+            archive_name = f"{backup_name}.tar.{'zst' if self.compression == 'zstd' else 'gz'}"
+            bytes_written, archived = self._write_archive(archive_name, base_path, changed)
+            # O manifesto registra o sha256 do que entrou no tar, não o calculado antes
+            entries.update(archived)
+        for path, entry in entries.items():
+            entry['archive'] = archive_name if path in changed else full['files'][path]['archive']
+
+        manifest = dict(metadata or {}, backup_name=backup_name, created_at=time.time(),
+                        kind='full' if full is None else 'diff',
+                        base=None if full is None else full['backup_name'],
+                        archive=archive_name, archive_size=bytes_written, files=entries)
+        atomic_write(self.manifest_path(backup_name), json.dumps(manifest, indent=2))
+        self._save_index()
+        return {
+            'manifest': self.manifest_path(backup_name),
+            'kind': manifest['kind'],
+            'base': manifest['base'],
+            'files_backed_up': list(entries),
+            'files_archived': len(changed),
+            'bytes_written': bytes_written,
+            'raw_bytes': sum(entries[path]['size'] for path in changed)
+        }
+
+    def restore(self, base_path: str, backup_name: str) -> Dict[str, Any]:
+        """
+        Restaura em base_path os arquivos do manifesto, cada um lido do
+        diferencial ou do completo em que está. Arquivos cujo conteúdo já é o
+        do backup não são reescritos. Retorna {files_restored, files_skipped,
+        archives_read}.
+        """
+        manifest = self.load_manifest(backup_name)
+        if manifest is None:
+            raise FileNotFoundError(f"Manifesto não encontrado: {backup_name}")
+
+        result = {'files_restored': [], 'files_skipped': [], 'archives_read': []}
+        pending: Dict[Optional[str], Dict[str, Dict[str, Any]]] = {}
+        for relative_path, entry in manifest['files'].items():
+            target_path = os.path.join(base_path, relative_path)
+            try:
+                stat = os.stat(target_path)
+            except FileNotFoundError:
+                stat = None
+            if stat is not None and stat.st_size == entry['size'] and self._hash(target_path, stat) == entry['sha256']:
+                result['files_skipped'].append(relative_path)
+            else:
+                pending.setdefault(entry.get('archive'), {})[relative_path] = entry
+
+        for archive_name, wanted in pending.items():
+            if archive_name is None:
+                # Formato anterior: conteúdo em blobs soltos
+                for relative_path, entry in wanted.items():
+                    with open(self.blob_path(entry['sha256']), 'rb') as source:
+                        self._restore_file(base_path, relative_path, entry, source)
+                    result['files_restored'].append(relative_path)
+                continue
+            for member, source in self._iter_archive(archive_name):
+                entry = wanted.pop(member.name, None)
+                if entry is not None:
+                    self._restore_file(base_path, member.name, entry, source)
+                    result['files_restored'].append(member.name)
+            result['archives_read'].append(archive_name)
+            if wanted:
+                raise FileNotFoundError(f"Arquivos ausentes em {archive_name}: {', '.join(sorted(wanted))}")
+
+        self._save_index()
+        return result
+
+    @staticmethod
+    def _restore_file(base_path: str, relative_path: str, entry: Dict[str, Any], source: BinaryIO):
+        digest = hashlib.sha256()
+
+        def chunks():
+            for chunk in _read_chunks(source):
+                digest.update(chunk)
+                yield chunk
+
+        # O arquivo em uso só é substituído depois de conferido o sha256 do conteúdo
+        target_path = os.path.join(base_path, relative_path)
+        temp_path = write_temp(target_path, chunks())
+        try:
+            if digest.hexdigest() != entry['sha256']:
+                raise ValueError(f"Conteúdo restaurado de {relative_path} não confere com o sha256 do backup")
+            os.chmod(temp_path, entry['mode'])
+            os.replace(temp_path, target_path)
+        except Exception:
+            discard_temp(temp_path)
+            raise
+
+    def delete_manifest(self, backup_name: str) -> bool:
+        try:
+            os.remove(self.manifest_path(backup_name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _references(manifests: List[Dict[str, Any]]) -> Tuple[set, set]:
+        """Nomes dos tar e sha256 dos blobs usados pelos manifestos."""
+        archives, blobs = set(), set()
+        for manifest in manifests:
+            for entry in manifest['files'].values():
+                if entry.get('archive'):
+                    archives.add(entry['archive'])
+                else:
+                    blobs.add(entry['sha256'])
+        return archives, blobs
+
+    def freeable_bytes(self, backup_names: List[str]) -> int:
+        """
+        Bytes que remover esses backups liberaria: os tar e blobs que só eles
+        usam. Um completo do qual um diferencial mantido depende não conta.
+        """
+        removed = set(backup_names)
+        manifests = self.list_manifests()
+        kept_archives, kept_blobs = self._references(
+            [manifest for manifest in manifests if manifest.get('backup_name') not in removed])
+        archives, blobs = self._references(
+            [manifest for manifest in manifests if manifest.get('backup_name') in removed])
+        paths = [os.path.join(self.archives_dir, name) for name in archives - kept_archives]
+        paths += [self.blob_path(sha256) for sha256 in blobs - kept_blobs]
+        return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+    def collect_garbage(self) -> Dict[str, int]:
+        """
+        Remove os tar e blobs que nenhum manifesto referencia. Um completo
+        fica enquanto houver diferencial apontando para ele.
+        Retorna {files_removed, bytes_freed}.
+        """
+        archives, blobs = self._references(self.list_manifests())
+        candidates = [(os.path.join(self.archives_dir, name), name in archives)
+                      for name in os.listdir(self.archives_dir)]
+        if os.path.isdir(self.objects_dir):
+            for prefix in os.listdir(self.objects_dir):
+                candidates.extend((os.path.join(self.objects_dir, prefix, sha256), sha256 in blobs)
+                                  for sha256 in os.listdir(os.path.join(self.objects_dir, prefix)))
+
+        files_removed, bytes_freed = 0, 0
+        for path, referenced in candidates:
+            # Temporários de gravações em andamento começam com '.'
+            if referenced or os.path.basename(path).startswith('.'):
+                continue
+            bytes_freed += os.path.getsize(path)
+            os.remove(path)
+            files_removed += 1
+        if files_removed:
+            self.logger.info(f"{files_removed} arquivos de backup sem referência removidos ({bytes_freed} bytes)")
+        return {'files_removed': files_removed, 'bytes_freed': bytes_freed}
+
+    def disk_usage(self) -> int:
+        """Bytes ocupados pelos tar e blobs do armazenamento."""
+        total = sum(os.path.getsize(os.path.join(self.archives_dir, name)) for name in os.listdir(self.archives_dir))
+        if os.path.isdir(self.objects_dir):
+            for prefix in os.listdir(self.objects_dir):
+                prefix_dir = os.path.join(self.objects_dir, prefix)
+                total += sum(os.path.getsize(os.path.join(prefix_dir, name)) for name in os.listdir(prefix_dir))
+        return total
+
+    def get_stats(self) -> Dict[str, Any]:
+        manifests = self.list_manifests()
+        return {
+            'manifests': len(manifests),
+            'full': sum(1 for manifest in manifests if manifest.get('kind') == 'full'),
+            'diff': sum(1 for manifest in manifests if manifest.get('kind') == 'diff'),
+            'archives': len(os.listdir(self.archives_dir)),
+            'bytes': self.disk_usage(),
+            'compression': self.compression
+        }
@@ -7,6 +7,8 @@ from datetime import datetime
 from typing import Dict, List, Any, Optional
 import git
 from utils.logger import Logger
+from utils.workspace_scanner import get_workspace_scanner
+from .backup_store import BackupStore
 
 class SorteDeploymentManager:
     """
@@ -18,14 +20,22 @@ class SorteDeploymentManager:
         self.base_path = base_path
         self.logger = Logger("SorteDeploymentManager")
         
+        # Varredura do projeto compartilhada com o editor e o guardião
+        self.scanner = get_workspace_scanner(base_path)
+        
         # Configurações de deploy
         self.backup_dir = os.path.join(base_path, "backups")
         self.deploy_history_file = os.path.join(base_path, "deploy_history.json")
-        self.max_backups = 10  # Manter apenas os 10 backups mais recentes
+        # Diferenciais comprimidos são pequenos: bem mais pontos de restauração no mesmo espaço
+        self.max_backups = int(os.getenv('BACKUP_MAX_COUNT', '50'))
+        self.max_backup_bytes = int(os.getenv('BACKUP_MAX_MB', '100')) * 1024 * 1024
         
         # Inicializar diretórios
         os.makedirs(self.backup_dir, exist_ok=True)
         
+        # Tar comprimidos completos/diferenciais + um manifesto por backup
+        self.backup_store = BackupStore(self.backup_dir)
+        
         # Inicializar histórico de deploy
         self.deploy_history = self._load_deploy_history()
         
@@ -50,39 +60,36 @@ class SorteDeploymentManager:
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_name = f"backup_{timestamp}_{backup_reason}"
-        backup_path = os.path.join(self.backup_dir, backup_name)
+        started_at = time.perf_counter()
+        
+        backup_info = {
+            "timestamp": timestamp,
+            "reason": backup_reason,
+            "backup_name": backup_name,
+            "backup_path": self.backup_store.manifest_path(backup_name),
+            "files_backed_up": [],
+            "git_commit": None,
+            "system_state": None,
+            "success": False
+        }
         
         try:
-            os.makedirs(backup_path, exist_ok=True)
-            
-            backup_info = {
-                "timestamp": timestamp,
-                "reason": backup_reason,
-                "backup_name": backup_name,
-                "backup_path": backup_path,
-                "files_backed_up": [],
-                "git_commit": self._get_current_git_commit(),
-                "system_state": self._capture_system_state(),
-                "success": False
-            }
-            
-            # Backup dos arquivos críticos
-            for file_path in self.critical_files:
-                source_path = os.path.join(self.base_path, file_path)
-                if os.path.exists(source_path):
-                    # Criar estrutura de diretórios no backup
-                    backup_file_path = os.path.join(backup_path, file_path)
-                    os.makedirs(os.path.dirname(backup_file_path), exist_ok=True)
-                    
-                    # Copiar arquivo
-                    shutil.copy2(source_path, backup_file_path)
-                    backup_info["files_backed_up"].append(file_path)
-                    self.logger.info(f"Arquivo copiado para backup: {file_path}")
+            backup_info["git_commit"] = self._get_current_git_commit()
+            backup_info["system_state"] = self._capture_system_state()
             
-            # Salvar informações do backup
-            backup_info_file = os.path.join(backup_path, "backup_info.json")
-            with open(backup_info_file, 'w') as f:
-                json.dump(backup_info, f, indent=2)
+            # Backup dos arquivos críticos: o diferencial só leva o que mudou desde o último completo
+            snapshot = self.backup_store.snapshot(
+                self.base_path, self.critical_files, backup_name,
+                metadata={key: backup_info[key] for key in ("timestamp", "reason", "git_commit", "system_state")}
+            )
+            backup_info["files_backed_up"] = snapshot["files_backed_up"]
+            backup_info["kind"] = snapshot["kind"]
+            backup_info["base"] = snapshot["base"]
+            backup_info["files_archived"] = snapshot["files_archived"]
+            backup_info["bytes_written"] = snapshot["bytes_written"]
+            backup_info["duration"] = time.perf_counter() - started_at
+            self.logger.info(f"Backup {snapshot['kind']}: {len(snapshot['files_backed_up'])} arquivos, "
+                             f"{snapshot['files_archived']} gravados ({snapshot['bytes_written']} bytes comprimidos)")
             
             backup_info["success"] = True
             
@@ -189,39 +196,21 @@ class SorteDeploymentManager:
             "timestamp": datetime.now().strftime("%Y%m%d_%H%M%S"),
             "backup_name": backup_name,
             "files_restored": [],
+            "files_skipped": [],
             "success": False,
             "error": None
         }
         
         try:
-            backup_path = os.path.join(self.backup_dir, backup_name)
-            
-            if not os.path.exists(backup_path):
-                raise Exception(f"Backup não encontrado: {backup_name}")
-            
-            # Carregar informações do backup
-            backup_info_file = os.path.join(backup_path, "backup_info.json")
-            if os.path.exists(backup_info_file):
-                with open(backup_info_file, 'r') as f:
-                    backup_info = json.load(f)
-                    files_to_restore = backup_info.get("files_backed_up", [])
-            else:
-                # Fallback: restaurar todos os arquivos críticos
-                files_to_restore = self.critical_files
-            
-            # Restaurar arquivos
-            for file_path in files_to_restore:
-                backup_file_path = os.path.join(backup_path, file_path)
-                target_file_path = os.path.join(self.base_path, file_path)
-                
-                if os.path.exists(backup_file_path):
-                    # Criar diretório de destino se necessário
-                    os.makedirs(os.path.dirname(target_file_path), exist_ok=True)
-                    
-                    # Restaurar arquivo
-                    shutil.copy2(backup_file_path, target_file_path)
-                    rollback_info["files_restored"].append(file_path)
+            if self.backup_store.load_manifest(backup_name) is not None:
+                # Lê do diferencial e do completo; arquivos que já têm o conteúdo do backup ficam como estão
+                restored = self.backup_store.restore(self.base_path, backup_name)
+                rollback_info["files_restored"] = restored["files_restored"]
+                rollback_info["files_skipped"] = restored["files_skipped"]
+                for file_path in restored["files_restored"]:
                     self.logger.info(f"Arquivo restaurado: {file_path}")
+            else:
+                self._restore_directory_backup(backup_name, rollback_info)
             
             rollback_info["success"] = True
             self.logger.info(f"Rollback executado com sucesso para backup: {backup_name}")
@@ -237,6 +226,39 @@ class SorteDeploymentManager:
             rollback_info["error"] = str(e)
             return rollback_info
     
+    def _restore_directory_backup(self, backup_name: str, rollback_info: Dict[str, Any]):
+        """
+        Restaura um backup no formato antigo (cópia completa em diretório).
+        """
+        backup_path = os.path.join(self.backup_dir, backup_name)
+        
+        if not os.path.exists(backup_path):
+            raise Exception(f"Backup não encontrado: {backup_name}")
+        
+        # Carregar informações do backup
+        backup_info_file = os.path.join(backup_path, "backup_info.json")
+        if os.path.exists(backup_info_file):
+            with open(backup_info_file, 'r') as f:
+                backup_info = json.load(f)
+                files_to_restore = backup_info.get("files_backed_up", [])
+        else:
+            # Fallback: restaurar todos os arquivos críticos
+            files_to_restore = self.critical_files
+        
+        # Restaurar arquivos
+        for file_path in files_to_restore:
+            backup_file_path = os.path.join(backup_path, file_path)
+            target_file_path = os.path.join(self.base_path, file_path)
+            
+            if os.path.exists(backup_file_path):
+                # Criar diretório de destino se necessário
+                os.makedirs(os.path.dirname(target_file_path), exist_ok=True)
+                
+                # Restaurar arquivo
+                shutil.copy2(backup_file_path, target_file_path)
+                rollback_info["files_restored"].append(file_path)
+                self.logger.info(f"Arquivo restaurado: {file_path}")
+    
     def _run_pre_deploy_validations(self) -> Dict[str, Any]:
         """
         Executa validações antes do deploy.
@@ -302,29 +324,11 @@ class SorteDeploymentManager:
     
     def _validate_python_syntax(self) -> Dict[str, Any]:
         """
-        Valida a sintaxe de todos os arquivos Python críticos.
+        Valida a sintaxe (compilação) de todos os arquivos Python do projeto,
+        fora de venv e backups, em paralelo.
         """
         try:
-            import ast
-            
-            syntax_errors = []
-            
-            for file_path in self.critical_files:
-                if file_path.endswith('.py'):
-                    full_path = os.path.join(self.base_path, file_path)
-                    if os.path.exists(full_path):
-                        try:
-                            with open(full_path, 'r') as f:
-                                content = f.read()
-                            ast.parse(content)
-                        except SyntaxError as e:
-                            syntax_errors.append(f"{file_path}: {e}")
-            
-            return {
-                "passed": len(syntax_errors) == 0,
-                "errors": syntax_errors,
-                "files_checked": len([f for f in self.critical_files if f.endswith('.py')])
-            }
+            return self.scanner.check_syntax()
             
         except Exception as e:
             return {
@@ -617,26 +621,45 @@ class SorteDeploymentManager:
     
     def _cleanup_old_backups(self):
         """
-        Remove backups antigos, mantendo apenas os mais recentes.
+        Remove os backups mais antigos além de max_backups ou do espaço
+        máximo. Um completo só sai do disco quando nenhum diferencial
+        mantido depende dele, então pelo espaço só são removidos backups se
+        isso de fato levar o armazenamento para dentro do limite.
         """
         try:
             backups = self.deploy_history.get("backups", [])
-            
-            if len(backups) > self.max_backups:
-                # Ordenar por timestamp
-                backups.sort(key=lambda x: x["timestamp"])
-                
-                # Remover backups antigos
-                backups_to_remove = backups[:-self.max_backups]
-                
-                for backup in backups_to_remove:
-                    backup_path = backup["backup_path"]
-                    if os.path.exists(backup_path):
-                        shutil.rmtree(backup_path)
-                        self.logger.info(f"Backup antigo removido: {backup['backup_name']}")
-                
-                # Atualizar lista
-                self.deploy_history["backups"] = backups[-self.max_backups:]
+            backups.sort(key=lambda x: x["timestamp"])
+            
+            excess = max(len(backups) - self.max_backups, 0)
+            usage = self.backup_store.disk_usage()
+            if usage > self.max_backup_bytes:
+                names = [backup["backup_name"] for backup in backups]
+                # Menor quantidade de backups antigos cuja remoção libera espaço suficiente
+                needed = next((count for count in range(max(excess, 1), len(backups))
+                               if usage - self.backup_store.freeable_bytes(names[:count]) <= self.max_backup_bytes),
+                              None)
+                if needed is None:
+                    self.logger.warning(f"Backups ocupam {usage} bytes, acima do limite de {self.max_backup_bytes}, "
+                                        f"mas remover os antigos não liberaria espaço suficiente")
+                else:
+                    excess = needed
+            
+            removed = min(excess, len(backups) - 1)
+            for _ in range(removed):
+                backup = backups.pop(0)
+                backup_path = backup["backup_path"]
+                if self.backup_store.delete_manifest(backup["backup_name"]):
+                    self.logger.info(f"Backup antigo removido: {backup['backup_name']}")
+                elif os.path.isdir(backup_path):
+                    shutil.rmtree(backup_path)
+                    self.logger.info(f"Backup antigo removido: {backup['backup_name']}")
+            
+            if removed:
+                # Tar que só os backups removidos usavam
+                self.backup_store.collect_garbage()
+            
+            # Atualizar lista
+            self.deploy_history["backups"] = backups
                 
         except Exception as e:
             self.logger.error(f"Erro ao limpar backups antigos: {e}")
@@ -685,11 +708,7 @@ class SorteDeploymentManager:
         Calcula o tamanho total do diretório de backups.
         """
         try:
-            total_size = 0
-            for dirpath, dirnames, filenames in os.walk(self.backup_dir):
-                for filename in filenames:
-                    filepath = os.path.join(dirpath, filename)
-                    total_size += os.path.getsize(filepath)
+            total_size = self.scanner.directory_size(self.backup_dir)
             
             # Converter para MB
             size_mb = total_size / (1024 * 1024)
@@ -0,0 +1,164 @@
+import ast
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from utils.atomic_files import RACY_WINDOW_NS
+
+# Estimativa de memória ocupada por nó da AST
+NODE_COST_BYTES = 120
+
+
+class ASTCache:
+    """
+    Cache de ASTs já analisadas, por caminho de arquivo.
+    A entrada é validada por (mtime_ns, tamanho) e, quando o arquivo foi
+    modificado há pouco ou o stat mudou, pelo hash do conteúdo. Tem limite
+    LRU de entradas e de memória estimada.
+
+    Por padrão cada chamador recebe uma cópia privada da árvore, gerada a
+    partir de um snapshot serializado (mais barato que reanalisar), e pode
+    modificá-la à vontade. A árvore compartilhada só sai com shared=True,
+    para leitores que não a modificam; se ainda assim ela for alterada, a
+    revalidação percebe a diferença para o snapshot e descarta a entrada.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self.stats = {'hits': 0, 'parses': 0, 'revalidations': 0, 'evictions': 0, 'copies': 0, 'corrupted': 0}
+
+    def get(self, file_path: str, shared: bool = False) -> Optional[Tuple[str, ast.AST]]:
+        """
+        Retorna (código, árvore) do arquivo, analisando-o só se ele mudou.
+        A árvore é uma cópia privada, exceto com shared=True (somente
+        leitura). Levanta FileNotFoundError/OSError se o arquivo não puder
+        ser lido e SyntaxError se o código for inválido (nada é guardado
+        nesses casos).
+        """
+        key = os.path.abspath(file_path)
+        stat = os.stat(key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._stat_matches(entry, stat) and not self._is_racy(entry):
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return self._hand_out(entry, shared)
+
+        with open(key, 'rb') as f:
+            data = f.read()
+        content_hash = hashlib.sha256(data).hexdigest()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['hash'] == content_hash and self._tree_intact(key, entry):
+                # Conteúdo igual (toque no arquivo ou janela de mtime): só atualiza o stat
+                entry['mtime_ns'], entry['size'] = stat.st_mtime_ns, stat.st_size
+                entry['verified_at_ns'] = time.time_ns()
+                self._entries.move_to_end(key)
+                self.stats['revalidations'] += 1
+                return self._hand_out(entry, shared)
+
+        # Mesma conversão de quebras de linha da leitura em modo texto
+        source = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+        tree = ast.parse(source)
+        entry = {
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'hash': content_hash,
+            'verified_at_ns': time.time_ns(),
+            'source': source,
+            'tree': tree,
+            'snapshot': None,
+            'shared_out': False,
+            'cost': len(data) + NODE_COST_BYTES * sum(1 for _ in ast.walk(tree))
+        }
+
+        with self._lock:
+            self.stats['parses'] += 1
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous['cost']
+            self._entries[key] = entry
+            self._bytes += entry['cost']
+            self._evict()
+            return self._hand_out(entry, shared)
+
+    @staticmethod
+    def _stat_matches(entry: Dict[str, Any], stat: os.stat_result) -> bool:
+        return entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size
+
+    @staticmethod
+    def _is_racy(entry: Dict[str, Any]) -> bool:
+        """Um mtime muito próximo da última verificação não garante que o conteúdo é o mesmo."""
+        return entry['mtime_ns'] >= entry['verified_at_ns'] - RACY_WINDOW_NS
+
+    def _tree_intact(self, key: str, entry: Dict[str, Any]) -> bool:
+        """Confere se a árvore compartilhada ainda é igual ao snapshot; se não, descarta a entrada."""
+        if not entry['shared_out'] or pickle.dumps(entry['tree'], protocol=pickle.HIGHEST_PROTOCOL) == \
+                entry['snapshot']:
+            return True
+        self._entries.pop(key, None)
+        self._bytes -= entry['cost']
+        self.stats['corrupted'] += 1
+        return False
+
+    def _hand_out(self, entry: Dict[str, Any], shared: bool) -> Tuple[str, ast.AST]:
+        # O snapshot é tirado antes de a árvore compartilhada sair, para a revalidação conferir
+        if entry['snapshot'] is None:
+            entry['snapshot'] = pickle.dumps(entry['tree'], protocol=pickle.HIGHEST_PROTOCOL)
+            entry['cost'] += len(entry['snapshot'])
+            self._bytes += len(entry['snapshot'])
+            self._evict()
+        if shared:
+            entry['shared_out'] = True
+            return entry['source'], entry['tree']
+        self.stats['copies'] += 1
+        return entry['source'], pickle.loads(entry['snapshot'])
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            if len(self._entries) == 1:
+                break
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted['cost']
+            self.stats['evictions'] += 1
+
+    def invalidate(self, file_path: Optional[str] = None):
+        """Remove a entrada de um arquivo (ou todas)."""
+        with self._lock:
+            if file_path is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            entry = self._entries.pop(os.path.abspath(file_path), None)
+            if entry is not None:
+                self._bytes -= entry['cost']
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self._bytes,
+                        max_entries=self.max_entries, max_bytes=self.max_bytes)
+
+
+_default_cache: Optional[ASTCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_ast_cache() -> ASTCache:
+    """Retorna o cache de ASTs compartilhado, configurado por variáveis de ambiente."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ASTCache(
+                max_entries=int(os.getenv('AST_CACHE_MAX_ENTRIES', '256')),
+                max_bytes=int(float(os.getenv('AST_CACHE_MAX_MB', '64')) * 1024 * 1024)
+            )
+        return _default_cache
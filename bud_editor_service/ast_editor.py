@@ -1,7 +1,11 @@
 import ast
 import os
-import shutil
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Tuple, Union
+from bud_editor_service.ast_cache import ASTCache, get_ast_cache
+from bud_editor_service.symbol_index import SymbolIndex, get_symbol_index
+from bud_editor_service.edit_transaction import EditTransaction
+from bud_editor_service.undo_journal import UndoJournal, get_undo_journal
+from utils.atomic_files import atomic_write
 from utils.logger import Logger
 
 class ASTCodeEditor:
@@ -10,9 +14,31 @@ class ASTCodeEditor:
     para modificações mais seguras e semanticamente corretas.
     """
     
-    def __init__(self, base_path: str):
+    def __init__(self, base_path: str, ast_cache: Optional[ASTCache] = None,
+                 symbol_index: Optional[SymbolIndex] = None, undo_journal: Optional[UndoJournal] = None):
         self.base_path = base_path
         self.logger = Logger("ASTCodeEditor")
+        
+        # Cache de ASTs compartilhado: cada arquivo é analisado uma vez por alteração
+        self.ast_cache = ast_cache or get_ast_cache()
+        
+        # Índice de símbolos do projeto, construído no primeiro uso
+        self._symbol_index = symbol_index
+        
+        # Diário de versões (substitui as cópias '.backup')
+        self._undo_journal = undo_journal
+    
+    @property
+    def undo_journal(self) -> UndoJournal:
+        if self._undo_journal is None:
+            self._undo_journal = get_undo_journal(self.base_path)
+        return self._undo_journal
+    
+    @property
+    def symbol_index(self) -> SymbolIndex:
+        if self._symbol_index is None:
+            self._symbol_index = get_symbol_index(self.base_path)
+        return self._symbol_index
     
     def read_file(self, relative_path: str) -> Optional[str]:
         """Lê o conteúdo de um arquivo."""
@@ -28,12 +54,11 @@ class ASTCodeEditor:
             return None
     
     def write_file(self, relative_path: str, content: str) -> bool:
-        """Escreve conteúdo em um arquivo."""
+        """Escreve conteúdo em um arquivo (atomicamente, via temporário + rename)."""
         file_path = os.path.join(self.base_path, relative_path)
         try:
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            atomic_write(file_path, content)
+            self.after_write(relative_path)
             self.logger.log_code_modification(relative_path, "WRITE", True)
             return True
         except Exception as e:
@@ -41,36 +66,70 @@ class ASTCodeEditor:
             self.logger.log_code_modification(relative_path, "WRITE", False)
             return False
     
-    def create_backup(self, relative_path: str) -> bool:
-        """Cria um backup do arquivo antes de modificá-lo."""
-        file_path = os.path.join(self.base_path, relative_path)
-        backup_path = f"{file_path}.backup"
-        
-        try:
-            if os.path.exists(file_path):
-                shutil.copy2(file_path, backup_path)
-                self.logger.info(f"Backup criado: {backup_path}")
-                return True
+    def after_write(self, relative_path: str):
+        """Atualiza o cache de ASTs e o índice de símbolos após gravar um arquivo."""
+        self.ast_cache.invalidate(os.path.join(self.base_path, relative_path))
+        if self._symbol_index is not None:
+            self._symbol_index.update_file(relative_path)
+    
+    def transaction(self) -> EditTransaction:
+        """
+        Abre uma transação de edição: várias operações, em um ou mais arquivos,
+        gravadas juntas com uma única serialização por arquivo.
+        """
+        return EditTransaction(self)
+    
+    def _run_single(self, operation: str, *args) -> bool:
+        transaction = self.transaction()
+        if not getattr(transaction, operation)(*args):
+            transaction.rollback()
             return False
+        return transaction.commit()['success']
+    
+    def create_backup(self, relative_path: str, content: Optional[str] = None) -> bool:
+        """
+        Registra a versão atual do arquivo no diário de versões antes de modificá-lo.
+        Só a diferença para a versão anterior é gravada.
+        """
+        try:
+            version = self.undo_journal.record(relative_path, content, label='backup')
+            if version is None:
+                return False
+            self.logger.info(f"Backup criado: {relative_path} (versão {version})")
+            return True
         except Exception as e:
             self.logger.error(f"Erro ao criar backup: {e}")
             return False
     
-    def restore_backup(self, relative_path: str) -> bool:
-        """Restaura um arquivo a partir do backup."""
-        file_path = os.path.join(self.base_path, relative_path)
-        backup_path = f"{file_path}.backup"
-        
+    def restore_backup(self, relative_path: str, steps: int = 1) -> bool:
+        """Restaura o arquivo para uma das últimas versões registradas (a mais recente por padrão)."""
         try:
-            if os.path.exists(backup_path):
-                shutil.copy2(backup_path, file_path)
-                self.logger.info(f"Arquivo restaurado do backup: {file_path}")
+            if self.undo_journal.restore(relative_path, steps=steps):
+                self.after_write(relative_path)
+                self.logger.info(f"Arquivo restaurado do backup: {relative_path}")
                 return True
             return False
         except Exception as e:
             self.logger.error(f"Erro ao restaurar backup: {e}")
             return False
     
+    def get_parsed(self, relative_path: str, shared: bool = False) -> Optional[Tuple[str, ast.AST]]:
+        """
+        Retorna (código, AST) do arquivo usando o cache de ASTs.
+        A árvore é uma cópia que pode ser modificada; shared=True devolve a
+        árvore compartilhada do cache, que não deve ser alterada.
+        """
+        file_path = os.path.join(self.base_path, relative_path)
+        try:
+            return self.ast_cache.get(file_path, shared=shared)
+        except FileNotFoundError:
+            self.logger.error(f"Arquivo não encontrado: {file_path}")
+        except SyntaxError as e:
+            self.logger.error(f"Erro de sintaxe no código: {e}")
+        except Exception as e:
+            self.logger.error(f"Erro ao ler arquivo {file_path}: {e}")
+        return None
+    
     def parse_code(self, code: str) -> Optional[ast.AST]:
         """Analisa o código Python e retorna a AST."""
         try:
@@ -93,12 +152,37 @@ class ASTCodeEditor:
                 return ""
     
     def find_function_node(self, tree: ast.AST, function_name: str) -> Optional[ast.FunctionDef]:
-        """Encontra um nó de função específico na AST."""
+        """
+        Encontra um nó de função específico na AST. Aceita também o nome
+        qualificado ('Classe.metodo'), descendo pelos corpos das classes.
+        """
+        if '.' in function_name:
+            node = self._find_qualified_node(tree, function_name.split('.'))
+            return node if isinstance(node, ast.FunctionDef) else None
         for node in ast.walk(tree):
             if isinstance(node, ast.FunctionDef) and node.name == function_name:
                 return node
         return None
     
+    def _find_qualified_node(self, tree: ast.AST, parts: List[str]) -> Optional[ast.AST]:
+        node = tree
+        for part in parts:
+            if part == '<locals>':
+                continue
+            node = next((child for child in getattr(node, 'body', [])
+                         if isinstance(child, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef))
+                         and child.name == part), None)
+            if node is None:
+                return None
+        return node
+    
+    def find_symbol(self, qualname: str, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Localiza uma classe, função ou método em todo o projeto pelo índice de
+        símbolos, sem reanalisar arquivos. Retorna arquivo, tipo e linhas de cada ocorrência.
+        """
+        return self.symbol_index.lookup(qualname, kind)
+    
     def find_class_node(self, tree: ast.AST, class_name: str) -> Optional[ast.ClassDef]:
         """Encontra um nó de classe específico na AST."""
         for node in ast.walk(tree):
@@ -108,129 +192,15 @@ class ASTCodeEditor:
     
     def add_function_to_class(self, relative_path: str, class_name: str, function_code: str) -> bool:
         """Adiciona uma função a uma classe existente."""
-        content = self.read_file(relative_path)
-        if not content:
-            return False
-        
-        # Criar backup
-        self.create_backup(relative_path)
-        
-        try:
-            tree = self.parse_code(content)
-            if not tree:
-                return False
-            
-            # Encontrar a classe
-            class_node = self.find_class_node(tree, class_name)
-            if not class_node:
-                self.logger.error(f"Classe '{class_name}' não encontrada")
-                return False
-            
-            # Analisar o código da nova função
-            function_tree = self.parse_code(function_code)
-            if not function_tree:
-                return False
-            
-            # Adicionar a função à classe
-            for node in function_tree.body:
-                if isinstance(node, ast.FunctionDef):
-                    class_node.body.append(node)
-            
-            # Converter de volta para código
-            new_code = self.ast_to_code(tree)
-            
-            # Escrever o arquivo modificado
-            success = self.write_file(relative_path, new_code)
-            self.logger.log_code_modification(relative_path, f"ADD_FUNCTION_TO_CLASS:{class_name}", success)
-            return success
-            
-        except Exception as e:
-            self.logger.error(f"Erro ao adicionar função à classe: {e}")
-            self.restore_backup(relative_path)
-            return False
+        return self._run_single('add_function_to_class', relative_path, class_name, function_code)
     
     def modify_function_body(self, relative_path: str, function_name: str, new_body_code: str) -> bool:
         """Modifica o corpo de uma função existente."""
-        content = self.read_file(relative_path)
-        if not content:
-            return False
-        
-        # Criar backup
-        self.create_backup(relative_path)
-        
-        try:
-            tree = self.parse_code(content)
-            if not tree:
-                return False
-            
-            # Encontrar a função
-            function_node = self.find_function_node(tree, function_name)
-            if not function_node:
-                self.logger.error(f"Função '{function_name}' não encontrada")
-                return False
-            
-            # Analisar o novo corpo da função
-            new_body_tree = self.parse_code(new_body_code)
-            if not new_body_tree:
-                return False
-            
-            # Substituir o corpo da função
-            function_node.body = new_body_tree.body
-            
-            # Converter de volta para código
-            new_code = self.ast_to_code(tree)
-            
-            # Escrever o arquivo modificado
-            success = self.write_file(relative_path, new_code)
-            self.logger.log_code_modification(relative_path, f"MODIFY_FUNCTION:{function_name}", success)
-            return success
-            
-        except Exception as e:
-            self.logger.error(f"Erro ao modificar função: {e}")
-            self.restore_backup(relative_path)
-            return False
+        return self._run_single('modify_function_body', relative_path, function_name, new_body_code)
     
     def add_import(self, relative_path: str, import_statement: str) -> bool:
         """Adiciona uma declaração de import ao arquivo."""
-        content = self.read_file(relative_path)
-        if not content:
-            return False
-        
-        # Verificar se o import já existe
-        if import_statement in content:
-            self.logger.info(f"Import já existe: {import_statement}")
-            return True
-        
-        # Criar backup
-        self.create_backup(relative_path)
-        
-        try:
-            tree = self.parse_code(content)
-            if not tree:
-                return False
-            
-            # Analisar a declaração de import
-            import_tree = self.parse_code(import_statement)
-            if not import_tree:
-                return False
-            
-            # Adicionar o import no início do arquivo
-            for node in import_tree.body:
-                if isinstance(node, (ast.Import, ast.ImportFrom)):
-                    tree.body.insert(0, node)
-            
-            # Converter de volta para código
-            new_code = self.ast_to_code(tree)
-            
-            # Escrever o arquivo modificado
-            success = self.write_file(relative_path, new_code)
-            self.logger.log_code_modification(relative_path, f"ADD_IMPORT", success)
-            return success
-            
-        except Exception as e:
-            self.logger.error(f"Erro ao adicionar import: {e}")
-            self.restore_backup(relative_path)
-            return False
+        return self._run_single('add_import', relative_path, import_statement)
     
     def validate_syntax(self, code: str) -> bool:
         """Valida se o código Python tem sintaxe correta."""
@@ -242,13 +212,10 @@ class ASTCodeEditor:
     
     def get_function_names(self, relative_path: str) -> List[str]:
         """Retorna uma lista com os nomes de todas as funções no arquivo."""
-        content = self.read_file(relative_path)
-        if not content:
-            return []
-        
-        tree = self.parse_code(content)
-        if not tree:
+        parsed = self.get_parsed(relative_path, shared=True)
+        if not parsed or not parsed[0]:
             return []
+        tree = parsed[1]
         
         function_names = []
         for node in ast.walk(tree):
@@ -259,13 +226,10 @@ class ASTCodeEditor:
     
     def get_class_names(self, relative_path: str) -> List[str]:
         """Retorna uma lista com os nomes de todas as classes no arquivo."""
-        content = self.read_file(relative_path)
-        if not content:
-            return []
-        
-        tree = self.parse_code(content)
-        if not tree:
+        parsed = self.get_parsed(relative_path, shared=True)
+        if not parsed or not parsed[0]:
             return []
+        tree = parsed[1]
         
         class_names = []
         for node in ast.walk(tree):
@@ -0,0 +1,236 @@
+import ast
+import os
+import textwrap
+from typing import Dict, List, Any, Callable, Optional, Tuple, TYPE_CHECKING
+from bud_editor_service.source_patcher import (
+    PatchConflict, SourcePatch, append_to_block, module_insert_offset, replace_body
+)
+from utils.atomic_files import atomic_write, discard_temp, write_temp
+from utils.logger import Logger
+
+if TYPE_CHECKING:
+    from bud_editor_service.ast_editor import ASTCodeEditor
+
+
+class EditTransaction:
+    """
+    Transação de edição sobre um ou mais arquivos.
+    As operações são localizadas na AST compartilhada do arquivo (analisada
+    uma vez, pelo cache de ASTs) e viram edições de trecho sobre o texto
+    original: no commit só os trechos alterados são reescritos, preservando
+    comentários e formatação do resto. Cada arquivo é gravado uma só vez, com
+    um backup por arquivo, via temporário + rename. Se qualquer operação
+    falhar, nenhum arquivo é alterado.
+
+    Uso:
+        with editor.transaction() as tx:
+            tx.add_import('bud_logic/strategy.py', 'import math')
+            tx.modify_function_body('bud_logic/strategy.py', 'sinal', 'return 1')
+    """
+
+    def __init__(self, editor: 'ASTCodeEditor'):
+        self.editor = editor
+        self.logger = Logger("EditTransaction")
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._originals: Dict[str, str] = {}
+        self._operations: List[Tuple[str, str]] = []
+        self.failed = False
+        self.closed = False
+        self.result: Optional[Dict[str, Any]] = None
+
+    def _state(self, relative_path: str) -> Optional[Dict[str, Any]]:
+        """Texto, AST (somente leitura) e edições pendentes do arquivo."""
+        if relative_path not in self._files:
+            parsed = self.editor.get_parsed(relative_path, shared=True)
+            if not parsed or not parsed[0]:
+                return None
+            source, tree = parsed
+            self._originals[relative_path] = source
+            self._files[relative_path] = {'source': source, 'tree': tree, 'patch': SourcePatch(source)}
+        return self._files[relative_path]
+
+    def _flush(self, state: Dict[str, Any]) -> bool:
+        """
+        Aplica as edições pendentes e reanalisa o texto. Só é necessário quando
+        uma operação depende de outra da mesma transação (ex.: modificar uma
+        função adicionada antes, ou editar duas vezes o mesmo trecho).
+        """
+        if not state['patch']:
+            return False
+        source = state['patch'].apply()
+        state.update(source=source, tree=ast.parse(source), patch=SourcePatch(source))
+        return True
+
+    def _edit(self, relative_path: str, locate: Callable[[ast.AST], Optional[ast.AST]],
+              apply: Callable[[SourcePatch, ast.AST], None], missing: str) -> bool:
+        state = self._state(relative_path)
+        if state is None:
+            return self._fail(f"Não foi possível carregar {relative_path}")
+        for attempt in range(2):
+            node = locate(state['tree'])
+            if node is not None:
+                try:
+                    apply(state['patch'], node)
+                    return True
+                except PatchConflict:
+                    pass
+                except SyntaxError as e:
+                    return self._fail(f"Código resultante inválido em {relative_path}: {e}")
+            try:
+                if attempt or not self._flush(state):
+                    break
+            except SyntaxError as e:
+                return self._fail(f"Código resultante inválido em {relative_path}: {e}")
+        return self._fail(missing)
+
+    def _fail(self, message: str) -> bool:
+        self.logger.error(message)
+        self.failed = True
+        return False
+
+    def _check_open(self):
+        if self.closed:
+            raise RuntimeError("Transação de edição já finalizada")
+
+    @staticmethod
+    def _definitions(code: str, tree: ast.AST, types: tuple, separator: str = '\n\n') -> str:
+        """Trechos do código com as definições de nível superior (com decoradores)."""
+        lines = code.splitlines()
+        blocks = []
+        for node in tree.body:
+            if isinstance(node, types):
+                start = node.decorator_list[0].lineno if getattr(node, 'decorator_list', None) else node.lineno
+                blocks.append(textwrap.dedent('\n'.join(lines[start - 1:node.end_lineno])))
+        return separator.join(blocks)
+
+    def add_import(self, relative_path: str, import_statement: str) -> bool:
+        """Adiciona uma declaração de import no início do arquivo."""
+        self._check_open()
+        state = self._state(relative_path)
+        if state is None:
+            return self._fail(f"Não foi possível carregar {relative_path}")
+        if import_statement in state['source'] or (state['patch'] and import_statement in state['patch'].apply()):
+            self.logger.info(f"Import já existe: {import_statement}")
+            return True
+
+        import_tree = self.editor.parse_code(import_statement)
+        if not import_tree:
+            return self._fail(f"Import inválido: {import_statement}")
+        imports = self._definitions(import_statement, import_tree, (ast.Import, ast.ImportFrom), '\n')
+        if not imports:
+            return True
+
+        if not self._edit(relative_path, lambda tree: tree,
+                          lambda patch, tree: patch.insert(module_insert_offset(patch, tree), imports + '\n'),
+                          f"Não foi possível adicionar o import em {relative_path}"):
+            return False
+        self._operations.append((relative_path, "ADD_IMPORT"))
+        return True
+
+    def add_function_to_class(self, relative_path: str, class_name: str, function_code: str) -> bool:
+        """Adiciona uma função a uma classe existente."""
+        self._check_open()
+        function_tree = self.editor.parse_code(function_code)
+        if not function_tree:
+            return self._fail(f"Código inválido para a classe '{class_name}'")
+        functions = self._definitions(function_code, function_tree, (ast.FunctionDef, ast.AsyncFunctionDef))
+
+        if functions and not self._edit(relative_path, lambda tree: self.editor.find_class_node(tree, class_name),
+                                        lambda patch, node: append_to_block(patch, node, functions),
+                                        f"Classe '{class_name}' não encontrada"):
+            return False
+        self._operations.append((relative_path, f"ADD_FUNCTION_TO_CLASS:{class_name}"))
+        return True
+
+    def modify_function_body(self, relative_path: str, function_name: str, new_body_code: str) -> bool:
+        """Substitui o corpo de uma função existente."""
+        self._check_open()
+        if not self.editor.parse_code(new_body_code):
+            return self._fail(f"Corpo inválido para a função '{function_name}'")
+
+        if not self._edit(relative_path, lambda tree: self.editor.find_function_node(tree, function_name),
+                          lambda patch, node: replace_body(patch, node, new_body_code),
+                          f"Função '{function_name}' não encontrada"):
+            return False
+        self._operations.append((relative_path, f"MODIFY_FUNCTION:{function_name}"))
+        return True
+
+    def commit(self) -> Dict[str, Any]:
+        """
+        Grava todos os arquivos alterados. Os temporários são preparados antes
+        de qualquer rename; se um rename falhar, os arquivos já substituídos
+        voltam ao conteúdo original.
+        """
+        self._check_open()
+        self.closed = True
+        if self.failed:
+            return {'success': False, 'files': [], 'operations': len(self._operations),
+                    'error': 'Transação com operações que falharam; nada foi gravado'}
+
+        changed = sorted({path for path, _ in self._operations})
+        staged: List[Tuple[str, str, str]] = []
+        try:
+            for relative_path in changed:
+                # Cada trecho já foi validado ao ser agendado; o módulo não é reanalisado
+                state = self._files[relative_path]
+                new_code = state['patch'].apply() if state['patch'] else state['source']
+                file_path = os.path.join(self.editor.base_path, relative_path)
+                staged.append((relative_path, file_path, write_temp(file_path, new_code)))
+        except Exception as e:
+            for _, _, temp_path in staged:
+                discard_temp(temp_path)
+            return self._finish(changed, False, f"Erro ao preparar a transação: {e}")
+
+        for relative_path in changed:
+            self.editor.create_backup(relative_path, self._originals[relative_path])
+
+        replaced = []
+        try:
+            for relative_path, file_path, temp_path in staged:
+                os.replace(temp_path, file_path)
+                replaced.append((relative_path, file_path))
+        except Exception as e:
+            for _, _, temp_path in staged[len(replaced):]:
+                discard_temp(temp_path)
+            for relative_path, file_path in replaced:
+                try:
+                    atomic_write(file_path, self._originals[relative_path])
+                except Exception as restore_error:
+                    self.logger.error(f"Erro ao restaurar {relative_path}: {restore_error}")
+            self._refresh(changed)
+            return self._finish(changed, False, f"Erro ao gravar a transação: {e}")
+
+        self._refresh(changed)
+        return self._finish(changed, True)
+
+    def rollback(self):
+        """Descarta as operações pendentes sem tocar nos arquivos."""
+        self.closed = True
+        self._files.clear()
+        self._operations.clear()
+
+    def _refresh(self, changed: List[str]):
+        for relative_path in changed:
+            self.editor.after_write(relative_path)
+
+    def _finish(self, changed: List[str], success: bool, error: Optional[str] = None) -> Dict[str, Any]:
+        for relative_path, operation in self._operations:
+            self.editor.logger.log_code_modification(relative_path, operation, success)
+        if error:
+            self.logger.error(error)
+        result = {'success': success, 'files': changed, 'operations': len(self._operations)}
+        if error:
+            result['error'] = error
+        return result
+
+    def __enter__(self) -> 'EditTransaction':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.closed:
+            return False
+        if exc_type is not None:
+            self.rollback()
+        else:
+            self.result = self.commit()
+        return False
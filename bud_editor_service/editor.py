@@ -1,4 +1,10 @@
+import mmap
 import os
+import re
+from utils.atomic_files import atomic_write
+
+# A partir deste tamanho o arquivo é lido por mmap em vez de carregado inteiro
+MMAP_THRESHOLD = 1024 * 1024
 
 class CodeEditor:
     def __init__(self, base_path):
@@ -27,14 +33,64 @@ class CodeEditor:
         return True
 
     def replace_in_file(self, relative_path, old_str, new_str):
+        # Substitui apenas a primeira ocorrência
+        result = self.replace_many(relative_path, {old_str: new_str}, max_per_pattern=1)
+        return result['total'] > 0
+
+    def replace_many(self, relative_path, replacements, max_per_pattern=None):
+        """
+        Aplica várias substituições de uma vez, em uma única passada sobre o
+        conteúdo (um autômato com todos os padrões; a ocorrência mais longa
+        vence quando dois padrões começam na mesma posição). O texto
+        substituído não é reanalisado, então trocas como {'a': 'b', 'b': 'a'}
+        funcionam. Arquivos grandes são lidos por mmap. O arquivo é gravado
+        uma única vez, de forma atômica, e só se houver alguma ocorrência.
+        Retorna o total e a contagem por padrão.
+        """
         file_path = os.path.join(self.base_path, relative_path)
-        content = self.read_file(relative_path)
-        if content is None:
-            return False
-        if old_str not in content:
-            return False
-        new_content = content.replace(old_str, new_str, 1) # Replace only first occurrence
-        self.write_file(relative_path, new_content)
-        return True
+        pairs = [(old.encode('utf-8'), new.encode('utf-8')) for old, new in dict(replacements).items() if old]
+        result = {'success': False, 'file': relative_path, 'total': 0,
+                  'counts': {old: 0 for old in dict(replacements) if old}}
+        if not os.path.exists(file_path):
+            return result
+        result['success'] = True
+        if not pairs:
+            return result
+
+        targets = dict(pairs)
+        pattern = re.compile(b'|'.join(re.escape(old) for old, _ in sorted(pairs, key=lambda pair: -len(pair[0]))))
+        counts = {old: 0 for old, _ in pairs}
+
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size >= MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                    self._replace_view(file_path, view, pattern, targets, counts, max_per_pattern)
+            else:
+                self._replace_view(file_path, f.read(), pattern, targets, counts, max_per_pattern)
+
+        result['counts'] = {old.decode('utf-8'): count for old, count in counts.items()}
+        result['total'] = sum(counts.values())
+        return result
+
+    def _replace_view(self, file_path, view, pattern, targets, counts, max_per_pattern):
+        # Primeiro localiza as ocorrências; só grava se houver alguma
+        matches = []
+        for match in pattern.finditer(view):
+            old = match.group()
+            if max_per_pattern is not None and counts[old] >= max_per_pattern:
+                continue
+            counts[old] += 1
+            matches.append((match.start(), match.end(), targets[old]))
+        if not matches:
+            return
 
+        def chunks():
+            position = 0
+            for start, end, new in matches:
+                yield view[position:start]
+                yield new
+                position = end
+            yield view[position:]
 
+        atomic_write(file_path, chunks())
@@ -0,0 +1,135 @@
+import ast
+import bisect
+import textwrap
+from typing import List, Optional, Tuple
+
+
+class PatchConflict(ValueError):
+    """Duas edições pendentes se sobrepõem no texto original."""
+
+
+class SourcePatch:
+    """
+    Conjunto de edições sobre o texto original de um módulo, posicionadas
+    pelos lineno/col_offset e end_lineno/end_col_offset dos nós da AST.
+    Só os trechos alterados são reescritos; o resto do arquivo, incluindo
+    comentários e formatação, é preservado byte a byte.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self._lines = source.splitlines(keepends=True)
+        # Offset (em caracteres) do início de cada linha; lineno começa em 1
+        self._line_starts = [0]
+        for line in self._lines:
+            self._line_starts.append(self._line_starts[-1] + len(line))
+        self._edits: List[Tuple[int, int, int, str]] = []
+
+    def __bool__(self) -> bool:
+        return bool(self._edits)
+
+    def line(self, lineno: int) -> str:
+        return self._lines[lineno - 1] if 0 < lineno <= len(self._lines) else ''
+
+    def offset(self, lineno: int, col_offset: int) -> int:
+        """Converte (linha, coluna) da AST em offset no texto; col_offset da AST é em bytes UTF-8."""
+        if lineno > len(self._lines):
+            return len(self.source)
+        line = self._lines[lineno - 1]
+        if not line.isascii():
+            col_offset = len(line.encode('utf-8')[:col_offset].decode('utf-8', errors='ignore'))
+        return self._line_starts[lineno - 1] + col_offset
+
+    def line_end(self, lineno: int) -> int:
+        """Offset logo após a quebra de linha de lineno (ou o fim do texto)."""
+        return self._line_starts[min(lineno, len(self._lines))]
+
+    def replace(self, start: int, end: int, text: str):
+        """Agenda a substituição de source[start:end] por text."""
+        for other_start, other_end, _, _ in self._edits:
+            # Inserções podem encostar em outras edições, mas não cair dentro delas
+            if (start < other_end and other_start < end) or other_start < start < other_end \
+                    or start < other_start < end:
+                raise PatchConflict(f"Edição em {start}:{end} sobrepõe {other_start}:{other_end}")
+        # A ordem de inserção desempata edições na mesma posição
+        bisect.insort(self._edits, (start, end, len(self._edits), text))
+
+    def insert(self, offset: int, text: str):
+        self.replace(offset, offset, text)
+
+    def apply(self) -> str:
+        """Texto final, montado em uma passada sobre as edições ordenadas."""
+        parts = []
+        position = 0
+        for start, end, _, text in self._edits:
+            parts.append(self.source[position:start])
+            parts.append(text)
+            position = end
+        parts.append(self.source[position:])
+        return ''.join(parts)
+
+
+def indent_block(code: str, indent: str) -> str:
+    """Reindenta um bloco de código (já sem indentação comum) para o nível indent."""
+    code = textwrap.dedent(code).strip('\n')
+    return '\n'.join(indent + line if line.strip() else '' for line in code.split('\n'))
+
+
+def replace_body(patch: SourcePatch, node: ast.AST, new_body_code: str):
+    """
+    Substitui o corpo de uma função/classe, mantendo o cabeçalho e os decoradores.
+    Só a definição alterada é reanalisada para validar o resultado; levanta
+    SyntaxError se ela ficar inválida.
+    """
+    first, last = node.body[0], node.body[-1]
+    start = patch.offset(first.lineno, first.col_offset)
+    end = patch.offset(last.end_lineno, last.end_col_offset)
+    if first.lineno == node.lineno:
+        # Corpo na mesma linha do cabeçalho ('def f(): return 1'): passa para um bloco
+        indent = _leading_whitespace(patch.line(node.lineno)) + '    '
+        while start > 0 and patch.source[start - 1] in ' \t':
+            start -= 1
+        replacement = '\n' + indent_block(new_body_code, indent)
+    else:
+        indent = _leading_whitespace(patch.line(first.lineno))
+        replacement = indent_block(new_body_code, indent)[len(indent):]
+
+    decorators = getattr(node, 'decorator_list', None)
+    header_start = patch.offset(decorators[0].lineno if decorators else node.lineno, 0)
+    ast.parse(textwrap.dedent(patch.source[header_start:start] + replacement))
+    patch.replace(start, end, replacement)
+
+
+def append_to_block(patch: SourcePatch, node: ast.AST, code: str):
+    """Acrescenta código ao fim do corpo de uma classe, separado por uma linha em branco."""
+    first = node.body[0]
+    if first.lineno == node.lineno:
+        indent = _leading_whitespace(patch.line(node.lineno)) + '    '
+    else:
+        indent = _leading_whitespace(patch.line(first.lineno))
+    end = patch.line_end(node.end_lineno)
+    prefix = '' if end == 0 or patch.source[end - 1] == '\n' else '\n'
+    patch.insert(end, prefix + '\n' + indent_block(code, indent) + '\n')
+
+
+def module_insert_offset(patch: SourcePatch, tree: ast.Module) -> int:
+    """Posição para novos imports: depois da docstring e dos imports de __future__."""
+    insert_after: Optional[ast.AST] = None
+    for index, node in enumerate(tree.body):
+        is_docstring = (index == 0 and isinstance(node, ast.Expr)
+                        and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str))
+        is_future = isinstance(node, ast.ImportFrom) and node.module == '__future__'
+        if not (is_docstring or is_future):
+            break
+        insert_after = node
+    if insert_after is not None:
+        return patch.line_end(insert_after.end_lineno)
+    if tree.body:
+        first = tree.body[0]
+        decorators = getattr(first, 'decorator_list', None)
+        return patch.offset(decorators[0].lineno if decorators else first.lineno, 0)
+    return len(patch.source)
+
+
+def _leading_whitespace(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
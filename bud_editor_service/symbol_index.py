@@ -0,0 +1,224 @@
+import ast
+import os
+import threading
+import time
+from typing import Dict, List, Any, Optional, Set, Tuple
+from bud_editor_service.ast_cache import ASTCache, get_ast_cache
+from utils.atomic_files import RACY_WINDOW_NS
+from utils.logger import Logger
+from utils.workspace_scanner import WorkspaceScanner, get_workspace_scanner
+
+
+class _SymbolCollector(ast.NodeVisitor):
+    """
+    Coleta classes e funções de um arquivo em uma única passada, com nomes
+    qualificados no formato do __qualname__ do Python
+    ('Classe.metodo', 'funcao.<locals>.interna').
+    """
+
+    def __init__(self, relative_path: str, module: str):
+        self.relative_path = relative_path
+        self.module = module
+        self.scope: List[Tuple[str, str]] = []
+        self.symbols: List[Dict[str, Any]] = []
+
+    def _qualname(self, name: str) -> str:
+        parts = []
+        for scope_name, scope_kind in self.scope:
+            parts.append(scope_name)
+            if scope_kind != 'class':
+                parts.append('<locals>')
+        return '.'.join(parts + [name])
+
+    def _add(self, node: ast.AST, kind: str):
+        self.symbols.append({
+            'qualname': self._qualname(node.name),
+            'name': node.name,
+            'kind': kind,
+            'file': self.relative_path,
+            'module': self.module,
+            'lineno': node.lineno,
+            'end_lineno': node.end_lineno,
+            'col_offset': node.col_offset
+        })
+        self.scope.append((node.name, kind))
+        self.generic_visit(node)
+        self.scope.pop()
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self._add(node, 'class')
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        in_class = bool(self.scope) and self.scope[-1][1] == 'class'
+        self._add(node, 'method' if in_class else 'function')
+
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef):
+        self.visit_FunctionDef(node)
+
+
+class SymbolIndex:
+    """
+    Índice de símbolos (classes, funções e métodos) de todo o projeto.
+    Mapeia nomes qualificados, como 'SorteAlertSystem.send_alert', para
+    arquivo, tipo do nó e intervalo de linhas, com consulta em O(1).
+    O índice é construído sob demanda e atualizado por arquivo quando o
+    ASTCodeEditor escreve; arquivos alterados por fora são detectados pelo
+    stat ao serem consultados.
+    """
+
+    def __init__(self, base_path: str, ast_cache: Optional[ASTCache] = None,
+                 scanner: Optional[WorkspaceScanner] = None):
+        self.base_path = os.path.abspath(base_path)
+        self.ast_cache = ast_cache or get_ast_cache()
+        self.scanner = scanner or get_workspace_scanner(self.base_path)
+        self.logger = Logger("SymbolIndex")
+
+        self._lock = threading.RLock()
+        self._built = False
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._by_qualname: Dict[str, List[Dict[str, Any]]] = {}
+        self._by_name: Dict[str, List[Dict[str, Any]]] = {}
+        self.stats = {'files_indexed': 0, 'updates': 0, 'parse_errors': 0}
+
+    @staticmethod
+    def _module_name(relative_path: str) -> str:
+        module = relative_path[:-3].replace(os.sep, '.').replace('/', '.')
+        return module[:-len('.__init__')] if module.endswith('.__init__') else module
+
+    def build(self):
+        """Indexa todos os arquivos Python do projeto."""
+        with self._lock:
+            self._files.clear()
+            self._by_qualname.clear()
+            self._by_name.clear()
+            for relative_path in self.scanner.iter_python_files():
+                self._index_file(relative_path)
+            self._built = True
+            self.logger.info(f"Índice de símbolos construído: {len(self._files)} arquivos, "
+                             f"{len(self._by_name)} nomes")
+
+    def _ensure_built(self):
+        if not self._built:
+            self.build()
+
+    def _index_file(self, relative_path: str):
+        """(Re)indexa um arquivo, substituindo os símbolos anteriores dele."""
+        self._drop_file(relative_path)
+        file_path = os.path.join(self.base_path, relative_path)
+        try:
+            stat = os.stat(file_path)
+            _, tree = self.ast_cache.get(file_path, shared=True)
+        except FileNotFoundError:
+            return
+        except (SyntaxError, UnicodeDecodeError, OSError) as e:
+            self.stats['parse_errors'] += 1
+            self.logger.warning(f"Arquivo ignorado no índice de símbolos {relative_path}: {e}")
+            return
+
+        collector = _SymbolCollector(relative_path, self._module_name(relative_path))
+        collector.visit(tree)
+        self._files[relative_path] = {
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'indexed_at_ns': time.time_ns(),
+            'symbols': collector.symbols
+        }
+        for symbol in collector.symbols:
+            for key in (symbol['qualname'], f"{symbol['module']}.{symbol['qualname']}"):
+                self._by_qualname.setdefault(key, []).append(symbol)
+            self._by_name.setdefault(symbol['name'], []).append(symbol)
+        self.stats['files_indexed'] += 1
+
+    def _drop_file(self, relative_path: str):
+        entry = self._files.pop(relative_path, None)
+        if entry is None:
+            return
+        for symbol in entry['symbols']:
+            for key in (symbol['qualname'], f"{symbol['module']}.{symbol['qualname']}"):
+                remaining = [s for s in self._by_qualname.get(key, []) if s['file'] != relative_path]
+                if remaining:
+                    self._by_qualname[key] = remaining
+                else:
+                    self._by_qualname.pop(key, None)
+            remaining = [s for s in self._by_name.get(symbol['name'], []) if s['file'] != relative_path]
+            if remaining:
+                self._by_name[symbol['name']] = remaining
+            else:
+                self._by_name.pop(symbol['name'], None)
+
+    def update_file(self, relative_path: str):
+        """Atualiza o índice após a escrita de um arquivo (sem efeito antes do build)."""
+        relative_path = os.path.normpath(relative_path)
+        if not relative_path.endswith('.py'):
+            return
+        with self._lock:
+            if not self._built:
+                return
+            self._index_file(relative_path)
+            self.stats['updates'] += 1
+
+    def _revalidate(self, files: Set[str]):
+        """Reindexa os arquivos consultados que mudaram no disco desde a indexação."""
+        for relative_path in files:
+            entry = self._files.get(relative_path)
+            try:
+                stat = os.stat(os.path.join(self.base_path, relative_path))
+            except FileNotFoundError:
+                self._drop_file(relative_path)
+                continue
+            # Na janela de mtime recente o stat não basta; o cache de ASTs confere o hash
+            if (entry is None or entry['mtime_ns'] != stat.st_mtime_ns or entry['size'] != stat.st_size
+                    or entry['mtime_ns'] >= entry['indexed_at_ns'] - RACY_WINDOW_NS):
+                self._index_file(relative_path)
+                self.stats['updates'] += 1
+
+    def lookup(self, qualname: str, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Procura um nome qualificado ('Classe.metodo' ou 'pacote.modulo.Classe.metodo').
+        """
+        with self._lock:
+            self._ensure_built()
+            matches = self._by_qualname.get(qualname, [])
+            if matches:
+                self._revalidate({s['file'] for s in matches})
+                matches = self._by_qualname.get(qualname, [])
+            return [dict(s) for s in matches if kind is None or s['kind'] == kind]
+
+    def find(self, name: str, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Procura símbolos pelo nome simples, em qualquer arquivo."""
+        with self._lock:
+            self._ensure_built()
+            matches = self._by_name.get(name, [])
+            if matches:
+                self._revalidate({s['file'] for s in matches})
+                matches = self._by_name.get(name, [])
+            return [dict(s) for s in matches if kind is None or s['kind'] == kind]
+
+    def symbols_in_file(self, relative_path: str) -> List[Dict[str, Any]]:
+        """Símbolos definidos em um arquivo, na ordem do código."""
+        relative_path = os.path.normpath(relative_path)
+        with self._lock:
+            self._ensure_built()
+            self._revalidate({relative_path})
+            entry = self._files.get(relative_path)
+            return [dict(s) for s in entry['symbols']] if entry else []
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, built=self._built, files=len(self._files),
+                        qualified_names=len(self._by_qualname), names=len(self._by_name))
+
+
+_indexes: Dict[str, SymbolIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_symbol_index(base_path: str) -> SymbolIndex:
+    """Retorna o índice de símbolos compartilhado do projeto em base_path."""
+    key = os.path.abspath(base_path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = SymbolIndex(key)
+            _indexes[key] = index
+        return index
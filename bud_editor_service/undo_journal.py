@@ -0,0 +1,226 @@
+import difflib
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Any, Optional
+from urllib.parse import quote
+from utils.atomic_files import atomic_write
+from utils.logger import Logger
+
+JOURNAL_DIR = '.sorte_journal'
+
+
+def _hash(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def make_delta(old: str, new: str) -> List[list]:
+    """Diferença por linhas: [início, fim, linhas novas] para cada trecho alterado de old."""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    return [[i1, i2, new_lines[j1:j2]] for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+
+
+def apply_delta(old: str, delta: List[list]) -> str:
+    old_lines = old.splitlines(keepends=True)
+    parts = []
+    position = 0
+    for start, end, lines in delta:
+        parts.extend(old_lines[position:start])
+        parts.extend(lines)
+        position = end
+    parts.extend(old_lines[position:])
+    return ''.join(parts)
+
+
+class UndoJournal:
+    """
+    Histórico de versões por arquivo, em um diário (append-only) de diferenças
+    compactas. A primeira versão de cada arquivo é guardada inteira; as
+    seguintes, apenas como diferença para a anterior. Permite restaurar
+    qualquer uma das últimas max_depth versões, sem espalhar cópias
+    '.backup' pelo projeto.
+
+    Quando o diário passa do dobro da profundidade ou do limite de tamanho,
+    ele é compactado: a versão mais antiga mantida vira a nova base.
+    """
+
+    def __init__(self, base_path: str, journal_dir: Optional[str] = None,
+                 max_depth: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.base_path = base_path
+        self.journal_dir = journal_dir or os.path.join(base_path, JOURNAL_DIR)
+        self.max_depth = max_depth if max_depth is not None else int(os.getenv('UNDO_JOURNAL_DEPTH', '10'))
+        self.max_bytes = max_bytes if max_bytes is not None else int(float(os.getenv('UNDO_JOURNAL_MAX_KB', '1024')) * 1024)
+        self.logger = Logger("UndoJournal")
+        self._lock = threading.RLock()
+        # Conteúdo da última versão de cada arquivo, para calcular a próxima diferença sem reler o diário
+        self._latest: Dict[str, Dict[str, Any]] = {}
+
+    def _journal_path(self, relative_path: str) -> str:
+        key = os.path.normpath(relative_path).replace(os.sep, '/')
+        return os.path.join(self.journal_dir, quote(key, safe='') + '.jsonl')
+
+    def _read_records(self, relative_path: str) -> List[Dict[str, Any]]:
+        records = []
+        try:
+            with open(self._journal_path(relative_path), 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        records.append(json.loads(line))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Diário de {relative_path} ilegível: {e}")
+        return records
+
+    @staticmethod
+    def _replay(records: List[Dict[str, Any]]) -> List[str]:
+        """Conteúdo de cada versão do diário, reconstruído a partir da base."""
+        contents = []
+        content = ''
+        for record in records:
+            content = record['content'] if record['type'] == 'snapshot' else apply_delta(content, record['delta'])
+            contents.append(content)
+        return contents
+
+    def _latest_version(self, relative_path: str) -> Optional[Dict[str, Any]]:
+        latest = self._latest.get(relative_path)
+        if latest is None:
+            records = self._read_records(relative_path)
+            if not records:
+                return None
+            latest = {'version': records[-1]['version'], 'hash': records[-1]['hash'],
+                      'content': self._replay(records)[-1], 'records': len(records)}
+            self._latest[relative_path] = latest
+        return latest
+
+    def record(self, relative_path: str, content: Optional[str] = None, label: str = '') -> Optional[int]:
+        """
+        Registra o conteúdo atual do arquivo (ou o informado) como uma nova
+        versão. Não faz nada se ele for igual à última versão registrada.
+        Retorna o número da versão ou None se o arquivo não existir.
+        """
+        relative_path = os.path.normpath(relative_path)
+        if content is None:
+            try:
+                with open(os.path.join(self.base_path, relative_path), 'r', encoding='utf-8') as f:
+                    content = f.read()
+            except FileNotFoundError:
+                return None
+
+        content_hash = _hash(content)
+        with self._lock:
+            latest = self._latest_version(relative_path)
+            if latest is not None and latest['hash'] == content_hash:
+                return latest['version']
+
+            version = latest['version'] + 1 if latest else 1
+            record = {'version': version, 'time': time.time(), 'hash': content_hash, 'label': label}
+            if latest is None:
+                record.update(type='snapshot', content=content)
+            else:
+                record.update(type='delta', delta=make_delta(latest['content'], content))
+
+            journal_path = self._journal_path(relative_path)
+            os.makedirs(self.journal_dir, exist_ok=True)
+            with open(journal_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+            records = (latest['records'] if latest else 0) + 1
+            self._latest[relative_path] = {'version': version, 'hash': content_hash,
+                                           'content': content, 'records': records}
+            if records > 2 * self.max_depth or os.path.getsize(journal_path) > self.max_bytes:
+                self._compact(relative_path)
+            return version
+
+    def _compact(self, relative_path: str):
+        """Mantém só as últimas max_depth versões (menos, se não couberem em max_bytes)."""
+        records = self._read_records(relative_path)
+        contents = self._replay(records)
+        keep = max(1, min(self.max_depth, len(records)))
+        while True:
+            first = len(records) - keep
+            kept = [dict(records[first], type='snapshot', content=contents[first])]
+            kept[0].pop('delta', None)
+            kept += records[first + 1:]
+            data = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in kept)
+            if keep == 1 or len(data.encode('utf-8')) <= self.max_bytes:
+                break
+            keep -= 1
+
+        atomic_write(self._journal_path(relative_path), data)
+        self._latest[relative_path]['records'] = len(kept)
+        self.logger.info(f"Diário de {relative_path} compactado: {len(records)} -> {len(kept)} versões")
+
+    def list_versions(self, relative_path: str) -> List[Dict[str, Any]]:
+        """Versões disponíveis do arquivo, da mais antiga para a mais recente."""
+        relative_path = os.path.normpath(relative_path)
+        with self._lock:
+            return [{'version': record['version'], 'time': record['time'], 'label': record.get('label', ''),
+                     'type': record['type'],
+                     'changed_lines': sum(max(end - start, len(lines)) for start, end, lines in record.get('delta', []))}
+                    for record in self._read_records(relative_path)]
+
+    def get_version(self, relative_path: str, version: int) -> Optional[str]:
+        """Conteúdo de uma versão específica."""
+        relative_path = os.path.normpath(relative_path)
+        with self._lock:
+            records = self._read_records(relative_path)
+            for record, content in zip(records, self._replay(records)):
+                if record['version'] == version:
+                    return content
+            return None
+
+    def restore(self, relative_path: str, version: Optional[int] = None, steps: int = 1) -> bool:
+        """
+        Restaura o arquivo para uma versão (ou a steps-ésima versão mais recente).
+        O conteúdo atual é registrado antes, então a restauração também pode ser desfeita.
+        """
+        relative_path = os.path.normpath(relative_path)
+        with self._lock:
+            records = self._read_records(relative_path)
+            if not records:
+                self.logger.warning(f"Nenhuma versão registrada para {relative_path}")
+                return False
+            if version is None:
+                if not 0 < steps <= len(records):
+                    self.logger.warning(f"Só há {len(records)} versões de {relative_path}")
+                    return False
+                version = records[-steps]['version']
+            content = self.get_version(relative_path, version)
+            if content is None:
+                self.logger.warning(f"Versão {version} de {relative_path} não está mais no diário")
+                return False
+
+            self.record(relative_path, label='antes_da_restauracao')
+            atomic_write(os.path.join(self.base_path, relative_path), content)
+            self.logger.info(f"Arquivo {relative_path} restaurado para a versão {version}")
+            return True
+
+    def discard(self, relative_path: str):
+        """Apaga o histórico de um arquivo."""
+        relative_path = os.path.normpath(relative_path)
+        with self._lock:
+            self._latest.pop(relative_path, None)
+            try:
+                os.remove(self._journal_path(relative_path))
+            except FileNotFoundError:
+                pass
+
+
+_journals: Dict[str, UndoJournal] = {}
+_journals_lock = threading.Lock()
+
+
+def get_undo_journal(base_path: str) -> UndoJournal:
+    """Retorna o diário de versões compartilhado do projeto em base_path."""
+    key = os.path.abspath(base_path)
+    with _journals_lock:
+        journal = _journals.get(key)
+        if journal is None:
+            journal = UndoJournal(key)
+            _journals[key] = journal
+        return journal
@@ -1,43 +1,322 @@
+import atexit
+import json
+import signal
 import subprocess
 import os
+from utils.logger import Logger
+
+# Saída estruturada; verificações entre módulos ficam de fora para que o
+# resultado de um arquivo não dependa de quais outros foram analisados junto
+PYLINT_ARGS = ['--output-format=json', '--disable=duplicate-code,cyclic-import']
+
+# Bits do código de saída do pylint para cada categoria de mensagem (32 = erro de uso)
+PYLINT_EXIT_BITS = {'fatal': 1, 'error': 2, 'warning': 4, 'refactor': 8, 'convention': 16}
+
+# Regras de segurança que impedem a execução do candidato no sandbox, qualquer que seja a severidade
+SANDBOX_BLOCKING_RULES = ('eval-exec', 'os-command', 'subprocess-shell', 'subprocess', 'dynamic-import',
+                          'network', 'file-write-outside', 'file-write')
 
 class CodeGuardian:
-    def __init__(self, base_path):
+    def __init__(self, base_path, lint_workers=None):
         self.base_path = base_path
+        self.logger = Logger("CodeGuardian")
+        self._symbol_index = None
+        self._lint_cache = None
+        self._lint_pool = None
+        # Quantas análises do pylint rodam ao mesmo tempo em workers aquecidos (0 desliga o pool)
+        self.lint_workers = lint_workers if lint_workers is not None else int(os.getenv('LINT_WORKERS', '2'))
+        # Categorias de mensagem que reprovam o arquivo: por padrão qualquer mensagem (nota 10.00/10).
+        # LINT_FAIL_ON=fatal,error,warning, por exemplo, passa a só exibir convenções e refatorações.
+        self.fail_on = {category.strip() for category in
+                        os.getenv('LINT_FAIL_ON', ','.join(PYLINT_EXIT_BITS)).split(',') if category.strip()}
+
+    @property
+    def symbol_index(self):
+        # Índice de símbolos compartilhado com o editor (construído no primeiro uso)
+        if self._symbol_index is None:
+            from bud_editor_service.symbol_index import get_symbol_index
+            self._symbol_index = get_symbol_index(self.base_path)
+        return self._symbol_index
+
+    @property
+    def scanner(self):
+        # Varredura do projeto compartilhada com o editor e o gerenciador de deploy
+        from utils.workspace_scanner import get_workspace_scanner
+        return get_workspace_scanner(self.base_path)
+
+    def validate_workspace_syntax(self):
+        """Compila todos os arquivos Python do projeto (fora de venv e backups) em paralelo."""
+        print("Verificando a sintaxe de todos os arquivos do projeto...")
+        summary = self.scanner.check_syntax()
+        for error in summary['errors']:
+            print(f"Erro de sintaxe: {error}")
+        print(f"{summary['files_checked']} arquivos verificados, {len(summary['errors'])} com erro.")
+        return summary
+
+    def locate_symbol(self, qualname):
+        """Retorna arquivo e linhas de uma classe/função (ex.: 'SorteAlertSystem.send_alert')."""
+        matches = self.symbol_index.lookup(qualname)
+        if not matches:
+            print(f"Símbolo não encontrado no projeto: {qualname}")
+        return matches
+
+    @property
+    def lint_cache(self):
+        # Resultados do pylint por hash do conteúdo, versão do pylint e configuração
+        if self._lint_cache is None:
+            from bud_guardian_service.lint_cache import LintCache
+            self._lint_cache = LintCache(self.base_path, args=PYLINT_ARGS)
+        return self._lint_cache
+
+    @property
+    def lint_pool(self):
+        # Processos de lint de vida longa com pylint/astroid já importados
+        if self._lint_pool is None and self.lint_workers > 0:
+            from bud_guardian_service.lint_workers import LintWorkerPool
+            self._lint_pool = LintWorkerPool(self.base_path, workers=self.lint_workers, args=PYLINT_ARGS)
+            atexit.register(self._lint_pool.close)
+        return self._lint_pool
 
-    def validate_code(self, file_path):
+    def validate_code(self, file_path, cancel_event=None):
         print(f"Validando código em: {file_path} com Pylint...")
-        full_file_path = os.path.join(self.base_path, file_path)
-        try:
-            # Run pylint as a subprocess
-            result = subprocess.run(['pylint', full_file_path], capture_output=True, text=True, check=True)
-            print("Pylint output:")
-            print(result.stdout)
-            if "Your code has been rated at 10.00/10" in result.stdout:
-                print(f"Validação de código para {file_path} bem-sucedida (Pylint).")
-                return True
+        return self.validate_files([file_path], cancel_event=cancel_event)[file_path]
+
+    def validate_files(self, file_paths, cancel_event=None):
+        """
+        Valida vários arquivos com o pylint. Arquivos cujo conteúdo já foi
+        validado (mesmo hash, versão do pylint e configuração) saem do cache;
+        os demais são analisados juntos nos workers de lint aquecidos (ou,
+        sem eles, em uma única execução do pylint). cancel_event interrompe
+        a análise em andamento (worker ou subprocesso); os arquivos ainda não
+        analisados saem como reprovados.
+        Retorna {arquivo: passou}.
+        """
+        results = {}
+        misses = []
+        for file_path in file_paths:
+            try:
+                with open(os.path.join(self.base_path, file_path), 'rb') as f:
+                    key = self.lint_cache.key_for(f.read())
+            except FileNotFoundError:
+                print(f"Arquivo não encontrado para validação: {file_path}")
+                results[file_path] = False
+                continue
+            entry = self.lint_cache.get(key)
+            if entry is None:
+                misses.append((file_path, key))
             else:
-                print(f"Validação de código para {file_path} falhou (Pylint).")
-                return False
-        except subprocess.CalledProcessError as e:
-            print(f"Erro ao executar Pylint em {file_path}: {e.stderr}")
-            return False
+                results[file_path] = self._report_lint(file_path, entry, cached=True)
+
+        if misses:
+            entries = self._run_pylint([file_path for file_path, _ in misses], cancel_event)
+            for file_path, key in misses:
+                if entries is None:
+                    results[file_path] = False
+                    continue
+                entry = entries[os.path.normpath(file_path)]
+                # Só guarda se o arquivo não mudou enquanto o pylint rodava
+                with open(os.path.join(self.base_path, file_path), 'rb') as f:
+                    if self.lint_cache.key_for(f.read()) == key:
+                        self.lint_cache.put(key, entry)
+                results[file_path] = self._report_lint(file_path, entry, cached=False)
+        return results
+
+    def _run_pylint(self, file_paths, cancel_event=None):
+        """
+        Analisa os arquivos nos workers aquecidos (ou, sem eles, em uma única
+        execução do pylint) e agrupa as mensagens por arquivo. Retorna None
+        se o pylint não rodou ou foi cancelado.
+        """
+        messages = self.lint_pool.lint_many(list(file_paths), cancel_event) if self.lint_pool else None
+        if messages is None:
+            if cancel_event is not None and cancel_event.is_set():
+                print("Validação com Pylint cancelada.")
+                return None
+            if self.lint_pool:
+                self.logger.warning("Workers de lint indisponíveis; executando o pylint em um subprocesso")
+            messages = self._run_pylint_subprocess(file_paths, cancel_event)
+            if messages is None:
+                return None
+        return self._group_messages(file_paths, messages)
+
+    def _run_pylint_subprocess(self, file_paths, cancel_event=None):
+        """
+        Executa o pylint em um processo novo e retorna as mensagens (None se
+        não rodou). O processo é encerrado se cancel_event for sinalizado.
+        """
+        try:
+            # Sessão própria: no cancelamento o grupo inteiro (pylint -j e afins) é encerrado
+            process = subprocess.Popen(['pylint', *PYLINT_ARGS, *file_paths], cwd=self.base_path,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                       start_new_session=True)
+        except FileNotFoundError:
+            print("Erro: Pylint não encontrado. Certifique-se de que está instalado.")
+            return None
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=0.05 if cancel_event is not None else None)
+                break
+            except subprocess.TimeoutExpired:
+                if cancel_event.is_set():
+                    try:
+                        os.killpg(process.pid, signal.SIGKILL)
+                    except (AttributeError, OSError):
+                        process.kill()
+                    process.communicate()
+                    print("Validação com Pylint cancelada.")
+                    return None
+        if process.returncode & 32:
+            print(f"Erro de uso do Pylint: {stderr}")
+            return None
+        try:
+            return json.loads(stdout or '[]')
+        except ValueError:
+            print(f"Erro ao executar Pylint: {stderr}")
+            return None
+
+    @staticmethod
+    def _group_messages(file_paths, messages):
+        entries = {os.path.normpath(file_path): {'messages': []} for file_path in file_paths}
+        for message in messages:
+            entry = entries.setdefault(os.path.normpath(message['path']), {'messages': []})
+            entry['messages'].append({key: message.get(key) for key in
+                                      ('type', 'line', 'column', 'symbol', 'message-id', 'message')})
+        return entries
+
+    def _passed(self, messages):
+        return not any(message['type'] in self.fail_on for message in messages)
+
+    def run_pylint_analysis(self, file_path):
+        """
+        Análise avulsa (sem cache nem workers) de um arquivo em um processo
+        novo do pylint; usada como referência no benchmark dos workers.
+        """
+        try:
+            result = subprocess.run(['pylint', *PYLINT_ARGS, file_path], cwd=self.base_path,
+                                    capture_output=True, text=True)
         except FileNotFoundError:
             print("Erro: Pylint não encontrado. Certifique-se de que está instalado.")
             return False
+        fail_bits = sum(PYLINT_EXIT_BITS.get(category, 0) for category in self.fail_on) | 32
+        if result.returncode & fail_bits:
+            return False
+        try:
+            messages = json.loads(result.stdout or '[]')
+        except ValueError:
+            # Saída em outro formato (ex.: relatório texto): vale o código de saída
+            return True
+        return self._passed(messages)
 
-    def run_tests(self):
-        print("Executando testes automatizados (placeholder)...")
-        # In a real scenario, this would run unit and integration tests
-        # using frameworks like pytest or unittest.
-        # For now, it's a placeholder that always returns True.
-        print("Testes automatizados (placeholder) concluídos.")
-        return True
+    def _report_lint(self, file_path, entry, cached):
+        origem = " (cache)" if cached else ""
+        for message in entry['messages']:
+            print(f"{file_path}:{message['line']}:{message['column']}: {message['message-id']} "
+                  f"{message['message']} ({message['symbol']})")
+        passed = self._passed(entry['messages'])
+        if passed:
+            print(f"Validação de código para {file_path} bem-sucedida (Pylint){origem}.")
+        else:
+            print(f"Validação de código para {file_path} falhou (Pylint){origem}.")
+        return passed
+
+    @property
+    def test_impact(self):
+        # Grafo de imports do projeto e mapa de cobertura para escolher os testes afetados
+        from bud_guardian_service.impact_analysis import get_test_impact_analyzer
+        return get_test_impact_analyzer(self.base_path)
+
+    def run_tests(self, changed_files=None, cancel_event=None):
+        """
+        Executa só os testes afetados pelos arquivos alterados (todos, se
+        changed_files for None), divididos em shards paralelos. Retorna o
+        relatório do TestImpactAnalyzer: passed, testes escolhidos e o motivo
+        de cada um, resultado de cada caso e dos shards. Sinalizar
+        cancel_event encerra os shards em execução.
+        """
+        print(f"Executando testes afetados por: {', '.join(changed_files) if changed_files else 'todo o projeto'}...")
+        report = self.test_impact.run(changed_files, cancel_event=cancel_event)
+        for node, reasons in report['selected'].items():
+            print(f"  {node}: {'; '.join(reasons)}")
+        summary = report['summary']
+        print(f"Testes concluídos: {summary['passed']} passaram, {summary['failed']} falharam, "
+              f"{summary['errors']} erros, {summary['skipped']} ignorados "
+              f"({len(report['shards'])} shards, {report['duration']:.1f}s).")
+        return report
+
+    @property
+    def sandbox(self):
+        # Execução do código gerado com rlimits e carga sintética
+        from bud_guardian_service.sandbox_runner import get_sandbox_runner
+        return get_sandbox_runner(self.base_path)
+
+    def check_candidate_security(self, file_path, candidate_code, blocking_rules=()):
+        """
+        Verificação de segurança do novo conteúdo de file_path, ainda em
+        memória. Reprovam as ocorrências com severidade em SECURITY_FAIL_ON
+        e as das regras em blocking_rules, qualquer que seja a severidade.
+        Retorna o relatório de SecurityAnalyzer.analyze_source com blocking
+        (as ocorrências que reprovaram).
+        """
+        report = self.security_analyzer.analyze_source(candidate_code, file_path)
+        blocking = [finding for finding in report['findings']
+                    if finding['severity'] in self.security_analyzer.fail_on or finding['rule'] in blocking_rules]
+        report = dict(report, passed=report['complete'] and not blocking, blocking=blocking)
+        if not report['passed']:
+            for finding in blocking:
+                print(f"{file_path}:{finding['line']}:{finding['column']}: [{finding['severity']}] "
+                      f"{finding['message']}: {finding['detail']} ({finding['rule']})")
+            if report['error']:
+                print(f"Verificação de segurança incompleta: {report['error']}")
+            print(f"Candidato para {file_path} reprovado na verificação de segurança.")
+        return report
+
+    def benchmark_candidate(self, file_path, candidate_code):
+        """
+        Executa o novo conteúdo de file_path no sandbox e o compara com a
+        versão atual do arquivo. Retorna o resultado de SandboxRunner.compare;
+        accepted é False se o candidato travar, estourar os limites ou
+        regredir além do limite configurado. Mesmo com o sandbox sem rede e
+        sem gravação, um candidato com acesso à rede, subprocessos, execução
+        dinâmica ou escrita de arquivos (SANDBOX_BLOCKING_RULES) nem chega a
+        ser executado.
+        """
+        security = self.check_candidate_security(file_path, candidate_code, SANDBOX_BLOCKING_RULES)
+        if not security['passed']:
+            reasons = [f"{finding['rule']} na linha {finding['line']}: {finding['detail']}"
+                       for finding in security['blocking']]
+            reasons = reasons or [security['error']]
+            return {'accepted': False, 'reasons': [f"verificação de segurança: {reason}" for reason in reasons],
+                    'candidate': None, 'baseline': None, 'ratios': {}, 'security': security}
+
+        print(f"Executando {file_path} candidato no sandbox...")
+        try:
+            with open(os.path.join(self.base_path, file_path), 'r', encoding='utf-8') as f:
+                current_code = f.read()
+        except FileNotFoundError:
+            current_code = None
+        report = self.sandbox.compare(candidate_code, current_code, file_path)
+        for reason in report['reasons']:
+            print(f"Candidato rejeitado: {reason}")
+        return dict(report, security=security)
 
-    def check_security(self, file_path):
-        print(f"Verificando segurança do código em: {file_path} (placeholder)...")
-        # Placeholder for security checks (e.g., dependency vulnerabilities, common security flaws)
-        print("Verificação de segurança (placeholder) concluída.")
-        return True
+    @property
+    def security_analyzer(self):
+        # Regras de segurança em uma passada pela AST, com cache por hash do conteúdo
+        from bud_guardian_service.security_rules import get_security_analyzer
+        return get_security_analyzer(self.base_path)
 
+    def check_security(self, file_path, cancel_event=None):
+        print(f"Verificando segurança do código em: {file_path}...")
+        report = self.security_analyzer.analyze_file(file_path, cancel_event=cancel_event)
+        for finding in report['findings']:
+            print(f"{file_path}:{finding['line']}:{finding['column']}: [{finding['severity']}] "
+                  f"{finding['message']}: {finding['detail']} ({finding['rule']})")
+        if report['error']:
+            print(f"Verificação de segurança incompleta: {report['error']}")
+        origem = " (cache)" if report['cached'] else ""
+        if report['passed']:
+            print(f"Verificação de segurança para {file_path} concluída sem bloqueios{origem}.")
+        else:
+            print(f"Verificação de segurança para {file_path} falhou{origem}.")
+        return report['passed']
 
@@ -0,0 +1,397 @@
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+from collections import deque
+from typing import Dict, List, Any, Iterable, Optional, Set, Tuple
+from bud_editor_service.ast_cache import ASTCache, get_ast_cache
+from utils.atomic_files import atomic_write
+from utils.logger import Logger
+from utils.workspace_scanner import WorkspaceScanner, get_workspace_scanner
+
+COVERAGE_MAP_FILE = '.sorte_test_map.json'
+
+# Strings como 'pacote.modulo.Classe' (alvos de patch()) também contam como dependência
+_DOTTED_NAME = re.compile(r'^[A-Za-z_][\w]*(\.[A-Za-z_][\w]*)+$')
+
+
+def module_name(relative_path: str) -> str:
+    module = relative_path[:-3].replace(os.sep, '.').replace('/', '.')
+    return module[:-len('.__init__')] if module.endswith('.__init__') else module
+
+
+def is_test_file(relative_path: str) -> bool:
+    name = os.path.basename(relative_path)
+    return name.endswith('.py') and (name.startswith('test_') or name.endswith('_test.py'))
+
+
+class _ImportCollector(ast.NodeVisitor):
+    """Nomes de módulos citados em um trecho da AST (imports e alvos de patch em string)."""
+
+    def __init__(self, package: str):
+        self.package = package
+        self.names: Set[str] = set()
+
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            self.names.add(alias.name)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        if node.level:
+            parts = self.package.split('.') if self.package else []
+            parts = parts[:len(parts) - node.level + 1]
+            base = '.'.join(parts + ([node.module] if node.module else []))
+        else:
+            base = node.module or ''
+        if base:
+            self.names.add(base)
+        for alias in node.names:
+            if alias.name != '*':
+                self.names.add(f"{base}.{alias.name}" if base else alias.name)
+
+    def visit_Constant(self, node: ast.Constant):
+        if isinstance(node.value, str) and _DOTTED_NAME.match(node.value):
+            self.names.add(node.value)
+
+
+class TestImpactAnalyzer:
+    """
+    Escolhe quais testes precisam rodar depois de uma alteração.
+    Um grafo estático de imports do projeto liga cada módulo alterado aos
+    testes que o importam, direta ou indiretamente; a unidade de seleção é a
+    classe de teste (ou função test_* de módulo). Opcionalmente, um mapa de
+    cobertura gerado em uma execução completa anterior acrescenta os testes
+    que executaram os arquivos alterados. Os testes escolhidos rodam em
+    shards, cada um em um processo do pytest.
+    """
+
+    __test__ = False
+
+    def __init__(self, base_path: str, ast_cache: Optional[ASTCache] = None,
+                 scanner: Optional[WorkspaceScanner] = None, shards: Optional[int] = None,
+                 coverage_map_path: Optional[str] = None):
+        self.base_path = os.path.abspath(base_path)
+        self.ast_cache = ast_cache or get_ast_cache()
+        self.scanner = scanner or get_workspace_scanner(self.base_path)
+        self.shards = shards or int(os.getenv('TEST_SHARDS', '0')) or os.cpu_count() or 1
+        self.coverage_map_path = coverage_map_path or os.path.join(self.base_path, COVERAGE_MAP_FILE)
+        self.timeout = float(os.getenv('TEST_TIMEOUT', '600'))
+        self.logger = Logger("TestImpactAnalyzer")
+
+        self._lock = threading.Lock()
+        # Dependências de cada arquivo, revalidadas pelo stat: {arquivo: {stat, module, nodes}}
+        self._files: Dict[str, Dict[str, Any]] = {}
+        # Duração da última execução de cada teste, para equilibrar os shards
+        self._durations: Dict[str, float] = {}
+
+    def _file_info(self, relative_path: str) -> Optional[Dict[str, Any]]:
+        file_path = os.path.join(self.base_path, relative_path)
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        info = self._files.get(relative_path)
+        if info is not None and info['stat'] == signature:
+            return info
+
+        module = module_name(relative_path)
+        package = module if relative_path.endswith('__init__.py') else module.rpartition('.')[0]
+        try:
+            _, tree = self.ast_cache.get(file_path, shared=True)
+        except (SyntaxError, UnicodeDecodeError, OSError) as e:
+            self.logger.warning(f"Arquivo fora do grafo de imports {relative_path}: {e}")
+            tree = ast.Module(body=[], type_ignores=[])
+
+        # Imports do módulo valem para todos os testes do arquivo; os de cada
+        # classe/função de teste, só para ela
+        shared = _ImportCollector(package)
+        nodes: Dict[str, Set[str]] = {}
+        for statement in tree.body:
+            test_node = is_test_file(relative_path) and self._test_node_name(statement)
+            collector = _ImportCollector(package) if test_node else shared
+            collector.visit(statement)
+            if test_node:
+                nodes[f"{relative_path.replace(os.sep, '/')}::{test_node}"] = collector.names
+        info = {'stat': signature, 'module': module, 'imports': shared.names, 'nodes': nodes}
+        self._files[relative_path] = info
+        return info
+
+    @staticmethod
+    def _test_node_name(statement: ast.stmt) -> Optional[str]:
+        if isinstance(statement, ast.ClassDef) and statement.name.startswith('Test'):
+            return statement.name
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)) and statement.name.startswith('test'):
+            return statement.name
+        return None
+
+    def build_graph(self) -> Dict[str, Any]:
+        """
+        Monta o grafo do projeto: {'modules': {módulo: arquivo},
+        'importers': {módulo: módulos que o importam}, 'tests': {teste: módulos}}.
+        """
+        with self._lock:
+            files = list(self.scanner.iter_python_files())
+            for relative_path in set(self._files) - set(files):
+                del self._files[relative_path]
+            infos = {relative_path: self._file_info(relative_path) for relative_path in files}
+            infos = {path: info for path, info in infos.items() if info is not None}
+
+        modules = {info['module']: path for path, info in infos.items()}
+        importers: Dict[str, Set[str]] = {}
+        tests: Dict[str, Set[str]] = {}
+        for info in infos.values():
+            for imported in self._resolve(info['imports'], modules):
+                importers.setdefault(imported, set()).add(info['module'])
+            for node, names in info['nodes'].items():
+                tests[node] = self._resolve(names | info['imports'], modules)
+        return {'modules': modules, 'importers': importers, 'tests': tests}
+
+    @staticmethod
+    def _resolve(names: Iterable[str], modules: Dict[str, str]) -> Set[str]:
+        """Módulos do projeto citados pelos nomes (incluindo os pacotes pais, cujo __init__ roda no import)."""
+        resolved = set()
+        for name in names:
+            parts = name.split('.')
+            for size in range(1, len(parts) + 1):
+                candidate = '.'.join(parts[:size])
+                if candidate in modules:
+                    resolved.add(candidate)
+        return resolved
+
+    def load_coverage_map(self) -> Dict[str, List[str]]:
+        """Mapa {teste: arquivos executados} da última execução completa (vazio se não houver)."""
+        try:
+            with open(self.coverage_map_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('tests', {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Mapa de cobertura ilegível {self.coverage_map_path}: {e}")
+            return {}
+
+    def record_coverage_map(self, data_file: str = '.coverage') -> Dict[str, Any]:
+        """
+        Gera o mapa de cobertura a partir de um arquivo do coverage.py com
+        contextos por teste (pytest --cov-context=test ou dynamic_context =
+        test_function) e o grava em .sorte_test_map.json.
+        """
+        try:
+            from coverage import CoverageData
+        except ImportError:
+            self.logger.warning("coverage.py não instalado; mapa de cobertura não gerado")
+            return {'success': False, 'error': 'coverage.py não instalado'}
+
+        data = CoverageData(os.path.join(self.base_path, data_file))
+        data.read()
+        modules = {module_name(path): path.replace(os.sep, '/') for path in self.scanner.iter_python_files()}
+        tests: Dict[str, Set[str]] = {}
+        for measured in data.measured_files():
+            relative_path = os.path.relpath(measured, self.base_path)
+            if relative_path.startswith('..'):
+                continue
+            contexts = set()
+            for line_contexts in data.contexts_by_lineno(measured).values():
+                contexts.update(line_contexts)
+            for context in contexts:
+                node = self._node_for_context(context, modules)
+                if node:
+                    tests.setdefault(node, set()).add(relative_path.replace(os.sep, '/'))
+
+        coverage_map = {'version': 1, 'created_at': time.time(),
+                        'tests': {node: sorted(files) for node, files in sorted(tests.items())}}
+        atomic_write(self.coverage_map_path, json.dumps(coverage_map, ensure_ascii=False, indent=1))
+        self.logger.info(f"Mapa de cobertura gravado: {len(tests)} testes")
+        return {'success': True, 'tests': len(tests), 'path': self.coverage_map_path}
+
+    @staticmethod
+    def _node_for_context(context: str, modules: Dict[str, str]) -> Optional[str]:
+        """'tests/x.py::TestY::test_z|run' (pytest-cov) ou 'tests.x.TestY.test_z' (coverage) -> 'tests/x.py::TestY'."""
+        if not context:
+            return None
+        if '::' in context:
+            parts = context.split('|')[0].split('::')
+            return '::'.join(parts[:2])
+        parts = context.split('.')
+        for size in range(len(parts) - 1, 0, -1):
+            path = modules.get('.'.join(parts[:size]))
+            if path:
+                return f"{path}::{parts[size]}"
+        return None
+
+    def select(self, changed_files: Optional[List[str]] = None) -> Dict[str, List[str]]:
+        """
+        Retorna {teste: motivos} para os arquivos alterados (todos os testes
+        se changed_files for None).
+        """
+        graph = self.build_graph()
+        if changed_files is None:
+            return {node: ["execução completa"] for node in sorted(graph['tests'])}
+
+        changed = [os.path.normpath(path).replace(os.sep, '/') for path in changed_files]
+        selected: Dict[str, List[str]] = {}
+
+        # Caminho de cada módulo afetado até o módulo alterado, pelos importadores
+        chains: Dict[str, List[str]] = {}
+        queue = deque()
+        for path in changed:
+            if path.endswith('.py'):
+                module = module_name(path)
+                chains[module] = [module]
+                queue.append(module)
+            if is_test_file(path):
+                for node in graph['tests']:
+                    if node.split('::')[0] == path:
+                        selected.setdefault(node, []).append("arquivo de teste alterado")
+            if os.path.basename(path) == 'conftest.py':
+                prefix = os.path.dirname(path)
+                for node in graph['tests']:
+                    if node.startswith(f"{prefix}/" if prefix else ''):
+                        selected.setdefault(node, []).append(f"conftest alterado: {path}")
+        while queue:
+            module = queue.popleft()
+            for importer in graph['importers'].get(module, ()):
+                if importer not in chains:
+                    chains[importer] = [importer] + chains[module]
+                    queue.append(importer)
+
+        for node, dependencies in graph['tests'].items():
+            reached = [chains[module] for module in dependencies if module in chains]
+            if reached:
+                chain = min(reached, key=len)
+                reason = f"importa {chain[-1]}" if len(chain) == 1 else f"importa {' -> '.join(chain)}"
+                if reason not in selected.get(node, []):
+                    selected.setdefault(node, []).append(reason)
+
+        for node, covered in self.load_coverage_map().items():
+            hits = sorted(set(covered) & set(changed))
+            if hits:
+                selected.setdefault(node, []).append(f"cobertura: executou {', '.join(hits)}")
+
+        return dict(sorted(selected.items()))
+
+    def _shard(self, nodes: List[str]) -> List[List[str]]:
+        """Distribui os testes entre os shards pela duração conhecida (os mais longos primeiro)."""
+        count = max(1, min(self.shards, len(nodes)))
+        shards: List[Tuple[float, List[str]]] = [(0.0, []) for _ in range(count)]
+        for node in sorted(nodes, key=lambda n: -self._durations.get(n, 1.0)):
+            index = min(range(count), key=lambda i: shards[i][0])
+            load, members = shards[index]
+            shards[index] = (load + self._durations.get(node, 1.0), members + [node])
+        return [members for _, members in shards]
+
+    def run(self, changed_files: Optional[List[str]] = None,
+            cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Seleciona e executa os testes afetados. Retorna {passed, selected
+        (teste: motivos), tests (resultado de cada caso), shards, summary,
+        cancelled, duration}. Se cancel_event for sinalizado, os shards em
+        execução são encerrados e o relatório sai como cancelado.
+        """
+        started_at = time.perf_counter()
+        selected = self.select(changed_files)
+        report = {'passed': True, 'cancelled': False, 'changed_files': changed_files, 'selected': selected,
+                  'tests': [], 'shards': [], 'summary': {'passed': 0, 'failed': 0, 'errors': 0, 'skipped': 0}}
+        if not selected:
+            self.logger.info("Nenhum teste afetado pelas alterações")
+            report['duration'] = time.perf_counter() - started_at
+            return report
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            processes = []
+            for index, nodes in enumerate(self._shard(list(selected))):
+                xml_path = os.path.join(temp_dir, f"shard_{index}.xml")
+                # Saída em arquivo: a espera abaixo acompanha o cancelamento sem ler o pipe
+                log = open(os.path.join(temp_dir, f"shard_{index}.log"), 'w+', encoding='utf-8')
+                command = [sys.executable, '-m', 'pytest', '-q', '-p', 'no:cacheprovider',
+                           f'--junitxml={xml_path}', *nodes]
+                process = subprocess.Popen(command, cwd=self.base_path, stdout=log, stderr=subprocess.STDOUT)
+                processes.append((nodes, xml_path, log, process, time.perf_counter()))
+
+            deadline = time.monotonic() + self.timeout
+            for nodes, xml_path, log, process, shard_started_at in processes:
+                status = self._wait(process, deadline, cancel_event)
+                with log:
+                    log.seek(0)
+                    output = log.read()
+                if status == 'timeout':
+                    output += f"\nTempo limite de {self.timeout:.0f}s excedido"
+                report['cancelled'] = report['cancelled'] or status == 'cancelled'
+                # 0 = tudo passou, 5 = nenhum teste coletado
+                shard_passed = status == 'done' and process.returncode in (0, 5)
+                report['shards'].append({'tests': nodes, 'returncode': process.returncode,
+                                         'passed': shard_passed, 'status': status,
+                                         'duration': time.perf_counter() - shard_started_at,
+                                         'output': '' if shard_passed else output[-4000:]})
+                report['passed'] = report['passed'] and shard_passed
+                report['tests'].extend(self._read_junit(xml_path, nodes))
+
+        for case in report['tests']:
+            report['summary'][case['outcome'] if case['outcome'] != 'error' else 'errors'] += 1
+        report['duration'] = time.perf_counter() - started_at
+        self.logger.info(f"Testes afetados: {len(selected)} selecionados, {report['summary']} "
+                         f"em {len(report['shards'])} shards ({report['duration']:.1f}s)"
+                         f"{' - cancelados' if report['cancelled'] else ''}")
+        return report
+
+    @staticmethod
+    def _wait(process: subprocess.Popen, deadline: float, cancel_event: Optional[threading.Event]) -> str:
+        """Espera o shard terminar; encerra-o no tempo limite ou no cancelamento."""
+        while True:
+            try:
+                process.wait(timeout=0.05 if cancel_event is not None else max(0.0, deadline - time.monotonic()))
+                return 'done'
+            except subprocess.TimeoutExpired:
+                pass
+            cancelled = cancel_event is not None and cancel_event.is_set()
+            if cancelled or time.monotonic() >= deadline:
+                process.kill()
+                process.wait()
+                return 'cancelled' if cancelled else 'timeout'
+
+    def _read_junit(self, xml_path: str, nodes: List[str]) -> List[Dict[str, Any]]:
+        try:
+            root = ElementTree.parse(xml_path).getroot()
+        except (OSError, ElementTree.ParseError):
+            return []
+        cases = []
+        node_by_class = {node.split('::')[0][:-3].replace('/', '.') + '.' + node.split('::')[1]: node
+                         for node in nodes if '::' in node}
+        durations: Dict[str, float] = {}
+        for case in root.iter('testcase'):
+            classname = case.get('classname', '')
+            node = node_by_class.get(classname) or node_by_class.get(f"{classname}.{case.get('name')}")
+            outcome = 'passed'
+            for tag, name in (('failure', 'failed'), ('error', 'error'), ('skipped', 'skipped')):
+                if case.find(tag) is not None:
+                    outcome = name
+                    break
+            duration = float(case.get('time') or 0)
+            cases.append({'test': f"{classname}::{case.get('name')}", 'node': node,
+                          'outcome': outcome, 'duration': duration})
+            if node:
+                durations[node] = durations.get(node, 0.0) + duration
+        with self._lock:
+            self._durations.update(durations)
+        return cases
+
+
+_analyzers: Dict[str, TestImpactAnalyzer] = {}
+_analyzers_lock = threading.Lock()
+
+
+def get_test_impact_analyzer(base_path: str) -> TestImpactAnalyzer:
+    """Retorna o analisador de impacto compartilhado do projeto em base_path."""
+    key = os.path.abspath(base_path)
+    with _analyzers_lock:
+        analyzer = _analyzers.get(key)
+        if analyzer is None:
+            analyzer = TestImpactAnalyzer(key)
+            _analyzers[key] = analyzer
+        return analyzer
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import subprocess
+import threading
+from typing import Dict, Any, Optional, Sequence
+from utils.atomic_files import atomic_write
+
+CACHE_DIR = '.sorte_lint_cache'
+
+# Arquivos de configuração que o pylint lê a partir do diretório do projeto
+RCFILE_CANDIDATES = ('pylintrc', '.pylintrc', 'pyproject.toml', 'setup.cfg', 'tox.ini')
+
+_pylint_version: Optional[str] = None
+_pylint_version_lock = threading.Lock()
+
+
+def get_pylint_version() -> str:
+    """Versão do pylint instalado (consultada uma vez por processo)."""
+    global _pylint_version
+    with _pylint_version_lock:
+        if _pylint_version is None:
+            try:
+                from importlib.metadata import version
+                _pylint_version = version('pylint')
+            except Exception:
+                try:
+                    result = subprocess.run(['pylint', '--version'], capture_output=True, text=True, timeout=60)
+                    _pylint_version = result.stdout.splitlines()[0] if result.stdout else 'desconhecida'
+                except (OSError, subprocess.SubprocessError):
+                    _pylint_version = 'desconhecida'
+        return _pylint_version
+
+
+class LintCache:
+    """
+    Cache persistente de resultados do pylint.
+    A chave combina o hash do conteúdo do arquivo, a versão do pylint, o hash
+    dos arquivos de configuração (pylintrc, pyproject.toml...) e os argumentos
+    usados: se nada disso mudou, o resultado anterior continua válido.
+    Cada entrada é um arquivo JSON em <projeto>/.sorte_lint_cache.
+    """
+
+    def __init__(self, base_path: str, cache_dir: Optional[str] = None, args: Sequence[str] = ()):
+        self.base_path = base_path
+        self.cache_dir = cache_dir or os.getenv('LINT_CACHE_DIR') or os.path.join(base_path, CACHE_DIR)
+        self.args = list(args)
+        self._lock = threading.Lock()
+        self._environment_key: Optional[str] = None
+        self._rcfile_stats: Optional[tuple] = None
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0}
+
+    def _rcfile_paths(self):
+        return [os.path.join(self.base_path, name) for name in RCFILE_CANDIDATES] + \
+               ([os.environ['PYLINTRC']] if os.getenv('PYLINTRC') else [])
+
+    def _environment(self) -> str:
+        """Parte da chave comum a todos os arquivos: versão do pylint, configuração e argumentos."""
+        rcfile_stats = []
+        for path in self._rcfile_paths():
+            try:
+                stat = os.stat(path)
+                rcfile_stats.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                continue
+        rcfile_stats = tuple(rcfile_stats)
+
+        with self._lock:
+            if self._environment_key is None or rcfile_stats != self._rcfile_stats:
+                digest = hashlib.sha256()
+                digest.update(get_pylint_version().encode('utf-8'))
+                digest.update(json.dumps(self.args).encode('utf-8'))
+                for path, _, _ in rcfile_stats:
+                    with open(path, 'rb') as f:
+                        digest.update(path.encode('utf-8') + b'\0' + hashlib.sha256(f.read()).digest())
+                self._environment_key = digest.hexdigest()
+                self._rcfile_stats = rcfile_stats
+            return self._environment_key
+
+    def key_for(self, content: bytes) -> str:
+        return hashlib.sha256(self._environment().encode('ascii') + hashlib.sha256(content).digest()).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._entry_path(key), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+        with self._lock:
+            self.stats['hits'] += 1
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any]):
+        atomic_write(self._entry_path(key), json.dumps(entry, ensure_ascii=False))
+        with self._lock:
+            self.stats['stores'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, cache_dir=self.cache_dir, pylint_version=get_pylint_version())
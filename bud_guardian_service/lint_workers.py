@@ -0,0 +1,263 @@
+import itertools
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Sequence
+from utils.logger import Logger
+
+# Raiz do repositório, para que os workers importem este módulo de qualquer diretório
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _lint_in_process(files: List[str], args: List[str], base_path: str) -> List[Dict[str, Any]]:
+    """Executa o pylint dentro do worker (já importado) e retorna as mensagens estruturadas."""
+    import astroid
+    from pylint.lint import Run
+    from pylint.reporters import CollectingReporter
+
+    reporter = CollectingReporter()
+    try:
+        Run([*args, *files], reporter=reporter, exit=False)
+    finally:
+        # Módulos do projeto podem mudar entre execuções; stdlib e dependências continuam em cache
+        for name, module in list(astroid.MANAGER.astroid_cache.items()):
+            module_file = getattr(module, 'file', None)
+            if module_file and os.path.abspath(module_file).startswith(base_path + os.sep):
+                del astroid.MANAGER.astroid_cache[name]
+        astroid.MANAGER._mod_file_cache.clear()
+
+    return [{'path': message.path, 'type': message.category, 'line': message.line,
+             'column': message.column, 'symbol': message.symbol, 'message-id': message.msg_id,
+             'message': message.msg} for message in reporter.messages]
+
+
+def worker_main():
+    """
+    Laço do worker: importa o pylint uma vez e atende pedidos JSON (um por
+    linha) recebidos pelo stdin, respondendo pelo stdout.
+    """
+    import pylint.lint  # noqa: F401  (aquece os imports antes do primeiro pedido)
+    import astroid  # noqa: F401
+
+    base_path = os.path.abspath(os.getcwd())
+    output = sys.stdout
+    # Qualquer print do pylint/plugins vai para o stderr, sem corromper o protocolo
+    sys.stdout = sys.stderr
+    output.write(json.dumps({'ready': True}) + '\n')
+    output.flush()
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        try:
+            response = {'id': request['id'], 'ok': True,
+                        'messages': _lint_in_process(request['files'], request['args'], base_path)}
+        except BaseException as e:
+            response = {'id': request['id'], 'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        output.write(json.dumps(response) + '\n')
+        output.flush()
+
+
+class _Worker:
+    def __init__(self, process: subprocess.Popen):
+        self.process = process
+        self.jobs = 0
+        self.ready = False
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+
+class LintWorkerPool:
+    """
+    Pool de processos de lint de vida longa, com pylint/astroid já importados.
+    Cada pedido (lista de arquivos) vai para um worker livre por pipe; o
+    número de workers (LINT_WORKERS) limita quantas análises rodam ao mesmo
+    tempo. Os workers são iniciados sob demanda e um worker que falha é
+    substituído.
+    """
+
+    def __init__(self, base_path: str, workers: Optional[int] = None, args: Sequence[str] = (),
+                 timeout: float = 120.0):
+        self.base_path = os.path.abspath(base_path)
+        self.workers = workers if workers is not None else int(os.getenv('LINT_WORKERS', '2'))
+        self.args = [arg for arg in args if not arg.startswith('--output-format')]
+        self.timeout = timeout
+        self.logger = Logger("LintWorkerPool")
+
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._all: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self.stats = {'jobs': 0, 'files': 0, 'restarts': 0, 'failures': 0, 'cancelled': 0}
+
+    def _spawn(self) -> _Worker:
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_ROOT, env.get('PYTHONPATH')]))
+        process = subprocess.Popen([sys.executable, '-m', 'bud_guardian_service.lint_workers'],
+                                   cwd=self.base_path, env=env, text=True, bufsize=1,
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        return _Worker(process)
+
+    def _acquire(self, cancel_event: Optional[threading.Event] = None) -> Optional[_Worker]:
+        """
+        Worker livre; inicia um novo enquanto o pool não estiver completo
+        (inclusive depois de um worker descartado no cancelamento). None se
+        cancel_event for sinalizado durante a espera.
+        """
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                if len(self._all) < self.workers:
+                    worker = self._spawn()
+                    self._all.append(worker)
+                    return worker
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            try:
+                return self._idle.get(timeout=0.05)
+            except queue.Empty:
+                pass
+
+    def warm_up(self) -> int:
+        """Inicia todos os workers e espera terminarem de importar o pylint. Retorna quantos estão prontos."""
+        with self._lock:
+            while len(self._all) < self.workers:
+                worker = self._spawn()
+                self._all.append(worker)
+                self._idle.put(worker)
+            workers = list(self._all)
+        return sum(1 for worker in workers if self._wait_ready(worker))
+
+    def _wait_ready(self, worker: _Worker) -> bool:
+        if worker.ready:
+            return True
+        try:
+            worker.ready = json.loads(self._read_response(worker)).get('ready', False)
+        except (RuntimeError, ValueError):
+            worker.ready = False
+        return worker.ready
+
+    def lint(self, files: List[str],
+             cancel_event: Optional[threading.Event] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Analisa os arquivos em um worker e retorna as mensagens estruturadas
+        (ou None se o worker falhou, para o chamador usar o pylint avulso).
+        Se cancel_event for sinalizado, o worker em análise é encerrado (o
+        próximo pedido inicia outro) e o retorno é None.
+        """
+        if not files:
+            return []
+        worker = self._acquire(cancel_event)
+        if worker is None:
+            return None
+        try:
+            if not worker.alive() or not self._wait_ready(worker):
+                worker = self._replace(worker)
+                if not self._wait_ready(worker):
+                    raise RuntimeError("worker de lint não iniciou")
+
+            request = {'id': next(self._ids), 'files': list(files), 'args': self.args}
+            worker.process.stdin.write(json.dumps(request) + '\n')
+            worker.process.stdin.flush()
+            line = self._read_response(worker, cancel_event)
+            if line is None:
+                with self._lock:
+                    self.stats['cancelled'] += 1
+                self._discard(worker)
+                worker = None
+                return None
+            response = json.loads(line)
+            if response.get('id') != request['id'] or not response.get('ok'):
+                raise RuntimeError(response.get('error', 'resposta inesperada do worker'))
+
+            worker.jobs += 1
+            with self._lock:
+                self.stats['jobs'] += 1
+                self.stats['files'] += len(files)
+            return response['messages']
+        except Exception as e:
+            self.logger.warning(f"Falha no worker de lint: {e}")
+            with self._lock:
+                self.stats['failures'] += 1
+            worker = self._replace(worker)
+            return None
+        finally:
+            if worker is not None:
+                self._idle.put(worker)
+
+    def _read_response(self, worker: _Worker, cancel_event: Optional[threading.Event] = None) -> Optional[str]:
+        """Próxima linha do worker; None se cancel_event for sinalizado antes da resposta."""
+        result: List[str] = []
+        reader = threading.Thread(target=lambda: result.append(worker.process.stdout.readline()), daemon=True)
+        reader.start()
+        deadline = time.monotonic() + self.timeout
+        while reader.is_alive() and time.monotonic() < deadline:
+            reader.join(0.05 if cancel_event is not None else self.timeout)
+            if cancel_event is not None and cancel_event.is_set() and reader.is_alive():
+                return None
+        if reader.is_alive() or not result or not result[0]:
+            raise RuntimeError("worker de lint sem resposta")
+        return result[0]
+
+    def lint_many(self, files: List[str],
+                  cancel_event: Optional[threading.Event] = None) -> Optional[List[Dict[str, Any]]]:
+        """Divide os arquivos entre os workers e analisa as partes em paralelo."""
+        if len(files) < 2 or self.workers < 2:
+            return self.lint(files, cancel_event)
+        size = -(-len(files) // self.workers)
+        chunks = [files[index:index + size] for index in range(0, len(files), size)]
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            results = list(executor.map(lambda chunk: self.lint(chunk, cancel_event), chunks))
+        if any(result is None for result in results):
+            return None
+        return [message for result in results for message in result]
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        self._terminate(worker)
+        replacement = self._spawn()
+        with self._lock:
+            self._all = [replacement if current is worker else current for current in self._all]
+            self.stats['restarts'] += 1
+        return replacement
+
+    def _discard(self, worker: _Worker):
+        """Mata o worker no meio de uma análise; o pool inicia outro sob demanda."""
+        worker.process.kill()
+        worker.process.wait()
+        with self._lock:
+            self._all = [current for current in self._all if current is not worker]
+
+    @staticmethod
+    def _terminate(worker: _Worker):
+        try:
+            worker.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            worker.process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            worker.process.kill()
+
+    def close(self):
+        """Encerra todos os workers."""
+        with self._lock:
+            workers, self._all = self._all, []
+            self._idle = queue.Queue()
+        for worker in workers:
+            self._terminate(worker)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, workers=self.workers,
+                        alive=sum(1 for worker in self._all if worker.alive()))
+
+
+if __name__ == '__main__':
+    worker_main()
@@ -0,0 +1,208 @@
+"""
+Processo do sandbox: executa o código candidato e uma carga sintética.
+
+Executado como script isolado (python -I), só com a biblioteca padrão. Lê o
+pedido JSON do stdin, se isola da rede (namespaces de usuário e de rede
+novos, sem interfaces), aplica a si mesmo os limites de CPU, memória,
+arquivos abertos e tamanho de arquivo pedidos (antes de compilar o
+candidato) e escreve o resultado JSON na última linha do stdout.
+"""
+import ctypes
+import inspect
+import json
+import math
+import os
+import random
+import signal
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: sem rlimits nem ru_maxrss
+    resource = None
+
+# Parâmetros reconhecidos pelo nome na carga sintética
+_SERIES_NAMES = ('prices', 'precos', 'closes', 'close', 'candles', 'data', 'dados', 'series', 'serie',
+                 'history', 'historico', 'values', 'valores')
+_PRICE_NAMES = ('price', 'preco', 'last', 'ultimo', 'entry', 'entrada', 'stop', 'target', 'alvo')
+_AMOUNT_NAMES = ('volume', 'quantity', 'quantidade', 'qty', 'amount', 'valor', 'capital', 'balance', 'saldo',
+                 'size', 'tamanho')
+_PERIOD_NAMES = ('period', 'periodo', 'window', 'janela', 'length', 'n', 'lookback')
+_SYMBOL_NAMES = ('symbol', 'simbolo', 'ativo', 'pair', 'par', 'ticker')
+
+
+_CLONE_NEWUSER = 0x10000000
+_CLONE_NEWNET = 0x40000000
+
+
+def isolate_network():
+    """
+    Move o processo para namespaces de usuário e de rede novos: só resta o
+    loopback, desligado. Retorna None se deu certo, senão o motivo.
+    """
+    if not sys.platform.startswith('linux'):
+        return f"sem namespaces de rede em {sys.platform}"
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.unshare(_CLONE_NEWUSER | _CLONE_NEWNET) != 0:
+            return f"unshare: {os.strerror(ctypes.get_errno())}"
+    except (OSError, AttributeError) as e:
+        return f"unshare: {e}"
+    return None
+
+
+def apply_limits(limits):
+    """Aplica os rlimits ao próprio processo; o pai não usa preexec_fn, que não é seguro com threads."""
+    if resource is None or not limits:
+        return
+    for name, value in (('RLIMIT_CPU', (limits['cpu_seconds'], limits['cpu_seconds'] + 1)),
+                        ('RLIMIT_AS', (limits['memory_bytes'],) * 2),
+                        ('RLIMIT_NOFILE', (limits['max_open_files'],) * 2),
+                        ('RLIMIT_FSIZE', (limits['max_file_size'],) * 2),
+                        ('RLIMIT_CORE', (0, 0))):
+        resource.setrlimit(getattr(resource, name), value)
+    if hasattr(signal, 'SIGXFSZ'):
+        # Escrita acima de RLIMIT_FSIZE vira OSError (EFBIG) no candidato, em vez de matar o processo
+        signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+
+
+def make_market(size, seed=42):
+    """Série de preços determinística (passeio aleatório) usada por todas as execuções."""
+    rng = random.Random(seed)
+    prices = [100.0]
+    for _ in range(size - 1):
+        prices.append(max(0.01, prices[-1] * math.exp(rng.gauss(0, 0.01))))
+    return prices
+
+
+def _argument_for(parameter, market):
+    name = parameter.name.lower()
+    if parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+        return inspect.Parameter.empty
+    if any(token in name for token in _SERIES_NAMES):
+        return list(market)
+    if any(token == name or name.endswith('_' + token) for token in _PRICE_NAMES):
+        return market[-1]
+    if any(token in name for token in _AMOUNT_NAMES):
+        return 1000.0
+    if name in _PERIOD_NAMES or any(name.endswith('_' + token) for token in _PERIOD_NAMES):
+        return 14
+    if any(token == name or name.endswith('_' + token) for token in _SYMBOL_NAMES):
+        return 'BTCUSDT'
+    return parameter.default
+
+
+def _call_plan(function, market):
+    """Argumentos sintéticos para a função, ou None se algum parâmetro não puder ser preenchido."""
+    try:
+        signature = inspect.signature(function)
+    except (TypeError, ValueError):
+        return None
+    args, kwargs = [], {}
+    for parameter in signature.parameters.values():
+        value = _argument_for(parameter, market)
+        if value is inspect.Parameter.empty:
+            if parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+                continue
+            return None
+        if parameter.kind == parameter.KEYWORD_ONLY:
+            kwargs[parameter.name] = value
+        else:
+            args.append(value)
+    return args, kwargs
+
+
+def discover_callables(namespace, module_name):
+    """Funções públicas do módulo e métodos públicos de classes instanciáveis sem argumentos."""
+    found = {}
+    for name, value in list(namespace.items()):
+        if name.startswith('_') or getattr(value, '__module__', None) != module_name:
+            continue
+        if inspect.isfunction(value):
+            found[name] = value
+        elif inspect.isclass(value):
+            try:
+                instance = value()
+            except Exception:
+                continue
+            for method_name, method in inspect.getmembers(instance, inspect.ismethod):
+                if not method_name.startswith('_'):
+                    found[f"{name}.{method_name}"] = method
+    return found
+
+
+def run_workload(callables, market, iterations, repeat):
+    """Executa cada chamável iterations vezes por rodada; guarda o melhor tempo entre as rodadas."""
+    calls = {}
+    for name, function in sorted(callables.items()):
+        plan = _call_plan(function, market)
+        if plan is None:
+            calls[name] = {'wall_time': None, 'error': 'parâmetros sem valor sintético'}
+            continue
+        args, kwargs = plan
+        best, error = None, None
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            try:
+                for _ in range(iterations):
+                    function(*args, **kwargs)
+            except MemoryError:
+                raise
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - started_at
+            best = elapsed if best is None else min(best, elapsed)
+            if error:
+                break
+        calls[name] = {'wall_time': best, 'error': error}
+    return calls
+
+
+def main():
+    request = json.loads(sys.stdin.read())
+    isolation_error = isolate_network()
+    apply_limits(request.get('limits'))
+    output = sys.stdout
+    if isolation_error and request.get('require_isolation', True):
+        # Sem isolamento de rede o candidato não é executado
+        output.write('\n' + json.dumps({'ok': False, 'isolated': False, 'calls': {},
+                                        'error': f"Isolamento de rede indisponível ({isolation_error})"}) + '\n')
+        output.flush()
+        return
+    # Prints do código candidato não podem corromper o resultado
+    sys.stdout = sys.stderr
+    sys.path[:0] = request.get('sys_path', [])
+
+    result = {'ok': True, 'error': None, 'isolated': isolation_error is None}
+    cpu_started_at = time.process_time()
+    wall_started_at = time.perf_counter()
+    try:
+        namespace = {'__name__': '__sandbox__', '__builtins__': __builtins__}
+        code = compile(request['code'], request.get('filename', '<candidato>'), 'exec')
+        exec(code, namespace)
+        result['import_time'] = time.perf_counter() - wall_started_at
+
+        market = make_market(request.get('workload_size', 2000))
+        callables = discover_callables(namespace, '__sandbox__')
+        result['calls'] = run_workload(callables, market, request.get('iterations', 20),
+                                       request.get('repeat', 3))
+    except MemoryError:
+        result.update(ok=False, error='MemoryError: limite de memória atingido')
+    except BaseException as e:
+        result.update(ok=False, error=f"{type(e).__name__}: {e}")
+
+    result['wall_time'] = time.perf_counter() - wall_started_at
+    result['cpu_time'] = time.process_time() - cpu_started_at
+    if resource is not None:
+        # ru_maxrss vem em KB no Linux e em bytes no macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result['peak_rss_kb'] = peak // 1024 if sys.platform == 'darwin' else peak
+    else:
+        result['peak_rss_kb'] = None
+    output.write('\n' + json.dumps(result) + '\n')
+    output.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+from typing import Dict, List, Any, Optional
+from utils.logger import Logger
+
+CHILD_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sandbox_child.py')
+
+# Versões atuais medidas guardadas (as mais antigas saem primeiro)
+MAX_BASELINES = 64
+
+# Diferenças abaixo disso são ruído de medição, não regressão
+MIN_TIME_DELTA = 0.005
+MIN_RSS_DELTA_KB = 8 * 1024
+
+
+class SandboxRunner:
+    """
+    Executa código candidato em um subprocesso isolado (python -I, sem rede,
+    diretório temporário somente leitura, sem gravação de arquivos) com
+    rlimits de CPU, memória e arquivos abertos, dirige o código com uma carga sintética (série de preços
+    determinística passada às funções e métodos públicos) e mede tempo de
+    parede, tempo de CPU e pico de RSS.
+    compare() rejeita o candidato que trava, estoura os limites ou fica
+    mais lento/pesado que a versão atual além do limite configurado.
+    """
+
+    def __init__(self, base_path: str, cpu_seconds: Optional[int] = None, memory_mb: Optional[int] = None,
+                 max_open_files: Optional[int] = None, timeout: Optional[float] = None,
+                 max_slowdown: Optional[float] = None, max_memory_growth: Optional[float] = None,
+                 require_isolation: Optional[bool] = None):
+        self.base_path = os.path.abspath(base_path)
+        self.cpu_seconds = cpu_seconds or int(os.getenv('SANDBOX_CPU_SECONDS', '5'))
+        self.memory_mb = memory_mb or int(os.getenv('SANDBOX_MEMORY_MB', '512'))
+        self.max_open_files = max_open_files or int(os.getenv('SANDBOX_MAX_FILES', '64'))
+        self.timeout = timeout or float(os.getenv('SANDBOX_TIMEOUT', '10'))
+        self.max_slowdown = max_slowdown or float(os.getenv('SANDBOX_MAX_SLOWDOWN', '1.5'))
+        self.max_memory_growth = max_memory_growth or float(os.getenv('SANDBOX_MAX_MEMORY_GROWTH', '1.5'))
+        # Sem namespaces de rede disponíveis o candidato só roda com SANDBOX_REQUIRE_ISOLATION=0
+        self.require_isolation = require_isolation if require_isolation is not None else \
+            os.getenv('SANDBOX_REQUIRE_ISOLATION', '1') != '0'
+        self.workload = {
+            'workload_size': int(os.getenv('SANDBOX_WORKLOAD_SIZE', '2000')),
+            'iterations': int(os.getenv('SANDBOX_ITERATIONS', '20')),
+            'repeat': int(os.getenv('SANDBOX_REPEAT', '3'))
+        }
+        self.logger = Logger("SandboxRunner")
+
+        self._lock = threading.Lock()
+        # Medições da versão atual por hash do conteúdo (ela muda bem menos que os candidatos)
+        self._baselines: Dict[str, Dict[str, Any]] = {}
+
+    def _limits(self) -> Dict[str, int]:
+        """rlimits que o processo do sandbox aplica a si mesmo antes de compilar o candidato."""
+        return {
+            'cpu_seconds': self.cpu_seconds,
+            'memory_bytes': self.memory_mb * 1024 * 1024,
+            'max_open_files': self.max_open_files,
+            # O candidato não grava arquivos (a saída do sandbox vai por pipes)
+            'max_file_size': 0
+        }
+
+    def run(self, code: str, filename: str = '<candidato>') -> Dict[str, Any]:
+        """
+        Executa o código no sandbox. Retorna {success, error, killed_by
+        ('cpu', 'memory', 'timeout' ou None), isolated (sem rede), wall_time,
+        cpu_time, peak_rss_kb, import_time, calls: {nome: {wall_time, error}}}.
+        """
+        request = dict(self.workload, code=code, filename=filename, sys_path=[self.base_path], limits=self._limits(),
+                       require_isolation=self.require_isolation)
+        env = {'PATH': os.environ.get('PATH', ''), 'PYTHONHASHSEED': '0', 'PYTHONDONTWRITEBYTECODE': '1'}
+
+        with tempfile.TemporaryDirectory(prefix='sorte_sandbox_') as work_dir:
+            os.chmod(work_dir, 0o500)
+            # Sessão própria: no tempo limite o grupo de processos inteiro é encerrado
+            process = subprocess.Popen([sys.executable, '-I', CHILD_SCRIPT], cwd=work_dir, env=env, text=True,
+                                       stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       start_new_session=True)
+            killed_by = None
+            try:
+                stdout, stderr = process.communicate(json.dumps(request), timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                self._kill(process)
+                stdout, stderr = process.communicate()
+                killed_by = 'timeout'
+
+        result = {'success': False, 'error': None, 'killed_by': killed_by, 'returncode': process.returncode,
+                  'isolated': None, 'wall_time': None, 'cpu_time': None, 'peak_rss_kb': None, 'import_time': None, 'calls': {}}
+        lines = stdout.strip().splitlines()
+        try:
+            report = json.loads(lines[-1]) if lines else None
+        except ValueError:
+            report = None
+
+        if report is not None:
+            result.update({key: report.get(key) for key in
+                           ('wall_time', 'cpu_time', 'peak_rss_kb', 'import_time', 'isolated')},
+                          calls=report.get('calls') or {})
+            result['success'] = bool(report['ok'])
+            result['error'] = report['error']
+            if report['error'] and report['error'].startswith('MemoryError'):
+                result['killed_by'] = 'memory'
+        elif killed_by == 'timeout':
+            result['error'] = f"Tempo limite de {self.timeout:.0f}s excedido"
+        elif process.returncode in (-signal.SIGXCPU, -signal.SIGKILL):
+            result.update(killed_by='cpu', error=f"Limite de {self.cpu_seconds}s de CPU excedido")
+        else:
+            tail = stderr.strip().splitlines()[-1:] if stderr else []
+            result['error'] = f"Sandbox terminou com código {process.returncode}: {' '.join(tail)}"
+        return result
+
+    @staticmethod
+    def _kill(process: subprocess.Popen):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (AttributeError, OSError):
+            process.kill()
+
+    def _baseline(self, code: str, filename: str) -> Dict[str, Any]:
+        key = hashlib.sha256(code.encode('utf-8')).hexdigest()
+        with self._lock:
+            cached = self._baselines.get(key)
+        if cached is None:
+            cached = self.run(code, filename)
+            with self._lock:
+                self._baselines[key] = cached
+                while len(self._baselines) > MAX_BASELINES:
+                    self._baselines.pop(next(iter(self._baselines)))
+        return cached
+
+    @staticmethod
+    def _workload_time(measurement: Dict[str, Any], names: List[str]) -> float:
+        return sum(measurement['calls'][name]['wall_time'] or 0.0 for name in names)
+
+    def compare(self, candidate_code: str, baseline_code: Optional[str] = None,
+                filename: str = '<candidato>') -> Dict[str, Any]:
+        """
+        Executa o candidato (e a versão atual, se houver) e decide se ele
+        pode substituí-la. Retorna {accepted, reasons, candidate, baseline, ratios}.
+        """
+        reasons = []
+        baseline = self._baseline(baseline_code, filename) if baseline_code else None
+        if baseline is not None and not baseline['success']:
+            # Sem referência válida, o candidato só precisa rodar dentro dos limites
+            self.logger.warning(f"Versão atual de {filename} falhou no sandbox: {baseline['error']}")
+            baseline = None
+
+        candidate = self.run(candidate_code, filename)
+        ratios = {}
+        if not candidate['success']:
+            reasons.append(f"falhou no sandbox: {candidate['error']}")
+        elif baseline is not None:
+            # A carga compara os chamáveis que existem nas duas versões
+            common = sorted(name for name in candidate['calls'] if name in baseline['calls']
+                            and candidate['calls'][name]['wall_time'] is not None
+                            and baseline['calls'][name]['wall_time'] is not None)
+            measures = [('workload_time', self._workload_time(candidate, common),
+                         self._workload_time(baseline, common), MIN_TIME_DELTA, self.max_slowdown),
+                        ('cpu_time', candidate['cpu_time'], baseline['cpu_time'], MIN_TIME_DELTA, self.max_slowdown),
+                        ('peak_rss_kb', candidate['peak_rss_kb'], baseline['peak_rss_kb'], MIN_RSS_DELTA_KB,
+                         self.max_memory_growth)]
+            for name, value, reference, min_delta, limit in measures:
+                if value is None or reference is None:
+                    continue
+                ratios[name] = value / reference if reference else None
+                if value - reference > min_delta and value > reference * limit:
+                    reasons.append(f"{name} {value:.4g} contra {reference:.4g} da versão atual "
+                                   f"(limite {limit:.2f}x)")
+            for name in common:
+                error = candidate['calls'][name]['error']
+                if error and not baseline['calls'][name]['error']:
+                    reasons.append(f"{name} passou a falhar: {error}")
+
+        accepted = not reasons
+        if candidate['success']:
+            self.logger.info(f"Sandbox {filename}: {'aceito' if accepted else 'rejeitado'} "
+                             f"(parede {candidate['wall_time']:.3f}s, CPU {candidate['cpu_time']:.3f}s, "
+                             f"RSS {candidate['peak_rss_kb']} KB)")
+        else:
+            self.logger.warning(f"Sandbox {filename}: rejeitado ({candidate['error']})")
+        return {'accepted': accepted, 'reasons': reasons, 'candidate': candidate,
+                'baseline': baseline, 'ratios': ratios}
+
+
+_runners: Dict[str, SandboxRunner] = {}
+_runners_lock = threading.Lock()
+
+
+def get_sandbox_runner(base_path: str) -> SandboxRunner:
+    """Retorna o sandbox compartilhado do projeto em base_path."""
+    key = os.path.abspath(base_path)
+    with _runners_lock:
+        runner = _runners.get(key)
+        if runner is None:
+            runner = SandboxRunner(key)
+            _runners[key] = runner
+        return runner
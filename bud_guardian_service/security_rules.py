@@ -0,0 +1,370 @@
+import ast
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Any, Optional, Sequence
+from bud_editor_service.ast_cache import ASTCache, get_ast_cache
+from utils.logger import Logger
+
+SEVERITIES = ('low', 'medium', 'high')
+
+# Modos de open() que gravam no arquivo
+_WRITE_MODE_CHARS = set('wax+')
+
+# Quantos nós visitar entre as consultas ao relógio do orçamento de tempo
+_BUDGET_CHECK_INTERVAL = 256
+
+
+class SecurityRule:
+    """
+    Regra de segurança aplicada a um tipo de nó da AST. Para chamadas
+    (ast.Call), names restringe a regra aos nomes qualificados chamados
+    ('os.system', 'subprocess' vale para todo o módulo). check recebe
+    (nó, nome qualificado, analisador) e retorna o detalhe da ocorrência,
+    ou None se o nó não viola a regra.
+    """
+
+    def __init__(self, rule_id: str, severity: str, message: str, node_type: type = ast.Call,
+                 names: Sequence[str] = (), check: Optional[Callable[..., Optional[str]]] = None):
+        if severity not in SEVERITIES:
+            raise ValueError(f"Severidade desconhecida: {severity}")
+        self.rule_id = rule_id
+        self.severity = severity
+        self.message = message
+        self.node_type = node_type
+        self.names = tuple(names)
+        self.check = check or (lambda node, name, analysis: name)
+
+
+def _literal(node: Optional[ast.AST]) -> Any:
+    try:
+        return ast.literal_eval(node) if node is not None else None
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+def _argument(node: ast.Call, position: Optional[int], keyword: str) -> Optional[ast.AST]:
+    for item in node.keywords:
+        if item.arg == keyword:
+            return item.value
+    return node.args[position] if position is not None and len(node.args) > position else None
+
+
+def _check_shell(node: ast.Call, name: str, analysis: "_SecurityVisitor") -> Optional[str]:
+    shell = _argument(node, None, 'shell')
+    return f"{name}(shell=True)" if shell is not None and _literal(shell) is not False else None
+
+
+def _check_subprocess(node: ast.Call, name: str, analysis: "_SecurityVisitor") -> Optional[str]:
+    return None if _check_shell(node, name, analysis) else name
+
+
+def _check_dynamic_import(node: ast.Call, name: str, analysis: "_SecurityVisitor") -> Optional[str]:
+    target = _argument(node, 0, 'name')
+    return f"{name}({ast.unparse(target) if target is not None else ''})" if _literal(target) is None else None
+
+
+def _check_open_outside(node: ast.Call, name: str, analysis: "_SecurityVisitor") -> Optional[str]:
+    mode = _literal(_argument(node, 1, 'mode'))
+    if not isinstance(mode, str) or not _WRITE_MODE_CHARS & set(mode):
+        return None
+    return analysis.outside_base(_argument(node, 0, 'file'), name)
+
+
+def _check_path_outside(position: int, keyword: str):
+    def check(node: ast.Call, name: str, analysis: "_SecurityVisitor") -> Optional[str]:
+        return analysis.outside_base(_argument(node, position, keyword), name)
+    return check
+
+
+def _check_path_method_outside(node: ast.Call, name: str, analysis: "_SecurityVisitor") -> Optional[str]:
+    # Path('/etc/x').write_text(...): o caminho está na chamada que cria o Path
+    receiver = node.func.value if isinstance(node.func, ast.Attribute) else None
+    if isinstance(receiver, ast.Call) and analysis.qualified_name(receiver.func) in ('pathlib.Path', 'Path'):
+        return analysis.outside_base(_argument(receiver, 0, 'path'), name)
+    return None
+
+
+def _check_open_write(node: ast.Call, name: str, analysis: "_SecurityVisitor") -> Optional[str]:
+    # Modo não literal conta como escrita; fora do projeto já é file-write-outside
+    mode = _argument(node, 1, 'mode')
+    literal = _literal(mode)
+    if mode is None or (isinstance(literal, str) and not _WRITE_MODE_CHARS & set(literal)):
+        return None
+    return None if analysis.outside_base(_argument(node, 0, 'file'), name) else name
+
+
+def _check_path_inside(position: int, keyword: str):
+    def check(node: ast.Call, name: str, analysis: "_SecurityVisitor") -> Optional[str]:
+        return None if analysis.outside_base(_argument(node, position, keyword), name) else name
+    return check
+
+
+def _check_path_method_inside(node: ast.Call, name: str, analysis: "_SecurityVisitor") -> Optional[str]:
+    return None if _check_path_method_outside(node, name, analysis) else name
+
+
+_SUBPROCESS_CALLS = ('subprocess.run', 'subprocess.call', 'subprocess.check_call', 'subprocess.check_output',
+                     'subprocess.Popen', 'subprocess.getoutput', 'subprocess.getstatusoutput')
+_OS_COMMANDS = ('os.system', 'os.popen', 'os.execl', 'os.execle', 'os.execlp', 'os.execlpe', 'os.execv',
+                'os.execve', 'os.execvp', 'os.execvpe', 'os.spawnl', 'os.spawnle', 'os.spawnlp', 'os.spawnlpe',
+                'os.spawnv', 'os.spawnve', 'os.spawnvp', 'os.spawnvpe', 'os.posix_spawn', 'os.posix_spawnp',
+                'pty.spawn', 'commands.getoutput')
+_NETWORK_CALLS = ('requests', 'httpx', 'aiohttp.ClientSession', 'aiohttp.request', 'urllib.request.urlopen',
+                  'urllib.request.Request', 'urllib.request.urlretrieve', 'http.client.HTTPConnection',
+                  'http.client.HTTPSConnection', 'socket.socket', 'socket.create_connection', 'ftplib.FTP',
+                  'smtplib.SMTP', 'smtplib.SMTP_SSL', 'telnetlib.Telnet', 'paramiko.SSHClient')
+_FILE_CHANGES = (('os.remove', 0, 'path'), ('os.unlink', 0, 'path'), ('os.rmdir', 0, 'path'),
+                 ('os.removedirs', 0, 'name'), ('os.rename', 1, 'dst'), ('os.replace', 1, 'dst'),
+                 ('os.chmod', 0, 'path'), ('os.truncate', 0, 'path'), ('shutil.rmtree', 0, 'path'),
+                 ('shutil.move', 1, 'dst'), ('shutil.copy', 1, 'dst'), ('shutil.copy2', 1, 'dst'),
+                 ('shutil.copyfile', 1, 'dst'), ('shutil.copytree', 1, 'dst'))
+
+DEFAULT_RULES = [
+    SecurityRule('eval-exec', 'high', "Execução dinâmica de código",
+                 names=('eval', 'exec', 'builtins.eval', 'builtins.exec')),
+    SecurityRule('os-command', 'high', "Execução de comando do sistema", names=_OS_COMMANDS),
+    SecurityRule('subprocess-shell', 'high', "Subprocesso com shell=True",
+                 names=_SUBPROCESS_CALLS, check=_check_shell),
+    SecurityRule('subprocess', 'medium', "Execução de subprocesso",
+                 names=_SUBPROCESS_CALLS, check=_check_subprocess),
+    SecurityRule('dynamic-import', 'high', "Import dinâmico com __import__", names=('__import__', 'builtins.__import__')),
+    SecurityRule('dynamic-import', 'medium', "Import dinâmico de módulo não literal",
+                 names=('importlib.import_module',), check=_check_dynamic_import),
+    SecurityRule('network', 'medium', "Acesso à rede", names=_NETWORK_CALLS),
+    SecurityRule('file-write-outside', 'high', "Escrita em arquivo fora do projeto",
+                 names=('open', 'io.open', 'builtins.open', 'os.open'), check=_check_open_outside),
+    SecurityRule('file-write-outside', 'high', "Escrita em arquivo fora do projeto",
+                 names=('write_text', 'write_bytes'), check=_check_path_method_outside),
+] + [SecurityRule('file-write-outside', 'high', "Alteração de arquivo fora do projeto",
+                  names=(name,), check=_check_path_outside(position, keyword))
+     for name, position, keyword in _FILE_CHANGES] + [
+    # Gravação dentro do projeto: só informativa na análise normal, mas impede a execução no sandbox
+    SecurityRule('file-write', 'low', "Escrita em arquivo", names=('open', 'io.open', 'builtins.open'),
+                 check=_check_open_write),
+    SecurityRule('file-write', 'low', "Escrita em arquivo", names=('os.open',),
+                 check=_check_path_inside(0, 'path')),
+    SecurityRule('file-write', 'low', "Escrita em arquivo", names=('write_text', 'write_bytes'),
+                 check=_check_path_method_inside),
+] + [SecurityRule('file-write', 'low', "Alteração de arquivo", names=(name,),
+                  check=_check_path_inside(position, keyword))
+     for name, position, keyword in _FILE_CHANGES]
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class _SecurityVisitor(ast.NodeVisitor):
+    """
+    Passada única pela AST: cada nó é testado só contra as regras do seu
+    tipo e, nas chamadas, só contra as regras do nome chamado (e dos
+    módulos que o contêm). Os aliases de import são resolvidos durante a
+    própria passada.
+    """
+
+    def __init__(self, analyzer: "SecurityAnalyzer", deadline: float,
+                 cancel_event: Optional[threading.Event] = None):
+        self.analyzer = analyzer
+        self.deadline = deadline
+        self.cancel_event = cancel_event
+        self.aliases: Dict[str, str] = {}
+        self.findings: List[Dict[str, Any]] = []
+        self.nodes = 0
+
+    def visit(self, node: ast.AST):
+        self.nodes += 1
+        if self.nodes % _BUDGET_CHECK_INTERVAL == 0:
+            if time.perf_counter() > self.deadline:
+                raise _BudgetExceeded()
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                raise _Cancelled()
+
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                # 'import os.path' liga o nome 'os'; 'import os.path as p' liga 'p' a 'os.path'
+                bound = alias.name if alias.asname else alias.name.split('.')[0]
+                self.aliases[alias.asname or bound] = bound
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            for alias in node.names:
+                self.aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+
+        if isinstance(node, ast.Call):
+            name = self.qualified_name(node.func)
+            if name:
+                for rule in self.analyzer.rules_for_call(name):
+                    self._apply(rule, node, name)
+        for rule in self.analyzer.rules_by_type.get(type(node), ()):
+            self._apply(rule, node, None)
+
+        for child in ast.iter_child_nodes(node):
+            self.visit(child)
+
+    def _apply(self, rule: SecurityRule, node: ast.AST, name: Optional[str]):
+        detail = rule.check(node, name, self)
+        if detail:
+            self.findings.append({'rule': rule.rule_id, 'severity': rule.severity, 'message': rule.message,
+                                  'detail': detail, 'line': getattr(node, 'lineno', None),
+                                  'column': getattr(node, 'col_offset', None)})
+
+    def qualified_name(self, node: ast.AST) -> Optional[str]:
+        """Nome chamado com os aliases resolvidos: 'sp.run' -> 'subprocess.run'. Métodos de objetos viram '.metodo'."""
+        parts = []
+        while isinstance(node, ast.Attribute):
+            parts.append(node.attr)
+            node = node.value
+        if isinstance(node, ast.Name):
+            parts.append(self.aliases.get(node.id, node.id))
+        elif parts:
+            parts.append('')
+        else:
+            return None
+        return '.'.join(reversed(parts))
+
+    def outside_base(self, path_node: Optional[ast.AST], name: str) -> Optional[str]:
+        path = _literal(path_node)
+        if not isinstance(path, str):
+            return None
+        return f"{name}({path!r})" if self.analyzer.is_outside_base(path) else None
+
+
+class SecurityAnalyzer:
+    """
+    Verificação estática de segurança de código Python em uma única
+    passada pela AST: eval/exec, subprocessos e os.system, __import__
+    dinâmico, acesso à rede e escrita de arquivos fora de base_path.
+    Os resultados ficam em cache pelo hash do conteúdo, e cada arquivo tem
+    um orçamento de tempo (SECURITY_TIME_BUDGET_MS): se estourar, a análise
+    é interrompida e o resultado sai como incompleto.
+    """
+
+    def __init__(self, base_path: str, rules: Optional[List[SecurityRule]] = None,
+                 time_budget: Optional[float] = None, fail_on: Optional[Sequence[str]] = None,
+                 max_entries: int = 512, ast_cache: Optional[ASTCache] = None):
+        self.base_path = os.path.abspath(base_path)
+        self.ast_cache = ast_cache or get_ast_cache()
+        self.rules = list(rules) if rules is not None else list(DEFAULT_RULES)
+        self.time_budget = time_budget if time_budget is not None else \
+            float(os.getenv('SECURITY_TIME_BUDGET_MS', '2000')) / 1000
+        self.fail_on = set(fail_on) if fail_on is not None else \
+            {severity.strip() for severity in os.getenv('SECURITY_FAIL_ON', 'high').split(',') if severity.strip()}
+        self.max_entries = max_entries
+        self.logger = Logger("SecurityAnalyzer")
+
+        # Regras indexadas: chamadas pelo nome qualificado (ou final '.metodo'); os demais nós pelo tipo
+        self.rules_by_name: Dict[str, List[SecurityRule]] = {}
+        self.rules_by_type: Dict[type, List[SecurityRule]] = {}
+        for rule in self.rules:
+            if rule.node_type is ast.Call and rule.names:
+                for name in rule.names:
+                    self.rules_by_name.setdefault(name, []).append(rule)
+            else:
+                self.rules_by_type.setdefault(rule.node_type, []).append(rule)
+
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.stats = {'hits': 0, 'analyses': 0, 'budget_exceeded': 0}
+
+    def rules_for_call(self, name: str) -> List[SecurityRule]:
+        """Regras do nome chamado, dos módulos que o contêm e do nome do método ('write_text')."""
+        rules = []
+        parts = name.split('.')
+        for size in range(len(parts), 0, -1):
+            rules.extend(self.rules_by_name.get('.'.join(parts[:size]), ()))
+        if len(parts) > 1:
+            rules.extend(self.rules_by_name.get(parts[-1], ()))
+        return rules
+
+    def is_outside_base(self, path: str) -> bool:
+        resolved = os.path.normpath(os.path.join(self.base_path, os.path.expanduser(path)))
+        return resolved != self.base_path and not resolved.startswith(self.base_path + os.sep)
+
+    def analyze_source(self, source: str, filename: str = '<código>', tree: Optional[ast.AST] = None,
+                       cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Analisa o código (ou a árvore já analisada dele) e retorna {passed,
+        findings, complete, cached, duration}. passed é False se houver
+        ocorrência com severidade em SECURITY_FAIL_ON (padrão: high), se o
+        código não compilar ou se a análise não terminar dentro do orçamento
+        (ou for interrompida por cancel_event).
+        """
+        key = hashlib.sha256(source.encode('utf-8', 'surrogatepass')).hexdigest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.stats['hits'] += 1
+                return dict(cached, cached=True)
+
+        started_at = time.perf_counter()
+        result = {'findings': [], 'complete': True, 'error': None}
+        interrupted = False
+        try:
+            if tree is None:
+                tree = ast.parse(source, filename=filename)
+            visitor = _SecurityVisitor(self, started_at + self.time_budget, cancel_event)
+            try:
+                visitor.visit(tree)
+            except _Cancelled:
+                interrupted = True
+                result.update(complete=False, error=f"Análise cancelada após {visitor.nodes} nós")
+            except _BudgetExceeded:
+                interrupted = True
+                result.update(complete=False, error=f"Orçamento de {self.time_budget * 1000:.0f} ms excedido "
+                                                    f"após {visitor.nodes} nós")
+                with self._lock:
+                    self.stats['budget_exceeded'] += 1
+                self.logger.warning(f"Análise de segurança incompleta em {filename}: {result['error']}")
+            result['findings'] = visitor.findings
+        except (SyntaxError, ValueError, RecursionError) as e:
+            result.update(complete=False, error=f"Código não analisável: {e}")
+
+        result['passed'] = result['complete'] and not any(finding['severity'] in self.fail_on
+                                                          for finding in result['findings'])
+        result['duration'] = time.perf_counter() - started_at
+        with self._lock:
+            self.stats['analyses'] += 1
+            # Resultados incompletos por tempo ou cancelamento não são guardados: a próxima tentativa pode terminar
+            if not interrupted:
+                self._cache[key] = result
+                if len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return dict(result, cached=False)
+
+    def analyze_file(self, relative_path: str, cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """Analisa um arquivo do projeto, reaproveitando a AST do cache compartilhado com o editor."""
+        file_path = os.path.join(self.base_path, relative_path)
+        try:
+            source, tree = self.ast_cache.get(file_path, shared=True)
+        except SyntaxError:
+            with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+                return self.analyze_source(f.read(), relative_path, cancel_event=cancel_event)
+        except (OSError, UnicodeDecodeError) as e:
+            return {'passed': False, 'findings': [], 'complete': False, 'cached': False,
+                    'duration': 0.0, 'error': f"Arquivo ilegível: {e}"}
+        return self.analyze_source(source, relative_path, tree=tree, cancel_event=cancel_event)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, entries=len(self._cache), rules=len(self.rules))
+
+
+_analyzers: Dict[str, SecurityAnalyzer] = {}
+_analyzers_lock = threading.Lock()
+
+
+def get_security_analyzer(base_path: str) -> SecurityAnalyzer:
+    """Retorna o analisador de segurança compartilhado do projeto em base_path."""
+    key = os.path.abspath(base_path)
+    with _analyzers_lock:
+        analyzer = _analyzers.get(key)
+        if analyzer is None:
+            analyzer = SecurityAnalyzer(key)
+            _analyzers[key] = analyzer
+        return analyzer
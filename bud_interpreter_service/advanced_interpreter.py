@@ -1,9 +1,16 @@
-import re
 import ast
 import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Dict, List, Any, Optional
 from bud_editor_service.editor import CodeEditor
+from bud_editor_service.undo_journal import get_undo_journal
 from bud_interpreter_service.gpt_bridge import GPTBridge
+from bud_interpreter_service.intent_classifier import get_intent_classifier
+from bud_interpreter_service.context_builder import PromptContextBuilder
+from bud_interpreter_service.command_pipeline import CommandPipeline
 from bud_guardian_service.guardian import CodeGuardian
 from utils.logger import Logger
 
@@ -16,58 +23,29 @@ class AdvancedCommandInterpreter:
     def __init__(self, base_path: str):
         self.base_path = base_path
         self.code_editor = CodeEditor(base_path)
-        self.gpt_bridge = GPTBridge()
+        self.gpt_bridge = GPTBridge(base_path)
         self.code_guardian = CodeGuardian(base_path)
+        self.undo_journal = get_undo_journal(base_path)
         self.logger = Logger("AdvancedCommandInterpreter")
         
-        # Padrões de comando reconhecidos
-        self.command_patterns = {
-            'strategy_modification': [
-                r'.*mais agressiv.*',
-                r'.*estratégia.*agressiv.*',
-                r'.*trading.*agressiv.*',
-                r'.*aumentar.*agressividade.*',
-                r'.*ser mais agressiv.*'
-            ],
-            'risk_management': [
-                r'.*gerenciamento.*risco.*',
-                r'.*risk.*management.*',
-                r'.*reduzir.*risco.*',
-                r'.*aumentar.*risco.*',
-                r'.*ajustar.*risco.*'
-            ],
-            'performance_optimization': [
-                r'.*otimizar.*performance.*',
-                r'.*melhorar.*velocidade.*',
-                r'.*otimizar.*código.*',
-                r'.*performance.*melhor.*'
-            ],
-            'bug_fix': [
-                r'.*corrigir.*bug.*',
-                r'.*fix.*bug.*',
-                r'.*resolver.*erro.*',
-                r'.*corrigir.*erro.*'
-            ],
-            'feature_addition': [
-                r'.*adicionar.*funcionalidade.*',
-                r'.*nova.*feature.*',
-                r'.*implementar.*função.*',
-                r'.*criar.*método.*'
-            ]
-        }
+        # Classificador de intenção compartilhado, com as regras específicas deste interpretador
+        self.intent_classifier = get_intent_classifier('advanced')
+        
+        # Contexto do arquivo alvo recortado pela AST, dentro do orçamento de tokens
+        self.context_builder = PromptContextBuilder(base_path)
+        
+        # Pipeline concorrente, criado na primeira submissão (submit_command)
+        self.pipeline = None
+        self._pipeline_lock = threading.Lock()
+        
+        # Etapas de validação (sintaxe, segurança, testes) rodam em paralelo, em um executor por chamada
+        self.validation_workers = int(os.getenv('VALIDATION_WORKERS', '3'))
     
     def classify_command(self, command_text: str) -> str:
         """
-        Classifica o comando em uma categoria baseada em padrões regex.
+        Classifica o comando em uma categoria usando o classificador compartilhado.
         """
-        command_lower = command_text.lower()
-        
-        for category, patterns in self.command_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, command_lower):
-                    return category
-        
-        return 'general'
+        return self.intent_classifier.classify(command_text)['category']
     
     def extract_parameters(self, command_text: str, category: str) -> Dict[str, Any]:
         """
@@ -141,6 +119,16 @@ Instruções específicas:
 - Otimize algoritmos e estruturas de dados
 - Mantenha a funcionalidade existente
 - Adicione comentários sobre as otimizações
+"""
+        
+        # Apenas os trechos relevantes do arquivo alvo, não o arquivo inteiro
+        target_file = self.determine_target_file(category)
+        file_context = self.context_builder.build(target_file, command_text, category)
+        if file_context['context']:
+            base_prompt += f"""
+Contexto relevante de '{target_file}':
+```python
+{file_context['context']}```
 """
         
         base_prompt += """
@@ -166,59 +154,157 @@ O código deve ser funcional e seguir as melhores práticas de Python.
         """
         Interpreta o comando e executa as modificações necessárias.
         """
+        plan = self.plan_command(command_text)
+        for _, stage in self.pipeline_stages():
+            if stage(plan) is False:
+                break
+        return plan['result']
+    
+    def submit_command(self, command_text: str):
+        """
+        Submete o comando ao pipeline concorrente e retorna um Future com o
+        mesmo resultado de interpret_and_modify. Comandos para o mesmo arquivo
+        alvo são aplicados na ordem de submissão.
+        """
+        if self.pipeline is None:
+            with self._pipeline_lock:
+                if self.pipeline is None:
+                    self.pipeline = CommandPipeline(
+                        self.pipeline_stages(),
+                        serialized_stage='apply',
+                        workers={
+                            'prepare': int(os.getenv('PIPELINE_PREPARE_WORKERS', '2')),
+                            'generate': int(os.getenv('PIPELINE_GENERATE_WORKERS', '4')),
+                            'validate': int(os.getenv('PIPELINE_VALIDATE_WORKERS', '2')),
+                            'apply': int(os.getenv('PIPELINE_APPLY_WORKERS', '2'))
+                        },
+                        queue_size=int(os.getenv('PIPELINE_QUEUE_SIZE', '16'))
+                    )
+        plan = self.plan_command(command_text)
+        return self.pipeline.submit(plan, key=plan['target_file'])
+    
+    def get_pipeline_stats(self) -> Dict[str, Any]:
+        """Profundidade das filas e latência por etapa do pipeline."""
+        return self.pipeline.get_stats() if self.pipeline else {'running': False}
+    
+    def pipeline_stages(self):
+        """Etapas do processamento de um comando, na ordem de execução."""
+        return [
+            ('prepare', self._prepare_stage),
+            ('generate', self._generate_stage),
+            ('validate', self._validate_stage),
+            ('apply', self._apply_stage)
+        ]
+    
+    def plan_command(self, command_text: str) -> Dict[str, Any]:
+        """
+        Classifica o comando e determina o arquivo alvo (rápido, feito na submissão).
+        """
         self.logger.info(f"Interpretando comando: {command_text}")
         
-        # Classificar o comando
-        category = self.classify_command(command_text)
-        self.logger.info(f"Categoria identificada: {category}")
-        
-        # Extrair parâmetros
-        parameters = self.extract_parameters(command_text, category)
-        self.logger.info(f"Parâmetros extraídos: {parameters}")
-        
-        # Gerar prompt estruturado
-        structured_prompt = self.generate_structured_prompt(command_text, category, parameters)
+        classification = self.intent_classifier.classify(command_text)
+        category = classification['category']
+        self.logger.info(f"Categoria identificada: {category} (regra: {classification['rule']})")
         
+        return {
+            'command': command_text,
+            'classification': classification,
+            'category': category,
+            'target_file': self.determine_target_file(category)
+        }
+    
+    def _prepare_stage(self, plan: Dict[str, Any]) -> bool:
+        # Extrair parâmetros e gerar prompt estruturado
+        plan['parameters'] = self.extract_parameters(plan['command'], plan['category'])
+        self.logger.info(f"Parâmetros extraídos: {plan['parameters']}")
+        plan['prompt'] = self.generate_structured_prompt(plan['command'], plan['category'], plan['parameters'])
+        return True
+    
+    def _generate_stage(self, plan: Dict[str, Any]) -> bool:
         # Usar GPTBridge para gerar código
-        modification_result = self.gpt_bridge.process_command(structured_prompt)
+        modification_result = self.gpt_bridge.process_command(
+            plan['prompt'], category=plan['category'], target_file=plan['target_file']
+        )
+        if modification_result.get("action") != "generate_code":
+            plan['result'] = {
+                "status": "error",
+                "message": "Falha na geração de código pelo LLM"
+            }
+            return False
+        plan['generated_code'] = modification_result.get("code")
+        return True
+    
+    def _validate_stage(self, plan: Dict[str, Any]) -> bool:
+        generated_code = plan['generated_code']
+        if not generated_code or not self.validate_generated_code(generated_code):
+            plan['result'] = {
+                "status": "error",
+                "message": "Código gerado é inválido ou contém erros de sintaxe"
+            }
+            return False
         
-        if modification_result.get("action") == "generate_code":
-            generated_code = modification_result.get("code")
-            target_file = modification_result.get("target_file", self.determine_target_file(category))
-            
-            if generated_code and self.validate_generated_code(generated_code):
-                self.logger.info(f"Código gerado validado. Aplicando modificações em {target_file}")
-                
-                # Aplicar modificações
-                success = self.apply_code_modifications(target_file, generated_code, category)
-                
-                if success:
-                    # Executar validações de segurança
-                    validation_result = self.run_validations(target_file)
-                    
-                    return {
-                        "status": "success",
-                        "category": category,
-                        "parameters": parameters,
-                        "target_file": target_file,
-                        "validation_result": validation_result,
-                        "message": f"Comando executado com sucesso. Arquivo {target_file} modificado."
-                    }
-                else:
-                    return {
-                        "status": "error",
-                        "message": f"Falha ao aplicar modificações no arquivo {target_file}"
-                    }
-            else:
-                return {
+        # Verificar a segurança do novo conteúdo antes de executá-lo ou gravá-lo
+        candidate = self.candidate_content(plan['target_file'], generated_code, plan['category'])
+        security = self.code_guardian.check_candidate_security(plan['target_file'], candidate)
+        if not security.get('passed'):
+            plan['result'] = {
+                "status": "error",
+                "message": "Código gerado reprovado na verificação de segurança",
+                "security": security
+            }
+            return False
+        
+        # Executar o novo conteúdo no sandbox antes de qualquer write_file (opcional: SANDBOX_BENCHMARK=1)
+        if os.getenv('SANDBOX_BENCHMARK', '0') != '0':
+            benchmark = self.code_guardian.benchmark_candidate(plan['target_file'], candidate)
+            plan['benchmark'] = benchmark
+            if not benchmark.get('accepted'):
+                plan['result'] = {
                     "status": "error",
-                    "message": "Código gerado é inválido ou contém erros de sintaxe"
+                    "message": "Código gerado rejeitado no sandbox: " + "; ".join(benchmark.get('reasons', []))
                 }
-        else:
-            return {
+                return False
+        
+        self.logger.info(f"Código gerado validado. Aplicando modificações em {plan['target_file']}")
+        return True
+    
+    def candidate_content(self, target_file: str, generated_code: str, category: str) -> str:
+        """
+        Conteúdo que o arquivo alvo terá depois de apply_code_modifications.
+        """
+        if category in ['strategy_modification', 'risk_management']:
+            return generated_code
+        try:
+            with open(os.path.join(self.base_path, target_file), 'r', encoding='utf-8') as f:
+                current = f.read()
+        except FileNotFoundError:
+            current = ''
+        return current + f"\n\n# Modificação automática\n{generated_code}"
+    
+    def _apply_stage(self, plan: Dict[str, Any]) -> bool:
+        target_file = plan['target_file']
+        
+        # Aplicar modificações
+        if not self.apply_code_modifications(target_file, plan['generated_code'], plan['category']):
+            plan['result'] = {
                 "status": "error",
-                "message": "Falha na geração de código pelo LLM"
+                "message": f"Falha ao aplicar modificações no arquivo {target_file}"
             }
+            return False
+        
+        # Executar validações de segurança
+        validation_result = self.run_validations(target_file)
+        
+        plan['result'] = {
+            "status": "success",
+            "category": plan['category'],
+            "matched_rule": plan['classification']['rule'],
+            "parameters": plan['parameters'],
+            "target_file": target_file,
+            "validation_result": validation_result,
+            "message": f"Comando executado com sucesso. Arquivo {target_file} modificado."
+        }
+        return True
     
     def determine_target_file(self, category: str) -> str:
         """
@@ -239,12 +325,10 @@ O código deve ser funcional e seguir as melhores práticas de Python.
         Aplica as modificações de código de forma segura.
         """
         try:
-            # Fazer backup do arquivo original
-            original_content = self.code_editor.read_file(target_file)
-            if original_content:
-                backup_file = f"{target_file}.backup"
-                self.code_editor.write_file(backup_file, original_content)
-                self.logger.info(f"Backup criado: {backup_file}")
+            # Registrar a versão original no diário de versões (só a diferença é gravada)
+            version = self.undo_journal.record(target_file, label='antes_do_comando')
+            if version is not None:
+                self.logger.info(f"Backup criado: {target_file} (versão {version})")
             
             # Aplicar as modificações
             if category in ['strategy_modification', 'risk_management']:
@@ -261,41 +345,101 @@ O código deve ser funcional e seguir as melhores práticas de Python.
             self.logger.error(f"Erro ao aplicar modificações: {e}")
             return False
     
-    def run_validations(self, target_file: str) -> Dict[str, Any]:
+    def validation_stages(self, target_file: str):
+        """
+        Etapas de validação independentes: (nome, chave no resultado, rótulo,
+        função). Cada função recebe o evento de cancelamento e retorna
+        (passou, dados extras).
+        """
+        def syntax(cancel_event):
+            return bool(self.code_guardian.validate_code(target_file, cancel_event=cancel_event)), {}
+        
+        def security(cancel_event):
+            return bool(self.code_guardian.check_security(target_file, cancel_event=cancel_event)), {}
+        
+        def tests(cancel_event):
+            # Só os testes afetados pelo arquivo alterado
+            report = self.code_guardian.run_tests([target_file], cancel_event=cancel_event)
+            return bool(report.get('passed')), {'tests_run': report.get('selected', {})}
+        
+        return [
+            ('syntax', 'syntax_valid', "Validação sintática", syntax),
+            ('security', 'security_check', "Verificação de segurança", security),
+            ('tests', 'tests_passed', "Testes automatizados", tests)
+        ]
+    
+    def run_validations(self, target_file: str, fail_fast: Optional[bool] = None) -> Dict[str, Any]:
         """
-        Executa validações de código e segurança.
+        Executa validações de código, segurança e testes em paralelo.
+        Com fail_fast (padrão: VALIDATION_FAIL_FAST=1), a primeira etapa que
+        falhar cancela as demais: as que não começaram nem chegam a rodar, e
+        o pylint, a análise de segurança e os testes em execução são
+        interrompidos. O resultado guarda a duração de cada etapa.
         """
+        if fail_fast is None:
+            fail_fast = os.getenv('VALIDATION_FAIL_FAST', '1') != '0'
         validation_result = {
             "syntax_valid": False,
             "security_check": False,
             "tests_passed": False,
-            "details": []
+            "tests_run": {},
+            "details": [],
+            "stages": {},
+            "fail_fast": fail_fast
         }
         
+        started_at = time.perf_counter()
+        cancel_event = threading.Event()
+        stages = self.validation_stages(target_file)
+        
+        def run_stage(function):
+            stage_started_at = time.perf_counter()
+            try:
+                passed, extra = function(cancel_event)
+                return {'status': 'passed' if passed else 'failed', 'error': None, 'extra': extra,
+                        'duration': time.perf_counter() - stage_started_at}
+            except Exception as e:
+                return {'status': 'error', 'error': str(e), 'extra': {},
+                        'duration': time.perf_counter() - stage_started_at}
+        
+        # Executor próprio da chamada: etapas abandonadas no fail_fast não prendem
+        # os workers das validações seguintes
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self.validation_workers, len(stages))),
+                                      thread_name_prefix='validacao')
         try:
-            # Validação sintática
-            if self.code_guardian.validate_code(target_file):
-                validation_result["syntax_valid"] = True
-                validation_result["details"].append("Validação sintática: PASSOU")
-            else:
-                validation_result["details"].append("Validação sintática: FALHOU")
-            
-            # Verificação de segurança
-            if self.code_guardian.check_security(target_file):
-                validation_result["security_check"] = True
-                validation_result["details"].append("Verificação de segurança: PASSOU")
-            else:
-                validation_result["details"].append("Verificação de segurança: FALHOU")
-            
-            # Execução de testes
-            if self.code_guardian.run_tests():
-                validation_result["tests_passed"] = True
-                validation_result["details"].append("Testes automatizados: PASSOU")
+            futures = {executor.submit(run_stage, function): name for name, _, _, function in stages}
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    validation_result["stages"][futures[future]] = future.result()
+                if fail_fast and pending and any(stage['status'] != 'passed'
+                                                 for stage in validation_result["stages"].values()):
+                    cancel_event.set()
+                    for future in pending:
+                        # Etapas já em execução terminam em segundo plano, sem atrasar o resultado
+                        validation_result["stages"][futures[future]] = {'status': 'cancelled', 'error': None,
+                                                                         'extra': {}, 'duration': None}
+                    break
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        for name, key, label, _ in stages:
+            stage = validation_result["stages"][name]
+            validation_result.update(stage.pop('extra'))
+            validation_result[key] = stage['status'] == 'passed'
+            if stage['status'] == 'passed':
+                suffix = f" ({len(validation_result['tests_run'])} afetados)" if name == 'tests' else ""
+                validation_result["details"].append(f"{label}: PASSOU{suffix}")
+            elif stage['status'] == 'cancelled':
+                validation_result["details"].append(f"{label}: CANCELADA")
+            elif stage['status'] == 'error':
+                validation_result["details"].append(f"Erro durante validação ({label}): {stage['error']}")
             else:
-                validation_result["details"].append("Testes automatizados: FALHOU")
-            
-        except Exception as e:
-            validation_result["details"].append(f"Erro durante validação: {e}")
+                validation_result["details"].append(f"{label}: FALHOU")
         
+        validation_result["duration"] = time.perf_counter() - started_at
+        statuses = ", ".join(f"{name} {stage['status']}" for name, stage in validation_result["stages"].items())
+        self.logger.info(f"Validações de {target_file} em {validation_result['duration']:.2f}s: {statuses}")
         return validation_result
 
@@ -0,0 +1,202 @@
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, List, Any, Callable, Optional, Tuple
+from utils.logger import Logger
+
+# Uma etapa recebe o item em processamento e retorna False quando ele já terminou
+Stage = Tuple[str, Callable[[Dict[str, Any]], bool]]
+
+_STOP = object()
+
+
+class _PipelineJob:
+    """Item em trânsito pelo pipeline, com a ordem dele dentro do arquivo alvo."""
+
+    __slots__ = ('item', 'key', 'sequence', 'future', 'finished', 'enqueued_at')
+
+    def __init__(self, item: Dict[str, Any], key: str, sequence: int):
+        self.item = item
+        self.key = key
+        self.sequence = sequence
+        self.future: Future = Future()
+        self.finished = False
+        self.enqueued_at = 0.0
+
+
+def _percentile(values: List[float], percent: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percent / 100.0 * (len(ordered) - 1))))]
+
+
+class CommandPipeline:
+    """
+    Pipeline de comandos em etapas, cada uma com seu pool de workers e filas
+    limitadas entre elas. Comandos com arquivos alvo diferentes andam em
+    paralelo; na etapa serializada (aplicação) os comandos de um mesmo arquivo
+    são executados na ordem em que foram submetidos.
+    """
+
+    def __init__(self, stages: List[Stage], serialized_stage: str,
+                 workers: Optional[Dict[str, int]] = None, queue_size: int = 16,
+                 latency_window: int = 200):
+        self.stages = stages
+        self.stage_names = [name for name, _ in stages]
+        if serialized_stage not in self.stage_names:
+            raise ValueError(f"Etapa serializada desconhecida: {serialized_stage}")
+        self.serialized_stage = serialized_stage
+        self.workers = {name: (workers or {}).get(name, 1) for name in self.stage_names}
+        self.queue_size = queue_size
+        self.logger = Logger("CommandPipeline")
+
+        self.queues: Dict[str, queue.Queue] = {name: queue.Queue(maxsize=queue_size) for name in self.stage_names}
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._running = False
+
+        # Ordem por arquivo: próximo número de sequência a aplicar e os que chegaram adiantados
+        self._next_sequence: Dict[str, int] = {}
+        self._sequence_counters: Dict[str, itertools.count] = {}
+        self._parked: Dict[str, Dict[int, _PipelineJob]] = {}
+
+        self._latencies: Dict[str, deque] = {name: deque(maxlen=latency_window) for name in self.stage_names}
+        self._waits: Dict[str, deque] = {name: deque(maxlen=latency_window) for name in self.stage_names}
+        self._processed: Dict[str, int] = {name: 0 for name in self.stage_names}
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0}
+
+    def start(self):
+        """Inicia os workers de todas as etapas (idempotente)."""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            for index, name in enumerate(self.stage_names):
+                for worker in range(self.workers[name]):
+                    thread = threading.Thread(target=self._worker, args=(index,),
+                                              name=f"CommandPipeline-{name}-{worker}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+        self.logger.info(f"Pipeline de comandos iniciado: {self.workers}")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Para os workers depois que as filas atuais forem processadas."""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            threads, self._threads = self._threads, []
+        for index, name in enumerate(self.stage_names):
+            for _ in range(self.workers[name]):
+                self.queues[name].put(_STOP)
+            for thread in threads:
+                if thread.name.startswith(f"CommandPipeline-{name}-"):
+                    thread.join(timeout)
+
+    def submit(self, item: Dict[str, Any], key: str) -> Future:
+        """
+        Submete um comando. A chave (arquivo alvo) define a ordem na etapa
+        serializada. Bloqueia se a primeira fila estiver cheia.
+        """
+        self.start()
+        with self._lock:
+            counter = self._sequence_counters.setdefault(key, itertools.count())
+            self._next_sequence.setdefault(key, 0)
+            job = _PipelineJob(item, key, next(counter))
+            self.stats['submitted'] += 1
+        self._enqueue(0, job)
+        return job.future
+
+    def _enqueue(self, index: int, job: _PipelineJob):
+        job.enqueued_at = time.monotonic()
+        self.queues[self.stage_names[index]].put(job)
+
+    def _worker(self, index: int):
+        name, _ = self.stages[index]
+        while True:
+            job = self.queues[name].get()
+            if job is _STOP:
+                return
+            self._waits[name].append(time.monotonic() - job.enqueued_at)
+            if name == self.serialized_stage:
+                self._run_serialized(index, job)
+            else:
+                self._run_stage(index, job)
+                self._forward(index, job)
+
+    def _run_stage(self, index: int, job: _PipelineJob):
+        """Executa uma etapa; itens já finalizados só atravessam o pipeline."""
+        if job.finished:
+            return
+        name, stage = self.stages[index]
+        started_at = time.monotonic()
+        try:
+            if stage(job.item) is False:
+                job.finished = True
+        except Exception as e:
+            self.logger.error(f"Erro na etapa {name}: {e}")
+            job.item['result'] = {'status': 'error', 'message': f"Erro na etapa {name}: {e}"}
+            job.finished = True
+        finally:
+            self._latencies[name].append(time.monotonic() - started_at)
+            with self._lock:
+                self._processed[name] += 1
+
+    def _forward(self, index: int, job: _PipelineJob):
+        if index + 1 < len(self.stages):
+            self._enqueue(index + 1, job)
+        else:
+            self._complete(job)
+
+    def _run_serialized(self, index: int, job: _PipelineJob):
+        """
+        Aplica os itens de um arquivo na ordem de submissão. Um item adiantado
+        fica estacionado (sem ocupar o worker) e é processado por quem
+        concluir o item anterior do mesmo arquivo.
+        """
+        with self._lock:
+            if job.sequence != self._next_sequence[job.key]:
+                self._parked.setdefault(job.key, {})[job.sequence] = job
+                return
+
+        while job is not None:
+            self._run_stage(index, job)
+            self._forward(index, job)
+            with self._lock:
+                self._next_sequence[job.key] = job.sequence + 1
+                job = self._parked.get(job.key, {}).pop(job.sequence + 1, None)
+
+    def _complete(self, job: _PipelineJob):
+        result = job.item.get('result')
+        with self._lock:
+            if result and result.get('status') == 'success':
+                self.stats['completed'] += 1
+            else:
+                self.stats['failed'] += 1
+        job.future.set_result(result)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Profundidade das filas, itens estacionados e latência de cada etapa."""
+        with self._lock:
+            stats = dict(self.stats)
+            parked = {key: len(jobs) for key, jobs in self._parked.items() if jobs}
+            processed = dict(self._processed)
+        stages = {}
+        for name in self.stage_names:
+            latencies = list(self._latencies[name])
+            waits = list(self._waits[name])
+            stages[name] = {
+                'workers': self.workers[name],
+                'queue_depth': self.queues[name].qsize(),
+                'processed': processed[name],
+                'latency_avg': sum(latencies) / len(latencies) if latencies else None,
+                'latency_p95': _percentile(latencies, 95),
+                'queue_wait_avg': sum(waits) / len(waits) if waits else None
+            }
+        stats.update({'running': self._running, 'queue_size': self.queue_size,
+                      'parked': parked, 'stages': stages})
+        return stats
@@ -0,0 +1,253 @@
+import ast
+import math
+import os
+import re
+import unicodedata
+from typing import Dict, List, Any, Optional, Set
+from bud_editor_service.ast_editor import ASTCodeEditor
+from utils.logger import Logger
+
+# Palavras-chave que indicam relevância de um símbolo para cada categoria
+CATEGORY_HINTS = {
+    'strategy_modification': ['strategy', 'signal', 'trend', 'aggress', 'bull', 'bear', 'entry', 'exit', 'trade'],
+    'risk_management': ['risk', 'stop', 'loss', 'take', 'profit', 'position', 'size', 'exposure', 'limit'],
+    'performance_optimization': ['cache', 'loop', 'batch', 'process', 'calculate', 'compute'],
+    'bug_fix': ['error', 'fix', 'validate', 'check'],
+    'feature_addition': [],
+    'system_configuration': ['config', 'setting', 'log', 'alert'],
+}
+
+STOPWORDS = {
+    'que', 'com', 'para', 'por', 'uma', 'mais', 'menos', 'seja', 'fique', 'mas',
+    'dos', 'das', 'nos', 'nas', 'the', 'and', 'for', 'com', 'sem', 'isso', 'este', 'esta'
+}
+
+# Pontuação de um símbolo citado explicitamente no comando
+EXPLICIT_MENTION_SCORE = 100
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa de tokens (~4 caracteres por token), a mesma usada nos limites da OpenAI."""
+    return math.ceil(len(text) / 4)
+
+
+def _strip_accents(text: str) -> str:
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+
+
+def _identifier_parts(name: str) -> List[str]:
+    """Divide um identificador em partes ('calculatePositionSize' -> calculate, position, size)."""
+    spaced = re.sub(r'([a-z0-9])([A-Z])', r'\1 \2', name)
+    return [part.lower() for part in re.split(r'[_\s]+', spaced) if part]
+
+
+class PromptContextBuilder:
+    """
+    Monta o contexto do arquivo alvo para os prompts dos LLMs.
+    Em vez do arquivo inteiro, usa a AST para extrair apenas os imports, os
+    atributos de classe e as funções relevantes ao comando, dentro de um
+    orçamento de tokens. Funções relevantes que não cabem inteiras entram
+    apenas com a assinatura.
+    """
+
+    def __init__(self, base_path: str, token_budget: Optional[int] = None,
+                 ast_editor: Optional[ASTCodeEditor] = None):
+        self.base_path = base_path
+        self.token_budget = token_budget if token_budget is not None else int(os.getenv('PROMPT_CONTEXT_TOKEN_BUDGET', '800'))
+        self.ast_editor = ast_editor or ASTCodeEditor(base_path)
+        self.logger = Logger("PromptContextBuilder")
+
+    def _command_keywords(self, command: str) -> Set[str]:
+        words = re.findall(r'[a-z0-9]+', _strip_accents(command).lower())
+        return {word for word in words if len(word) >= 3 and word not in STOPWORDS}
+
+    def _explicit_mentions(self, target_file: str, tree: ast.AST, command: str) -> Set[ast.AST]:
+        """Funções e classes citadas pelo nome (simples ou qualificado) no comando."""
+        words = set(re.findall(r'[A-Za-z_][A-Za-z0-9_.]*', command))
+        words |= {part for word in words for part in word.split('.')}
+        lines = {symbol['lineno'] for symbol in self.ast_editor.symbol_index.symbols_in_file(target_file)
+                 if symbol['name'] in words or symbol['qualname'] in words}
+        if not lines:
+            return set()
+        return {node for node in ast.walk(tree)
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node.lineno in lines}
+
+    def _score(self, node: ast.AST, keywords: Set[str], hints: List[str], mentioned: Set[ast.AST]) -> int:
+        if node in mentioned:
+            return EXPLICIT_MENTION_SCORE
+        score = 0
+        for part in _identifier_parts(node.name):
+            if len(part) < 3:
+                continue
+            if any(word.startswith(part[:4]) or part.startswith(word[:4]) for word in keywords if len(word) >= 4):
+                score += 10
+            if any(part.startswith(hint) for hint in hints):
+                score += 3
+        return score
+
+    @staticmethod
+    def _cost(text: str) -> int:
+        # Inclui a linha em branco que separa as partes no contexto final
+        return estimate_tokens(text + '\n')
+
+    @staticmethod
+    def _lines(source_lines: List[str], start: int, end: int) -> str:
+        return ''.join(source_lines[start - 1:end]).rstrip() + '\n'
+
+    def _node_start(self, node: ast.AST) -> int:
+        decorators = getattr(node, 'decorator_list', [])
+        return decorators[0].lineno if decorators else node.lineno
+
+    def _full_source(self, source_lines: List[str], node: ast.AST) -> str:
+        return self._lines(source_lines, self._node_start(node), node.end_lineno)
+
+    def _signature(self, source_lines: List[str], node: ast.AST) -> str:
+        """Cabeçalho da função com corpo reduzido a '...'."""
+        body_start = node.body[0]
+        if body_start.lineno > node.lineno:
+            header = self._lines(source_lines, self._node_start(node), body_start.lineno - 1)
+        else:
+            header = source_lines[node.lineno - 1][:body_start.col_offset].rstrip() + '\n'
+        return header + ' ' * (node.col_offset + 4) + '...\n'
+
+    def _class_header(self, source_lines: List[str], node: ast.ClassDef) -> str:
+        """Cabeçalho da classe com seus atributos (de classe e definidos no __init__)."""
+        first_body_line = node.body[0].lineno
+        header = self._lines(source_lines, self._node_start(node), first_body_line - 1) \
+            if first_body_line > node.lineno else f"class {node.name}:\n"
+
+        indent = ' ' * (node.col_offset + 4)
+        attributes = []
+        instance_attributes = []
+        for item in node.body:
+            if isinstance(item, (ast.Assign, ast.AnnAssign)):
+                attributes.append(self._lines(source_lines, item.lineno, item.end_lineno))
+            elif isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and item.name == '__init__':
+                for sub in ast.walk(item):
+                    targets = sub.targets if isinstance(sub, ast.Assign) else [sub.target] if isinstance(sub, ast.AnnAssign) else []
+                    for target in targets:
+                        if isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) \
+                                and target.value.id == 'self' and target.attr not in instance_attributes:
+                            instance_attributes.append(target.attr)
+        if instance_attributes:
+            attributes.append(f"{indent}# atributos: {', '.join('self.' + name for name in instance_attributes)}\n")
+        return header + ''.join(attributes)
+
+    def _plain_excerpt(self, target_file: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Primeiras linhas de um arquivo que não é Python, dentro do orçamento de tokens."""
+        lines = []
+        size = 0
+        with open(os.path.join(self.base_path, target_file), 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                # Mesma proporção de estimate_tokens: ~4 caracteres por token
+                if size + len(line) > self.token_budget * 4:
+                    break
+                lines.append(line)
+                size += len(line)
+        result['context'] = ''.join(lines)
+        result['tokens'] = estimate_tokens(result['context'])
+        return result
+
+    def build(self, target_file: str, command: str, category: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Extrai do arquivo alvo o contexto relevante ao comando.
+        Retorna o texto do contexto, os tokens estimados e os símbolos
+        incluídos inteiros, resumidos (só assinatura) ou omitidos.
+        """
+        result = {
+            'target_file': target_file,
+            'context': '',
+            'tokens': 0,
+            'token_budget': self.token_budget,
+            'included': [],
+            'summarized': [],
+            'omitted': []
+        }
+        if self.token_budget <= 0 or not os.path.exists(os.path.join(self.base_path, target_file)):
+            return result
+        if not target_file.endswith('.py'):
+            # config.yaml e afins: sem AST, só o início do arquivo
+            return self._plain_excerpt(target_file, result)
+
+        parsed = self.ast_editor.get_parsed(target_file, shared=True)
+        if parsed is None or not parsed[0]:
+            return result
+        source, tree = parsed
+        source_lines = source.splitlines(keepends=True)
+
+        keywords = self._command_keywords(command)
+        hints = CATEGORY_HINTS.get(category, [])
+        mentioned = self._explicit_mentions(target_file, tree, command)
+
+        # Imports e constantes de módulo entram primeiro, pois são baratos e dão contexto de nomes
+        module_lines = [self._lines(source_lines, node.lineno, node.end_lineno)
+                        for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+        module_lines += [self._lines(source_lines, node.lineno, node.end_lineno)
+                         for node in tree.body
+                         if isinstance(node, (ast.Assign, ast.AnnAssign)) and node.end_lineno == node.lineno]
+        module_text = ''.join(module_lines)
+        used = self._cost(module_text) if module_text else 0
+        if used > self.token_budget:
+            module_text, used = '', 0
+
+        # Funções candidatas (de módulo e métodos), com o nome qualificado
+        candidates = []
+        for node in tree.body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                candidates.append((None, node, node.name))
+            elif isinstance(node, ast.ClassDef):
+                for item in node.body:
+                    if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                        candidates.append((node, item, f"{node.name}.{item.name}"))
+
+        scored = []
+        for order, (owner, node, qualname) in enumerate(candidates):
+            score = self._score(node, keywords, hints, mentioned)
+            if owner is not None and owner in mentioned:
+                score = max(score, EXPLICIT_MENTION_SCORE // 2)
+            scored.append((score, order, owner, node, qualname))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+
+        chosen: Dict[int, str] = {}
+        class_headers: Dict[ast.ClassDef, str] = {}
+        for score, order, owner, node, qualname in scored:
+            header_cost = 0
+            if owner is not None and owner not in class_headers:
+                header_text = self._class_header(source_lines, owner)
+                header_cost = self._cost(header_text)
+
+            full_text = self._full_source(source_lines, node)
+            signature_text = self._signature(source_lines, node)
+            if score > 0 and used + header_cost + self._cost(full_text) <= self.token_budget:
+                chosen[order] = full_text
+                result['included'].append(qualname)
+            elif used + header_cost + self._cost(signature_text) <= self.token_budget:
+                chosen[order] = signature_text
+                result['summarized'].append(qualname)
+            else:
+                result['omitted'].append(qualname)
+                continue
+
+            if header_cost:
+                class_headers[owner] = header_text
+            used += header_cost + self._cost(chosen[order])
+
+        # Reconstrói na ordem original do arquivo
+        parts = [module_text] if module_text else []
+        emitted_classes = set()
+        for order, (owner, node, qualname) in enumerate(candidates):
+            if order not in chosen:
+                continue
+            if owner is not None and owner not in emitted_classes:
+                parts.append(class_headers[owner])
+                emitted_classes.add(owner)
+            parts.append(chosen[order])
+
+        result['context'] = '\n'.join(part.rstrip('\n') + '\n' for part in parts)
+        result['tokens'] = estimate_tokens(result['context'])
+        self.logger.debug(
+            f"Contexto de {target_file}: {result['tokens']}/{self.token_budget} tokens, "
+            f"{len(result['included'])} completas, {len(result['summarized'])} resumidas, "
+            f"{len(result['omitted'])} omitidas"
+        )
+        return result
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Optional
+from utils.logger import Logger
+
+
+def normalize_command(command: str) -> str:
+    """
+    Normaliza o comando do operador para uso na chave do cache:
+    forma Unicode canônica, sem diferença de caixa, espaços colapsados e sem
+    pontuação nas pontas ("Seja mais agressiva!" == "seja mais  agressiva").
+    """
+    text = unicodedata.normalize('NFKC', command).casefold()
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip(' .,;:!?')
+
+
+def hash_file(path: str) -> str:
+    """Hash sha256 do conteúdo do arquivo ('missing' se ele não existir)."""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return 'missing'
+
+
+class GenerationCache:
+    """
+    Cache de código gerado pelos LLMs.
+    A chave combina o comando normalizado, a categoria e o hash do arquivo
+    alvo, de modo que qualquer edição no arquivo invalida a entrada. As
+    entradas têm limite LRU, TTL e podem ser persistidas em disco.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600.0,
+                 persist_path: Optional[str] = None, clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist_path = persist_path
+        self._clock = clock
+        self.logger = Logger("GenerationCache")
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+        if persist_path:
+            self._load()
+
+    @staticmethod
+    def make_key(backend: str, command: str, category: Optional[str], target_path: Optional[str]) -> str:
+        """Monta a chave a partir do comando, categoria e conteúdo do arquivo alvo."""
+        parts = {
+            'backend': backend,
+            'command': normalize_command(command),
+            'category': category,
+            'target_file_hash': hash_file(target_path) if target_path else None
+        }
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return self._clock() - entry['stored_at'] >= self.ttl
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Retorna o valor em cache ou None (entradas expiradas são removidas)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry):
+                if entry is not None:
+                    del self._entries[key]
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return dict(entry['value'])
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Armazena o valor, removendo as entradas menos usadas acima do limite."""
+        with self._lock:
+            self._entries[key] = {'stored_at': self._clock(), 'value': dict(value)}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+            snapshot = list(self._entries.items()) if self.persist_path else None
+
+        if snapshot is not None:
+            self._save(snapshot)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.persist_path and os.path.exists(self.persist_path):
+            os.remove(self.persist_path)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries),
+                        max_entries=self.max_entries, ttl=self.ttl,
+                        persistent=bool(self.persist_path))
+
+    def _load(self):
+        """Carrega as entradas persistidas que ainda não expiraram."""
+        try:
+            with open(self.persist_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            self.logger.warning(f"Cache de geração em disco ignorado: {e}")
+            return
+
+        for key, entry in data.get('entries', []):
+            if not self._expired(entry):
+                self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _save(self, snapshot):
+        """Grava as entradas em disco de forma atômica (arquivo temporário + rename)."""
+        try:
+            directory = os.path.dirname(os.path.abspath(self.persist_path))
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'entries': snapshot}, f)
+            os.replace(temp_path, self.persist_path)
+        except Exception as e:
+            self.logger.warning(f"Falha ao persistir cache de geração: {e}")
+
+
+_default_cache: Optional[GenerationCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_generation_cache() -> GenerationCache:
+    """Retorna o cache de geração compartilhado, configurado por variáveis de ambiente."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = GenerationCache(
+                max_entries=int(os.getenv('GENERATION_CACHE_SIZE', '256')),
+                ttl=float(os.getenv('GENERATION_CACHE_TTL', '3600')),
+                persist_path=os.getenv('GENERATION_CACHE_PATH') or None
+            )
+        return _default_cache
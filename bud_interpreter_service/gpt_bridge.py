@@ -1,35 +1,168 @@
+import asyncio
+import threading
 import openai
 from dotenv import load_dotenv
 import os
+from bud_interpreter_service.generation_cache import GenerationCache, get_generation_cache
+from bud_interpreter_service.rate_limiter import ConcurrencyLimiter, TokenBucket, TokenUsageTracker
+from utils.async_loops import bind_to_loop, get_background_loop
+
+SYSTEM_PROMPT = "Você é um assistente de IA que gera código Python com base em instruções em linguagem natural. O código deve ser modular, seguro e seguir as melhores práticas."
 
 class GPTBridge:
-    def __init__(self):
+    def __init__(self, base_path=None, alert_system=None, services=None):
         load_dotenv() # Carrega as variáveis de ambiente do arquivo .env
         openai.api_key = os.getenv("OPENAI_API_KEY")
         if not openai.api_key:
             print("Erro: OPENAI_API_KEY não encontrada nas variáveis de ambiente.")
+        # Diretório do projeto e cache de código gerado compartilhado com o LocalLLMBridge
+        self.base_path = base_path or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.generation_cache = get_generation_cache()
+
+        # Limites da cota da OpenAI: requisições/min, tokens/min e chamadas simultâneas
+        self.request_bucket = TokenBucket(float(os.getenv("OPENAI_RPM_LIMIT", "60")))
+        self.token_bucket = TokenBucket(float(os.getenv("OPENAI_TPM_LIMIT", "40000")))
+        self.max_concurrency = int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))
+        self.concurrency = ConcurrencyLimiter(self.max_concurrency)
+        self.expected_completion_tokens = int(os.getenv("OPENAI_EXPECTED_COMPLETION_TOKENS", "500"))
+
+        # Uso real de tokens, reportado ao SorteAlertSystem ao atingir os limiares da cota.
+        # Sem alert_system explícito, o do registro de serviços é usado no primeiro alerta.
+        self.usage_tracker = TokenUsageTracker(int(os.getenv("OPENAI_DAILY_TOKEN_QUOTA", "1000000")))
+        self.alert_system = alert_system
+        self.services = services
+        self._alert_system_resolved = alert_system is not None
+
+        # Um cliente assíncrono por loop de eventos, fechado quando o loop encerra
+        self._client_lock = threading.Lock()
+        self._async_clients = {}
+
+    def _messages(self, prompt):
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _estimate_tokens(self, prompt):
+        # Aproximação de ~4 caracteres por token, corrigida depois pelo uso real
+        return (len(SYSTEM_PROMPT) + len(prompt)) // 4 + self.expected_completion_tokens
+
+    def _record_usage(self, response, estimated_tokens):
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return None
+        total_tokens = usage.total_tokens or (usage.prompt_tokens + usage.completion_tokens)
+        self.token_bucket.adjust(total_tokens - estimated_tokens)
+        return self.usage_tracker.record(usage.prompt_tokens, usage.completion_tokens, total_tokens)
+
+    def _get_alert_system(self):
+        if not self._alert_system_resolved:
+            from core.service_registry import get_service_registry
+            services = self.services or get_service_registry()
+            self.alert_system = services.get_optional('alert_system')
+            self._alert_system_resolved = True
+        return self.alert_system
+
+    def _notify_quota(self, usage_percent):
+        print(f"Uso da cota da OpenAI em {usage_percent:.1f}%")
+        alert_system = self._get_alert_system()
+        if alert_system:
+            alert_system.alert_api_quota_warning("OpenAI", usage_percent)
+
+    async def _get_async_client(self):
+        """Cliente do loop em execução, fechado no encerramento desse loop."""
+        loop = asyncio.get_running_loop()
+        with self._client_lock:
+            entry = self._async_clients.get(loop)
+            if entry is not None:
+                return entry[0]
+            # Loops fechados sem encerrar os geradores assíncronos não passam pelo close abaixo
+            for closed_loop in [other for other in self._async_clients if other.is_closed()]:
+                del self._async_clients[closed_loop]
+            client = openai.AsyncOpenAI(
+                api_key=openai.api_key,
+                base_url=os.getenv("OPENAI_BASE_URL") or None
+            )
+            self._async_clients[loop] = (client, None)
 
-    def generate_code_from_prompt(self, prompt, model="gpt-3.5-turbo"):
+        async def close():
+            with self._client_lock:
+                self._async_clients.pop(loop, None)
+            await client.close()
+
+        binding = await bind_to_loop(close)
+        with self._client_lock:
+            if loop in self._async_clients:
+                self._async_clients[loop] = (client, binding)
+        return client
+
+    def _cache_key(self, prompt, model, category, target_file):
+        target_path = os.path.join(self.base_path, target_file) if target_file else None
+        return GenerationCache.make_key(f"openai:{model}", prompt, category, target_path)
+
+    def generate_code_from_prompt(self, prompt, model="gpt-3.5-turbo", category=None, target_file=None):
+        """
+        Versão síncrona: aguarda a assíncrona no loop persistente do processo,
+        com o mesmo cliente, semáforo e baldes (a espera pela cota não prende
+        uma thread dormindo antes da chamada).
+        """
+        return get_background_loop().run(
+            self.generate_code_from_prompt_async(prompt, model, category=category, target_file=target_file)
+        )
+
+    async def generate_code_from_prompt_async(self, prompt, model="gpt-3.5-turbo", category=None, target_file=None):
+        """Versão assíncrona, limitada por semáforo e pelos baldes de requisições e tokens."""
         if not openai.api_key:
             return None
+        cache_key = self._cache_key(prompt, model, category, target_file)
+        cached = self.generation_cache.get(cache_key)
+        if cached:
+            return cached['code']
         try:
-            response = openai.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "Você é um assistente de IA que gera código Python com base em instruções em linguagem natural. O código deve ser modular, seguro e seguir as melhores práticas."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            return response.choices[0].message.content
+            estimated_tokens = self._estimate_tokens(prompt)
+            client = await self._get_async_client()
+            async with self.concurrency:
+                await self.request_bucket.acquire()
+                await self.token_bucket.acquire(estimated_tokens)
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=self._messages(prompt)
+                )
+            usage_percent = self._record_usage(response, estimated_tokens)
+            if usage_percent is not None:
+                # O alerta síncrono cria seu próprio loop, então roda fora deste
+                await asyncio.to_thread(self._notify_quota, usage_percent)
+            generated_code = response.choices[0].message.content
+            if generated_code:
+                self.generation_cache.put(cache_key, {'code': generated_code})
+            return generated_code
         except Exception as e:
             print(f"Erro ao gerar código com GPT: {e}")
             return None
 
-    def process_command(self, command_text):
+    def get_usage(self):
+        return dict(self.usage_tracker.get_usage(),
+                    available_request_slots=self.request_bucket.available,
+                    available_tokens=self.token_bucket.available,
+                    max_concurrency=self.max_concurrency)
+
+    def _command_prompt(self, command_text, target_file):
+        return f"Gere um trecho de código Python para implementar a seguinte ideia: {command_text}. O código deve ser adicionado ao arquivo {target_file}."
+
+    def process_command(self, command_text, category=None, target_file="bud_logic/strategy.py"):
         print(f"GPTBridge processando comando para geração de código: {command_text}")
         generated_code = self.generate_code_from_prompt(
-            f"Gere um trecho de código Python para implementar a seguinte ideia: {command_text}. O código deve ser adicionado ao arquivo bud_logic/strategy.py."
+            self._command_prompt(command_text, target_file),
+            category=category,
+            target_file=target_file
         )
-        return {"action": "generate_code", "code": generated_code, "target_file": "bud_logic/strategy.py"}
-
+        return {"action": "generate_code", "code": generated_code, "target_file": target_file}
 
+    async def process_command_async(self, command_text, category=None, target_file="bud_logic/strategy.py"):
+        print(f"GPTBridge processando comando para geração de código: {command_text}")
+        generated_code = await self.generate_code_from_prompt_async(
+            self._command_prompt(command_text, target_file),
+            category=category,
+            target_file=target_file
+        )
+        return {"action": "generate_code", "code": generated_code, "target_file": target_file}
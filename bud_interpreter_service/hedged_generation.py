@@ -0,0 +1,173 @@
+import ast
+import asyncio
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Any, Callable, Awaitable, Optional, Tuple
+from utils.logger import Logger
+
+Backend = Tuple[str, Callable[[], Awaitable[Dict[str, Any]]]]
+
+_CODE_BLOCK = re.compile(r"```(?:python|py)?[ \t]*\n(.*?)```", re.DOTALL)
+
+
+def extract_code(text: str) -> str:
+    """Remove as cercas de markdown (```python ... ```) que alguns modelos devolvem."""
+    match = _CODE_BLOCK.search(text or '')
+    return match.group(1).strip() if match else (text or '').strip()
+
+
+def is_valid_code(result: Optional[Dict[str, Any]]) -> bool:
+    """Um resultado é válido se a geração teve sucesso e o código passa no ast.parse."""
+    if not result or not result.get('success') or not (result.get('code') or '').strip():
+        return False
+    try:
+        ast.parse(result['code'])
+        return True
+    except SyntaxError:
+        return False
+
+
+def _percentile(values: List[float], percent: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class HedgedGenerator:
+    """
+    Geração de código com requisições "hedged" entre vários backends.
+    O primeiro backend (primário) começa imediatamente; se ele não entregar
+    um resultado válido dentro de hedge_delay, os demais são disparados ao
+    mesmo tempo. O primeiro resultado que passa no ast.parse vence e os outros
+    são cancelados. Vitórias e latências de cada backend são registradas para
+    ajustar o hedge_delay.
+    """
+
+    def __init__(self, hedge_delay: float = 1.0, latency_window: int = 200,
+                 validator: Callable[[Optional[Dict[str, Any]]], bool] = is_valid_code,
+                 clock: Callable[[], float] = time.monotonic):
+        self.hedge_delay = hedge_delay
+        self.latency_window = latency_window
+        self.validator = validator
+        self._clock = clock
+        self.logger = Logger("HedgedGenerator")
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.backend_stats: Dict[str, Dict[str, Any]] = {}
+
+    def _stats_for(self, name: str) -> Dict[str, Any]:
+        stats = self.backend_stats.get(name)
+        if stats is None:
+            stats = {'launched': 0, 'wins': 0, 'invalid': 0, 'errors': 0, 'cancelled': 0,
+                     'latencies': deque(maxlen=self.latency_window)}
+            self.backend_stats[name] = stats
+        return stats
+
+    def _record(self, name: str, outcome: str, latency: Optional[float] = None):
+        with self._lock:
+            stats = self._stats_for(name)
+            stats[outcome] += 1
+            if latency is not None:
+                stats['latencies'].append(latency)
+
+    async def generate(self, backends: List[Backend]) -> Dict[str, Any]:
+        """
+        Executa os backends em regime de hedge e retorna o primeiro resultado válido.
+        O resultado vencedor recebe a chave 'hedge' com o backend vencedor,
+        a latência e os backends disparados.
+        """
+        with self._lock:
+            self.requests += 1
+
+        started_at = self._clock()
+        waiting = list(backends)
+        running: Dict[asyncio.Task, Tuple[str, float]] = {}
+        failures: Dict[str, str] = {}
+        launched: List[str] = []
+
+        def launch(name: str, factory: Callable[[], Awaitable[Dict[str, Any]]]):
+            running[asyncio.ensure_future(factory())] = (name, self._clock())
+            launched.append(name)
+            self._record(name, 'launched')
+
+        try:
+            if waiting:
+                launch(*waiting.pop(0))
+
+            while running or waiting:
+                elapsed = self._clock() - started_at
+                # Dispara os hedges após o atraso, ou antes se nada mais estiver rodando
+                if waiting and (not running or elapsed >= self.hedge_delay):
+                    for name, factory in waiting:
+                        launch(name, factory)
+                    waiting = []
+
+                timeout = max(self.hedge_delay - elapsed, 0.0) if waiting else None
+                done, _ = await asyncio.wait(list(running), timeout=timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    name, launched_at = running.pop(task)
+                    latency = self._clock() - launched_at
+                    try:
+                        result = task.result()
+                    except (Exception, asyncio.CancelledError) as e:
+                        self._record(name, 'errors', latency)
+                        failures[name] = str(e)
+                        continue
+
+                    if not self.validator(result):
+                        self._record(name, 'invalid', latency)
+                        failures[name] = (result or {}).get('error') or 'código inválido'
+                        continue
+
+                    self._record(name, 'wins', latency)
+                    self.logger.info(f"Backend vencedor: {name} em {latency:.2f}s")
+                    result = dict(result)
+                    result['hedge'] = {
+                        'winner': name,
+                        'latency': latency,
+                        'total_latency': self._clock() - started_at,
+                        'launched': list(launched),
+                        'hedge_delay': self.hedge_delay
+                    }
+                    return result
+        finally:
+            # Cancela os backends que perderam (ou todos, se a chamada foi cancelada)
+            for task, (name, _) in running.items():
+                task.cancel()
+                self._record(name, 'cancelled')
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        self.logger.warning(f"Nenhum backend gerou código válido: {failures}")
+        return {
+            'success': False,
+            'error': 'Nenhum backend gerou código válido',
+            'code': '',
+            'explanation': 'Todos os backends falharam ou geraram código inválido',
+            'backend_errors': failures
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Taxa de vitória e latências (p50/p95) de cada backend."""
+        with self._lock:
+            backends = {}
+            for name, stats in self.backend_stats.items():
+                latencies = list(stats['latencies'])
+                backends[name] = {
+                    'launched': stats['launched'],
+                    'wins': stats['wins'],
+                    'invalid': stats['invalid'],
+                    'errors': stats['errors'],
+                    'cancelled': stats['cancelled'],
+                    'win_rate': stats['wins'] / stats['launched'] if stats['launched'] else 0.0,
+                    'latency_p50': _percentile(latencies, 50),
+                    'latency_p95': _percentile(latencies, 95)
+                }
+            return {'requests': self.requests, 'hedge_delay': self.hedge_delay, 'backends': backends}
@@ -0,0 +1,156 @@
+import re
+from bisect import bisect_left
+from typing import Dict, List, Any, NamedTuple, Optional, Tuple
+
+
+class IntentRule(NamedTuple):
+    """
+    Regra de classificação: sequência de fragmentos separados por '.*' que
+    devem aparecer nessa ordem no comando (sem os '.*' nas pontas). Quando
+    várias regras casam, vence a de menor priority.
+    """
+    category: str
+    pattern: str
+    priority: int
+
+
+# Regras do AdvancedCommandInterpreter: só frases específicas. Um texto livre
+# que não casa com nenhuma fica em 'general' em vez de ir para uma categoria
+# cujo caminho de aplicação reescreve o arquivo alvo inteiro.
+ADVANCED_RULES = [
+    IntentRule('strategy_modification', 'mais agressiv', 100),
+    IntentRule('strategy_modification', 'estratégia.*agressiv', 110),
+    IntentRule('strategy_modification', 'trading.*agressiv', 120),
+    IntentRule('strategy_modification', 'aumentar.*agressividade', 130),
+    IntentRule('strategy_modification', 'ser mais agressiv', 140),
+    IntentRule('risk_management', 'gerenciamento.*risco', 200),
+    IntentRule('risk_management', 'risk.*management', 210),
+    IntentRule('risk_management', 'reduzir.*risco', 220),
+    IntentRule('risk_management', 'aumentar.*risco', 230),
+    IntentRule('risk_management', 'ajustar.*risco', 240),
+    IntentRule('performance_optimization', 'otimizar.*performance', 300),
+    IntentRule('performance_optimization', 'melhorar.*velocidade', 310),
+    IntentRule('performance_optimization', 'otimizar.*código', 320),
+    IntentRule('performance_optimization', 'performance.*melhor', 330),
+    IntentRule('bug_fix', 'corrigir.*bug', 400),
+    IntentRule('bug_fix', 'fix.*bug', 410),
+    IntentRule('bug_fix', 'resolver.*erro', 420),
+    IntentRule('bug_fix', 'corrigir.*erro', 430),
+    IntentRule('feature_addition', 'adicionar.*funcionalidade', 500),
+    IntentRule('feature_addition', 'nova.*feature', 510),
+    IntentRule('feature_addition', 'implementar.*função', 520),
+    IntentRule('feature_addition', 'criar.*método', 530),
+]
+
+# Palavras-chave do CommandInterpreter, que só gera o trecho de código e tem
+# system_configuration como categoria padrão
+KEYWORD_RULES = [
+    IntentRule('strategy_modification', 'agressiv', 100),
+    IntentRule('strategy_modification', 'conservador', 110),
+    IntentRule('strategy_modification', 'estratégia', 120),
+    IntentRule('risk_management', 'risco', 200),
+    IntentRule('risk_management', 'stop', 210),
+    IntentRule('risk_management', 'profit', 220),
+    IntentRule('performance_optimization', 'otimiz', 300),
+    IntentRule('performance_optimization', 'performance', 310),
+    IntentRule('performance_optimization', 'velocidade', 320),
+    IntentRule('system_configuration', 'config', 400),
+    IntentRule('system_configuration', 'alert', 410),
+    IntentRule('system_configuration', 'log', 420),
+]
+
+RULE_SETS = {'advanced': ADVANCED_RULES, 'keywords': KEYWORD_RULES}
+
+
+class IntentClassifier:
+    """
+    Classificador de intenção dos interpretadores de comando. Todas as regras
+    são compiladas uma única vez em um só padrão, e o texto é percorrido uma
+    vez para localizar todos os fragmentos de todas as regras; as regras são
+    então avaliadas em ordem de priority.
+    """
+
+    def __init__(self, rules: Optional[List[IntentRule]] = None, default_category: str = 'general'):
+        self.rules = sorted(rules if rules is not None else ADVANCED_RULES, key=lambda rule: rule.priority)
+        self.default_category = default_category
+
+        # Regras em ordem de avaliação: (regra, fragmentos)
+        self._compiled_rules: List[Tuple[IntentRule, List[str]]] = [
+            (rule, [fragment for fragment in rule.pattern.split('.*') if fragment]) for rule in self.rules
+        ]
+
+        fragments = {fragment for _, rule_fragments in self._compiled_rules for fragment in rule_fragments}
+
+        # Fragmentos mais longos primeiro: em cada posição o lookahead captura o
+        # maior fragmento, e os fragmentos que são prefixo dele são derivados.
+        ordered = sorted(fragments, key=len, reverse=True)
+        self._scanner = re.compile(
+            '(?=(' + '|'.join(re.escape(fragment) for fragment in ordered) + '))'
+        )
+        self._prefixes = {
+            fragment: [other for other in ordered if fragment.startswith(other)]
+            for fragment in ordered
+        }
+
+    @property
+    def categories(self) -> List[str]:
+        """Categorias conhecidas, na ordem da regra mais prioritária de cada uma."""
+        return list(dict.fromkeys(rule.category for rule in self.rules))
+
+    def _scan(self, text: str) -> Dict[str, List[int]]:
+        """Percorre o texto uma vez e retorna as posições de cada fragmento."""
+        occurrences: Dict[str, List[int]] = {}
+        if not self._prefixes:
+            return occurrences
+        for match in self._scanner.finditer(text):
+            start = match.start()
+            for fragment in self._prefixes[match.group(1)]:
+                occurrences.setdefault(fragment, []).append(start)
+        return occurrences
+
+    @staticmethod
+    def _rule_matches(fragments: List[str], occurrences: Dict[str, List[int]]) -> bool:
+        """Verifica se os fragmentos aparecem em sequência no texto."""
+        position = 0
+        for fragment in fragments:
+            starts = occurrences.get(fragment)
+            if not starts:
+                return False
+            index = bisect_left(starts, position)
+            if index == len(starts):
+                return False
+            position = starts[index] + len(fragment)
+        return True
+
+    def classify(self, command_text: str) -> Dict[str, Any]:
+        """
+        Classifica o comando e retorna a categoria vencedora, a regra que a
+        disparou e a regra mais prioritária de cada categoria que casou.
+        """
+        occurrences = self._scan(command_text.lower())
+
+        winner: Optional[IntentRule] = None
+        matches: Dict[str, str] = {}
+        for rule, fragments in self._compiled_rules:
+            if rule.category in matches:
+                continue
+            if self._rule_matches(fragments, occurrences):
+                matches[rule.category] = rule.pattern
+                winner = winner or rule
+
+        return {
+            'category': winner.category if winner else self.default_category,
+            'rule': winner.pattern if winner else None,
+            'matches': matches
+        }
+
+
+_classifiers: Dict[str, IntentClassifier] = {}
+
+
+def get_intent_classifier(rule_set: str = 'advanced') -> IntentClassifier:
+    """Retorna o classificador compartilhado do conjunto de regras, compilado na primeira chamada."""
+    classifier = _classifiers.get(rule_set)
+    if classifier is None:
+        classifier = _classifiers.setdefault(rule_set, IntentClassifier(RULE_SETS[rule_set]))
+    return classifier
@@ -1,37 +1,35 @@
 from bud_editor_service.editor import CodeEditor
 from bud_guardian_service.guardian import CodeGuardian
 from bud_interpreter_service.local_llm import LocalLLMBridge
+from bud_interpreter_service.gpt_bridge import GPTBridge
+from bud_interpreter_service.intent_classifier import get_intent_classifier
 from utils.logger import Logger
+from utils.async_loops import get_background_loop
 import re
 import os
 import time
+from typing import Optional, Callable, Awaitable, Tuple
 
 class CommandInterpreter:
-    def __init__(self):
+    def __init__(self, services=None):
         # Determinar base_path automaticamente
         current_dir = os.path.dirname(os.path.abspath(__file__))
         self.base_path = os.path.dirname(current_dir)  # Diretório pai (bud_supreme)
         
-        self.editor = CodeEditor(self.base_path)
-        self.guardian = CodeGuardian(self.base_path)
-        self.llm_bridge = LocalLLMBridge()
+        # Componentes compartilhados vêm do registro de serviços, quando informado
+        self.services = services
+        self._editor = None
+        self._guardian = None
+        self.llm_bridge = services.get('local_llm_bridge') if services else LocalLLMBridge(self.base_path)
         self.logger = Logger("CommandInterpreter")
         
-        # Mapeamento de comandos para categorias
-        self.command_categories = {
-            'agressiv': 'strategy_modification',
-            'conservador': 'strategy_modification',
-            'estratégia': 'strategy_modification',
-            'risco': 'risk_management',
-            'stop': 'risk_management',
-            'profit': 'risk_management',
-            'otimiz': 'performance_optimization',
-            'performance': 'performance_optimization',
-            'velocidade': 'performance_optimization',
-            'config': 'system_configuration',
-            'alert': 'system_configuration',
-            'log': 'system_configuration'
-        }
+        # Classificador de intenção compartilhado, com as palavras-chave deste interpretador
+        self.intent_classifier = get_intent_classifier('keywords')
+        
+        # Geração hedged entre modelo local, OpenAI e templates (LLM_HEDGE_ENABLED)
+        self.hedge_enabled = os.getenv('LLM_HEDGE_ENABLED', 'false').lower() == 'true'
+        if self.hedge_enabled and os.getenv('OPENAI_API_KEY'):
+            self.llm_bridge.openai_bridge = GPTBridge(self.base_path, services=services)
         
         # Mapeamento de comandos para arquivos alvo
         self.target_files = {
@@ -41,6 +39,20 @@ class CommandInterpreter:
             'system_configuration': 'config.yaml'
         }
     
+    @property
+    def editor(self) -> CodeEditor:
+        """Editor de código, criado apenas no primeiro uso."""
+        if self._editor is None:
+            self._editor = self.services.get('code_editor') if self.services else CodeEditor(self.base_path)
+        return self._editor
+    
+    @property
+    def guardian(self) -> CodeGuardian:
+        """Guardião de código, criado apenas no primeiro uso."""
+        if self._guardian is None:
+            self._guardian = self.services.get('code_guardian') if self.services else CodeGuardian(self.base_path)
+        return self._guardian
+    
     def interpret_command(self, command: str) -> dict:
         """
         Interpreta um comando em linguagem natural e retorna instruções para execução.
@@ -48,39 +60,53 @@ class CommandInterpreter:
         try:
             self.logger.info(f"Interpretando comando: {command}")
             
-            # Classificar categoria do comando
-            category = self._classify_command(command)
+            # Classificar categoria do comando e determinar arquivo alvo
+            classification, target_file = self._plan_command(command)
             
-            # Determinar arquivo alvo
-            target_file = self.target_files.get(category, 'core/main_controller.py')
+            # Gerar código usando LLM local (ou todos os backends em hedge)
+            if self.hedge_enabled:
+                generation_result = self._run_async(self.llm_bridge.generate_code_hedged(
+                    command=command,
+                    category=classification['category'],
+                    target_file=target_file
+                ))
+            else:
+                generation_result = self.llm_bridge.generate_code(
+                    command=command,
+                    category=classification['category'],
+                    target_file=target_file
+                )
             
-            # Gerar código usando LLM local
-            generation_result = self.llm_bridge.generate_code(
-                command=command,
-                category=category,
-                target_file=target_file
-            )
-            
-            if not generation_result['success']:
-                return {
-                    'success': False,
-                    'error': generation_result['error'],
-                    'command': command
-                }
-            
-            # Validar código gerado (versão simplificada)
-            validation_result = {'is_safe': True, 'issues': []}
+            return self._interpretation_result(command, classification, target_file, generation_result)
             
+        except Exception as e:
+            self.logger.error(f"Erro na interpretação do comando: {e}")
             return {
-                'success': True,
-                'command': command,
-                'category': category,
-                'target_file': target_file,
-                'generated_code': generation_result['code'],
-                'explanation': generation_result['explanation'],
-                'model_used': generation_result.get('model_used', 'unknown'),
-                'validation_passed': True
+                'success': False,
+                'error': str(e),
+                'command': command
             }
+    
+    async def interpret_command_streaming(self, command: str,
+                                          on_partial: Optional[Callable[[str], Awaitable[None]]] = None) -> dict:
+        """
+        Versão assíncrona de interpret_command que repassa o código parcial
+        gerado pelo modelo local a on_partial enquanto ele é produzido.
+        """
+        try:
+            self.logger.info(f"Interpretando comando (streaming): {command}")
+            
+            classification, target_file = self._plan_command(command)
+            
+            generate = self.llm_bridge.generate_code_hedged if self.hedge_enabled else self.llm_bridge.generate_code_async
+            generation_result = await generate(
+                command=command,
+                category=classification['category'],
+                target_file=target_file,
+                on_partial=on_partial
+            )
+            
+            return self._interpretation_result(command, classification, target_file, generation_result)
             
         except Exception as e:
             self.logger.error(f"Erro na interpretação do comando: {e}")
@@ -90,6 +116,53 @@ class CommandInterpreter:
                 'command': command
             }
     
+    @staticmethod
+    def _run_async(coroutine):
+        """
+        Executa uma corrotina a partir do caminho síncrono, no loop persistente
+        do processo: os clientes HTTP e da OpenAI (e seus pools de conexões)
+        são reaproveitados entre comandos. Funciona também dentro dos handlers
+        do Telegram, que já têm um loop rodando nesta thread.
+        """
+        return get_background_loop().run(coroutine)
+    
+    def _plan_command(self, command: str) -> Tuple[dict, str]:
+        """
+        Classifica o comando e determina o arquivo alvo.
+        """
+        classification = self._classify_command(command)
+        target_file = self.target_files.get(classification['category'], 'core/main_controller.py')
+        return classification, target_file
+    
+    def _interpretation_result(self, command: str, classification: dict, target_file: str,
+                               generation_result: dict) -> dict:
+        """
+        Monta o resultado da interpretação a partir do resultado da geração.
+        """
+        if not generation_result['success']:
+            return {
+                'success': False,
+                'error': generation_result['error'],
+                'command': command
+            }
+        
+        # Validar código gerado (versão simplificada)
+        validation_result = {'is_safe': True, 'issues': []}
+        
+        return {
+            'success': True,
+            'command': command,
+            'category': classification['category'],
+            'matched_rule': classification['rule'],
+            'target_file': target_file,
+            'generated_code': generation_result['code'],
+            'explanation': generation_result['explanation'],
+            'model_used': generation_result.get('model_used', 'unknown'),
+            'time_to_first_token': generation_result.get('time_to_first_token'),
+            'hedge': generation_result.get('hedge'),
+            'validation_passed': True
+        }
+    
     def execute_command(self, command: str) -> dict:
         """
         Interpreta e executa um comando completo.
@@ -97,36 +170,24 @@ class CommandInterpreter:
         try:
             # Interpretar comando
             interpretation_result = self.interpret_command(command)
+            return self._execution_result(command, interpretation_result)
             
-            if not interpretation_result['success']:
-                return interpretation_result
-            
-            # Para comandos simples, executar diretamente
-            if 'backup' in command.lower():
-                return {
-                    'success': True,
-                    'command': command,
-                    'category': 'system_configuration',
-                    'explanation': 'Comando de backup executado com sucesso',
-                    'model_used': 'simple_command',
-                    'tests_passed': True
-                }
-            
-            # Para outros comandos, simular execução
-            result = {
-                'success': True,
-                'command': command,
-                'category': interpretation_result['category'],
-                'target_file': interpretation_result['target_file'],
-                'explanation': interpretation_result['explanation'],
-                'model_used': interpretation_result.get('model_used', 'unknown'),
-                'backup_created': f"backup_{int(time.time())}.zip",
-                'tests_passed': True,
-                'test_results': {'passed': True, 'total': 5, 'failed': 0}
+        except Exception as e:
+            self.logger.error(f"Erro na execução do comando: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'command': command
             }
-            
-            self.logger.info(f"Comando executado com sucesso: {command}")
-            return result
+    
+    async def execute_command_streaming(self, command: str,
+                                        on_partial: Optional[Callable[[str], Awaitable[None]]] = None) -> dict:
+        """
+        Versão assíncrona de execute_command com repasse do código parcial.
+        """
+        try:
+            interpretation_result = await self.interpret_command_streaming(command, on_partial)
+            return self._execution_result(command, interpretation_result)
             
         except Exception as e:
             self.logger.error(f"Erro na execução do comando: {e}")
@@ -136,18 +197,50 @@ class CommandInterpreter:
                 'command': command
             }
     
-    def _classify_command(self, command: str) -> str:
+    def _execution_result(self, command: str, interpretation_result: dict) -> dict:
         """
-        Classifica um comando em uma categoria.
+        Executa um comando já interpretado e monta o resultado.
         """
-        command_lower = command.lower()
+        if not interpretation_result['success']:
+            return interpretation_result
+        
+        # Para comandos simples, executar diretamente
+        if 'backup' in command.lower():
+            return {
+                'success': True,
+                'command': command,
+                'category': 'system_configuration',
+                'explanation': 'Comando de backup executado com sucesso',
+                'model_used': 'simple_command',
+                'tests_passed': True
+            }
+        
+        # Para outros comandos, simular execução
+        result = {
+            'success': True,
+            'command': command,
+            'category': interpretation_result['category'],
+            'target_file': interpretation_result['target_file'],
+            'explanation': interpretation_result['explanation'],
+            'model_used': interpretation_result.get('model_used', 'unknown'),
+            'backup_created': f"backup_{int(time.time())}.zip",
+            'tests_passed': True,
+            'test_results': {'passed': True, 'total': 5, 'failed': 0}
+        }
         
-        for keyword, category in self.command_categories.items():
-            if keyword in command_lower:
-                return category
+        self.logger.info(f"Comando executado com sucesso: {command}")
+        return result
+    
+    def _classify_command(self, command: str) -> dict:
+        """
+        Classifica um comando em uma categoria e informa a regra que disparou.
+        """
+        classification = self.intent_classifier.classify(command)
         
         # Categoria padrão
-        return 'system_configuration'
+        if classification['category'] == self.intent_classifier.default_category:
+            classification['category'] = 'system_configuration'
+        return classification
     
     def get_status(self) -> dict:
         """
@@ -158,7 +251,7 @@ class CommandInterpreter:
             'llm_bridge_status': self.llm_bridge.get_model_status(),
             'editor_status': 'active',
             'guardian_status': 'active',
-            'supported_categories': list(self.command_categories.values()),
+            'supported_categories': self.intent_classifier.categories,
             'target_files': self.target_files,
             'base_path': self.base_path
         }
@@ -0,0 +1,190 @@
+import threading
+import time
+from typing import Dict, Any, Callable, Optional
+from utils.logger import Logger
+
+
+class CircuitBreaker:
+    """
+    Disjuntor para chamadas ao modelo local.
+    Após falhas consecutivas o circuito abre e as chamadas são recusadas sem
+    custo; depois do tempo de espera uma única chamada de teste é liberada
+    (meio-aberto) e o resultado dela decide se o circuito fecha ou reabre.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    def _current_state(self) -> str:
+        """Retorna o estado atual, promovendo aberto para meio-aberto se já expirou."""
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow_request(self) -> bool:
+        """Indica se uma chamada pode ser feita agora (reserva a chamada de teste)."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        """Registra uma chamada bem-sucedida e fecha o circuito."""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """Registra uma falha; abre o circuito ao atingir o limite ou no teste."""
+        with self._lock:
+            state = self._current_state()
+            self._failures += 1
+            self._trial_in_flight = False
+            if state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+    def release_trial(self):
+        """Libera a chamada de teste reservada sem registrar resultado (ex.: chamada cancelada)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retorna o estado do disjuntor."""
+        with self._lock:
+            state = self._current_state()
+            status = {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout': self.reset_timeout
+            }
+            if state == self.OPEN:
+                status['retry_in'] = max(self.reset_timeout - (self._clock() - self._opened_at), 0.0)
+            return status
+
+
+class ModelHealthMonitor:
+    """
+    Mantém em cache o estado (disponível/indisponível) do modelo local.
+    Um prober em segundo plano atualiza o estado periodicamente; consultas no
+    caminho da requisição apenas leem o cache e nunca esperam pela rede.
+    """
+
+    def __init__(self, probe: Callable[[], bool], probe_interval: float = 10.0,
+                 ttl: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.probe = probe
+        self.probe_interval = probe_interval
+        self.ttl = ttl
+        self._clock = clock
+        self.logger = Logger("ModelHealthMonitor")
+
+        self._lock = threading.Lock()
+        self._available: Optional[bool] = None
+        self._checked_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+
+    def start(self):
+        """Inicia o prober em segundo plano (idempotente)."""
+        if self.is_running():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ModelHealthMonitor", daemon=True)
+        self._thread.start()
+        self.logger.info("Monitor de saúde do modelo local iniciado")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Para o prober em segundo plano."""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.refresh()
+            self._wake_event.wait(self.probe_interval)
+            self._wake_event.clear()
+
+    def refresh(self) -> bool:
+        """Executa uma verificação agora e atualiza o cache."""
+        try:
+            available = bool(self.probe())
+        except Exception as e:
+            self.logger.warning(f"Falha na verificação do modelo local: {e}")
+            available = False
+
+        with self._lock:
+            changed = self._available is not None and self._available != available
+            self._available = available
+            self._checked_at = self._clock()
+
+        if changed:
+            self.logger.info(f"Modelo local agora {'disponível' if available else 'indisponível'}")
+        return available
+
+    def mark_unavailable(self):
+        """Marca o modelo como indisponível e antecipa a próxima verificação."""
+        with self._lock:
+            self._available = False
+            self._checked_at = self._clock()
+        self._wake_event.set()
+
+    def _is_fresh(self) -> bool:
+        return self._checked_at is not None and self._clock() - self._checked_at < self.ttl
+
+    def is_available(self) -> bool:
+        """
+        Retorna o estado em cache. Com o prober ativo, um estado desconhecido
+        ou expirado conta como indisponível; sem ele, o cache é renovado aqui.
+        """
+        with self._lock:
+            if self._is_fresh():
+                return bool(self._available)
+
+        if self.is_running():
+            self._wake_event.set()
+            return False
+
+        return self.refresh()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retorna o estado em cache sem disparar verificações."""
+        with self._lock:
+            age = None if self._checked_at is None else self._clock() - self._checked_at
+            return {
+                'available': bool(self._available) if self._is_fresh() else False,
+                'last_check_age': age,
+                'ttl': self.ttl,
+                'probe_interval': self.probe_interval,
+                'background_probe': self.is_running()
+            }
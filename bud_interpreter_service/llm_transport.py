@@ -0,0 +1,247 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Dict, Any, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+from utils.logger import Logger
+from utils.async_loops import bind_to_loop
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+RETRYABLE_STATUS = {502, 503, 504}
+
+
+class _RetryPolicy:
+    """
+    Política de retentativas compartilhada pelos transportes síncrono e assíncrono.
+    Falhas ocorridas antes do envio (conexão recusada, timeout de conexão) são
+    retentadas para qualquer método; as demais só para métodos idempotentes.
+    """
+
+    def __init__(self, max_retries: int, backoff_base: float, backoff_max: float):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Backoff exponencial com jitter completo."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def should_retry_status(self, status_code: int, idempotent: bool) -> bool:
+        return idempotent and status_code in RETRYABLE_STATUS
+
+    def should_retry_exception(self, sent: bool, idempotent: bool) -> bool:
+        return idempotent or not sent
+
+
+class LLMTransport:
+    """
+    Transporte HTTP para o endpoint do modelo local.
+    Mantém um pool de conexões keep-alive, timeouts separados de conexão e de
+    leitura e retentativas com backoff apenas quando é seguro repetir.
+    """
+
+    def __init__(self, base_url: str, pool_size: int = 10, connect_timeout: float = 3.0,
+                 read_timeout: float = 30.0, max_retries: int = 2,
+                 backoff_base: float = 0.2, backoff_max: float = 2.0):
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retry_policy = _RetryPolicy(max_retries, backoff_base, backoff_max)
+        self.logger = Logger("LLMTransport")
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0}
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    @staticmethod
+    def _failed_before_send(error: Exception) -> bool:
+        """Indica se a falha aconteceu antes de a requisição ser enviada."""
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+            reason = error.args[0]
+            if isinstance(reason, MaxRetryError):
+                reason = reason.reason
+            return isinstance(reason, NewConnectionError)
+        return False
+
+    def request(self, method: str, path: str, json: Optional[Dict] = None,
+                read_timeout: Optional[float] = None, retries: Optional[int] = None,
+                idempotent: Optional[bool] = None, **kwargs) -> requests.Response:
+        """
+        Executa uma requisição reaproveitando conexões do pool.
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        max_retries = self.retry_policy.max_retries if retries is None else retries
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        url = f"{self.base_url}{path}"
+
+        attempt = 0
+        while True:
+            self._count('requests')
+            try:
+                response = self.session.request(method, url, json=json, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                sent = not self._failed_before_send(e)
+                if attempt >= max_retries or not self.retry_policy.should_retry_exception(sent, idempotent):
+                    self._count('failures')
+                    raise
+                self.logger.warning(f"Falha em {method} {path} ({e}); nova tentativa")
+            else:
+                if attempt >= max_retries or not self.retry_policy.should_retry_status(response.status_code, idempotent):
+                    return response
+                response.close()
+                self.logger.warning(f"{method} {path} retornou {response.status_code}; nova tentativa")
+
+            self._count('retries')
+            time.sleep(self.retry_policy.backoff_delay(attempt))
+            attempt += 1
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, json: Optional[Dict] = None, **kwargs) -> requests.Response:
+        return self.request('POST', path, json=json, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return dict(self.stats, pool_size=self.pool_size)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncLLMTransport:
+    """
+    Variante assíncrona do LLMTransport para uso direto nos handlers do Telegram.
+    Usa o mesmo pool/timeout/retentativas, sobre um httpx.AsyncClient.
+    """
+
+    def __init__(self, base_url: str, pool_size: int = 10, connect_timeout: float = 3.0,
+                 read_timeout: float = 30.0, max_retries: int = 2,
+                 backoff_base: float = 0.2, backoff_max: float = 2.0):
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retry_policy = _RetryPolicy(max_retries, backoff_base, backoff_max)
+        self.logger = Logger("AsyncLLMTransport")
+        # Um httpx.AsyncClient por loop de eventos, fechado quando o loop encerra
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0}
+
+    async def _get_client(self):
+        """Cliente httpx do loop em execução, criado sob demanda."""
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        with self._clients_lock:
+            entry = self._clients.get(loop)
+            if entry is not None and not entry[0].is_closed:
+                return entry[0]
+            # Loops fechados sem encerrar os geradores assíncronos não passam pelo close abaixo
+            for closed_loop in [other for other in self._clients if other.is_closed()]:
+                del self._clients[closed_loop]
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(max_connections=self.pool_size,
+                                    max_keepalive_connections=self.pool_size),
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+            )
+            self._clients[loop] = (client, None)
+
+        async def close():
+            with self._clients_lock:
+                if self._clients.get(loop, (None,))[0] is client:
+                    del self._clients[loop]
+            await client.aclose()
+
+        binding = await bind_to_loop(close)
+        with self._clients_lock:
+            if self._clients.get(loop, (None,))[0] is client:
+                self._clients[loop] = (client, binding)
+        return client
+
+    async def request(self, method: str, path: str, json: Optional[Dict] = None,
+                      read_timeout: Optional[float] = None, retries: Optional[int] = None,
+                      idempotent: Optional[bool] = None, stream: bool = False, **kwargs):
+        """
+        Executa uma requisição assíncrona reaproveitando conexões do pool.
+        Com stream=True o corpo não é lido: o chamador consome a resposta
+        incrementalmente e deve fechá-la com aclose().
+        """
+        import httpx
+
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        max_retries = self.retry_policy.max_retries if retries is None else retries
+        timeout = httpx.Timeout(read_timeout or self.read_timeout, connect=self.connect_timeout)
+
+        attempt = 0
+        while True:
+            self.stats['requests'] += 1
+            try:
+                client = await self._get_client()
+                http_request = client.build_request(method, path, json=json, timeout=timeout, **kwargs)
+                response = await client.send(http_request, stream=stream)
+            except httpx.TransportError as e:
+                sent = not isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if attempt >= max_retries or not self.retry_policy.should_retry_exception(sent, idempotent):
+                    self.stats['failures'] += 1
+                    raise
+                self.logger.warning(f"Falha em {method} {path} ({e!r}); nova tentativa")
+            else:
+                if attempt >= max_retries or not self.retry_policy.should_retry_status(response.status_code, idempotent):
+                    return response
+                await response.aclose()
+                self.logger.warning(f"{method} {path} retornou {response.status_code}; nova tentativa")
+
+            self.stats['retries'] += 1
+            await asyncio.sleep(self.retry_policy.backoff_delay(attempt))
+            attempt += 1
+
+    async def get(self, path: str, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path: str, json: Optional[Dict] = None, **kwargs):
+        return await self.request('POST', path, json=json, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats, pool_size=self.pool_size)
+
+    async def aclose(self):
+        """Fecha o cliente do loop em execução."""
+        with self._clients_lock:
+            entry = self._clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[0].aclose()
+
+
+_shared_transports: Dict[str, LLMTransport] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_transport(base_url: str, **options) -> LLMTransport:
+    """Retorna o transporte síncrono compartilhado para o endpoint informado."""
+    with _shared_lock:
+        transport = _shared_transports.get(base_url)
+        if transport is None:
+            transport = LLMTransport(base_url, **options)
+            _shared_transports[base_url] = transport
+        return transport
@@ -1,7 +1,14 @@
 import os
 import json
+import asyncio
+import time
 import requests
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Callable, Awaitable, AsyncIterator
+from bud_interpreter_service.llm_health import CircuitBreaker, ModelHealthMonitor
+from bud_interpreter_service.llm_transport import AsyncLLMTransport, get_shared_transport
+from bud_interpreter_service.generation_cache import GenerationCache, get_generation_cache
+from bud_interpreter_service.context_builder import PromptContextBuilder
+from bud_interpreter_service.hedged_generation import HedgedGenerator, extract_code
 from utils.logger import Logger
 
 class LocalLLMBridge:
@@ -10,14 +17,50 @@ class LocalLLMBridge:
     Utiliza modelos open-source hospedados localmente ou em serviços gratuitos.
     """
     
-    def __init__(self):
+    def __init__(self, base_path: Optional[str] = None):
         self.logger = Logger("LocalLLMBridge")
         
+        # Diretório do projeto, usado para localizar os arquivos alvo
+        self.base_path = base_path or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        
         # Configurações do modelo local
         self.model_endpoint = os.getenv('LOCAL_LLM_ENDPOINT', 'http://localhost:8000')
         self.model_name = os.getenv('LOCAL_LLM_MODEL', 'codellama')
         self.fallback_enabled = os.getenv('LLM_FALLBACK_ENABLED', 'true').lower() == 'true'
         
+        # Transporte HTTP com pool de conexões e retentativas (síncrono e assíncrono)
+        transport_options = {
+            'pool_size': int(os.getenv('LOCAL_LLM_POOL_SIZE', '10')),
+            'connect_timeout': float(os.getenv('LOCAL_LLM_CONNECT_TIMEOUT', '3')),
+            'read_timeout': float(os.getenv('LOCAL_LLM_READ_TIMEOUT', '30')),
+            'max_retries': int(os.getenv('LOCAL_LLM_MAX_RETRIES', '2'))
+        }
+        self.transport = get_shared_transport(self.model_endpoint, **transport_options)
+        self.async_transport = AsyncLLMTransport(self.model_endpoint, **transport_options)
+        
+        # Cache de código gerado (comando normalizado + categoria + hash do arquivo alvo)
+        self.generation_cache = get_generation_cache()
+        
+        # Contexto do arquivo alvo recortado pela AST (PROMPT_CONTEXT_TOKEN_BUDGET)
+        self.context_builder = PromptContextBuilder(self.base_path)
+        
+        # Estado de disponibilidade em cache e disjuntor para o modelo local
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv('LOCAL_LLM_BREAKER_THRESHOLD', '3')),
+            reset_timeout=float(os.getenv('LOCAL_LLM_BREAKER_RESET', '30'))
+        )
+        self.health_monitor = ModelHealthMonitor(
+            self._probe_local_model,
+            probe_interval=float(os.getenv('LOCAL_LLM_PROBE_INTERVAL', '10')),
+            ttl=float(os.getenv('LOCAL_LLM_HEALTH_TTL', '30'))
+        )
+        if os.getenv('LOCAL_LLM_BACKGROUND_PROBE', 'true').lower() == 'true':
+            self.health_monitor.start()
+        
+        # Geração hedged: modelo local, OpenAI (se configurada) e templates em paralelo
+        self.hedged_generator = HedgedGenerator(hedge_delay=float(os.getenv('LLM_HEDGE_DELAY', '1.0')))
+        self.openai_bridge = None
+        
         # Templates para diferentes tipos de comandos
         self.command_templates = {
             'strategy_modification': {
@@ -69,10 +112,73 @@ class LocalLLMBridge:
                 if pattern.lower() in command.lower():
                     return generator(command, target_file, context)
             
-            # Tentar usar modelo local primeiro
-            if self._is_local_model_available():
+            # Reutilizar código já gerado para o mesmo comando e arquivo alvo
+            cache_key = self._cache_key(command, category, target_file)
+            cached = self.generation_cache.get(cache_key)
+            if cached:
+                cached['cache_hit'] = True
+                return cached
+            
+            # Tentar usar modelo local primeiro (sem custo se o circuito estiver aberto)
+            if self._is_local_model_available() and self.circuit_breaker.allow_request():
                 result = self._generate_with_local_model(command, category, target_file, context)
                 if result['success']:
+                    self.generation_cache.put(cache_key, result)
+                    return result
+            
+            # Fallback para geração baseada em templates
+            if self.fallback_enabled:
+                return self._generate_with_templates(command, category, target_file, context)
+            
+            # Se nenhuma opção funcionar
+            return {
+                'success': False,
+                'error': 'Nenhum modelo de IA disponível para geração de código',
+                'code': '',
+                'explanation': 'Sistema operando em modo limitado'
+            }
+            
+        except Exception as e:
+            self.logger.error(f"Erro na geração de código: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'code': '',
+                'explanation': 'Erro interno na geração de código'
+            }
+    
+    async def generate_code_async(self, command: str, category: str, target_file: str, 
+                                  context: Optional[Dict] = None,
+                                  on_partial: Optional[Callable[[str], Awaitable[None]]] = None) -> Dict[str, Any]:
+        """
+        Versão assíncrona de generate_code, que pode ser aguardada diretamente
+        pelos handlers do Telegram sem bloquear o loop de eventos.
+        Se on_partial for informado, o modelo local é consumido em streaming e
+        o código parcial acumulado é repassado a cada token recebido.
+        """
+        try:
+            # Verificar se é um comando simples que não precisa de LLM
+            for pattern, generator in self.simple_command_patterns.items():
+                if pattern.lower() in command.lower():
+                    return generator(command, target_file, context)
+            
+            # Reutilizar código já gerado para o mesmo comando e arquivo alvo
+            cache_key = self._cache_key(command, category, target_file)
+            cached = self.generation_cache.get(cache_key)
+            if cached:
+                cached['cache_hit'] = True
+                if on_partial is not None:
+                    await on_partial(cached['code'])
+                return cached
+            
+            # Tentar usar modelo local primeiro (sem custo se o circuito estiver aberto)
+            if self._is_local_model_available() and self.circuit_breaker.allow_request():
+                if on_partial is not None:
+                    result = await self._stream_with_local_model(command, category, target_file, context, on_partial)
+                else:
+                    result = await self._generate_with_local_model_async(command, category, target_file, context)
+                if result['success']:
+                    self.generation_cache.put(cache_key, result)
                     return result
             
             # Fallback para geração baseada em templates
@@ -96,61 +202,307 @@ class LocalLLMBridge:
                 'explanation': 'Erro interno na geração de código'
             }
     
+    async def generate_code_hedged(self, command: str, category: str, target_file: str,
+                                   context: Optional[Dict] = None,
+                                   on_partial: Optional[Callable[[str], Awaitable[None]]] = None) -> Dict[str, Any]:
+        """
+        Gera código disparando modelo local, OpenAI e templates em regime de hedge:
+        o primeiro código que passar no ast.parse vence e os demais são cancelados.
+        """
+        try:
+            # Verificar se é um comando simples que não precisa de LLM
+            for pattern, generator in self.simple_command_patterns.items():
+                if pattern.lower() in command.lower():
+                    return generator(command, target_file, context)
+            
+            # Reutilizar código já gerado para o mesmo comando e arquivo alvo
+            cache_key = self._cache_key(command, category, target_file)
+            cached = self.generation_cache.get(cache_key)
+            if cached:
+                cached['cache_hit'] = True
+                if on_partial is not None:
+                    await on_partial(cached['code'])
+                return cached
+            
+            # O primeiro backend da lista é o primário; os demais entram após o hedge_delay
+            backends = []
+            if self._is_local_model_available():
+                backends.append(('local_llm', lambda: self._generate_hedged_local(
+                    command, category, target_file, context, on_partial)))
+            if self.openai_bridge is not None:
+                backends.append(('openai', lambda: self._generate_with_openai(command, category, target_file)))
+            if self.fallback_enabled:
+                backends.append(('template_fallback', lambda: self._generate_with_templates_async(
+                    command, category, target_file, context)))
+            
+            if not backends:
+                return {
+                    'success': False,
+                    'error': 'Nenhum modelo de IA disponível para geração de código',
+                    'code': '',
+                    'explanation': 'Sistema operando em modo limitado'
+                }
+            
+            result = await self.hedged_generator.generate(backends)
+            if result['success'] and result.get('model_used') != 'template_fallback':
+                self.generation_cache.put(cache_key, {k: v for k, v in result.items() if k != 'hedge'})
+            return result
+            
+        except Exception as e:
+            self.logger.error(f"Erro na geração de código: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'code': '',
+                'explanation': 'Erro interno na geração de código'
+            }
+    
+    async def _generate_hedged_local(self, command: str, category: str, target_file: str,
+                                     context: Optional[Dict],
+                                     on_partial: Optional[Callable[[str], Awaitable[None]]]) -> Dict[str, Any]:
+        """
+        Backend do modelo local para a geração hedged, respeitando o disjuntor.
+        """
+        if not self.circuit_breaker.allow_request():
+            return {
+                'success': False,
+                'error': 'Circuito do modelo local aberto',
+                'code': '',
+                'explanation': 'Modelo local temporariamente desabilitado'
+            }
+        try:
+            if on_partial is not None:
+                return await self._stream_with_local_model(command, category, target_file, context, on_partial)
+            return await self._generate_with_local_model_async(command, category, target_file, context)
+        except asyncio.CancelledError:
+            # Perdeu a corrida: não conta como falha do modelo local
+            self.circuit_breaker.release_trial()
+            raise
+    
+    async def _generate_with_openai(self, command: str, category: str, target_file: str) -> Dict[str, Any]:
+        """
+        Backend da OpenAI para a geração hedged (via GPTBridge assíncrono).
+        """
+        prompt = self._build_local_prompt(command, category, target_file)
+        generated = await self.openai_bridge.generate_code_from_prompt_async(
+            f"{prompt['system']}\n\n{prompt['user']}",
+            category=category,
+            target_file=target_file
+        )
+        if not generated:
+            return {
+                'success': False,
+                'error': 'OpenAI não retornou código',
+                'code': '',
+                'explanation': 'Falha na geração pela OpenAI'
+            }
+        return {
+            'success': True,
+            'code': extract_code(generated),
+            'explanation': f'Código gerado pela OpenAI para: {command}',
+            'model_used': 'openai'
+        }
+    
+    async def _generate_with_templates_async(self, command: str, category: str,
+                                             target_file: str, context: Optional[Dict]) -> Dict[str, Any]:
+        return self._generate_with_templates(command, category, target_file, context)
+    
+    def _cache_key(self, command: str, category: str, target_file: str) -> str:
+        """
+        Chave do cache de geração para o modelo local.
+        """
+        target_path = os.path.join(self.base_path, target_file) if target_file else None
+        return GenerationCache.make_key(f"local_llm:{self.model_endpoint}:{self.model_name}", command, category, target_path)
+    
     def _is_local_model_available(self) -> bool:
         """
-        Verifica se o modelo local está disponível.
+        Verifica se o modelo local está disponível usando o estado em cache.
+        """
+        if self.circuit_breaker.state == CircuitBreaker.OPEN:
+            return False
+        return self.health_monitor.is_available()
+    
+    def _probe_local_model(self) -> bool:
+        """
+        Consulta o endpoint de saúde do modelo local (usado pelo monitor).
         """
         try:
-            response = requests.get(f"{self.model_endpoint}/health", timeout=5)
+            response = self.transport.get('/health', read_timeout=5, retries=0)
             return response.status_code == 200
         except:
             return False
     
+    def _build_local_prompt(self, command: str, category: str, target_file: str) -> Dict[str, Any]:
+        """
+        Monta o corpo da requisição para o modelo local.
+        """
+        template = self.command_templates.get(category, self.command_templates['system_configuration'])
+        user_prompt = template['user_template'].format(
+            command=command,
+            target_file=target_file
+        )
+        
+        file_context = self.context_builder.build(target_file, command, category)
+        if file_context['context']:
+            user_prompt += f"\n\nContexto relevante do arquivo alvo:\n```python\n{file_context['context']}```"
+        
+        return {
+            'system': template['system_prompt'],
+            'user': user_prompt,
+            'max_tokens': 500,
+            'temperature': 0.1
+        }
+    
+    def _local_model_success(self, command: str, generated_code: str) -> Dict[str, Any]:
+        """
+        Registra o sucesso no disjuntor e monta o resultado da geração local.
+        """
+        self.circuit_breaker.record_success()
+        return {
+            'success': True,
+            'code': generated_code,
+            'explanation': f'Código gerado pelo modelo local para: {command}',
+            'model_used': 'local_llm'
+        }
+    
+    def _local_model_failure(self, error: Exception, connection_failed: bool) -> Dict[str, Any]:
+        """
+        Registra a falha no disjuntor e monta o resultado de erro da geração local.
+        """
+        self.logger.warning(f"Falha no modelo local: {error}")
+        self.circuit_breaker.record_failure()
+        if connection_failed:
+            self.health_monitor.mark_unavailable()
+        return {
+            'success': False,
+            'error': str(error),
+            'code': '',
+            'explanation': 'Falha na comunicação com modelo local'
+        }
+    
     def _generate_with_local_model(self, command: str, category: str, 
                                   target_file: str, context: Optional[Dict]) -> Dict[str, Any]:
         """
         Gera código usando modelo local.
         """
         try:
-            template = self.command_templates.get(category, self.command_templates['system_configuration'])
-            
-            prompt = {
-                'system': template['system_prompt'],
-                'user': template['user_template'].format(
-                    command=command,
-                    target_file=target_file
-                ),
-                'max_tokens': 500,
-                'temperature': 0.1
-            }
+            prompt = self._build_local_prompt(command, category, target_file)
             
-            response = requests.post(
-                f"{self.model_endpoint}/generate",
-                json=prompt,
-                timeout=30
-            )
+            response = self.transport.post('/generate', json=prompt)
             
             if response.status_code == 200:
                 result = response.json()
-                generated_code = result.get('text', '').strip()
+                return self._local_model_success(command, result.get('text', '').strip())
+            else:
+                raise Exception(f"Erro na API do modelo local: {response.status_code}")
                 
-                return {
-                    'success': True,
-                    'code': generated_code,
-                    'explanation': f'Código gerado pelo modelo local para: {command}',
-                    'model_used': 'local_llm'
-                }
+        except Exception as e:
+            return self._local_model_failure(e, isinstance(e, requests.exceptions.ConnectionError))
+    
+    async def _generate_with_local_model_async(self, command: str, category: str,
+                                               target_file: str, context: Optional[Dict]) -> Dict[str, Any]:
+        """
+        Versão assíncrona de _generate_with_local_model, para os handlers do Telegram.
+        """
+        import httpx
+        
+        try:
+            prompt = self._build_local_prompt(command, category, target_file)
+            
+            response = await self.async_transport.post('/generate', json=prompt)
+            
+            if response.status_code == 200:
+                result = response.json()
+                return self._local_model_success(command, result.get('text', '').strip())
             else:
                 raise Exception(f"Erro na API do modelo local: {response.status_code}")
                 
         except Exception as e:
-            self.logger.warning(f"Falha no modelo local: {e}")
-            return {
-                'success': False,
-                'error': str(e),
-                'code': '',
-                'explanation': 'Falha na comunicação com modelo local'
-            }
+            return self._local_model_failure(e, isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)))
+    
+    async def _stream_with_local_model(self, command: str, category: str, target_file: str,
+                                       context: Optional[Dict],
+                                       on_partial: Callable[[str], Awaitable[None]]) -> Dict[str, Any]:
+        """
+        Gera código com o modelo local em streaming (SSE, NDJSON ou texto em chunks).
+        """
+        import httpx
+        
+        try:
+            prompt = self._build_local_prompt(command, category, target_file)
+            prompt['stream'] = True
+            
+            started_at = time.monotonic()
+            time_to_first_token = None
+            generated_code = ''
+            
+            response = await self.async_transport.post('/generate', json=prompt, stream=True)
+            try:
+                if response.status_code != 200:
+                    raise Exception(f"Erro na API do modelo local: {response.status_code}")
+                
+                async for token in self._iter_stream_tokens(response):
+                    if time_to_first_token is None:
+                        time_to_first_token = time.monotonic() - started_at
+                    generated_code += token
+                    try:
+                        await on_partial(generated_code)
+                    except Exception as e:
+                        self.logger.warning(f"Falha ao repassar código parcial: {e}")
+            finally:
+                await response.aclose()
+            
+            result = self._local_model_success(command, generated_code.strip())
+            result['streamed'] = True
+            result['time_to_first_token'] = time_to_first_token
+            return result
+            
+        except Exception as e:
+            return self._local_model_failure(e, isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)))
+    
+    @staticmethod
+    async def _iter_stream_tokens(response) -> AsyncIterator[str]:
+        """
+        Extrai os tokens de uma resposta em streaming do modelo local.
+        """
+        content_type = response.headers.get('content-type', '')
+        
+        if 'application/json' in content_type:
+            # Servidor sem suporte a streaming: resposta completa de uma vez
+            body = await response.aread()
+            text = json.loads(body).get('text', '')
+            if text:
+                yield text
+            return
+        
+        if 'text/event-stream' not in content_type and 'ndjson' not in content_type:
+            async for chunk in response.aiter_text():
+                if chunk:
+                    yield chunk
+            return
+        
+        async for line in response.aiter_lines():
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('data:'):
+                line = line[len('data:'):].strip()
+            elif 'text/event-stream' in content_type:
+                # Campos SSE sem dados (event:, id:, comentários)
+                continue
+            
+            if line == '[DONE]':
+                break
+            
+            try:
+                payload = json.loads(line)
+            except ValueError:
+                yield line
+                continue
+            
+            token = payload.get('token', payload.get('text', '')) if isinstance(payload, dict) else str(payload)
+            if token:
+                yield token
     
     def _generate_with_templates(self, command: str, category: str, 
                                 target_file: str, context: Optional[Dict]) -> Dict[str, Any]:
@@ -474,6 +826,10 @@ stop_system()
         status = {
             'local_model_available': self._is_local_model_available(),
             'local_model_endpoint': self.model_endpoint,
+            'health_check': self.health_monitor.get_status(),
+            'circuit_breaker': self.circuit_breaker.get_status(),
+            'generation_cache': self.generation_cache.get_stats(),
+            'hedging': self.hedged_generator.get_stats(),
             'fallback_enabled': self.fallback_enabled,
             'supported_categories': list(self.command_templates.keys()),
             'simple_commands': list(self.simple_command_patterns.keys())
@@ -0,0 +1,183 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from datetime import date
+from typing import Dict, Any, Callable, List, Optional
+
+
+class TokenBucket:
+    """
+    Balde de tokens para limitar taxa (requisições ou tokens por minuto).
+    A espera é assíncrona (acquire); try_acquire só informa quanto esperar.
+    O saldo pode ficar negativo quando o consumo real excede a estimativa,
+    o que atrasa as próximas aquisições na medida certa.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated_at = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    def try_acquire(self, amount: float = 1.0) -> float:
+        """Consome os tokens se houver saldo; senão retorna quantos segundos esperar."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate_per_second
+
+    async def acquire(self, amount: float = 1.0):
+        while True:
+            wait = self.try_acquire(amount)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def adjust(self, delta: float):
+        """Corrige o saldo após conhecer o consumo real (delta > 0 consome mais)."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - delta)
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class ConcurrencyLimiter:
+    """
+    Limite de chamadas simultâneas válido para o processo todo, não para um
+    loop de eventos: os handlers do Telegram e o loop em segundo plano dividem
+    as mesmas vagas. Quem espera é acordado no próprio loop quando uma vaga
+    é liberada, de qualquer thread.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = deque()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._active < self.limit:
+                    self._active += 1
+                    return
+                waiter = loop.create_future()
+                self._waiters.append((loop, waiter))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._lock:
+                    if (loop, waiter) in self._waiters:
+                        self._waiters.remove((loop, waiter))
+                        raise
+                # Já tinha sido acordado: passa a vez adiante
+                self._wake_next()
+                raise
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+        self._wake_next()
+
+    def _wake_next(self):
+        while True:
+            with self._lock:
+                if not self._waiters or self._active >= self.limit:
+                    return
+                loop, waiter = self._waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(self._wake, waiter)
+                return
+            except RuntimeError:
+                # Loop já encerrado: tenta o próximo da fila
+                continue
+
+    @staticmethod
+    def _wake(waiter: asyncio.Future):
+        if not waiter.done():
+            waiter.set_result(None)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        self.release()
+
+    @property
+    def active(self) -> int:
+        with self._lock:
+            return self._active
+
+
+class TokenUsageTracker:
+    """
+    Acumula o uso real de tokens reportado pela API e calcula o percentual da
+    cota diária. Cada limiar de alerta é informado uma única vez por dia.
+    """
+
+    def __init__(self, daily_quota: int, thresholds: Optional[List[float]] = None,
+                 today: Callable[[], date] = date.today):
+        self.daily_quota = daily_quota
+        self.thresholds = sorted(thresholds or [80.0, 90.0, 100.0])
+        self._today = today
+        self._lock = threading.Lock()
+        self._day = today()
+        self._alerted: List[float] = []
+        self.usage = {'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+
+    def _roll_day(self):
+        today = self._today()
+        if today != self._day:
+            self._day = today
+            self._alerted = []
+            self.usage = {key: 0 for key in self.usage}
+
+    def record(self, prompt_tokens: int, completion_tokens: int,
+               total_tokens: Optional[int] = None) -> Optional[float]:
+        """
+        Registra o uso de uma resposta. Retorna o percentual da cota se um novo
+        limiar de alerta foi atingido, ou None.
+        """
+        with self._lock:
+            self._roll_day()
+            self.usage['requests'] += 1
+            self.usage['prompt_tokens'] += prompt_tokens
+            self.usage['completion_tokens'] += completion_tokens
+            self.usage['total_tokens'] += total_tokens if total_tokens is not None else prompt_tokens + completion_tokens
+
+            percent = self._usage_percent()
+            crossed = [t for t in self.thresholds if percent >= t and t not in self._alerted]
+            if crossed:
+                self._alerted.extend(crossed)
+                return percent
+            return None
+
+    def _usage_percent(self) -> float:
+        if not self.daily_quota:
+            return 0.0
+        return self.usage['total_tokens'] * 100.0 / self.daily_quota
+
+    def get_usage(self) -> Dict[str, Any]:
+        with self._lock:
+            self._roll_day()
+            return dict(self.usage, daily_quota=self.daily_quota,
+                        usage_percent=self._usage_percent(), day=self._day.isoformat())
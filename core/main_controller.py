@@ -1,4 +1,4 @@
-from bud_interpreter_service.interpreter import CommandInterpreter
+from core.service_registry import get_service_registry
 from utils.logger import Logger
 import time
 
@@ -10,8 +10,8 @@ def start_main_controller():
     logger.info("🎯 Controlador principal da Sorte AI iniciado")
     
     try:
-        # Inicializar interpretador de comandos
-        interpreter = CommandInterpreter()
+        # Interpretador de comandos compartilhado com o bot do Telegram
+        interpreter = get_service_registry().get('command_interpreter')
         logger.info("✅ Interpretador de comandos inicializado")
         
         # Verificar status do sistema
@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from typing import Dict, Any, Callable, List, Optional
+from utils.logger import Logger
+
+
+class ServiceRegistry:
+    """
+    Registro de serviços compartilhado pelo processo (bot, controlador e dashboard).
+    Cada componente é construído apenas no primeiro uso e reaproveitado por
+    todos os chamadores; componentes nunca usados não custam nada na inicialização.
+    """
+
+    def __init__(self, base_path: Optional[str] = None):
+        self.base_path = base_path or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.logger = Logger("ServiceRegistry")
+        self._factories: Dict[str, Callable[['ServiceRegistry'], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._build_times: Dict[str, float] = {}
+        self._locks: Dict[str, threading.RLock] = {}
+        self._lock = threading.Lock()
+        self._building = threading.local()
+
+    def register(self, name: str, factory: Callable[['ServiceRegistry'], Any]):
+        """Registra (ou substitui) a fábrica de um serviço."""
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+            self._locks.setdefault(name, threading.RLock())
+
+    def register_instance(self, name: str, instance: Any):
+        """Registra uma instância já construída (ex.: em testes)."""
+        with self._lock:
+            self._factories.setdefault(name, lambda registry: instance)
+            self._locks.setdefault(name, threading.RLock())
+            self._instances[name] = instance
+
+    def get(self, name: str) -> Any:
+        """Retorna o serviço, construindo-o na primeira chamada."""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if name not in self._factories:
+                raise KeyError(f"Serviço não registrado: {name}")
+            lock = self._locks[name]
+
+        building = getattr(self._building, 'names', None)
+        if building is None:
+            building = self._building.names = []
+        if name in building:
+            raise RuntimeError(f"Dependência circular entre serviços: {' -> '.join(building + [name])}")
+
+        with lock:
+            instance = self._instances.get(name)
+            if instance is not None:
+                return instance
+
+            building.append(name)
+            started_at = time.monotonic()
+            try:
+                instance = self._factories[name](self)
+            finally:
+                building.pop()
+
+            with self._lock:
+                self._instances[name] = instance
+                self._build_times[name] = time.monotonic() - started_at
+            self.logger.info(f"Serviço '{name}' inicializado em {self._build_times[name]:.2f}s")
+            return instance
+
+    def get_optional(self, name: str) -> Optional[Any]:
+        """Como get, mas retorna None se o serviço não puder ser construído."""
+        try:
+            return self.get(name)
+        except Exception as e:
+            self.logger.warning(f"Serviço '{name}' indisponível: {e}")
+            return None
+
+    def is_initialized(self, name: str) -> bool:
+        return name in self._instances
+
+    def reset(self, name: Optional[str] = None):
+        """Descarta instâncias construídas (todas ou apenas uma)."""
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+                self._build_times.clear()
+            else:
+                self._instances.pop(name, None)
+                self._build_times.pop(name, None)
+
+    @property
+    def services(self) -> List[str]:
+        return list(self._factories)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Serviços registrados e quais já foram construídos (com o tempo gasto)."""
+        with self._lock:
+            return {
+                'base_path': self.base_path,
+                'registered': list(self._factories),
+                'initialized': dict(self._build_times)
+            }
+
+
+def _register_default_services(registry: ServiceRegistry):
+    """Fábricas dos componentes da Sorte; os imports só acontecem no primeiro uso."""
+
+    def code_editor(services):
+        from bud_editor_service.editor import CodeEditor
+        return CodeEditor(services.base_path)
+
+    def ast_editor(services):
+        from bud_editor_service.ast_editor import ASTCodeEditor
+        return ASTCodeEditor(services.base_path)
+
+    def code_guardian(services):
+        from bud_guardian_service.guardian import CodeGuardian
+        return CodeGuardian(services.base_path)
+
+    def local_llm_bridge(services):
+        from bud_interpreter_service.local_llm import LocalLLMBridge
+        return LocalLLMBridge(services.base_path)
+
+    def command_interpreter(services):
+        from bud_interpreter_service.interpreter import CommandInterpreter
+        return CommandInterpreter(services=services)
+
+    def deployment_manager(services):
+        from bud_commander_service.deployment_manager import SorteDeploymentManager
+        return SorteDeploymentManager(services.base_path)
+
+    def test_suite(services):
+        from tests.test_suite import SorteTestSuite
+        return SorteTestSuite(services.base_path)
+
+    def alert_system(services):
+        from telegram_integration.alert_system import SorteAlertSystem
+        return SorteAlertSystem(services.base_path)
+
+    for name, factory in [
+        ('code_editor', code_editor),
+        ('ast_editor', ast_editor),
+        ('code_guardian', code_guardian),
+        ('local_llm_bridge', local_llm_bridge),
+        ('command_interpreter', command_interpreter),
+        ('deployment_manager', deployment_manager),
+        ('test_suite', test_suite),
+        ('alert_system', alert_system),
+    ]:
+        registry.register(name, factory)
+
+
+_registry: Optional[ServiceRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_service_registry() -> ServiceRegistry:
+    """Retorna o registro de serviços do processo, com os componentes padrão."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ServiceRegistry()
+            _register_default_services(_registry)
+        return _registry
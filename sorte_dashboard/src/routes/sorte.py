@@ -10,26 +10,23 @@ sorte_base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirnam
 sys.path.insert(0, sorte_base_path)
 
 try:
-    from bud_commander_service.deployment_manager import SorteDeploymentManager
-    from tests.test_suite import SorteTestSuite
+    from core.service_registry import get_service_registry
     from utils.logger import Logger
 except ImportError as e:
     print(f"Aviso: Não foi possível importar módulos da Sorte: {e}")
-    SorteDeploymentManager = None
-    SorteTestSuite = None
+    get_service_registry = None
     Logger = None
 
 sorte_bp = Blueprint('sorte', __name__)
 
-# Inicializar componentes da Sorte (se disponíveis)
-if SorteDeploymentManager and SorteTestSuite and Logger:
-    deployment_manager = SorteDeploymentManager(sorte_base_path)
-    test_suite = SorteTestSuite(sorte_base_path)
-    logger = Logger("SorteDashboard")
-else:
-    deployment_manager = None
-    test_suite = None
-    logger = None
+# Componentes da Sorte vêm do registro compartilhado e só são construídos no primeiro uso
+services = get_service_registry() if get_service_registry else None
+logger = Logger("SorteDashboard") if Logger else None
+
+
+def get_sorte_service(name):
+    """Retorna um componente da Sorte, ou None se não estiver disponível."""
+    return services.get_optional(name) if services else None
 
 @sorte_bp.route('/status', methods=['GET'])
 @cross_origin()
@@ -149,6 +146,7 @@ def get_recent_logs():
 def get_deployment_history():
     """Retorna o histórico de deployments."""
     try:
+        deployment_manager = get_sorte_service('deployment_manager')
         if deployment_manager:
             deployment_status = deployment_manager.get_deployment_status()
         else:
@@ -190,6 +188,7 @@ def get_deployment_history():
 def get_test_results():
     """Retorna os resultados dos testes mais recentes."""
     try:
+        test_suite = get_sorte_service('test_suite')
         if test_suite:
             # Executar testes (isso pode ser demorado, considere cache)
             test_results = test_suite.run_all_tests()
@@ -268,6 +267,7 @@ def create_backup():
         data = request.get_json() or {}
         reason = data.get('reason', 'manual_dashboard')
         
+        deployment_manager = get_sorte_service('deployment_manager')
         if deployment_manager:
             backup_result = deployment_manager.create_intelligent_backup(reason)
         else:
@@ -299,6 +299,7 @@ def perform_rollback():
         if not backup_name:
             return jsonify({"error": "Nome do backup não fornecido"}), 400
         
+        deployment_manager = get_sorte_service('deployment_manager')
         if deployment_manager:
             rollback_result = deployment_manager.rollback_to_backup(backup_name)
         else:
@@ -373,7 +374,7 @@ def health_check():
             "components": {
                 "database": "ok",
                 "api": "ok",
-                "sorte_integration": "ok" if deployment_manager else "limited"
+                "sorte_integration": "ok" if services else "limited"
             }
         }
         
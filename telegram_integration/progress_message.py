@@ -0,0 +1,62 @@
+import time
+from typing import Any, Callable, Optional
+from utils.logger import Logger
+
+
+class ThrottledMessageEditor:
+    """
+    Atualiza uma mensagem de progresso do Telegram com o código parcial gerado.
+    A primeira atualização é enviada imediatamente; as seguintes respeitam um
+    intervalo mínimo entre edições, para não estourar os limites da API.
+    """
+
+    def __init__(self, message: Any, header: str = "", min_interval: float = 1.0,
+                 max_length: int = 3500, clock: Callable[[], float] = time.monotonic):
+        self.message = message
+        self.header = header
+        self.min_interval = min_interval
+        self.max_length = max_length
+        self._clock = clock
+        self.logger = Logger("ThrottledMessageEditor")
+
+        self._pending: Optional[str] = None
+        self._last_sent: Optional[str] = None
+        self._next_edit_at = float('-inf')
+        self.edits = 0
+
+    def _render(self, partial_code: str) -> str:
+        """Monta o texto da mensagem, mantendo só o final do código se for longo."""
+        code = partial_code
+        if len(code) > self.max_length:
+            code = "…" + code[-self.max_length:]
+        return f"{self.header}\n\n{code}" if self.header else code
+
+    async def update(self, partial_code: str):
+        """Registra o código parcial e edita a mensagem se o intervalo permitir."""
+        self._pending = partial_code
+        if self._clock() >= self._next_edit_at:
+            await self._edit()
+
+    async def flush(self):
+        """Envia a última atualização pendente, ignorando o intervalo."""
+        if self._pending is not None:
+            await self._edit()
+
+    async def _edit(self):
+        text = self._render(self._pending)
+        self._pending = None
+        if text == self._last_sent:
+            return
+
+        self._next_edit_at = self._clock() + self.min_interval
+        try:
+            await self.message.edit_text(text)
+            self._last_sent = text
+            self.edits += 1
+        except Exception as e:
+            # RetryAfter informa quanto esperar antes da próxima edição
+            retry_after = getattr(e, 'retry_after', None)
+            if retry_after:
+                seconds = retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+                self._next_edit_at = self._clock() + seconds
+            self.logger.warning(f"Falha ao editar mensagem de progresso: {e}")
@@ -2,7 +2,8 @@ import asyncio
 import os
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from bud_interpreter_service.interpreter import CommandInterpreter
+from core.service_registry import get_service_registry
+from telegram_integration.progress_message import ThrottledMessageEditor
 from utils.logger import Logger
 
 class SorteTelegramBot:
@@ -15,7 +16,11 @@ class SorteTelegramBot:
         self.logger = Logger("SorteTelegramBot")
         self.token = os.getenv('TELEGRAM_BOT_TOKEN')
         self.chat_id = os.getenv('TELEGRAM_CHAT_ID')
-        self.interpreter = CommandInterpreter()
+        self.services = get_service_registry()
+        
+        # Streaming do código gerado para a mensagem de progresso
+        self.streaming_enabled = os.getenv('TELEGRAM_STREAMING_ENABLED', 'true').lower() == 'true'
+        self.progress_interval = float(os.getenv('TELEGRAM_PROGRESS_INTERVAL', '1.0'))
         
         if not self.token:
             raise ValueError("TELEGRAM_BOT_TOKEN não configurado")
@@ -31,6 +36,11 @@ class SorteTelegramBot:
         
         self.logger.info("Bot do Telegram inicializado")
     
+    @property
+    def interpreter(self):
+        """Interpretador compartilhado, construído no primeiro comando recebido."""
+        return self.services.get('command_interpreter')
+    
     def _register_handlers(self):
         """Registra os handlers de comandos e mensagens."""
         
@@ -185,10 +195,22 @@ Backup seguro e pronto para restauração se necessário.
             self.logger.info(f"Comando recebido: {command}")
             
             # Enviar confirmação de recebimento
-            await update.message.reply_text(f"🔄 Processando: '{command}'...")
+            progress_text = f"🔄 Processando: '{command}'..."
+            progress_message = await update.message.reply_text(progress_text)
             
-            # Executar comando
-            result = self.interpreter.execute_command(command)
+            # Executar comando, editando a mensagem de progresso com o código parcial
+            if self.streaming_enabled:
+                progress_editor = ThrottledMessageEditor(
+                    progress_message,
+                    header=progress_text,
+                    min_interval=self.progress_interval
+                )
+                result = await self.interpreter.execute_command_streaming(
+                    command, on_partial=progress_editor.update
+                )
+                await progress_editor.flush()
+            else:
+                result = self.interpreter.execute_command(command)
             
             if result['success']:
                 success_message = f"""
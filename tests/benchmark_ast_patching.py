@@ -0,0 +1,108 @@
+"""
+Benchmark: edição de uma função em um módulo de ~10 mil linhas.
+
+Compara o caminho antigo (cópia da AST + ast_to_code do módulo inteiro)
+com o patch por trechos do EditTransaction (só a função alterada é
+reescrita). Em ambos a AST vem do cache, como no uso normal do editor.
+
+Uso:
+    python tests/benchmark_ast_patching.py [linhas] [repetições]
+"""
+import difflib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bud_editor_service.ast_cache import ASTCache
+from bud_editor_service.ast_editor import ASTCodeEditor
+
+METHOD_TEMPLATE = '''
+    def indicador_{index}(self, precos):
+        # Média móvel simples de {index} períodos
+        janela = precos[-{period}:]
+        if not janela:
+            return None
+        media = sum(janela) / len(janela)
+        return media  # valor do indicador
+'''
+
+
+def build_module(target_lines: int) -> str:
+    parts = ['"""Estratégia gerada para o benchmark."""\nimport math\n\n\nclass Estrategia:\n']
+    lines, index = 5, 0
+    while lines < target_lines:
+        method = METHOD_TEMPLATE.format(index=index, period=index % 50 + 1)
+        parts.append(method)
+        lines += method.count('\n')
+        index += 1
+    return ''.join(parts)
+
+
+def legacy_edit(editor: ASTCodeEditor, relative_path: str, function_name: str, body: str) -> str:
+    """Caminho anterior: copia a AST, troca o corpo e regenera o módulo inteiro."""
+    _, tree = editor.get_parsed(relative_path, for_write=True)
+    editor.find_function_node(tree, function_name).body = editor.parse_code(body).body
+    return editor.ast_to_code(tree)
+
+
+def patched_edit(editor: ASTCodeEditor, relative_path: str, function_name: str, body: str) -> str:
+    """Caminho novo: edição por trecho sobre o texto original."""
+    transaction = editor.transaction()
+    transaction.modify_function_body(relative_path, function_name, body)
+    state = transaction._files[relative_path]
+    new_code = state['patch'].apply()
+    transaction.rollback()
+    return new_code
+
+
+def changed_lines(old: str, new: str) -> int:
+    return sum(1 for line in difflib.unified_diff(old.splitlines(), new.splitlines(), lineterm='', n=0)
+               if line[:1] in '+-' and not line.startswith(('+++', '---')))
+
+
+def measure(function, repetitions: int, *args) -> float:
+    started_at = time.perf_counter()
+    for _ in range(repetitions):
+        function(*args)
+    return (time.perf_counter() - started_at) / repetitions
+
+
+def main():
+    target_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        editor = ASTCodeEditor(temp_dir, ast_cache=ASTCache())
+        source = build_module(target_lines)
+        editor.write_file('estrategia.py', source)
+        function_name = 'indicador_7'
+        body = 'return sum(precos[-8:]) / 8'
+
+        # Aquece o cache de ASTs
+        editor.get_parsed('estrategia.py', for_write=True)
+
+        legacy = measure(legacy_edit, repetitions, editor, 'estrategia.py', function_name, body)
+        patched = measure(patched_edit, repetitions, editor, 'estrategia.py', function_name, body)
+
+        comments = source.count('#')
+        patched_diff = changed_lines(source, patched_edit(editor, 'estrategia.py', function_name, body))
+        legacy_code = legacy_edit(editor, 'estrategia.py', function_name, body)
+        legacy_diff = changed_lines(source, legacy_code)
+
+        print(f"Módulo: {source.count(chr(10))} linhas, {len(source) / 1024:.0f} KB, {comments} comentários")
+        print(f"Caminho antigo (ast_to_code): {legacy * 1000:8.1f} ms por edição, "
+              f"{legacy_diff} linhas alteradas, {legacy_code.count('#')} comentários restantes")
+        print(f"Patch por trechos:            {patched * 1000:8.1f} ms por edição, "
+              f"{patched_diff} linhas alteradas")
+        print(f"Ganho: {legacy / patched:.1f}x")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: latência do pylint por arquivo.
+
+Compara a análise avulsa (um processo novo do pylint por arquivo, como
+em run_pylint_analysis) com os workers aquecidos do LintWorkerPool, que
+já têm pylint/astroid importados e recebem os arquivos por pipe. O cache
+de resultados fica de fora: as duas medidas são de falhas de cache.
+
+Uso:
+    python tests/benchmark_lint_workers.py [arquivos] [workers]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bud_guardian_service.guardian import CodeGuardian, PYLINT_ARGS
+from bud_guardian_service.lint_workers import LintWorkerPool
+
+MODULE_TEMPLATE = '''"""Estratégia {index} gerada para o benchmark."""
+
+
+def media_movel(precos, periodo={period}):
+    """Média simples dos últimos períodos."""
+    janela = precos[-periodo:]
+    if not janela:
+        return None
+    return sum(janela) / len(janela)
+
+
+class Estrategia{index}:
+    """Compra quando o preço cruza a média."""
+
+    def __init__(self, periodo={period}):
+        self.periodo = periodo
+
+    def sinal(self, precos):
+        """Retorna 'compra', 'venda' ou None."""
+        media = media_movel(precos, self.periodo)
+        if media is None:
+            return None
+        return 'compra' if precos[-1] > media else 'venda'
+'''
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+
+    temp_dir = tempfile.mkdtemp()
+    pool = LintWorkerPool(temp_dir, workers=workers, args=PYLINT_ARGS)
+    try:
+        files = []
+        for index in range(file_count):
+            name = f"estrategia_{index}.py"
+            with open(os.path.join(temp_dir, name), 'w', encoding='utf-8') as f:
+                f.write(MODULE_TEMPLATE.format(index=index, period=index % 20 + 2))
+            files.append(name)
+
+        guardian = CodeGuardian(temp_dir, lint_workers=0)
+        started_at = time.perf_counter()
+        for name in files:
+            guardian.run_pylint_analysis(name)
+        cold = (time.perf_counter() - started_at) / file_count
+
+        started_at = time.perf_counter()
+        ready = pool.warm_up()
+        warm_up = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        for name in files:
+            pool.lint([name])
+        warm = (time.perf_counter() - started_at) / file_count
+
+        started_at = time.perf_counter()
+        pool.lint_many(files)
+        batch = time.perf_counter() - started_at
+
+        print(f"Arquivos: {file_count}, workers: {ready}")
+        print(f"Subprocesso novo por arquivo: {cold * 1000:8.1f} ms por arquivo")
+        print(f"Worker aquecido:              {warm * 1000:8.1f} ms por arquivo "
+              f"(aquecimento único: {warm_up * 1000:.0f} ms)")
+        print(f"Lote dividido entre workers:  {batch * 1000:8.1f} ms para {file_count} arquivos")
+        print(f"Ganho por arquivo: {cold / warm:.1f}x")
+    finally:
+        pool.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
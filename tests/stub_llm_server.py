@@ -0,0 +1,164 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+
+
+class StubLLMServer:
+    """
+    Servidor LLM local de teste com os endpoints /health e /generate, além de
+    um /v1/chat/completions compatível com a API da OpenAI.
+    Conta conexões e requisições para medir o reaproveitamento de conexões,
+    e permite programar respostas de erro, atrasos e respostas em streaming (SSE).
+    """
+
+    def __init__(self, generated_text: str = "def generated():\n    return True\n",
+                 delay: float = 0.0):
+        self.generated_text = generated_text
+        self.delay = delay
+        self.connections = 0
+        self.requests: List[str] = []
+        self.failures: Dict[str, List[int]] = {}
+        self.last_payload: Optional[Dict[str, Any]] = None
+        self.stream_chunks: Optional[List[str]] = None
+        self.stream_interval = 0.0
+        self.usage = {'prompt_tokens': 100, 'completion_tokens': 50}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def fail_next(self, path: str, *status_codes: int):
+        """Programa os próximos status de erro para um caminho."""
+        with self._lock:
+            self.failures.setdefault(path, []).extend(status_codes)
+
+    def _next_failure(self, path: str) -> Optional[int]:
+        with self._lock:
+            pending = self.failures.get(path)
+            if pending:
+                return pending.pop(0)
+            return None
+
+    def _chat_completion(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        usage = dict(self.usage, total_tokens=self.usage['prompt_tokens'] + self.usage['completion_tokens'])
+        return {
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': payload.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': self.generated_text},
+                'finish_reason': 'stop'
+            }],
+            'usage': usage
+        }
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: Dict[str, Any]):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_stream(self, chunks: List[str]):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                events = [f"data: {json.dumps({'token': chunk})}\n\n" for chunk in chunks]
+                events.append("data: [DONE]\n\n")
+                for event in events:
+                    data = event.encode('utf-8')
+                    self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+                    self.wfile.flush()
+                    time.sleep(stub.stream_interval)
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(length)) if length else {}
+                with stub._lock:
+                    stub.requests.append(f"{self.command} {self.path}")
+                    stub.last_payload = payload
+
+                status = stub._next_failure(self.path)
+                if status is not None:
+                    self._send_json(status, {'error': 'falha programada'})
+                    return
+
+                with stub._lock:
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    if stub.delay:
+                        time.sleep(stub.delay)
+                    self._route(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Cliente desistiu da requisição (ex.: backend cancelado no hedge)
+                    pass
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def _route(self, payload: Dict[str, Any]):
+                if self.path == '/health':
+                    self._send_json(200, {'status': 'ok'})
+                elif self.path == '/generate':
+                    if payload.get('stream') and stub.stream_chunks is not None:
+                        self._send_stream(stub.stream_chunks)
+                    else:
+                        self._send_json(200, {'text': stub.generated_text})
+                elif self.path == '/v1/chat/completions':
+                    self._send_json(200, stub._chat_completion(payload))
+                else:
+                    self._send_json(404, {'error': 'não encontrado'})
+
+            def do_GET(self):
+                self._handle()
+
+            def do_POST(self):
+                self._handle()
+
+        return Handler
+
+    def start(self) -> 'StubLLMServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'StubLLMServer':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -133,6 +133,7 @@ class SorteTestSuite:
         
         performance_results = {
             "command_interpretation_speed": self._test_command_interpretation_speed(),
+            "long_message_classification_speed": self._test_long_message_classification_speed(),
             "code_modification_speed": self._test_code_modification_speed(),
             "memory_usage": self._test_memory_usage(),
             "file_operations_speed": self._test_file_operations_speed()
@@ -141,6 +142,7 @@ class SorteTestSuite:
         # Critérios de performance (podem ser ajustados)
         performance_criteria = {
             "command_interpretation_speed": 5.0,  # segundos
+            "long_message_classification_speed": 2.0,  # segundos
             "code_modification_speed": 10.0,     # segundos
             "memory_usage": 500,                 # MB
             "file_operations_speed": 1.0        # segundos
@@ -402,13 +404,15 @@ def malicious_function():
             # Tentar analisar código malicioso
             tree = editor.parse_code(malicious_code)
             
-            # Verificar se a análise AST detecta padrões perigosos
-            dangerous_patterns = ['os.system', 'subprocess.call', 'eval', 'exec']
-            code_contains_danger = any(pattern in malicious_code for pattern in dangerous_patterns)
+            # Verificar se a análise de segurança da AST detecta as chamadas perigosas
+            from bud_guardian_service.security_rules import SecurityAnalyzer
+            report = SecurityAnalyzer(self.base_path).analyze_source(malicious_code)
+            detected = sorted({finding['detail'] for finding in report['findings']})
+            code_contains_danger = 'os.system' in detected and 'subprocess.call' in detected
             
             return {
-                "passed": tree is not None and code_contains_danger,  # AST deve funcionar, mas detectar perigo
-                "details": f"AST parsing funcionou, padrões perigosos detectados: {code_contains_danger}",
+                "passed": tree is not None and code_contains_danger and not report['passed'],  # AST deve funcionar, mas detectar perigo
+                "details": f"AST parsing funcionou, chamadas perigosas detectadas: {', '.join(detected)}",
                 "error": None
             }
             
@@ -457,6 +461,53 @@ def malicious_function():
                 "error": str(e)
             }
     
+    def _test_long_message_classification_speed(self) -> Dict[str, Any]:
+        """Testa velocidade de classificação de mensagens do tamanho real do Telegram."""
+        try:
+            import time
+            from bud_interpreter_service.advanced_interpreter import AdvancedCommandInterpreter
+            
+            interpreter = AdvancedCommandInterpreter(self.base_path)
+            
+            # Mensagens próximas do limite de 4096 caracteres do Telegram,
+            # como as replicadas a partir dos logs de comandos nas auditorias
+            filler = "analise o mercado e mantenha a posição atual por enquanto. "
+            base_commands = [
+                "seja mais agressiva com tendência de alta",
+                "reduzir risco das operações",
+                "otimizar performance do algoritmo",
+                "corrigir bug na execução",
+                "mensagem sem comando reconhecido"
+            ]
+            messages = []
+            for index in range(200):
+                command = base_commands[index % len(base_commands)]
+                padding = filler * (4096 // len(filler))
+                messages.append((padding + command)[-4096:])
+            
+            start_time = time.time()
+            for message in messages:
+                interpreter.classify_command(message)
+            end_time = time.time()
+            
+            total_time = end_time - start_time
+            avg_time = total_time / len(messages)
+            
+            return {
+                "value": total_time,
+                "average_per_message": avg_time,
+                "messages_tested": len(messages),
+                "message_length": 4096,
+                "details": f"Tempo total: {total_time:.3f}s, Média por mensagem: {avg_time * 1000:.3f}ms"
+            }
+            
+        except Exception as e:
+            return {
+                "value": float('inf'),
+                "details": f"Erro ao testar classificação de mensagens longas: {e}",
+                "error": str(e)
+            }
+    
     def _test_code_modification_speed(self) -> Dict[str, Any]:
         """Testa velocidade de modificação de código."""
         try:
@@ -488,7 +539,7 @@ class TestClass:
             # Limpar arquivo de teste
             try:
                 os.remove(os.path.join(self.base_path, test_file))
-                os.remove(os.path.join(self.base_path, f"{test_file}.backup"))
+                editor.undo_journal.discard(test_file)
             except:
                 pass
             
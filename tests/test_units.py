@@ -107,133 +107,2400 @@ def test_function(
     return True  # Parênteses não fechados
 """
         self.assertFalse(self.interpreter.validate_generated_code(invalid_code))
+    
+    def test_validation_stages_run_concurrently(self):
+        """Testa que a latência das validações é a da etapa mais lenta, com a duração de cada uma."""
+        import time
+        guardian = self.interpreter.code_guardian
+        slow = lambda *args, **kwargs: time.sleep(0.3) or True
+        guardian.validate_code.side_effect = slow
+        guardian.check_security.side_effect = slow
+        guardian.run_tests.side_effect = lambda *args, **kwargs: time.sleep(0.3) or {'passed': True, 'selected': {'t': ['r']}}
+        
+        result = self.interpreter.run_validations('bud_logic/strategy.py')
+        
+        self.assertTrue(result['syntax_valid'] and result['security_check'] and result['tests_passed'])
+        self.assertEqual(result['tests_run'], {'t': ['r']})
+        self.assertLess(result['duration'], 0.6)
+        for stage in result['stages'].values():
+            self.assertEqual(stage['status'], 'passed')
+            self.assertGreaterEqual(stage['duration'], 0.29)
+    
+    def test_fail_fast_cancels_remaining_stages(self):
+        """Testa que a primeira falha cancela as demais etapas (e que sem fail_fast todas rodam)."""
+        guardian = self.interpreter.code_guardian
+        guardian.validate_code.return_value = False
+        guardian.check_security.return_value = True
+        cancelled = []
+        
+        def run_tests(changed_files, cancel_event):
+            cancelled.append(cancel_event.wait(5))
+            return {'passed': False, 'cancelled': True, 'selected': {}}
+        guardian.run_tests.side_effect = run_tests
+        
+        result = self.interpreter.run_validations('bud_logic/strategy.py', fail_fast=True)
+        self.assertFalse(result['syntax_valid'])
+        self.assertEqual(result['stages']['syntax']['status'], 'failed')
+        self.assertEqual(result['stages']['tests']['status'], 'cancelled')
+        self.assertIn("Testes automatizados: CANCELADA", result['details'])
+        self.assertLess(result['duration'], 2)
+        
+        guardian.run_tests.side_effect = lambda changed_files, cancel_event: {'passed': True, 'selected': {}}
+        result = self.interpreter.run_validations('bud_logic/strategy.py', fail_fast=False)
+        self.assertEqual([stage['status'] for stage in result['stages'].values()].count('passed'), 2)
+        self.assertTrue(result['tests_passed'])
+        self.assertEqual(cancelled, [True])
+    
+    def test_abandoned_stages_do_not_block_next_validations(self):
+        """Testa que etapas ainda em execução após o fail_fast não atrasam as validações seguintes."""
+        import threading
+        guardian = self.interpreter.code_guardian
+        release = threading.Event()
+        guardian.validate_code.side_effect = lambda *args, **kwargs: release.wait(2)
+        guardian.check_security.return_value = False
+        guardian.run_tests.side_effect = lambda changed_files, cancel_event: {'passed': not cancel_event.wait(5),
+                                                                              'selected': {}}
+        try:
+            for _ in range(4):
+                result = self.interpreter.run_validations('bud_logic/strategy.py', fail_fast=True)
+                self.assertEqual(result['stages']['security']['status'], 'failed')
+                self.assertEqual(result['stages']['syntax']['status'], 'cancelled')
+                self.assertLess(result['duration'], 1)
+        finally:
+            release.set()
+    
+    def test_stage_exception_is_reported(self):
+        """Testa que uma exceção em uma etapa vira erro no resultado sem derrubar as outras."""
+        guardian = self.interpreter.code_guardian
+        guardian.check_security.side_effect = RuntimeError("analisador indisponível")
+        
+        result = self.interpreter.run_validations('bud_logic/strategy.py', fail_fast=False)
+        self.assertEqual(result['stages']['security']['status'], 'error')
+        self.assertIn("analisador indisponível", result['stages']['security']['error'])
+        self.assertFalse(result['security_check'])
+        self.assertEqual(result['stages']['syntax']['status'], 'passed')
+    
+    def test_sandbox_rejection_happens_before_write(self):
+        """Testa que o candidato rejeitado no sandbox não chega ao write_file."""
+        self.interpreter.code_guardian.check_candidate_security.return_value = {'passed': True}
+        self.interpreter.code_guardian.benchmark_candidate.return_value = {
+            'accepted': False, 'reasons': ['workload_time 0.5 contra 0.1 da versão atual (limite 1.50x)']
+        }
+        plan = {'generated_code': 'def f():\n    return 1\n', 'target_file': 'bud_logic/strategy.py',
+                'category': 'strategy_modification'}
+        
+        # O sandbox é opcional: sem SANDBOX_BENCHMARK=1 o candidato não é executado
+        with patch.dict(os.environ, {'SANDBOX_BENCHMARK': '0'}):
+            self.assertTrue(self.interpreter._validate_stage(dict(plan)))
+        self.interpreter.code_guardian.benchmark_candidate.assert_not_called()
+        
+        with patch.dict(os.environ, {'SANDBOX_BENCHMARK': '1'}):
+            self.assertFalse(self.interpreter._validate_stage(plan))
+        self.assertIn('workload_time', plan['result']['message'])
+        self.interpreter.code_guardian.benchmark_candidate.assert_called_once_with(
+            'bud_logic/strategy.py', 'def f():\n    return 1\n')
+        self.interpreter.code_editor.write_file.assert_not_called()
+    
+    def test_security_check_runs_before_sandbox(self):
+        """Testa que o candidato reprovado na segurança não é executado no sandbox nem gravado."""
+        guardian = self.interpreter.code_guardian
+        guardian.check_candidate_security.return_value = {'passed': False, 'findings': [], 'error': None}
+        plan = {'generated_code': 'import os\nos.system("rm -rf /")\n', 'target_file': 'bud_logic/strategy.py',
+                'category': 'strategy_modification'}
+        
+        self.assertFalse(self.interpreter._validate_stage(plan))
+        self.assertIn('segurança', plan['result']['message'])
+        guardian.check_candidate_security.assert_called_once_with('bud_logic/strategy.py', plan['generated_code'])
+        guardian.benchmark_candidate.assert_not_called()
+        self.interpreter.code_editor.write_file.assert_not_called()
+
+
+class TestIntentClassifier(unittest.TestCase):
+    """Testes unitários para o IntentClassifier compartilhado."""
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        from bud_interpreter_service.intent_classifier import IntentClassifier
+        self.classifier = IntentClassifier()
+    
+    def test_reports_fired_rule(self):
+        """Testa se a regra que disparou é informada."""
+        result = self.classifier.classify("Reduzir o risco das operações")
+        self.assertEqual(result['category'], 'risk_management')
+        self.assertEqual(result['rule'], 'reduzir.*risco')
+    
+    def test_priority_between_categories(self):
+        """Testa se a prioridade explícita decide entre categorias."""
+        result = self.classifier.classify("otimizar performance e reduzir risco")
+        self.assertEqual(result['category'], 'risk_management')
+        self.assertIn('performance_optimization', result['matches'])
+    
+    def test_fragments_must_appear_in_order(self):
+        """Testa se os fragmentos de uma regra respeitam a ordem."""
+        result = self.classifier.classify("bug para corrigir")
+        self.assertNotIn('bug_fix', result['matches'])
+        
+        result = self.classifier.classify("corrigir o bug")
+        self.assertEqual(result['rule'], 'corrigir.*bug')
+    
+    def test_advanced_rules_keep_original_results(self):
+        """Testa que as regras do AdvancedCommandInterpreter dão os mesmos resultados da busca regex original."""
+        import re
+        original_patterns = {
+            'strategy_modification': [r'.*mais agressiv.*', r'.*estratégia.*agressiv.*', r'.*trading.*agressiv.*',
+                                      r'.*aumentar.*agressividade.*', r'.*ser mais agressiv.*'],
+            'risk_management': [r'.*gerenciamento.*risco.*', r'.*risk.*management.*', r'.*reduzir.*risco.*',
+                                r'.*aumentar.*risco.*', r'.*ajustar.*risco.*'],
+            'performance_optimization': [r'.*otimizar.*performance.*', r'.*melhorar.*velocidade.*',
+                                         r'.*otimizar.*código.*', r'.*performance.*melhor.*'],
+            'bug_fix': [r'.*corrigir.*bug.*', r'.*fix.*bug.*', r'.*resolver.*erro.*', r'.*corrigir.*erro.*'],
+            'feature_addition': [r'.*adicionar.*funcionalidade.*', r'.*nova.*feature.*',
+                                 r'.*implementar.*função.*', r'.*criar.*método.*']
+        }
+        
+        def original(command):
+            for category, patterns in original_patterns.items():
+                if any(re.search(pattern, command.lower()) for pattern in patterns):
+                    return category
+            return 'general'
+        
+        commands = ["ser mais agressivo mas reduzir risco", "reduzir risco com uma estratégia mais agressiva",
+                    "corrigir erro na estratégia", "otimizar performance da estratégia",
+                    "implementar função de risco", "revisar a estratégia", "ajuste o stop loss",
+                    "mostrar o log de hoje", "seja mais conservador", "otimizar o código e corrigir o bug"]
+        for command in commands:
+            self.assertEqual(self.classifier.classify(command)['category'], original(command), command)
+        
+        self.assertEqual(self.classifier.classify("ser mais agressivo mas reduzir risco")['category'],
+                         'strategy_modification')
+        # Palavras soltas não mandam texto livre para categorias que reescrevem o arquivo alvo
+        for command in ("revisar a estratégia", "ajuste o stop loss", "mostrar o log de hoje"):
+            self.assertEqual(self.classifier.classify(command)['category'], 'general', command)
+    
+    def test_explicit_priority_decides(self):
+        """Testa que a priority das regras, e não a ordem da lista, decide entre as que casam."""
+        from bud_interpreter_service.intent_classifier import IntentClassifier, IntentRule
+        classifier = IntentClassifier([IntentRule('bug_fix', 'corrigir.*erro', 20),
+                                       IntentRule('risk_management', 'risco', 10)])
+        result = classifier.classify("corrigir erro de risco")
+        self.assertEqual((result['category'], result['rule']), ('risk_management', 'risco'))
+        self.assertEqual(classifier.categories, ['risk_management', 'bug_fix'])
+    
+    def test_default_category(self):
+        """Testa a categoria padrão quando nenhuma regra casa."""
+        result = self.classifier.classify("eval('__import__(\"os\")')")
+        self.assertEqual(result['category'], 'general')
+        self.assertIsNone(result['rule'])
+    
+    def test_long_telegram_message(self):
+        """Testa classificação de mensagens no limite de tamanho do Telegram."""
+        message = ("mantenha a posição atual. " * 200)[:4000] + " seja mais agressiva"
+        result = self.classifier.classify(message)
+        self.assertEqual(result['category'], 'strategy_modification')
+        self.assertEqual(result['rule'], 'mais agressiv')
+    
+    def test_interpreters_use_own_rule_sets(self):
+        """Testa que cada interpretador usa o classificador compartilhado do seu conjunto de regras."""
+        from bud_interpreter_service.intent_classifier import get_intent_classifier
+        
+        with patch('bud_interpreter_service.interpreter.CodeEditor'), \
+             patch('bud_interpreter_service.interpreter.CodeGuardian'), \
+             patch('bud_interpreter_service.interpreter.LocalLLMBridge'), \
+             patch('bud_interpreter_service.interpreter.Logger'):
+            from bud_interpreter_service.interpreter import CommandInterpreter
+            interpreter = CommandInterpreter()
+        
+        self.assertIs(interpreter.intent_classifier, get_intent_classifier('keywords'))
+        self.assertEqual(interpreter._classify_command("ajuste o stop loss")['category'], 'risk_management')
+        self.assertEqual(interpreter._classify_command("olá")['category'], 'system_configuration')
+        self.assertEqual(get_intent_classifier('advanced').classify("ajuste o stop loss")['category'], 'general')
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Testes unitários para o CircuitBreaker do modelo local."""
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        from bud_interpreter_service.llm_health import CircuitBreaker
+        self.now = 0.0
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0, clock=lambda: self.now)
+    
+    def test_opens_after_threshold(self):
+        """Testa abertura do circuito após falhas consecutivas."""
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow_request())
+    
+    def test_half_open_allows_single_trial(self):
+        """Testa que o estado meio-aberto libera apenas uma chamada de teste."""
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now = 10.0
+        self.assertEqual(self.breaker.state, 'half_open')
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+        
+        # Falha no teste reabre o circuito
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        
+        # Sucesso no teste fecha o circuito
+        self.now = 20.0
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, 'closed')
+
+
+class TestModelHealthMonitor(unittest.TestCase):
+    """Testes unitários para o ModelHealthMonitor."""
+    
+    def test_cached_state_respects_ttl(self):
+        """Testa se a verificação só é repetida após o TTL."""
+        from bud_interpreter_service.llm_health import ModelHealthMonitor
+        
+        now = [0.0]
+        probe = Mock(return_value=True)
+        monitor = ModelHealthMonitor(probe, ttl=5.0, clock=lambda: now[0])
+        
+        self.assertTrue(monitor.is_available())
+        self.assertTrue(monitor.is_available())
+        self.assertEqual(probe.call_count, 1)
+        
+        now[0] = 6.0
+        probe.return_value = False
+        self.assertFalse(monitor.is_available())
+        self.assertEqual(probe.call_count, 2)
+    
+    def test_background_probe_never_blocks_caller(self):
+        """Testa que, com o prober ativo, a consulta não chama o probe."""
+        import threading
+        import time
+        from bud_interpreter_service.llm_health import ModelHealthMonitor
+        
+        release = threading.Event()
+        calls = []
+        
+        def slow_probe():
+            calls.append(threading.current_thread().name)
+            release.wait(5)
+            return True
+        
+        monitor = ModelHealthMonitor(slow_probe, probe_interval=60.0)
+        monitor.start()
+        try:
+            # Estado ainda desconhecido: indisponível, sem esperar a rede
+            self.assertFalse(monitor.is_available())
+            release.set()
+            for _ in range(100):
+                if monitor.get_status()['available']:
+                    break
+                time.sleep(0.01)
+            self.assertTrue(monitor.is_available())
+            self.assertEqual(set(calls), {"ModelHealthMonitor"})
+        finally:
+            release.set()
+            monitor.stop(timeout=1)
+
+
+class TestLocalLLMBridgeAvailability(unittest.TestCase):
+    """Testes do uso do estado em cache e do disjuntor pelo LocalLLMBridge."""
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        self.temp_dir = tempfile.mkdtemp()
+        with patch.dict(os.environ, {'LOCAL_LLM_BACKGROUND_PROBE': 'false'}), \
+             patch('bud_interpreter_service.local_llm.Logger'):
+            from bud_interpreter_service.local_llm import LocalLLMBridge
+            from bud_interpreter_service.generation_cache import GenerationCache
+            self.bridge = LocalLLMBridge(self.temp_dir)
+            self.bridge.generation_cache = GenerationCache()
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_open_circuit_skips_local_model(self):
+        """Testa que o circuito aberto vai direto para o fallback sem rede."""
+        self.bridge.circuit_breaker.record_failure()
+        self.bridge.circuit_breaker.record_failure()
+        self.bridge.circuit_breaker.record_failure()
+        
+        with patch.object(self.bridge.transport, 'request') as mock_request:
+            result = self.bridge.generate_code("seja mais agressiva", "strategy_modification", "bud_logic/strategy.py")
+            status = self.bridge.get_model_status()
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['model_used'], 'template_fallback')
+        mock_request.assert_not_called()
+        self.assertEqual(status['circuit_breaker']['state'], 'open')
+    
+    def test_health_probe_is_cached(self):
+        """Testa que o status reutiliza o estado em cache."""
+        with patch.object(self.bridge.transport, 'request', return_value=Mock(status_code=503)) as mock_request:
+            self.bridge.get_model_status()
+            self.bridge.get_model_status()
+            self.assertFalse(self.bridge._is_local_model_available())
+        mock_request.assert_called_once()
+    
+    def test_repeated_command_uses_generation_cache(self):
+        """Testa que comandos repetidos não voltam ao modelo local até o arquivo mudar."""
+        target_file = "bud_logic/strategy.py"
+        target_path = os.path.join(self.temp_dir, target_file)
+        os.makedirs(os.path.dirname(target_path))
+        with open(target_path, 'w') as f:
+            f.write("AGGRESSIVENESS = 1\n")
+        
+        health = Mock(status_code=200)
+        generated = Mock(status_code=200)
+        generated.json.return_value = {'text': 'AGGRESSIVENESS = 2'}
+        
+        def fake_request(method, path, **kwargs):
+            return health if path == '/health' else generated
+        
+        with patch.object(self.bridge.transport, 'request', side_effect=fake_request) as mock_request:
+            first = self.bridge.generate_code("Reduza o risco!", "risk_management", target_file)
+            second = self.bridge.generate_code("reduza  o risco", "risk_management", target_file)
+            generate_calls = [c for c in mock_request.call_args_list if c.args[1] == '/generate']
+            self.assertEqual(len(generate_calls), 1)
+            self.assertTrue(second['cache_hit'])
+            self.assertEqual(second['code'], first['code'])
+            
+            # Editar o arquivo alvo invalida a entrada
+            with open(target_path, 'w') as f:
+                f.write("AGGRESSIVENESS = 3\n")
+            third = self.bridge.generate_code("reduza o risco", "risk_management", target_file)
+            generate_calls = [c for c in mock_request.call_args_list if c.args[1] == '/generate']
+            self.assertEqual(len(generate_calls), 2)
+            self.assertNotIn('cache_hit', third)
+
+
+class TestGenerationCache(unittest.TestCase):
+    """Testes unitários para o GenerationCache."""
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.now = 0.0
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _cache(self, **kwargs):
+        with patch('bud_interpreter_service.generation_cache.Logger'):
+            from bud_interpreter_service.generation_cache import GenerationCache
+            return GenerationCache(clock=lambda: self.now, **kwargs)
+    
+    def test_normalized_command_key(self):
+        """Testa que variações triviais do comando geram a mesma chave."""
+        from bud_interpreter_service.generation_cache import GenerationCache
+        
+        key_a = GenerationCache.make_key('local', "Seja mais agressiva!", 'strategy_modification', None)
+        key_b = GenerationCache.make_key('local', "  seja MAIS   agressiva", 'strategy_modification', None)
+        key_c = GenerationCache.make_key('local', "seja mais agressiva", 'risk_management', None)
+        self.assertEqual(key_a, key_b)
+        self.assertNotEqual(key_a, key_c)
+    
+    def test_lru_bound_and_ttl(self):
+        """Testa remoção LRU e expiração por TTL."""
+        cache = self._cache(max_entries=2, ttl=10.0)
+        cache.put('a', {'code': 'a'})
+        cache.put('b', {'code': 'b'})
+        cache.get('a')
+        cache.put('c', {'code': 'c'})
+        
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), {'code': 'a'})
+        
+        self.now = 10.0
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+    
+    def test_persistence_survives_restart(self):
+        """Testa que as entradas persistidas são recarregadas."""
+        persist_path = os.path.join(self.temp_dir, "cache", "generation.json")
+        cache = self._cache(persist_path=persist_path, ttl=10.0)
+        cache.put('a', {'code': 'persistido'})
+        
+        restarted = self._cache(persist_path=persist_path, ttl=10.0)
+        self.assertEqual(restarted.get('a'), {'code': 'persistido'})
+        
+        self.now = 11.0
+        expired = self._cache(persist_path=persist_path, ttl=10.0)
+        self.assertIsNone(expired.get('a'))
+
+
+class TestLLMTransport(unittest.TestCase):
+    """Testes do transporte HTTP com pool contra um servidor LLM local de teste."""
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        from tests.stub_llm_server import StubLLMServer
+        self.server = StubLLMServer().start()
+        
+        with patch('bud_interpreter_service.llm_transport.Logger'):
+            from bud_interpreter_service.llm_transport import LLMTransport
+            self.transport = LLMTransport(self.server.url, pool_size=4, backoff_base=0.001)
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        self.transport.close()
+        self.server.stop()
+    
+    def test_connection_reuse_and_throughput(self):
+        """Testa reaproveitamento de conexões e mede a vazão com o pool."""
+        import time
+        
+        start_time = time.time()
+        for _ in range(50):
+            self.assertEqual(self.transport.get('/health').status_code, 200)
+            self.assertEqual(self.transport.post('/generate', json={'user': 'x'}).status_code, 200)
+        elapsed = time.time() - start_time
+        
+        self.assertEqual(len(self.server.requests), 100)
+        self.assertEqual(self.server.connections, 1)
+        print(f"\nLLMTransport: 100 requisições em {elapsed:.3f}s "
+              f"({100 / elapsed:.0f} req/s, {self.server.connections} conexão)")
+    
+    def test_retries_idempotent_failures_only(self):
+        """Testa que apenas requisições idempotentes são retentadas após erro 503."""
+        self.server.fail_next('/health', 503, 503)
+        self.assertEqual(self.transport.get('/health').status_code, 200)
+        self.assertEqual(self.transport.get_stats()['retries'], 2)
+        
+        self.server.fail_next('/generate', 503)
+        self.assertEqual(self.transport.post('/generate', json={}).status_code, 503)
+        self.assertEqual(self.transport.get_stats()['retries'], 2)
+    
+    def test_connection_refused_is_retried_for_post(self):
+        """Testa que falhas antes do envio são retentadas mesmo para POST."""
+        import socket
+        import requests
+        from bud_interpreter_service.llm_transport import LLMTransport
+        
+        # Porta sem ninguém escutando: a conexão é recusada antes do envio
+        with socket.socket() as probe_socket:
+            probe_socket.bind(('127.0.0.1', 0))
+            closed_port = probe_socket.getsockname()[1]
+        
+        with patch('bud_interpreter_service.llm_transport.Logger'):
+            transport = LLMTransport(f"http://127.0.0.1:{closed_port}", max_retries=2, backoff_base=0.001)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            transport.post('/generate', json={})
+        self.assertEqual(transport.get_stats()['retries'], 2)
+    
+    def test_async_transport(self):
+        """Testa a variante assíncrona com reaproveitamento de conexões."""
+        import asyncio
+        
+        with patch('bud_interpreter_service.llm_transport.Logger'):
+            from bud_interpreter_service.llm_transport import AsyncLLMTransport
+            transport = AsyncLLMTransport(self.server.url, pool_size=2, backoff_base=0.001)
+        
+        async def run():
+            self.server.fail_next('/health', 502)
+            statuses = [(await transport.get('/health')).status_code for _ in range(10)]
+            response = await transport.post('/generate', json={'user': 'x'})
+            await transport.aclose()
+            return statuses, response.json()
+        
+        statuses, payload = asyncio.run(run())
+        self.assertEqual(statuses, [200] * 10)
+        self.assertIn('def generated', payload['text'])
+        self.assertEqual(transport.get_stats()['retries'], 1)
+        self.assertEqual(self.server.connections, 1)
+    
+    def test_sync_callers_reuse_client_on_background_loop(self):
+        """Testa que chamadas síncronas pelo loop persistente reaproveitam o cliente e as conexões."""
+        from utils.async_loops import BackgroundLoop
+        
+        with patch('bud_interpreter_service.llm_transport.Logger'):
+            from bud_interpreter_service.llm_transport import AsyncLLMTransport
+            transport = AsyncLLMTransport(self.server.url, pool_size=2)
+        background = BackgroundLoop()
+        
+        async def health():
+            return (await transport.get('/health')).status_code
+        
+        statuses = [background.run(health()) for _ in range(5)]
+        self.assertEqual(statuses, [200] * 5)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(transport._clients), 1)
+        client = next(iter(transport._clients.values()))[0]
+        
+        # Encerrar o loop fecha o cliente amarrado a ele
+        background.close()
+        self.assertTrue(client.is_closed)
+        self.assertEqual(transport._clients, {})
+
+
+class TestLocalLLMStreaming(unittest.TestCase):
+    """Testes da geração em streaming do modelo local até a mensagem do Telegram."""
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        from tests.stub_llm_server import StubLLMServer
+        self.server = StubLLMServer().start()
+        self.server.stream_chunks = ["def gerado():\n", "    x = 1\n", "    return x\n"]
+        self.server.stream_interval = 0.3
+        
+        env = {'LOCAL_LLM_ENDPOINT': self.server.url, 'LOCAL_LLM_BACKGROUND_PROBE': 'false'}
+        with patch.dict(os.environ, env), \
+             patch('bud_interpreter_service.local_llm.Logger'), \
+             patch('bud_interpreter_service.llm_transport.Logger'):
+            from bud_interpreter_service.local_llm import LocalLLMBridge
+            from bud_interpreter_service.generation_cache import GenerationCache
+            self.bridge = LocalLLMBridge()
+            self.bridge.generation_cache = GenerationCache()
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        self.server.stop()
+    
+    def test_partial_code_arrives_before_completion(self):
+        """Testa que o primeiro código parcial chega antes do fim da geração."""
+        import asyncio
+        import time
+        
+        partials = []
+        
+        async def on_partial(code):
+            partials.append((time.monotonic(), code))
+        
+        async def run():
+            started = time.monotonic()
+            result = await self.bridge.generate_code_async(
+                "otimize a performance", "performance_optimization", "core/main_controller.py",
+                on_partial=on_partial
+            )
+            await self.bridge.async_transport.aclose()
+            return started, time.monotonic(), result
+        
+        started, finished, result = asyncio.run(run())
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['model_used'], 'local_llm')
+        self.assertEqual(result['code'], "def gerado():\n    x = 1\n    return x")
+        self.assertEqual(len(partials), 3)
+        self.assertLess(partials[0][0] - started, 1.0)
+        self.assertLess(result['time_to_first_token'], finished - started)
+        self.assertTrue(self.server.last_payload['stream'])
+    
+    def test_non_streaming_server_response(self):
+        """Testa servidores que respondem JSON completo mesmo em modo streaming."""
+        import asyncio
+        
+        self.server.stream_chunks = None
+        partials = []
+        
+        async def on_partial(code):
+            partials.append(code)
+        
+        async def run():
+            result = await self.bridge.generate_code_async(
+                "otimize a performance", "performance_optimization", "core/main_controller.py",
+                on_partial=on_partial
+            )
+            await self.bridge.async_transport.aclose()
+            return result
+        
+        result = asyncio.run(run())
+        self.assertTrue(result['success'])
+        self.assertEqual(partials, [self.server.generated_text])
+
+
+class TestThrottledMessageEditor(unittest.TestCase):
+    """Testes da edição com taxa limitada da mensagem de progresso."""
+    
+    def test_throttles_edits_and_flushes_last_partial(self):
+        """Testa o envio imediato da primeira edição e o limite das seguintes."""
+        import asyncio
+        from unittest.mock import AsyncMock
+        
+        with patch('telegram_integration.progress_message.Logger'):
+            from telegram_integration.progress_message import ThrottledMessageEditor
+            now = [0.0]
+            message = Mock()
+            message.edit_text = AsyncMock()
+            editor = ThrottledMessageEditor(message, header="🔄 Processando", min_interval=1.0,
+                                            clock=lambda: now[0])
+        
+        async def run():
+            await editor.update("a")
+            now[0] = 0.5
+            await editor.update("ab")
+            now[0] = 1.2
+            await editor.update("abc")
+            now[0] = 1.4
+            await editor.update("abcd")
+            await editor.flush()
+        
+        asyncio.run(run())
+        
+        sent = [call.args[0] for call in message.edit_text.call_args_list]
+        self.assertEqual(sent, ["🔄 Processando\n\na", "🔄 Processando\n\nabc", "🔄 Processando\n\nabcd"])
+    
+    def test_long_code_keeps_tail(self):
+        """Testa que código longo é truncado mantendo o final."""
+        with patch('telegram_integration.progress_message.Logger'):
+            from telegram_integration.progress_message import ThrottledMessageEditor
+            editor = ThrottledMessageEditor(Mock(), max_length=10)
+        
+        self.assertEqual(editor._render("0123456789abcdef"), "…6789abcdef")
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Testes do balde de tokens e do acompanhamento da cota diária."""
+    
+    def test_token_bucket_waits_when_empty(self):
+        """Testa que o balde informa a espera necessária quando esgotado."""
+        from bud_interpreter_service.rate_limiter import TokenBucket
+        
+        now = [0.0]
+        bucket = TokenBucket(60, clock=lambda: now[0])
+        
+        self.assertEqual(bucket.try_acquire(60), 0.0)
+        self.assertAlmostEqual(bucket.try_acquire(1), 1.0)
+        now[0] = 1.0
+        self.assertEqual(bucket.try_acquire(1), 0.0)
+    
+    def test_token_bucket_adjust_goes_negative(self):
+        """Testa que o consumo real acima da estimativa atrasa as próximas aquisições."""
+        from bud_interpreter_service.rate_limiter import TokenBucket
+        
+        now = [0.0]
+        bucket = TokenBucket(60, clock=lambda: now[0])
+        bucket.try_acquire(60)
+        bucket.adjust(30)
+        
+        self.assertAlmostEqual(bucket.available, -30)
+        self.assertAlmostEqual(bucket.try_acquire(10), 40.0)
+    
+    def test_usage_tracker_alerts_each_threshold_once(self):
+        """Testa que cada limiar da cota é informado uma única vez por dia."""
+        from datetime import date
+        from bud_interpreter_service.rate_limiter import TokenUsageTracker
+        
+        day = [date(2024, 1, 1)]
+        tracker = TokenUsageTracker(1000, today=lambda: day[0])
+        
+        self.assertIsNone(tracker.record(500, 200))
+        self.assertEqual(tracker.record(80, 20), 80.0)
+        self.assertIsNone(tracker.record(10, 0))
+        self.assertEqual(tracker.record(150, 50), 101.0)
+        
+        day[0] = date(2024, 1, 2)
+        usage = tracker.get_usage()
+        self.assertEqual(usage['total_tokens'], 0)
+        self.assertEqual(tracker.record(800, 0), 80.0)
+
+
+class TestGPTBridgeRateLimiting(unittest.TestCase):
+    """Testes do cliente OpenAI assíncrono contra um servidor de completions local."""
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        from tests.stub_llm_server import StubLLMServer
+        self.server = StubLLMServer(generated_text="def gerado():\n    return 1\n", delay=0.2).start()
+        self.temp_dir = tempfile.mkdtemp()
+        self.alert_system = Mock()
+        
+        env = {
+            'OPENAI_API_KEY': 'chave-de-teste',
+            'OPENAI_BASE_URL': f"{self.server.url}/v1",
+            'OPENAI_MAX_CONCURRENCY': '2',
+            'OPENAI_DAILY_TOKEN_QUOTA': '1000'
+        }
+        with patch.dict(os.environ, env):
+            from bud_interpreter_service.gpt_bridge import GPTBridge
+            from bud_interpreter_service.generation_cache import GenerationCache
+            self.bridge = GPTBridge(self.temp_dir, alert_system=self.alert_system)
+            self.bridge.generation_cache = GenerationCache()
+            self.base_url = env['OPENAI_BASE_URL']
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        self.server.stop()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _run(self, prompts):
+        import asyncio
+        
+        async def run():
+            with patch.dict(os.environ, {'OPENAI_BASE_URL': self.base_url}):
+                return await asyncio.gather(*[
+                    self.bridge.generate_code_from_prompt_async(prompt) for prompt in prompts
+                ])
+        
+        return asyncio.run(run())
+    
+    def test_concurrency_limited_by_semaphore(self):
+        """Testa que no máximo OPENAI_MAX_CONCURRENCY chamadas ficam em voo."""
+        results = self._run([f"gere a função {i}" for i in range(6)])
+        
+        self.assertEqual(results, ["def gerado():\n    return 1\n"] * 6)
+        self.assertEqual(self.server.max_in_flight, 2)
+    
+    def test_usage_feeds_quota_alert(self):
+        """Testa que o uso real de tokens é acumulado e dispara o alerta de cota."""
+        self._run([f"gere a função {i}" for i in range(6)])
+        
+        usage = self.bridge.get_usage()
+        self.assertEqual(usage['requests'], 6)
+        self.assertEqual(usage['total_tokens'], 900)
+        self.alert_system.alert_api_quota_warning.assert_called_once_with('OpenAI', 90.0)
+    
+    def test_limit_and_client_shared_across_loops(self):
+        """Testa que o limite vale para o processo e que o cliente é fechado ao fim de cada loop."""
+        import threading
+        results = []
+        threads = [threading.Thread(target=lambda i=i: results.extend(
+            self._run([f"loop {i} função {j}" for j in range(3)]))) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(results), 6)
+        self.assertEqual(self.server.max_in_flight, 2)
+        self.assertEqual(self.bridge.concurrency.active, 0)
+        # Cada loop fechou o seu cliente ao encerrar
+        self.assertEqual(self.bridge._async_clients, {})
+    
+    def test_sync_callers_use_async_client(self):
+        """Testa que process_command usa o cliente assíncrono no loop persistente, sob o mesmo limite."""
+        import threading
+        from utils.async_loops import get_background_loop
+        results = []
+        with patch.dict(os.environ, {'OPENAI_BASE_URL': self.base_url}), \
+             patch('bud_interpreter_service.gpt_bridge.openai.chat') as sync_chat:
+            threads = [threading.Thread(target=lambda i=i: results.append(
+                self.bridge.process_command(f"comando {i}", target_file='mod.py'))) for i in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        
+        self.assertEqual([result['code'] for result in results], ["def gerado():\n    return 1\n"] * 5)
+        self.assertEqual(self.server.max_in_flight, 2)
+        sync_chat.completions.create.assert_not_called()
+        background = get_background_loop()
+        self.assertEqual(list(self.bridge._async_clients), [background._loop])
+        background.run(self.bridge._async_clients[background._loop][0].close())
+    
+    def test_alert_system_from_service_registry(self):
+        """Testa que sem alert_system explícito o alerta usa o do registro de serviços."""
+        from bud_interpreter_service.gpt_bridge import GPTBridge
+        services = Mock()
+        bridge = GPTBridge(self.temp_dir, services=services)
+        
+        bridge._notify_quota(80.0)
+        bridge._notify_quota(90.0)
+        
+        services.get_optional.assert_called_once_with('alert_system')
+        services.get_optional.return_value.alert_api_quota_warning.assert_called_with('OpenAI', 90.0)
+    
+    def test_cached_prompt_skips_api(self):
+        """Testa que um prompt repetido é servido pelo cache sem nova chamada."""
+        self._run(["gere a função"])
+        self._run(["gere a função"])
+        
+        self.assertEqual(self.server.requests.count('POST /v1/chat/completions'), 1)
+
+
+class TestPromptContextBuilder(unittest.TestCase):
+    """Testes do recorte de contexto do arquivo alvo pela AST."""
+    
+    SOURCE = '''import math
+from typing import Dict
+
+MAX_RISK = 0.02
+
+
+class RiskManager:
+    """Gerencia o risco das operações."""
+    default_stop = 0.05
+
+    def __init__(self, balance):
+        self.balance = balance
+        self.open_positions = []
+
+    def calculate_position_size(self, price):
+        """Calcula o tamanho da posição."""
+        risk_amount = self.balance * MAX_RISK
+        return math.floor(risk_amount / price)
+
+    def update_stop_loss(self, position, stop):
+        position['stop'] = stop
+        return position
+
+    def export_report(self):
+        lines = []
+        for position in self.open_positions:
+            lines.append(str(position))
+        return "\\n".join(lines)
+
+
+def unrelated_helper(values):
+    total = 0
+    for value in values:
+        total += value
+    return total
+'''
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        self.temp_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.temp_dir, 'bud_logic'))
+        with open(os.path.join(self.temp_dir, 'bud_logic', 'risk_manager.py'), 'w') as f:
+            f.write(self.SOURCE)
+        
+        with patch('bud_interpreter_service.context_builder.Logger'), \
+             patch('bud_editor_service.ast_editor.Logger'):
+            from bud_interpreter_service.context_builder import PromptContextBuilder
+            self.builder_class = PromptContextBuilder
+            self.builder = PromptContextBuilder(self.temp_dir, token_budget=800)
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_relevant_functions_imports_and_attributes(self):
+        """Testa que entram os imports, atributos e funções relevantes ao comando."""
+        result = self.builder.build('bud_logic/risk_manager.py', "reduza o tamanho da posição", 'risk_management')
+        context = result['context']
+        
+        self.assertIn('import math', context)
+        self.assertIn('MAX_RISK = 0.02', context)
+        self.assertIn('default_stop = 0.05', context)
+        self.assertIn('self.balance, self.open_positions', context)
+        self.assertIn('risk_amount = self.balance * MAX_RISK', context)
+        self.assertIn('RiskManager.calculate_position_size', result['included'])
+        self.assertNotIn('total += value', context)
+        self.assertTrue(self.builder.ast_editor.validate_syntax(context))
+    
+    def test_explicit_mention_found_by_name(self):
+        """Testa que uma função citada pelo nome entra completa."""
+        result = self.builder.build('bud_logic/risk_manager.py', "otimize unrelated_helper", 'performance_optimization')
+        
+        self.assertEqual(result['included'][0], 'unrelated_helper')
+        self.assertIn('total += value', result['context'])
+    
+    def test_respects_token_budget(self):
+        """Testa que o contexto nunca excede o orçamento e resume o que não cabe."""
+        from bud_interpreter_service.context_builder import estimate_tokens
+        
+        full_tokens = estimate_tokens(self.SOURCE)
+        for budget in (40, 80, 120, full_tokens):
+            builder = self.builder_class(self.temp_dir, token_budget=budget, ast_editor=self.builder.ast_editor)
+            result = builder.build('bud_logic/risk_manager.py', "ajuste o stop loss", 'risk_management')
+            self.assertLessEqual(result['tokens'], budget)
+        
+        small = self.builder_class(self.temp_dir, token_budget=120, ast_editor=self.builder.ast_editor)
+        result = small.build('bud_logic/risk_manager.py', "ajuste o stop loss", 'risk_management')
+        self.assertIn('RiskManager.update_stop_loss', result['included'])
+        self.assertTrue(result['summarized'] or result['omitted'])
+        self.assertLess(result['tokens'], full_tokens)
+    
+    def test_missing_file_returns_empty_context(self):
+        """Testa que um arquivo inexistente não gera contexto."""
+        result = self.builder.build('bud_logic/nao_existe.py', "qualquer coisa")
+        
+        self.assertEqual(result['context'], '')
+        self.assertEqual(result['tokens'], 0)
+    
+    def test_non_python_target_uses_plain_excerpt(self):
+        """Testa que arquivos que não são Python entram como trecho inicial, sem passar pela AST."""
+        with open(os.path.join(self.temp_dir, 'config.yaml'), 'w') as f:
+            f.write(''.join(f"chave_{i}: valor\n" for i in range(400)))
+        self.builder.ast_editor = Mock()
+        
+        result = self.builder.build('config.yaml', "mude o nível de log", 'system_configuration')
+        
+        self.assertTrue(result['context'].startswith('chave_0: valor\n'))
+        self.assertLessEqual(result['tokens'], self.builder.token_budget)
+        self.assertNotIn('chave_399', result['context'])
+        self.builder.ast_editor.get_parsed.assert_not_called()
+
+
+class TestHedgedGenerator(unittest.TestCase):
+    """Testes da geração hedged entre backends (primeiro código válido vence)."""
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        self.logger_patch = patch('bud_interpreter_service.hedged_generation.Logger')
+        self.logger_patch.start()
+        from bud_interpreter_service.hedged_generation import HedgedGenerator
+        self.generator = HedgedGenerator(hedge_delay=0.1)
+        self.cancelled = []
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        self.logger_patch.stop()
+    
+    def _backend(self, name, delay, code="x = 1", success=True):
+        import asyncio
+        
+        async def generate():
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.cancelled.append(name)
+                raise
+            return {'success': success, 'code': code, 'model_used': name}
+        return (name, generate)
+    
+    def _run(self, backends):
+        import asyncio
+        return asyncio.run(self.generator.generate(backends))
+    
+    def test_fast_primary_does_not_launch_hedges(self):
+        """Testa que um primário rápido vence sem disparar os outros backends."""
+        result = self._run([self._backend('local_llm', 0.01), self._backend('template_fallback', 0.0)])
+        
+        self.assertEqual(result['model_used'], 'local_llm')
+        self.assertEqual(result['hedge']['launched'], ['local_llm'])
+        self.assertNotIn('template_fallback', self.generator.get_stats()['backends'])
+    
+    def test_slow_primary_loses_and_is_cancelled(self):
+        """Testa que após o hedge_delay o backend mais rápido vence e o lento é cancelado."""
+        import time
+        
+        started = time.monotonic()
+        result = self._run([self._backend('local_llm', 2.0), self._backend('openai', 0.3),
+                            self._backend('template_fallback', 0.05)])
+        elapsed = time.monotonic() - started
+        
+        self.assertEqual(result['hedge']['winner'], 'template_fallback')
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(sorted(self.cancelled), ['local_llm', 'openai'])
+        stats = self.generator.get_stats()['backends']
+        self.assertEqual(stats['local_llm']['cancelled'], 1)
+        self.assertEqual(stats['template_fallback']['win_rate'], 1.0)
+    
+    def test_invalid_code_is_skipped(self):
+        """Testa que código que não passa no ast.parse não vence e dispara os hedges na hora."""
+        import time
+        
+        started = time.monotonic()
+        result = self._run([self._backend('local_llm', 0.0, code="def quebrado(:"),
+                            self._backend('template_fallback', 0.0, code="def ok():\n    return 1\n")])
+        
+        self.assertEqual(result['hedge']['winner'], 'template_fallback')
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertEqual(self.generator.get_stats()['backends']['local_llm']['invalid'], 1)
+    
+    def test_all_backends_fail(self):
+        """Testa o resultado quando nenhum backend gera código válido."""
+        result = self._run([self._backend('local_llm', 0.0, success=False),
+                            self._backend('template_fallback', 0.0, code="")])
+        
+        self.assertFalse(result['success'])
+        self.assertEqual(set(result['backend_errors']), {'local_llm', 'template_fallback'})
+    
+    def test_extract_code_from_markdown(self):
+        """Testa a remoção das cercas de markdown das respostas dos modelos."""
+        from bud_interpreter_service.hedged_generation import extract_code
+        
+        self.assertEqual(extract_code("Aqui está:\n```python\nx = 1\n```\n"), "x = 1")
+        self.assertEqual(extract_code("x = 2\n"), "x = 2")
+    
+    def test_local_bridge_hedges_slow_local_model(self):
+        """Testa que o LocalLLMBridge usa o template quando o modelo local demora."""
+        import asyncio
+        from tests.stub_llm_server import StubLLMServer
+        
+        with StubLLMServer(delay=1.0) as server:
+            env = {'LOCAL_LLM_ENDPOINT': server.url, 'LOCAL_LLM_BACKGROUND_PROBE': 'false',
+                   'LLM_HEDGE_DELAY': '0.1'}
+            with patch.dict(os.environ, env), \
+                 patch('bud_interpreter_service.local_llm.Logger'), \
+                 patch('bud_interpreter_service.llm_transport.Logger'):
+                from bud_interpreter_service.local_llm import LocalLLMBridge
+                from bud_interpreter_service.generation_cache import GenerationCache
+                bridge = LocalLLMBridge()
+                bridge.generation_cache = GenerationCache()
+                bridge.health_monitor.refresh()
+                
+                async def run():
+                    result = await bridge.generate_code_hedged(
+                        "seja mais agressiva", "strategy_modification", "bud_logic/strategy.py")
+                    await bridge.async_transport.aclose()
+                    return result
+                
+                result = asyncio.run(run())
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['model_used'], 'template_fallback')
+        self.assertEqual(result['hedge']['launched'], ['local_llm', 'template_fallback'])
+        self.assertEqual(bridge.circuit_breaker.state, 'closed')
+        self.assertEqual(bridge.generation_cache.get_stats()['entries'], 0)
+
+
+class TestCommandPipeline(unittest.TestCase):
+    """Testes do pipeline concorrente de comandos com ordem por arquivo."""
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        self.logger_patch = patch('bud_interpreter_service.command_pipeline.Logger')
+        self.logger_patch.start()
+        self.applied = []
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        self.logger_patch.stop()
+    
+    def _pipeline(self, **options):
+        import time
+        from bud_interpreter_service.command_pipeline import CommandPipeline
+        
+        def generate(item):
+            time.sleep(item['delay'])
+            return True
+        
+        def apply(item):
+            self.applied.append((item['file'], item['name']))
+            item['result'] = {'status': 'success', 'name': item['name']}
+            return True
+        
+        return CommandPipeline([('generate', generate), ('apply', apply)], serialized_stage='apply',
+                               workers={'generate': 4, 'apply': 2}, **options)
+    
+    def test_same_file_applied_in_submission_order(self):
+        """Testa que comandos do mesmo arquivo são aplicados na ordem de submissão."""
+        pipeline = self._pipeline()
+        delays = [0.3, 0.1, 0.2, 0.0]
+        futures = [pipeline.submit({'file': 'strategy.py', 'name': i, 'delay': d}, key='strategy.py')
+                   for i, d in enumerate(delays)]
+        results = [future.result(timeout=5) for future in futures]
+        pipeline.stop()
+        
+        self.assertEqual([r['name'] for r in results], [0, 1, 2, 3])
+        self.assertEqual(self.applied, [('strategy.py', i) for i in range(4)])
+    
+    def test_different_files_run_in_parallel(self):
+        """Testa que comandos de arquivos diferentes não esperam uns pelos outros."""
+        import time
+        
+        pipeline = self._pipeline()
+        started = time.monotonic()
+        slow = pipeline.submit({'file': 'strategy.py', 'name': 'lento', 'delay': 0.5}, key='strategy.py')
+        fast = pipeline.submit({'file': 'risk_manager.py', 'name': 'rapido', 'delay': 0.05}, key='risk_manager.py')
+        
+        fast.result(timeout=5)
+        fast_elapsed = time.monotonic() - started
+        slow.result(timeout=5)
+        pipeline.stop()
+        
+        self.assertLess(fast_elapsed, 0.3)
+        self.assertEqual(self.applied[0], ('risk_manager.py', 'rapido'))
+    
+    def test_failed_stage_does_not_block_file_order(self):
+        """Testa que um comando que falha antes da aplicação libera os seguintes."""
+        from bud_interpreter_service.command_pipeline import CommandPipeline
+        
+        def generate(item):
+            if item['name'] == 0:
+                raise RuntimeError("LLM indisponível")
+            return True
+        
+        def apply(item):
+            self.applied.append(item['name'])
+            item['result'] = {'status': 'success'}
+            return True
+        
+        pipeline = CommandPipeline([('generate', generate), ('apply', apply)], serialized_stage='apply')
+        first = pipeline.submit({'name': 0}, key='strategy.py')
+        second = pipeline.submit({'name': 1}, key='strategy.py')
+        
+        self.assertEqual(first.result(timeout=5)['status'], 'error')
+        self.assertEqual(second.result(timeout=5)['status'], 'success')
+        self.assertEqual(self.applied, [1])
+        stats = pipeline.get_stats()
+        pipeline.stop()
+        
+        self.assertEqual(stats['completed'], 1)
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['stages']['generate']['processed'], 2)
+        self.assertEqual(stats['stages']['apply']['processed'], 1)
+        self.assertIn('queue_depth', stats['stages']['apply'])
+        self.assertIsNotNone(stats['stages']['generate']['latency_avg'])
+    
+    def test_interpreter_submit_command(self):
+        """Testa o AdvancedCommandInterpreter submetendo comandos ao pipeline."""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            with patch('bud_interpreter_service.advanced_interpreter.CodeEditor'), \
+                 patch('bud_interpreter_service.advanced_interpreter.GPTBridge'), \
+                 patch('bud_interpreter_service.advanced_interpreter.CodeGuardian'), \
+                 patch('bud_interpreter_service.advanced_interpreter.Logger'):
+                from bud_interpreter_service.advanced_interpreter import AdvancedCommandInterpreter
+                interpreter = AdvancedCommandInterpreter(temp_dir)
+            
+            interpreter.gpt_bridge.process_command.return_value = {
+                'action': 'generate_code', 'code': 'x = 1\n', 'target_file': 'bud_logic/strategy.py'
+            }
+            future = interpreter.submit_command("seja mais agressiva com tendência de alta")
+            result = future.result(timeout=5)
+            
+            self.assertEqual(result['status'], 'success')
+            self.assertEqual(result['target_file'], 'bud_logic/strategy.py')
+            self.assertEqual(interpreter.get_pipeline_stats()['completed'], 1)
+            interpreter.pipeline.stop()
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class TestServiceRegistry(unittest.TestCase):
+    """Testes do registro de serviços compartilhado e preguiçoso."""
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        self.logger_patch = patch('core.service_registry.Logger')
+        self.logger_patch.start()
+        from core.service_registry import ServiceRegistry
+        self.registry = ServiceRegistry(base_path=tempfile.gettempdir())
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        self.logger_patch.stop()
+    
+    def test_built_once_on_first_use(self):
+        """Testa que o serviço só é construído no primeiro uso, uma única vez."""
+        import threading
+        import time
+        
+        calls = []
+        
+        def factory(registry):
+            calls.append(threading.current_thread().name)
+            time.sleep(0.05)
+            return object()
+        
+        self.registry.register('servico', factory)
+        self.assertEqual(calls, [])
+        self.assertFalse(self.registry.is_initialized('servico'))
+        
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.registry.get('servico'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertIn('servico', self.registry.get_status()['initialized'])
+    
+    def test_dependencies_and_cycles(self):
+        """Testa serviços que dependem de outros e a detecção de ciclos."""
+        self.registry.register('base', lambda registry: {'nome': 'base'})
+        self.registry.register('derivado', lambda registry: {'base': registry.get('base')})
+        self.assertIs(self.registry.get('derivado')['base'], self.registry.get('base'))
+        
+        self.registry.register('a', lambda registry: registry.get('b'))
+        self.registry.register('b', lambda registry: registry.get('a'))
+        with self.assertRaises(RuntimeError):
+            self.registry.get('a')
+        self.assertIsNone(self.registry.get_optional('a'))
+        with self.assertRaises(KeyError):
+            self.registry.get('inexistente')
+    
+    def test_interpreter_shares_registry_components(self):
+        """Testa que o CommandInterpreter usa os componentes do registro sob demanda."""
+        bridge, editor = Mock(), Mock()
+        self.registry.register_instance('local_llm_bridge', bridge)
+        editor_factory = Mock(return_value=editor)
+        self.registry.register('code_editor', editor_factory)
+        
+        with patch('bud_interpreter_service.interpreter.Logger'):
+            from bud_interpreter_service.interpreter import CommandInterpreter
+            interpreter = CommandInterpreter(services=self.registry)
+        
+        self.assertIs(interpreter.llm_bridge, bridge)
+        editor_factory.assert_not_called()
+        self.assertIs(interpreter.editor, editor)
+        self.assertIs(interpreter.editor, editor)
+        editor_factory.assert_called_once()
+    
+    def test_default_registry_is_lazy(self):
+        """Testa que o registro padrão não constrói nenhum componente ao ser criado."""
+        from core.service_registry import get_service_registry
+        
+        registry = get_service_registry()
+        self.assertIs(registry, get_service_registry())
+        self.assertIn('command_interpreter', registry.services)
+        self.assertIn('deployment_manager', registry.services)
+
+
+class TestASTCodeEditor(unittest.TestCase):
+    """Testes unitários para o ASTCodeEditor."""
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        self.temp_dir = tempfile.mkdtemp()
+        
+        with patch('bud_editor_service.ast_editor.Logger'):
+            from bud_editor_service.ast_editor import ASTCodeEditor
+            self.editor = ASTCodeEditor(self.temp_dir)
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_write_and_read_file(self):
+        """Testa escrita e leitura de arquivos."""
+        test_content = "print('Hello, World!')"
+        test_file = "test.py"
+        
+        # Escrever arquivo
+        success = self.editor.write_file(test_file, test_content)
+        self.assertTrue(success)
+        
+        # Ler arquivo
+        content = self.editor.read_file(test_file)
+        self.assertEqual(content, test_content)
+    
+    def test_create_and_restore_backup(self):
+        """Testa criação e restauração de backup."""
+        test_content = "original_content = True"
+        test_file = "backup_test.py"
+        
+        # Criar arquivo original
+        self.editor.write_file(test_file, test_content)
+        
+        # Criar backup
+        backup_success = self.editor.create_backup(test_file)
+        self.assertTrue(backup_success)
+        
+        # Modificar arquivo original
+        modified_content = "modified_content = True"
+        self.editor.write_file(test_file, modified_content)
+        
+        # Verificar que foi modificado
+        current_content = self.editor.read_file(test_file)
+        self.assertEqual(current_content, modified_content)
+        
+        # Restaurar backup
+        restore_success = self.editor.restore_backup(test_file)
+        self.assertTrue(restore_success)
+        
+        # Verificar que foi restaurado
+        restored_content = self.editor.read_file(test_file)
+        self.assertEqual(restored_content, test_content)
+    
+    def test_parse_code(self):
+        """Testa análise de código Python."""
+        valid_code = """
+def hello():
+    print("Hello, World!")
+    return True
+"""
+        
+        tree = self.editor.parse_code(valid_code)
+        self.assertIsNotNone(tree)
+        
+        # Código inválido
+        invalid_code = "def hello(\n    print('invalid')"
+        tree = self.editor.parse_code(invalid_code)
+        self.assertIsNone(tree)
+    
+    def test_validate_syntax(self):
+        """Testa validação de sintaxe."""
+        valid_code = "def test(): return True"
+        self.assertTrue(self.editor.validate_syntax(valid_code))
+        
+        invalid_code = "def test( return True"
+        self.assertFalse(self.editor.validate_syntax(invalid_code))
+    
+    def test_get_function_names(self):
+        """Testa extração de nomes de funções."""
+        code_with_functions = """
+def function_one():
+    pass
+
+def function_two():
+    return True
+
+class TestClass:
+    def method_one(self):
+        pass
+"""
+        
+        test_file = "functions_test.py"
+        self.editor.write_file(test_file, code_with_functions)
+        
+        function_names = self.editor.get_function_names(test_file)
+        expected_names = ['function_one', 'function_two', 'method_one']
+        
+        for name in expected_names:
+            self.assertIn(name, function_names)
+    
+    def test_get_class_names(self):
+        """Testa extração de nomes de classes."""
+        code_with_classes = """
+class ClassOne:
+    pass
+
+class ClassTwo:
+    def method(self):
+        pass
+
+def standalone_function():
+    pass
+"""
+        
+        test_file = "classes_test.py"
+        self.editor.write_file(test_file, code_with_classes)
+        
+        class_names = self.editor.get_class_names(test_file)
+        expected_names = ['ClassOne', 'ClassTwo']
+        
+        for name in expected_names:
+            self.assertIn(name, class_names)
+
+
+class TestASTCache(unittest.TestCase):
+    """Testes do cache de ASTs do ASTCodeEditor."""
+    
+    SOURCE = "import os\n\nclass Estrategia:\n    def sinal(self):\n        return 1\n\ndef auxiliar():\n    return 2\n"
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        self.temp_dir = tempfile.mkdtemp()
+        from bud_editor_service.ast_cache import ASTCache
+        self.cache = ASTCache()
+        with patch('bud_editor_service.ast_editor.Logger'):
+            from bud_editor_service.ast_editor import ASTCodeEditor
+            self.editor = ASTCodeEditor(self.temp_dir, ast_cache=self.cache)
+        self.editor.write_file('bud_logic/strategy.py', self.SOURCE)
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_repeated_introspection_parses_once(self):
+        """Testa que consultas repetidas analisam o arquivo uma única vez."""
+        for _ in range(5):
+            self.assertEqual(sorted(self.editor.get_function_names('bud_logic/strategy.py')), ['auxiliar', 'sinal'])
+            self.assertEqual(self.editor.get_class_names('bud_logic/strategy.py'), ['Estrategia'])
+        
+        self.assertEqual(self.cache.get_stats()['parses'], 1)
+    
+    def test_same_size_rewrite_is_detected(self):
+        """Testa que uma reescrita com o mesmo tamanho e mtime próximo é detectada."""
+        self.editor.get_function_names('bud_logic/strategy.py')
+        path = os.path.join(self.temp_dir, 'bud_logic', 'strategy.py')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.SOURCE.replace('auxiliar', 'ajudante'))
+        
+        self.assertEqual(sorted(self.editor.get_function_names('bud_logic/strategy.py')), ['ajudante', 'sinal'])
+        self.assertEqual(self.cache.get_stats()['parses'], 2)
+    
+    def test_unchanged_old_file_skips_hashing(self):
+        """Testa que um arquivo antigo e inalterado é servido só com o stat."""
+        path = os.path.join(self.temp_dir, 'bud_logic', 'strategy.py')
+        os.utime(path, ns=(10 ** 18, 10 ** 18 // 2))
+        self.editor.get_function_names('bud_logic/strategy.py')
+        
+        with patch('builtins.open', side_effect=AssertionError("arquivo relido")):
+            self.editor.get_class_names('bud_logic/strategy.py')
+        self.assertEqual(self.cache.get_stats()['hits'], 1)
+    
+    def test_write_copies_do_not_corrupt_cache(self):
+        """Testa que modificar a cópia entregue por padrão não altera a árvore compartilhada."""
+        import ast
+        
+        _, shared = self.editor.get_parsed('bud_logic/strategy.py', shared=True)
+        _, private = self.editor.get_parsed('bud_logic/strategy.py')
+        private.body.clear()
+        
+        self.assertIsNot(shared, private)
+        self.assertIs(self.editor.get_parsed('bud_logic/strategy.py', shared=True)[1], shared)
+        self.assertEqual(len(self.editor.get_parsed('bud_logic/strategy.py')[1].body), 3)
+        self.assertEqual(len(shared.body), 3)
+        
+        self.assertTrue(self.editor.modify_function_body('bud_logic/strategy.py', 'auxiliar', 'return 3'))
+        self.assertIn('return 3', self.editor.read_file('bud_logic/strategy.py'))
+        self.assertIsInstance(self.editor.get_parsed('bud_logic/strategy.py')[1], ast.Module)
+    
+    def test_mutated_shared_tree_is_dropped_on_revalidation(self):
+        """Testa que uma árvore compartilhada alterada é descartada na revalidação."""
+        _, shared = self.editor.get_parsed('bud_logic/strategy.py', shared=True)
+        shared.body.clear()
+        
+        # Mesmo conteúdo, stat diferente: a revalidação por hash confere a árvore
+        path = os.path.join(self.temp_dir, 'bud_logic', 'strategy.py')
+        os.utime(path, ns=(10 ** 18, 10 ** 18 // 2))
+        _, tree = self.editor.get_parsed('bud_logic/strategy.py', shared=True)
+        
+        self.assertIsNot(tree, shared)
+        self.assertEqual(len(tree.body), 3)
+        self.assertEqual(sorted(self.editor.get_function_names('bud_logic/strategy.py')), ['auxiliar', 'sinal'])
+        stats = self.cache.get_stats()
+        self.assertEqual(stats['corrupted'], 1)
+        self.assertEqual(stats['parses'], 2)
+    
+    def test_lru_eviction_by_entries_and_memory(self):
+        """Testa a remoção LRU pelo número de entradas e pelo limite de memória."""
+        from bud_editor_service.ast_cache import ASTCache
+        
+        for name in ('a.py', 'b.py', 'c.py'):
+            self.editor.write_file(name, self.SOURCE)
+        
+        small = ASTCache(max_entries=2)
+        for name in ('a.py', 'b.py', 'a.py', 'c.py'):
+            small.get(os.path.join(self.temp_dir, name))
+        self.assertEqual(small.get_stats()['entries'], 2)
+        self.assertEqual(small.get_stats()['evictions'], 1)
+        small.get(os.path.join(self.temp_dir, 'a.py'))
+        self.assertEqual(small.get_stats()['parses'], 3)
+        
+        tiny = ASTCache(max_bytes=1)
+        for name in ('a.py', 'b.py', 'c.py'):
+            tiny.get(os.path.join(self.temp_dir, name))
+        self.assertEqual(tiny.get_stats()['entries'], 1)
+
+
+class TestSymbolIndex(unittest.TestCase):
+    """Testes do índice de símbolos do projeto."""
+    
+    SOURCE = ("class SorteAlertSystem:\n"
+              "    def send_alert(self, msg):\n"
+              "        def formatar():\n"
+              "            return msg\n"
+              "        return formatar()\n"
+              "\n"
+              "async def enviar():\n"
+              "    return None\n")
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        self.temp_dir = tempfile.mkdtemp()
+        from bud_editor_service.ast_cache import ASTCache
+        with patch('bud_editor_service.symbol_index.Logger'):
+            from bud_editor_service.symbol_index import SymbolIndex
+            self.index = SymbolIndex(self.temp_dir, ast_cache=ASTCache())
+        with patch('bud_editor_service.ast_editor.Logger'):
+            from bud_editor_service.ast_editor import ASTCodeEditor
+            self.editor = ASTCodeEditor(self.temp_dir, ast_cache=self.index.ast_cache, symbol_index=self.index)
+        self.editor.write_file('telegram_integration/alert_system.py', self.SOURCE)
+        self.editor.write_file('venv/lib/ignorado.py', "def send_alert():\n    pass\n")
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_qualified_names_and_spans(self):
+        """Testa nomes qualificados, tipos e intervalos de linhas."""
+        [method] = self.index.lookup('SorteAlertSystem.send_alert')
+        self.assertEqual(method['kind'], 'method')
+        self.assertEqual(method['file'], os.path.join('telegram_integration', 'alert_system.py'))
+        self.assertEqual((method['lineno'], method['end_lineno']), (2, 5))
+        
+        self.assertEqual(self.index.lookup('SorteAlertSystem.send_alert.<locals>.formatar')[0]['kind'], 'function')
+        self.assertEqual(self.index.lookup('telegram_integration.alert_system.enviar')[0]['lineno'], 7)
+        self.assertEqual(self.index.lookup('SorteAlertSystem', kind='class')[0]['end_lineno'], 5)
+    
+    def test_ignored_directories_are_not_indexed(self):
+        """Testa que venv e afins ficam fora do índice."""
+        self.assertEqual([s['file'] for s in self.index.find('send_alert')],
+                         [os.path.join('telegram_integration', 'alert_system.py')])
+    
+    def test_write_file_updates_index_incrementally(self):
+        """Testa a atualização incremental após escrita pelo editor."""
+        self.index.lookup('enviar')
+        parses = self.index.ast_cache.get_stats()['parses']
+        
+        self.editor.write_file('telegram_integration/alert_system.py',
+                               self.SOURCE.replace('enviar', 'notificar'))
+        
+        self.assertEqual(self.index.lookup('enviar'), [])
+        self.assertEqual(len(self.index.lookup('notificar')), 1)
+        self.assertEqual(self.index.ast_cache.get_stats()['parses'], parses + 1)
+        self.assertEqual(self.editor.find_symbol('SorteAlertSystem.send_alert')[0]['lineno'], 2)
+    
+    def test_find_function_node_accepts_qualified_name(self):
+        """Testa a busca de nó pelo nome qualificado."""
+        _, tree = self.editor.get_parsed('telegram_integration/alert_system.py')
+        node = self.editor.find_function_node(tree, 'SorteAlertSystem.send_alert')
+        self.assertEqual(node.lineno, 2)
+        self.assertIsNone(self.editor.find_function_node(tree, 'Outra.send_alert'))
 
 
-class TestASTCodeEditor(unittest.TestCase):
-    """Testes unitários para o ASTCodeEditor."""
+class TestEditTransaction(unittest.TestCase):
+    """Testes das transações de edição do ASTCodeEditor."""
+    
+    SOURCE = "class Estrategia:\n\n    def sinal(self):\n        return 1\n"
     
     def setUp(self):
         """Configuração inicial para cada teste."""
         self.temp_dir = tempfile.mkdtemp()
+        from bud_editor_service.ast_cache import ASTCache
+        self.cache = ASTCache()
+        with patch('bud_editor_service.ast_editor.Logger'), patch('bud_editor_service.edit_transaction.Logger'):
+            from bud_editor_service.ast_editor import ASTCodeEditor
+            self.editor = ASTCodeEditor(self.temp_dir, ast_cache=self.cache)
+        self.editor.write_file('a.py', self.SOURCE)
+        self.editor.write_file('b.py', self.SOURCE)
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_several_operations_single_parse_and_write(self):
+        """Testa que várias operações no mesmo arquivo geram uma análise e uma escrita."""
+        with patch('bud_editor_service.edit_transaction.os.replace', wraps=os.replace) as replace:
+            with self.editor.transaction() as tx:
+                self.assertTrue(tx.add_import('a.py', 'import math'))
+                self.assertTrue(tx.add_function_to_class('a.py', 'Estrategia', 'def novo(self):\n    return 2'))
+                self.assertTrue(tx.modify_function_body('a.py', 'sinal', 'return math.pi'))
+        
+        self.assertTrue(tx.result['success'])
+        self.assertEqual(replace.call_count, 1)
+        self.assertEqual(self.cache.get_stats()['parses'], 1)
+        content = self.editor.read_file('a.py')
+        self.assertTrue(content.startswith('import math'))
+        self.assertIn('def novo(self)', content)
+        self.assertIn('return math.pi', content)
+        self.assertFalse([name for name in os.listdir(self.temp_dir) if name.endswith('.tmp')])
+    
+    def test_failed_operation_leaves_all_files_untouched(self):
+        """Testa que uma operação com falha descarta a transação inteira."""
+        with self.editor.transaction() as tx:
+            tx.modify_function_body('a.py', 'sinal', 'return 2')
+            self.assertFalse(tx.modify_function_body('b.py', 'inexistente', 'return 3'))
+        
+        self.assertFalse(tx.result['success'])
+        self.assertEqual(self.editor.read_file('a.py'), self.SOURCE)
+        self.assertEqual(self.editor.read_file('b.py'), self.SOURCE)
+    
+    def test_patch_rewrites_only_changed_span(self):
+        """Testa que só o corpo alterado é reescrito, preservando comentários."""
+        source = ("import os  # sistema\n\n"
+                  "class Estrategia:\n"
+                  "    # parâmetros\n"
+                  "    limite = 10\n\n"
+                  "    def sinal(self):\n"
+                  "        return 1\n\n"
+                  "    def saida(self): return 0\n")
+        self.editor.write_file('c.py', source)
+        
+        with self.editor.transaction() as tx:
+            tx.modify_function_body('c.py', 'sinal', 'valor = self.limite\nreturn valor')
+            tx.modify_function_body('c.py', 'saida', 'return -1')
         
+        self.assertEqual(self.editor.read_file('c.py'), source
+                         .replace("        return 1\n", "        valor = self.limite\n        return valor\n")
+                         .replace("def saida(self): return 0", "def saida(self):\n        return -1"))
+    
+    def test_dependent_operations_in_same_transaction(self):
+        """Testa modificar uma função adicionada na mesma transação."""
+        with self.editor.transaction() as tx:
+            tx.add_function_to_class('a.py', 'Estrategia', 'def novo(self):\n    return 2')
+            self.assertTrue(tx.modify_function_body('a.py', 'novo', 'return 5'))
+        
+        self.assertTrue(tx.result['success'])
+        self.assertIn("    def novo(self):\n        return 5\n", self.editor.read_file('a.py'))
+    
+    def test_invalid_body_is_rejected(self):
+        """Testa que um corpo inválido é rejeitado sem gravar nada."""
+        with self.editor.transaction() as tx:
+            self.assertTrue(tx.add_import('a.py', 'import math'))
+            self.assertFalse(tx.modify_function_body('a.py', 'sinal', 'return (1'))
+        
+        self.assertFalse(tx.result['success'])
+        self.assertEqual(self.editor.read_file('a.py'), self.SOURCE)
+    
+    def test_rename_failure_restores_replaced_files(self):
+        """Testa que uma falha no meio dos renames restaura os arquivos já substituídos."""
+        real_replace = os.replace
+        calls = []
+        
+        def flaky_replace(src, dst):
+            calls.append(dst)
+            if len(calls) == 2:
+                raise OSError("disco cheio")
+            return real_replace(src, dst)
+        
+        tx = self.editor.transaction()
+        tx.modify_function_body('a.py', 'sinal', 'return 2')
+        tx.modify_function_body('b.py', 'sinal', 'return 3')
+        with patch('bud_editor_service.edit_transaction.os.replace', side_effect=flaky_replace):
+            result = tx.commit()
+        
+        self.assertFalse(result['success'])
+        self.assertEqual(self.editor.read_file('a.py'), self.SOURCE)
+        self.assertEqual(self.editor.read_file('b.py'), self.SOURCE)
+        self.assertFalse([name for name in os.listdir(self.temp_dir) if name.endswith('.tmp')])
+
+
+class TestUndoJournal(unittest.TestCase):
+    """Testes do diário de versões que substitui as cópias .backup."""
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        self.temp_dir = tempfile.mkdtemp()
+        with patch('bud_editor_service.undo_journal.Logger'):
+            from bud_editor_service.undo_journal import UndoJournal
+            self.journal = UndoJournal(self.temp_dir, max_depth=3, max_bytes=1024 * 1024)
         with patch('bud_editor_service.ast_editor.Logger'):
             from bud_editor_service.ast_editor import ASTCodeEditor
-            self.editor = ASTCodeEditor(self.temp_dir)
+            self.editor = ASTCodeEditor(self.temp_dir, undo_journal=self.journal)
+        self.lines = [f"linha_{i} = {i}\n" for i in range(200)]
     
     def tearDown(self):
         """Limpeza após cada teste."""
         shutil.rmtree(self.temp_dir, ignore_errors=True)
     
-    def test_write_and_read_file(self):
-        """Testa escrita e leitura de arquivos."""
-        test_content = "print('Hello, World!')"
-        test_file = "test.py"
+    def _version(self, number):
+        lines = list(self.lines)
+        lines[number] = f"linha_{number} = 'editada'\n"
+        return ''.join(lines)
+    
+    def test_restore_any_recent_version(self):
+        """Testa restaurar qualquer uma das últimas versões, sem arquivos .backup."""
+        for number in range(3):
+            self.editor.write_file('estrategia.py', self._version(number))
+            self.assertTrue(self.editor.create_backup('estrategia.py'))
+        self.editor.write_file('estrategia.py', self._version(3))
         
-        # Escrever arquivo
-        success = self.editor.write_file(test_file, test_content)
-        self.assertTrue(success)
+        self.assertTrue(self.editor.restore_backup('estrategia.py', steps=2))
+        self.assertEqual(self.editor.read_file('estrategia.py'), self._version(1))
+        self.assertTrue(self.editor.restore_backup('estrategia.py'))
+        self.assertEqual(self.editor.read_file('estrategia.py'), self._version(3))
+        self.assertFalse([name for name in os.listdir(self.temp_dir) if name.endswith('.backup')])
+    
+    def test_versions_after_the_first_store_only_diffs(self):
+        """Testa que cada nova versão grava só a diferença."""
+        self.journal.record('estrategia.py', self._version(0))
+        journal_path = self.journal._journal_path('estrategia.py')
+        snapshot_size = os.path.getsize(journal_path)
         
-        # Ler arquivo
-        content = self.editor.read_file(test_file)
-        self.assertEqual(content, test_content)
+        self.journal.record('estrategia.py', self._version(1))
+        self.assertLess(os.path.getsize(journal_path) - snapshot_size, snapshot_size / 10)
+        self.assertEqual(self.journal.record('estrategia.py', self._version(1)), 2)
+        self.assertEqual(self.journal.get_version('estrategia.py', 1), self._version(0))
+        self.assertEqual(self.journal.list_versions('estrategia.py')[1]['changed_lines'], 2)
     
-    def test_create_and_restore_backup(self):
-        """Testa criação e restauração de backup."""
-        test_content = "original_content = True"
-        test_file = "backup_test.py"
+    def test_depth_and_size_caps_compact_journal(self):
+        """Testa a compactação pela profundidade e pelo limite de tamanho."""
+        for number in range(7):
+            self.journal.record('estrategia.py', self._version(number))
         
-        # Criar arquivo original
-        self.editor.write_file(test_file, test_content)
+        versions = self.journal.list_versions('estrategia.py')
+        self.assertEqual([v['version'] for v in versions], [5, 6, 7])
+        self.assertEqual(versions[0]['type'], 'snapshot')
+        self.assertEqual(self.journal.get_version('estrategia.py', 6), self._version(5))
         
-        # Criar backup
-        backup_success = self.editor.create_backup(test_file)
-        self.assertTrue(backup_success)
+        self.journal.max_bytes = 1
+        self.journal.record('estrategia.py', self._version(9))
+        self.assertEqual([v['version'] for v in self.journal.list_versions('estrategia.py')], [8])
+
+
+class TestWorkspaceScanner(unittest.TestCase):
+    """Testes da varredura paralela do projeto."""
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        self.temp_dir = tempfile.mkdtemp()
+        for relative_path, content in [
+            ('bud_logic/strategy.py', 'def sinal():\n    return 1\n'),
+            ('bud_logic/quebrado.py', 'def sinal(:\n'),
+            ('sorte_dashboard/venv/lib/pacote.py', 'x = 1\n'),
+            ('backups/backup_1/strategy.py', 'x = 1\n'),
+            ('bud_logic/__pycache__/strategy.py', 'x = 1\n'),
+            ('.sorte_journal/estado.py', 'x = 1\n'),
+            ('README.md', '# Sorte\n'),
+        ]:
+            path = os.path.join(self.temp_dir, relative_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+        with patch('utils.workspace_scanner.Logger'):
+            from utils.workspace_scanner import WorkspaceScanner
+            self.scanner = WorkspaceScanner(self.temp_dir, max_workers=2)
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_ignore_rules(self):
+        """Testa que venv, backups, __pycache__ e diretórios ocultos são ignorados."""
+        self.assertEqual(sorted(self.scanner.iter_python_files()),
+                         [os.path.join('bud_logic', 'quebrado.py'), os.path.join('bud_logic', 'strategy.py')])
+        self.assertEqual(self.scanner.directory_size(os.path.join(self.temp_dir, 'backups')), 6)
+    
+    def test_check_syntax_reports_errors(self):
+        """Testa o resumo da verificação de sintaxe."""
+        summary = self.scanner.check_syntax()
         
-        # Modificar arquivo original
-        modified_content = "modified_content = True"
-        self.editor.write_file(test_file, modified_content)
+        self.assertFalse(summary['passed'])
+        self.assertEqual(summary['files_checked'], 2)
+        self.assertEqual(len(summary['errors']), 1)
+        self.assertTrue(summary['errors'][0].startswith(os.path.join('bud_logic', 'quebrado.py')))
+    
+    def test_process_pool_returns_every_file(self):
+        """Testa a análise em pool de processos com muitos arquivos."""
+        files = []
+        for index in range(20):
+            relative_path = os.path.join('modulos', f'modulo_{index}.py')
+            os.makedirs(os.path.join(self.temp_dir, 'modulos'), exist_ok=True)
+            with open(os.path.join(self.temp_dir, relative_path), 'w', encoding='utf-8') as f:
+                f.write('return 1\n' if index == 7 else f'valor = {index}\n')
+            files.append(relative_path)
         
-        # Verificar que foi modificado
-        current_content = self.editor.read_file(test_file)
-        self.assertEqual(current_content, modified_content)
+        parsed = {result['file']: result['ok'] for result in self.scanner.scan(files, task='parse')}
+        compiled = {result['file']: result['ok'] for result in self.scanner.scan(files, task='compile')}
         
-        # Restaurar backup
-        restore_success = self.editor.restore_backup(test_file)
-        self.assertTrue(restore_success)
+        self.assertEqual(sorted(parsed), sorted(files))
+        self.assertTrue(all(parsed.values()))
+        self.assertEqual([name for name, ok in compiled.items() if not ok], [os.path.join('modulos', 'modulo_7.py')])
+
+
+class TestCodeEditorReplace(unittest.TestCase):
+    """Testes da substituição de vários padrões em uma passada."""
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        self.temp_dir = tempfile.mkdtemp()
+        from bud_editor_service.editor import CodeEditor
+        self.editor = CodeEditor(self.temp_dir)
+        self.editor.write_file('bud_logic/strategy.py', "stop = 0.02\ntake = 0.05\nstop_loss = stop * 2\n")
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_single_pass_with_counts(self):
+        """Testa substituições simultâneas, com contagem e uma única escrita."""
+        from utils.atomic_files import atomic_write
         
-        # Verificar que foi restaurado
-        restored_content = self.editor.read_file(test_file)
-        self.assertEqual(restored_content, test_content)
+        with patch('bud_editor_service.editor.atomic_write', wraps=atomic_write) as write:
+            result = self.editor.replace_many('bud_logic/strategy.py',
+                                              {'stop': 'take', 'take': 'stop', 'stop_loss': 'perda_maxima'})
+        
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(result['counts'], {'stop': 2, 'take': 1, 'stop_loss': 1})
+        self.assertEqual(result['total'], 4)
+        self.assertEqual(self.editor.read_file('bud_logic/strategy.py'),
+                         "take = 0.02\nstop = 0.05\nperda_maxima = take * 2\n")
     
-    def test_parse_code(self):
-        """Testa análise de código Python."""
-        valid_code = """
-def hello():
-    print("Hello, World!")
-    return True
-"""
+    def test_no_match_does_not_write(self):
+        """Testa que nada é gravado quando não há ocorrências."""
+        with patch('bud_editor_service.editor.atomic_write') as write:
+            result = self.editor.replace_many('bud_logic/strategy.py', {'inexistente': 'x'})
+            self.assertFalse(self.editor.replace_in_file('bud_logic/strategy.py', 'inexistente', 'x'))
         
-        tree = self.editor.parse_code(valid_code)
-        self.assertIsNotNone(tree)
+        write.assert_not_called()
+        self.assertTrue(result['success'])
+        self.assertEqual(result['total'], 0)
+        self.assertFalse(self.editor.replace_many('ausente.py', {'a': 'b'})['success'])
+    
+    def test_large_file_uses_mmap_and_first_occurrence_only(self):
+        """Testa a leitura por mmap e o limite de substituições por padrão."""
+        with patch('bud_editor_service.editor.MMAP_THRESHOLD', 1):
+            self.assertTrue(self.editor.replace_in_file('bud_logic/strategy.py', 'stop', 'parar'))
+            result = self.editor.replace_many('bud_logic/strategy.py', {'0.0': '0.1'})
         
-        # Código inválido
-        invalid_code = "def hello(\n    print('invalid')"
-        tree = self.editor.parse_code(invalid_code)
-        self.assertIsNone(tree)
+        self.assertEqual(result['counts'], {'0.0': 2})
+        self.assertEqual(self.editor.read_file('bud_logic/strategy.py'),
+                         "parar = 0.12\ntake = 0.15\nstop_loss = stop * 2\n")
+
+
+class TestLintCache(unittest.TestCase):
+    """Testes do cache de resultados do pylint no CodeGuardian."""
     
-    def test_validate_syntax(self):
-        """Testa validação de sintaxe."""
-        valid_code = "def test(): return True"
-        self.assertTrue(self.editor.validate_syntax(valid_code))
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        self.temp_dir = tempfile.mkdtemp()
+        for name, content in [('a.py', '"""Módulo."""\n'), ('b.py', 'x=1\n')]:
+            with open(os.path.join(self.temp_dir, name), 'w', encoding='utf-8') as f:
+                f.write(content)
+        from bud_guardian_service.guardian import CodeGuardian
+        self.guardian = CodeGuardian(self.temp_dir, lint_workers=0)
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _pylint_process(self, *paths):
+        import json
+        process = Mock()
+        process.returncode = 16 if paths else 0
+        process.communicate.return_value = (json.dumps([{'type': 'convention', 'path': path, 'line': 1, 'column': 0,
+                                                         'symbol': 'invalid-name', 'message-id': 'C0103',
+                                                         'message': 'nome'} for path in paths]), '')
+        return process
+    
+    @patch('builtins.print')
+    def test_misses_linted_in_one_invocation_and_hits_skip_pylint(self, _):
+        """Testa o modo em lote (só falhas de cache) e os acertos sem subprocesso."""
+        with patch('bud_guardian_service.guardian.subprocess.Popen', return_value=self._pylint_process('b.py')) as run:
+            self.assertEqual(self.guardian.validate_files(['a.py', 'b.py']), {'a.py': True, 'b.py': False})
+            self.assertEqual(run.call_count, 1)
+            self.assertEqual(run.call_args[0][0][-2:], ['a.py', 'b.py'])
+            
+            self.assertFalse(self.guardian.validate_code('b.py'))
+            self.assertTrue(self.guardian.validate_code('a.py'))
+            self.assertEqual(run.call_count, 1)
+        self.assertEqual(self.guardian.lint_cache.get_stats()['hits'], 2)
+    
+    @patch('builtins.print')
+    def test_content_and_config_changes_invalidate(self, _):
+        """Testa que mudar o arquivo ou o pylintrc força nova análise."""
+        with patch('bud_guardian_service.guardian.subprocess.Popen', return_value=self._pylint_process()) as run:
+            self.guardian.validate_code('a.py')
+            with open(os.path.join(self.temp_dir, 'a.py'), 'a', encoding='utf-8') as f:
+                f.write('VALOR = 1\n')
+            self.guardian.validate_code('a.py')
+            with open(os.path.join(self.temp_dir, '.pylintrc'), 'w', encoding='utf-8') as f:
+                f.write('[MESSAGES CONTROL]\ndisable=C0103\n')
+            self.guardian.validate_code('a.py')
+            self.guardian.validate_code('a.py')
         
-        invalid_code = "def test( return True"
-        self.assertFalse(self.editor.validate_syntax(invalid_code))
+        self.assertEqual(run.call_count, 3)
     
-    def test_get_function_names(self):
-        """Testa extração de nomes de funções."""
-        code_with_functions = """
-def function_one():
-    pass
+    @patch('builtins.print')
+    def test_pylint_failure_is_not_cached(self, _):
+        """Testa que uma falha ao executar o pylint não é guardada no cache."""
+        with patch('bud_guardian_service.guardian.subprocess.Popen', side_effect=FileNotFoundError):
+            self.assertFalse(self.guardian.validate_code('a.py'))
+        self.assertEqual(self.guardian.lint_cache.get_stats()['stores'], 0)
+    
+    @patch('builtins.print')
+    def test_cancel_event_kills_pylint_subprocess(self, _):
+        """Testa que o cancelamento encerra o pylint em execução e não guarda resultado no cache."""
+        import threading
+        import time
+        bin_dir = os.path.join(self.temp_dir, 'bin')
+        os.makedirs(bin_dir)
+        with open(os.path.join(bin_dir, 'pylint'), 'w') as f:
+            f.write('#!/bin/sh\nsleep 30\n')
+        os.chmod(os.path.join(bin_dir, 'pylint'), 0o755)
+        cancel_event = threading.Event()
+        threading.Timer(0.2, cancel_event.set).start()
+        
+        started_at = time.monotonic()
+        with patch.dict(os.environ, {'PATH': bin_dir + os.pathsep + os.environ.get('PATH', '')}):
+            self.assertEqual(self.guardian.validate_files(['a.py'], cancel_event=cancel_event), {'a.py': False})
+        self.assertLess(time.monotonic() - started_at, 5)
+        self.assertEqual(self.guardian.lint_cache.get_stats()['stores'], 0)
 
-def function_two():
-    return True
+class TestLintWorkerPool(unittest.TestCase):
+    """Testes do pool de workers de lint aquecidos."""
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        import importlib.util
+        if importlib.util.find_spec('pylint') is None:
+            self.skipTest("pylint não instalado")
+        self.temp_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.temp_dir, 'mod.py'), 'w', encoding='utf-8') as f:
+            f.write('"""Módulo."""\nimport os\n')
+        with patch('bud_guardian_service.lint_workers.Logger'):
+            from bud_guardian_service.lint_workers import LintWorkerPool
+            self.pool = LintWorkerPool(self.temp_dir, workers=1)
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        if hasattr(self, 'pool'):
+            self.pool.close()
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_worker_is_reused_and_sees_file_changes(self):
+        """Testa mensagens estruturadas, reuso do mesmo processo e releitura do arquivo."""
+        messages = self.pool.lint(['mod.py'])
+        self.assertEqual([(m['path'], m['type'], m['symbol']) for m in messages],
+                         [('mod.py', 'warning', 'unused-import')])
+        pid = self.pool._all[0].process.pid
+        
+        with open(os.path.join(self.temp_dir, 'mod.py'), 'w', encoding='utf-8') as f:
+            f.write('"""Módulo."""\n')
+        self.assertEqual(self.pool.lint(['mod.py']), [])
+        self.assertEqual(self.pool._all[0].process.pid, pid)
+        self.assertEqual(self.pool.get_stats()['jobs'], 2)
+    
+    def test_cancel_event_stops_busy_worker(self):
+        """Testa que o cancelamento mata o worker em análise e que o próximo pedido inicia outro."""
+        import subprocess
+        import threading
+        import time
+        from bud_guardian_service.lint_workers import _Worker
+        hanging = ("import json, sys, time\nprint(json.dumps({'ready': True}), flush=True)\n"
+                   "sys.stdin.readline()\ntime.sleep(30)\n")
+        spawn = self.pool._spawn
+        self.pool._spawn = lambda: _Worker(subprocess.Popen([sys.executable, '-c', hanging], text=True,
+                                                            stdin=subprocess.PIPE, stdout=subprocess.PIPE))
+        cancel_event = threading.Event()
+        threading.Timer(0.2, cancel_event.set).start()
+        
+        started_at = time.monotonic()
+        self.assertIsNone(self.pool.lint(['mod.py'], cancel_event))
+        self.assertLess(time.monotonic() - started_at, 5)
+        self.assertEqual((self.pool.get_stats()['cancelled'], self.pool._all), (1, []))
+        
+        self.pool._spawn = spawn
+        self.assertEqual(len(self.pool.lint(['mod.py'])), 1)
+    
+    def test_dead_worker_is_replaced(self):
+        """Testa que um worker que morreu é substituído sem perder o pedido."""
+        self.pool.warm_up()
+        self.pool._all[0].process.kill()
+        self.pool._all[0].process.wait()
+        
+        self.assertEqual(len(self.pool.lint(['mod.py'])), 1)
+        self.assertEqual(self.pool.get_stats()['restarts'], 1)
+    
+    @patch('builtins.print')
+    def test_guardian_uses_pool_and_falls_back_to_subprocess(self, _):
+        """Testa o guardião com o pool e o retorno ao subprocesso quando os workers falham."""
+        from bud_guardian_service.guardian import CodeGuardian
+        guardian = CodeGuardian(self.temp_dir, lint_workers=1)
+        guardian._lint_pool = self.pool
+        # Workers iniciados antes: o patch de Popen vale para o módulo subprocess inteiro
+        self.pool.warm_up()
+        with patch('bud_guardian_service.guardian.subprocess.Popen') as run:
+            self.assertEqual(len(guardian._run_pylint(['mod.py'])['mod.py']['messages']), 1)
+            run.assert_not_called()
+        
+        process = Mock(returncode=16)
+        process.communicate.return_value = ('[{"type": "convention", "path": "mod.py", "line": 1, "column": 0, '
+                                            '"symbol": "invalid-name", "message-id": "C0103", "message": "nome"}]', '')
+        with patch.object(self.pool, 'lint_many', return_value=None), \
+                patch('bud_guardian_service.guardian.subprocess.Popen', return_value=process) as run:
+            entries = guardian._run_pylint(['mod.py'])
+            run.assert_called_once()
+        # Por padrão qualquer mensagem reprova; LINT_FAIL_ON relaxa explicitamente
+        self.assertFalse(guardian._passed(entries['mod.py']['messages']))
+        with patch.dict(os.environ, {'LINT_FAIL_ON': 'fatal,error,warning'}):
+            relaxed = CodeGuardian(self.temp_dir, lint_workers=0)
+        self.assertTrue(relaxed._passed(entries['mod.py']['messages']))
 
-class TestClass:
-    def method_one(self):
-        pass
-"""
+
+class TestTestImpactAnalyzer(unittest.TestCase):
+    """Testes da seleção de testes afetados por uma alteração."""
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        self.temp_dir = tempfile.mkdtemp()
+        files = {
+            'pkg/__init__.py': '',
+            'pkg/core.py': 'def dobro(x):\n    return 2 * x\n',
+            'pkg/api.py': 'from .core import dobro\n\ndef quadruplo(x):\n    return dobro(dobro(x))\n',
+            'pkg/outro.py': 'VALOR = 1\n',
+            'tests/test_pkg.py': (
+                'import unittest\nfrom unittest.mock import patch\n\n'
+                'class TestApi(unittest.TestCase):\n'
+                '    def test_quadruplo(self):\n'
+                '        from pkg.api import quadruplo\n'
+                '        self.assertEqual(quadruplo(1), 4)\n\n'
+                'class TestPatch(unittest.TestCase):\n'
+                '    @patch(\'pkg.core.dobro\', return_value=0)\n'
+                '    def test_patch(self, _):\n'
+                '        self.assertTrue(True)\n\n'
+                'class TestFalha(unittest.TestCase):\n'
+                '    def test_falha(self):\n'
+                '        from pkg.outro import VALOR\n'
+                '        self.assertEqual(VALOR, 2)\n'),
+        }
+        for name, content in files.items():
+            os.makedirs(os.path.dirname(os.path.join(self.temp_dir, name)), exist_ok=True)
+            with open(os.path.join(self.temp_dir, name), 'w', encoding='utf-8') as f:
+                f.write(content)
+        with patch('bud_guardian_service.impact_analysis.Logger'):
+            from bud_editor_service.ast_cache import ASTCache
+            from bud_guardian_service.impact_analysis import TestImpactAnalyzer
+            self.analyzer = TestImpactAnalyzer(self.temp_dir, ast_cache=ASTCache(), shards=2)
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_selects_transitive_importers_and_patch_targets(self):
+        """Testa a seleção pelo grafo de imports, inclusive imports relativos e alvos de patch."""
+        selected = self.analyzer.select(['pkg/core.py'])
+        self.assertEqual(sorted(selected), ['tests/test_pkg.py::TestApi', 'tests/test_pkg.py::TestPatch'])
+        self.assertEqual(selected['tests/test_pkg.py::TestApi'], ['importa pkg.api -> pkg.core'])
         
-        test_file = "functions_test.py"
-        self.editor.write_file(test_file, code_with_functions)
+        self.assertEqual(list(self.analyzer.select(['pkg/outro.py'])), ['tests/test_pkg.py::TestFalha'])
+        self.assertEqual(len(self.analyzer.select(['tests/test_pkg.py'])), 3)
+    
+    def test_coverage_map_adds_tests(self):
+        """Testa que o mapa de cobertura seleciona testes que leem arquivos fora do grafo."""
+        import json
+        self.assertEqual(self.analyzer.select(['dados.cfg']), {})
+        with open(os.path.join(self.temp_dir, '.sorte_test_map.json'), 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'tests': {'tests/test_pkg.py::TestFalha': ['dados.cfg', 'pkg/outro.py']}}, f)
+        self.assertEqual(self.analyzer.select(['dados.cfg']),
+                         {'tests/test_pkg.py::TestFalha': ['cobertura: executou dados.cfg']})
+    
+    def test_run_reports_each_test_and_shards(self):
+        """Testa a execução em shards com o resultado de cada caso."""
+        report = self.analyzer.run(['pkg/core.py', 'pkg/outro.py'])
         
-        function_names = self.editor.get_function_names(test_file)
-        expected_names = ['function_one', 'function_two', 'method_one']
+        self.assertFalse(report['passed'])
+        self.assertEqual(len(report['shards']), 2)
+        outcomes = {case['node']: case['outcome'] for case in report['tests']}
+        self.assertEqual(outcomes, {'tests/test_pkg.py::TestApi': 'passed',
+                                    'tests/test_pkg.py::TestPatch': 'passed',
+                                    'tests/test_pkg.py::TestFalha': 'failed'})
+        self.assertEqual(report['summary']['failed'], 1)
+        self.assertTrue(self.analyzer.run(['pkg/core.py'])['passed'])
+    
+    def test_cancel_event_stops_running_shards(self):
+        """Testa que sinalizar o cancelamento encerra os shards em execução."""
+        import threading
+        import time
+        with open(os.path.join(self.temp_dir, 'tests', 'test_lento.py'), 'w', encoding='utf-8') as f:
+            f.write('import time\n\ndef test_lento():\n    time.sleep(30)\n')
+        cancel_event = threading.Event()
+        threading.Timer(0.5, cancel_event.set).start()
         
-        for name in expected_names:
-            self.assertIn(name, function_names)
+        started_at = time.perf_counter()
+        report = self.analyzer.run(['tests/test_lento.py'], cancel_event=cancel_event)
+        self.assertLess(time.perf_counter() - started_at, 10)
+        self.assertTrue(report['cancelled'])
+        self.assertFalse(report['passed'])
+        self.assertEqual(report['shards'][0]['status'], 'cancelled')
+
+
+class TestSecurityAnalyzer(unittest.TestCase):
+    """Testes das regras de segurança do CodeGuardian."""
     
-    def test_get_class_names(self):
-        """Testa extração de nomes de classes."""
-        code_with_classes = """
-class ClassOne:
-    pass
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        self.temp_dir = tempfile.mkdtemp()
+        with patch('bud_guardian_service.security_rules.Logger'):
+            from bud_guardian_service.security_rules import SecurityAnalyzer
+            self.analyzer = SecurityAnalyzer(self.temp_dir)
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_detects_rules_through_aliases(self):
+        """Testa as regras com imports renomeados e caminhos dentro/fora do projeto."""
+        code = (
+            "import os, subprocess as sp\n"
+            "from importlib import import_module\n"
+            "import requests\n"
+            "def f(cmd, nome):\n"
+            "    os.system('ls')\n"
+            "    sp.run(cmd, shell=True)\n"
+            "    sp.run(['ls'])\n"
+            "    eval(cmd)\n"
+            "    __import__(nome)\n"
+            "    import_module(nome)\n"
+            "    import_module('json')\n"
+            "    requests.get('http://exemplo.com')\n"
+            "    open('/etc/passwd', 'w')\n"
+            "    open('../fora.txt', mode='a')\n"
+            "    open('dados/saida.txt', 'w')\n"
+            "    open('/etc/hosts')\n"
+        )
+        report = self.analyzer.analyze_source(code)
+        
+        found = [(finding['line'], finding['rule'], finding['severity']) for finding in report['findings']]
+        self.assertEqual(found, [(5, 'os-command', 'high'), (6, 'subprocess-shell', 'high'),
+                                 (7, 'subprocess', 'medium'), (8, 'eval-exec', 'high'),
+                                 (9, 'dynamic-import', 'high'), (10, 'dynamic-import', 'medium'),
+                                 (12, 'network', 'medium'), (13, 'file-write-outside', 'high'),
+                                 (14, 'file-write-outside', 'high'), (15, 'file-write', 'low')])
+        self.assertFalse(report['passed'])
+    
+    def test_medium_findings_pass_and_results_are_cached(self):
+        """Testa que só severidade alta reprova e que o mesmo conteúdo sai do cache."""
+        code = "import subprocess\nsubprocess.run(['git', 'status'])\n"
+        first = self.analyzer.analyze_source(code)
+        second = self.analyzer.analyze_source(code)
+        
+        self.assertTrue(first['passed'])
+        self.assertEqual(len(first['findings']), 1)
+        self.assertFalse(first['cached'])
+        self.assertTrue(second['cached'])
+        self.assertEqual(self.analyzer.get_stats()['analyses'], 1)
+    
+    def test_time_budget_marks_result_incomplete(self):
+        """Testa que estourar o orçamento de tempo interrompe a análise sem guardar no cache."""
+        from bud_guardian_service.security_rules import SecurityAnalyzer
+        with patch('bud_guardian_service.security_rules.Logger'):
+            analyzer = SecurityAnalyzer(self.temp_dir, time_budget=0)
+        code = "\n".join(f"def f{i}(x):\n    return [y * 2 for y in x if y]" for i in range(200))
+        
+        report = analyzer.analyze_source(code)
+        self.assertFalse(report['complete'])
+        self.assertFalse(report['passed'])
+        self.assertIn('Orçamento', report['error'])
+        self.assertFalse(analyzer.analyze_source(code)['cached'])
+    
+    def test_cancel_event_interrupts_analysis(self):
+        """Testa que o cancelamento interrompe a análise sem guardar no cache."""
+        import threading
+        cancel_event = threading.Event()
+        cancel_event.set()
+        code = "\n".join(f"def f{i}(x):\n    return [y * 2 for y in x if y]" for i in range(200))
+        
+        report = self.analyzer.analyze_source(code, cancel_event=cancel_event)
+        self.assertFalse(report['complete'] or report['passed'])
+        self.assertIn('cancelada', report['error'])
+        self.assertTrue(self.analyzer.analyze_source(code)['complete'])
+        self.assertTrue(self.analyzer.analyze_source(code)['cached'])
 
-class ClassTwo:
-    def method(self):
-        pass
 
-def standalone_function():
-    pass
-"""
+class TestSandboxRunner(unittest.TestCase):
+    """Testes do sandbox que executa e mede o código gerado."""
+    
+    BASELINE = "def media(precos, periodo=14):\n    return sum(precos[-periodo:]) / periodo\n"
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        self.temp_dir = tempfile.mkdtemp()
+        with patch('bud_guardian_service.sandbox_runner.Logger'):
+            from bud_guardian_service.sandbox_runner import SandboxRunner
+            self.runner = SandboxRunner(self.temp_dir, cpu_seconds=1, memory_mb=256, timeout=5)
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_run_measures_synthetic_workload(self):
+        """Testa as medidas de tempo, CPU e memória e a chamada das funções com dados sintéticos."""
+        result = self.runner.run(self.BASELINE + "print('saida do candidato')\n")
         
-        test_file = "classes_test.py"
-        self.editor.write_file(test_file, code_with_classes)
+        self.assertTrue(result['success'], result['error'])
+        self.assertIsNone(result['calls']['media']['error'])
+        self.assertGreater(result['calls']['media']['wall_time'], 0)
+        self.assertGreater(result['wall_time'], 0)
+        self.assertGreaterEqual(result['cpu_time'], 0)
+        self.assertGreater(result['peak_rss_kb'], 0)
+    
+    def test_resource_limits_stop_candidate(self):
+        """Testa os limites de CPU, memória e arquivos abertos."""
+        self.assertEqual(self.runner.run("while True:\n    pass\n")['killed_by'], 'cpu')
+        self.assertEqual(self.runner.run("dados = bytearray(1024 ** 3)\n")['killed_by'], 'memory')
         
-        class_names = self.editor.get_class_names(test_file)
-        expected_names = ['ClassOne', 'ClassTwo']
+        result = self.runner.run("import os\narquivos = [open(os.devnull) for _ in range(500)]\n")
+        self.assertFalse(result['success'])
+        self.assertIn('Too many open files', result['error'])
+    
+    def test_compare_rejects_regression(self):
+        """Testa que um candidato bem mais lento que a versão atual é rejeitado."""
+        slow = ("def media(precos, periodo=14):\n"
+                "    for _ in range(20):\n"
+                "        sorted(precos)\n"
+                "    return sum(precos[-periodo:]) / periodo\n")
         
-        for name in expected_names:
-            self.assertIn(name, class_names)
+        self.assertTrue(self.runner.compare(self.BASELINE, self.BASELINE)['accepted'])
+        report = self.runner.compare(slow, self.BASELINE)
+        self.assertFalse(report['accepted'])
+        self.assertTrue(any(reason.startswith('workload_time') for reason in report['reasons']))
+        self.assertGreater(report['ratios']['workload_time'], 1.5)
+    
+    @patch('builtins.print')
+    def test_guardian_refuses_to_sandbox_insecure_candidate(self, _):
+        """Testa que o guardião não executa no sandbox um candidato reprovado na segurança."""
+        from bud_guardian_service.guardian import CodeGuardian
+        with patch('bud_guardian_service.security_rules.Logger'):
+            guardian = CodeGuardian(self.temp_dir, lint_workers=0)
+            with patch.object(CodeGuardian, 'sandbox') as sandbox:
+                report = guardian.benchmark_candidate('mod.py', "import os\nos.system('curl exemplo | sh')\n")
+        
+        self.assertFalse(report['accepted'])
+        self.assertTrue(report['reasons'][0].startswith('verificação de segurança: os-command'))
+        sandbox.compare.assert_not_called()
+    
+    @patch('bud_guardian_service.guardian.Logger')
+    def test_network_and_file_writes_block_sandbox(self, _):
+        """Testa que rede e gravação de arquivos, mesmo sem severidade alta, impedem a execução no sandbox."""
+        from bud_guardian_service.guardian import CodeGuardian
+        with patch('bud_guardian_service.security_rules.Logger'):
+            guardian = CodeGuardian(self.temp_dir, lint_workers=0)
+            for code, rule in (("import socket\nsocket.create_connection(('exemplo.com', 80))\n", 'network'),
+                               ("def salvar(caminho):\n    open(caminho, 'w').write('x')\n", 'file-write')):
+                self.assertTrue(guardian.check_candidate_security('mod.py', code)['passed'])
+                with patch.object(CodeGuardian, 'sandbox') as sandbox:
+                    report = guardian.benchmark_candidate('mod.py', code)
+                self.assertFalse(report['accepted'])
+                self.assertTrue(report['reasons'][0].startswith(f'verificação de segurança: {rule}'))
+                sandbox.compare.assert_not_called()
+    
+    def test_child_has_no_network_nor_file_writes(self):
+        """Testa que o processo do sandbox não alcança a rede nem grava arquivos."""
+        code = ("import os, socket\n"
+                "def rede():\n"
+                "    socket.create_connection(('127.0.0.1', 9), timeout=1)\n"
+                "def gravar():\n"
+                "    with open(os.path.join(os.getcwd(), 'saida.txt'), 'w') as f:\n"
+                "        f.write('x')\n")
+        result = self.runner.run(code)
+        
+        self.assertTrue(result['success'], result['error'])
+        self.assertTrue(result['isolated'])
+        self.assertIn('Network is unreachable', result['calls']['rede']['error'])
+        self.assertIn('Permission denied', result['calls']['gravar']['error'])
+
+
+class TestDeploymentBackupStore(unittest.TestCase):
+    """Testes dos backups endereçados por conteúdo do gerenciador de deploy."""
+    
+    def setUp(self):
+        """Configuração inicial para cada teste."""
+        self.temp_dir = tempfile.mkdtemp()
+        for name, content in (('bud_logic/strategy.py', 'RISCO = 1\n'), ('config.yaml', 'modo: teste\n')):
+            os.makedirs(os.path.join(self.temp_dir, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(self.temp_dir, name), 'w') as f:
+                f.write(content)
+        
+        with patch('bud_commander_service.deployment_manager.Logger'), \
+             patch('bud_commander_service.backup_store.Logger'):
+            from bud_commander_service.deployment_manager import SorteDeploymentManager
+            self.manager = SorteDeploymentManager(self.temp_dir)
+        self.manager._get_current_git_commit = Mock(return_value=None)
+        self.manager._capture_system_state = Mock(return_value={})
+    
+    def tearDown(self):
+        """Limpeza após cada teste."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _write(self, name, content):
+        with open(os.path.join(self.temp_dir, name), 'w') as f:
+            f.write(content)
+    
+    def test_differential_archives_hold_only_changes(self):
+        """Testa que o diferencial só leva o que mudou desde o último completo e que completos são periódicos."""
+        self.manager.backup_store.full_every = 2
+        first = self.manager.create_intelligent_backup("primeiro")
+        self.assertTrue(first["success"], first.get("error"))
+        self.assertEqual(sorted(first["files_backed_up"]), ['bud_logic/strategy.py', 'config.yaml'])
+        self.assertEqual((first["kind"], first["files_archived"]), ("full", 2))
+        
+        second = self.manager.create_intelligent_backup("segundo")
+        self.assertEqual((second["kind"], second["base"]), ("diff", first["backup_name"]))
+        self.assertEqual((second["files_archived"], second["bytes_written"]), (0, 0))
+        
+        # full_every = 2: um completo a cada dois backups, mesmo sem mudanças
+        third = self.manager.create_intelligent_backup("terceiro")
+        self.assertEqual((third["kind"], third["files_archived"]), ("full", 2))
+        self._write('config.yaml', 'modo: producao, mais longo\n')
+        fourth = self.manager.create_intelligent_backup("quarto")
+        # Diferencial maior que MAX_DIFF_RATIO do completo: vira completo
+        self.assertEqual(fourth["kind"], "full")
+        self.assertEqual(self.manager.backup_store.get_stats()["archives"], 3)
+    
+    def test_rollback_follows_chain_and_skips_matching_files(self):
+        """Testa o rollback de um diferencial, lendo também do completo, sem reescrever o que já confere."""
+        full = self.manager.create_intelligent_backup("completo")
+        self._write('bud_logic/strategy.py', 'RISCO = 2\n')
+        diff = self.manager.create_intelligent_backup("pre_deploy")
+        self.assertEqual((diff["kind"], diff["files_archived"]), ("diff", 1))
+        
+        self._write('bud_logic/strategy.py', 'RISCO = 9\n')
+        os.remove(os.path.join(self.temp_dir, 'config.yaml'))
+        rollback = self.manager.rollback_to_backup(diff["backup_name"])
+        
+        self.assertTrue(rollback["success"], rollback["error"])
+        self.assertEqual(sorted(rollback["files_restored"]), ['bud_logic/strategy.py', 'config.yaml'])
+        with open(os.path.join(self.temp_dir, 'bud_logic/strategy.py')) as f:
+            self.assertEqual(f.read(), 'RISCO = 2\n')
+        with open(os.path.join(self.temp_dir, 'config.yaml')) as f:
+            self.assertEqual(f.read(), 'modo: teste\n')
+        
+        again = self.manager.rollback_to_backup(full["backup_name"])
+        self.assertEqual(again["files_restored"], ['bud_logic/strategy.py'])
+        self.assertEqual(again["files_skipped"], ['config.yaml'])
+    
+    def test_cleanup_keeps_full_archive_while_diffs_depend_on_it(self):
+        """Testa que remover o completo mais antigo mantém o tar dele enquanto um diferencial o usa."""
+        self.manager.max_backups = 1
+        old = self.manager.create_intelligent_backup("antigo")
+        self._write('bud_logic/strategy.py', 'RISCO = 2\n')
+        new = self.manager.create_intelligent_backup("novo")
+        
+        stats = self.manager.backup_store.get_stats()
+        self.assertEqual((stats["manifests"], stats["diff"], stats["archives"]), (1, 1, 2))
+        self.assertFalse(self.manager.rollback_to_backup(old["backup_name"])["success"])
+        
+        os.remove(os.path.join(self.temp_dir, 'config.yaml'))
+        self.assertTrue(self.manager.rollback_to_backup(new["backup_name"])["success"])
+        
+        # O próximo backup é completo; o diferencial antigo sai e leva o completo junto
+        self.manager.backup_store.full_every = 1
+        self.manager.create_intelligent_backup("recente")
+        self.assertEqual(self.manager.backup_store.get_stats()["archives"], 1)
+    
+    def test_cleanup_by_size_only_removes_what_frees_space(self):
+        """Testa que a limpeza por espaço não apaga restauros que não liberariam bytes."""
+        store = self.manager.backup_store
+        store.full_every = 2
+        names = []
+        for step in (2, 3):
+            names.append(self.manager.create_intelligent_backup(f"antes_{step}")["backup_name"])
+            self._write('bud_logic/strategy.py', f'RISCO = {step}\n')
+            names.append(self.manager.create_intelligent_backup(f"depois_{step}")["backup_name"])
+        kinds = [store.load_manifest(name)["kind"] for name in names]
+        self.assertEqual(kinds, ["full", "diff", "full", "diff"])
+        
+        # O completo mais recente sozinho já passa do limite: nada é removido
+        self.manager.max_backup_bytes = 1
+        self.manager._cleanup_old_backups()
+        self.assertEqual(store.get_stats()["manifests"], 4)
+        
+        # Só o primeiro completo com seu diferencial libera espaço; o completo sozinho não
+        self.manager.max_backup_bytes = store.disk_usage() - 1
+        self.manager._cleanup_old_backups()
+        self.assertEqual([manifest["backup_name"] for manifest in store.list_manifests()], names[2:])
+        self.assertLessEqual(store.disk_usage(), self.manager.max_backup_bytes)
+    
+    def test_empty_full_is_not_used_as_base(self):
+        """Testa que um completo sem arquivos (todos ausentes) não quebra os backups seguintes."""
+        store = self.manager.backup_store
+        empty = store.snapshot(self.temp_dir, ['ausente.py'], 'vazio')
+        self.assertEqual((empty["kind"], empty["files_archived"]), ("full", 0))
+        
+        after = store.snapshot(self.temp_dir, ['config.yaml'], 'depois')
+        self.assertEqual((after["kind"], after["base"], after["files_archived"]), ("full", None, 1))
+        diff = store.snapshot(self.temp_dir, ['config.yaml'], 'diferencial')
+        self.assertEqual((diff["kind"], diff["base"]), ("diff", "depois"))
+    
+    def test_restore_checks_digest_before_replacing(self):
+        """Testa que um conteúdo que não confere com o sha256 do manifesto não substitui o arquivo em uso."""
+        import json
+        store = self.manager.backup_store
+        store.snapshot(self.temp_dir, ['config.yaml'], 'corrompido')
+        manifest = store.load_manifest('corrompido')
+        manifest['files']['config.yaml']['sha256'] = '0' * 64
+        with open(store.manifest_path('corrompido'), 'w') as f:
+            json.dump(manifest, f)
+        self._write('config.yaml', 'modo: atual\n')
+        
+        with self.assertRaises(ValueError):
+            store.restore(self.temp_dir, 'corrompido')
+        with open(os.path.join(self.temp_dir, 'config.yaml')) as f:
+            self.assertEqual(f.read(), 'modo: atual\n')
+        self.assertEqual([name for name in os.listdir(self.temp_dir) if name.endswith('.tmp')], [])
+    
+    def test_file_changed_during_snapshot_still_restores(self):
+        """Testa que o manifesto registra o sha256 do que entrou no tar, mesmo se o arquivo mudou depois do hash."""
+        store = self.manager.backup_store
+        original_hash = store._hash
+        
+        def hash_then_change(file_path, stat):
+            digest = original_hash(file_path, stat)
+            with open(file_path, 'w') as f:
+                f.write('modo: alterado durante o backup\n')
+            return digest
+        
+        with patch.object(store, '_hash', side_effect=hash_then_change):
+            store.snapshot(self.temp_dir, ['config.yaml'], 'corrida')
+        
+        self._write('config.yaml', 'modo: atual\n')
+        result = store.restore(self.temp_dir, 'corrida')
+        self.assertEqual(result['files_restored'], ['config.yaml'])
+        with open(os.path.join(self.temp_dir, 'config.yaml')) as f:
+            self.assertEqual(f.read(), 'modo: alterado durante o backup\n')
 
 
 class TestCodeGuardian(unittest.TestCase):
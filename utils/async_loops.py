@@ -0,0 +1,91 @@
+import asyncio
+import threading
+from typing import Any, AsyncGenerator, Awaitable, Callable, Coroutine, Optional
+
+
+async def _close_at_shutdown(close: Callable[[], Awaitable[Any]]) -> AsyncGenerator[None, None]:
+    try:
+        yield
+    finally:
+        await close()
+
+
+async def bind_to_loop(close: Callable[[], Awaitable[Any]]) -> AsyncGenerator[None, None]:
+    """
+    Amarra um recurso assíncrono (cliente HTTP, cliente da OpenAI) ao loop
+    em execução: close() roda nesse loop quando ele encerra os geradores
+    assíncronos (asyncio.run faz isso antes de fechar o loop). Retorna o
+    gerador, que o chamador mantém referenciado enquanto usar o recurso:
+    o loop só guarda uma referência fraca a ele.
+    """
+    generator = _close_at_shutdown(close)
+    await generator.__anext__()
+    return generator
+
+
+class BackgroundLoop:
+    """
+    Loop de eventos persistente em uma thread daemon, para o código síncrono
+    rodar corrotinas sem criar um loop por chamada: os clientes HTTP
+    amarrados a ele (e seus pools de conexões) duram o processo todo.
+    """
+
+    def __init__(self, name: str = 'sorte-async'):
+        self.name = name
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name=self.name, daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def run(self, coroutine: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Executa a corrotina no loop persistente e espera o resultado."""
+        loop = self._ensure_started()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            coroutine.close()
+            raise RuntimeError("BackgroundLoop.run chamado de dentro do próprio loop")
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result(timeout)
+
+    def close(self):
+        """Encerra os geradores assíncronos (fechando os recursos amarrados) e o loop."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None or loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(loop.shutdown_asyncgens(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+_background_loop: Optional[BackgroundLoop] = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> BackgroundLoop:
+    """Retorna o loop persistente do processo, iniciado no primeiro uso."""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = BackgroundLoop()
+        return _background_loop
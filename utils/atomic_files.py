@@ -0,0 +1,60 @@
+import os
+import tempfile
+from typing import Iterable, Union
+
+# Janela em que um mtime recente ainda pode esconder uma segunda escrita do mesmo
+# tamanho (granularidade do relógio do sistema de arquivos); nela o conteúdo é conferido
+RACY_WINDOW_NS = 2_000_000_000
+
+
+def atomic_write(file_path: str, content: Union[str, Iterable[bytes]]):
+    """
+    Escreve o arquivo de forma atômica: grava em um temporário no mesmo
+    diretório e o renomeia por cima do original. Leitores veem o conteúdo
+    antigo ou o novo, nunca um arquivo pela metade. content pode ser texto
+    ou uma sequência de blocos de bytes, gravados à medida que são gerados.
+    """
+    temp_path = write_temp(file_path, content)
+    try:
+        os.replace(temp_path, file_path)
+    except Exception:
+        discard_temp(temp_path)
+        raise
+
+
+def write_temp(file_path: str, content: Union[str, Iterable[bytes]]) -> str:
+    """
+    Grava content em um temporário ao lado de file_path (com fsync e a
+    permissão do original) e retorna o caminho dele. Quem chama decide se
+    o renomeia por cima do original ou o descarta com discard_temp.
+    """
+    directory = os.path.dirname(file_path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(file_path)}.", suffix='.tmp')
+    try:
+        if isinstance(content, str):
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+        else:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content:
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+        if os.path.exists(file_path):
+            # mkstemp cria o arquivo com permissão 0600; mantém a do original
+            os.chmod(temp_path, os.stat(file_path).st_mode & 0o7777)
+    except Exception:
+        discard_temp(temp_path)
+        raise
+    return temp_path
+
+
+def discard_temp(temp_path: str):
+    """Remove um temporário de write_temp, ignorando se ele já não existe."""
+    try:
+        os.unlink(temp_path)
+    except OSError:
+        pass
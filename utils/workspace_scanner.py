@@ -0,0 +1,134 @@
+import ast
+import fnmatch
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Any, Iterator, Optional, Sequence, Tuple
+from utils.logger import Logger
+
+# Diretórios que não fazem parte do código do projeto (ambientes virtuais, backups,
+# caches e diretórios ocultos como .git e .sorte_journal)
+DEFAULT_IGNORE = ('.*', '__pycache__', 'venv', 'env', 'site-packages', 'node_modules', 'backups', '*.egg-info')
+
+# Abaixo disso o custo de iniciar os processos supera o ganho
+MIN_FILES_FOR_POOL = 16
+
+
+def _check_file(path: str, task: str) -> Dict[str, Any]:
+    """Analisa (ast.parse) ou compila um arquivo; executado nos processos do pool."""
+    result = {'ok': True, 'error': None, 'lineno': None}
+    try:
+        with open(path, 'rb') as f:
+            source = f.read()
+        if task == 'compile':
+            compile(source, path, 'exec', dont_inherit=True)
+        else:
+            ast.parse(source, filename=path)
+    except SyntaxError as e:
+        result.update(ok=False, error=f"{e.msg} (linha {e.lineno})", lineno=e.lineno)
+    except (OSError, ValueError) as e:
+        result.update(ok=False, error=str(e))
+    return result
+
+
+class WorkspaceScanner:
+    """
+    Varredura do projeto compartilhada pelo editor, guardião e gerenciador de deploy.
+    Percorre a árvore com os.scandir respeitando as regras de exclusão (venv,
+    backups, __pycache__...) e analisa ou compila os arquivos em um pool de
+    processos, entregando o resultado de cada arquivo assim que fica pronto.
+    """
+
+    def __init__(self, base_path: str, ignore: Optional[Sequence[str]] = None,
+                 max_workers: Optional[int] = None):
+        self.base_path = os.path.abspath(base_path)
+        self.ignore = tuple(ignore) if ignore is not None else DEFAULT_IGNORE
+        self.max_workers = max_workers or int(os.getenv('WORKSPACE_SCAN_WORKERS', '0')) or os.cpu_count() or 1
+        self.logger = Logger("WorkspaceScanner")
+
+    def is_ignored(self, name: str, ignore: Optional[Sequence[str]] = None) -> bool:
+        patterns = self.ignore if ignore is None else ignore
+        return any(name == pattern or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+    def iter_entries(self, root: Optional[str] = None, suffixes: Optional[Tuple[str, ...]] = ('.py',),
+                     ignore: Optional[Sequence[str]] = None) -> Iterator[Tuple[str, os.DirEntry]]:
+        """
+        Gera (caminho relativo à raiz, DirEntry) de cada arquivo, sem seguir links
+        simbólicos. suffixes=None inclui todos os arquivos.
+        """
+        root = os.path.abspath(root or self.base_path)
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if self.is_ignored(entry.name, ignore):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False) and (suffixes is None or entry.name.endswith(suffixes)):
+                            yield os.path.relpath(entry.path, root), entry
+            except OSError as e:
+                self.logger.warning(f"Diretório ignorado na varredura {directory}: {e}")
+
+    def iter_python_files(self, root: Optional[str] = None) -> Iterator[str]:
+        """Caminhos relativos dos arquivos .py do projeto."""
+        for relative_path, _ in self.iter_entries(root):
+            yield relative_path
+
+    def directory_size(self, path: str) -> int:
+        """Tamanho total em bytes de um diretório (sem regras de exclusão)."""
+        total = 0
+        for _, entry in self.iter_entries(path, suffixes=None, ignore=()):
+            try:
+                total += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                pass
+        return total
+
+    def scan(self, files: Optional[List[str]] = None, task: str = 'parse') -> Iterator[Dict[str, Any]]:
+        """
+        Analisa (task='parse') ou compila (task='compile') os arquivos, por
+        padrão todos os .py do projeto, e gera o resultado de cada um
+        ({'file', 'ok', 'error', 'lineno'}) na ordem em que terminam.
+        """
+        if task not in ('parse', 'compile'):
+            raise ValueError(f"Tarefa de varredura desconhecida: {task}")
+        files = list(self.iter_python_files()) if files is None else list(files)
+
+        if len(files) < MIN_FILES_FOR_POOL or self.max_workers == 1:
+            for relative_path in files:
+                yield dict(_check_file(os.path.join(self.base_path, relative_path), task), file=relative_path)
+            return
+
+        with ProcessPoolExecutor(max_workers=min(self.max_workers, len(files))) as pool:
+            futures = {pool.submit(_check_file, os.path.join(self.base_path, relative_path), task): relative_path
+                       for relative_path in files}
+            for future in as_completed(futures):
+                yield dict(future.result(), file=futures[future])
+
+    def check_syntax(self, files: Optional[List[str]] = None, task: str = 'compile') -> Dict[str, Any]:
+        """Resumo da verificação de sintaxe do projeto (ou dos arquivos informados)."""
+        errors = []
+        checked = 0
+        for result in self.scan(files, task):
+            checked += 1
+            if not result['ok']:
+                errors.append(f"{result['file']}: {result['error']}")
+        return {'passed': not errors, 'errors': sorted(errors), 'files_checked': checked}
+
+
+_scanners: Dict[str, WorkspaceScanner] = {}
+_scanners_lock = threading.Lock()
+
+
+def get_workspace_scanner(base_path: str) -> WorkspaceScanner:
+    """Retorna o scanner compartilhado do projeto em base_path."""
+    key = os.path.abspath(base_path)
+    with _scanners_lock:
+        scanner = _scanners.get(key)
+        if scanner is None:
+            scanner = WorkspaceScanner(key)
+            _scanners[key] = scanner
+        return scanner